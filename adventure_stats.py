@@ -0,0 +1,172 @@
+"""Chart data for the statistics page, computed on the server.
+
+``AdventureStatistics.build()`` turns a stored adventure into the series the
+statistics page charts:
+
+- each player's initiative rolls
+- CR, XP and difficulty per encounter, plus cumulative XP per player
+- damage per encounter (enemies, each player, untracked) and each player's
+  total
+
+Each encounter is summarized on its own and memoized by its stored JSON, so
+when one encounter changes (a round is played, or it completes) only that
+encounter is recomputed; the rest come from the cache. Whole results are
+also kept per adventure version, so an unchanged adventure costs a dict
+lookup.
+"""
+import json
+import threading
+
+from difficulty import xp_for_cr
+from monster_search import cr_value
+
+# Encounters whose damage and initiative count (unstarted ones may hold stale HP)
+ACTIVE_STATES = ('started', 'complete')
+ENCOUNTER_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 64
+
+
+def _is_player(combatant):
+    # After restore_adventure_from_storage(), only monsters have a 'name'
+    return 'name' not in combatant
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+class AdventureStatistics:
+    """Builds and caches statistics for adventures.
+
+    ``restore(adventure)`` expands a stored adventure (the app's
+    ``restore_adventure_from_storage``); ``engine`` is a ``DifficultyEngine``.
+    ``on_lookup(hit)``, if given, is called for every versioned ``build()``.
+    """
+
+    def __init__(self, restore, encounter_cache_size=ENCOUNTER_CACHE_SIZE,
+                 result_cache_size=RESULT_CACHE_SIZE, on_lookup=None):
+        self.restore = restore
+        self.on_lookup = on_lookup
+        self.encounter_cache_size = encounter_cache_size
+        self.result_cache_size = result_cache_size
+        self._encounters = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _remember(cache, key, value, limit):
+        cache[key] = value
+        while len(cache) > limit:
+            cache.pop(next(iter(cache)))
+
+    def summarize_encounter(self, encounter, players, engine):
+        """Chart values for one stored encounter, for the stored ``players``."""
+        restored = self.restore({'players': players, 'encounters': [encounter]})
+        encounter = restored['encounters'][0]
+        names = {p['dndBeyondUrl']: p['name'] for p in restored['players'] if p.get('dndBeyondUrl')}
+        levels = [p.get('level') for p in restored['players']]
+
+        custom_cr = encounter.get('totalCR')
+        rating = engine.rate_encounter(encounter, levels)
+        if custom_cr not in (None, ''):
+            cr = str(custom_cr)
+            xp = xp_for_cr(cr)
+        else:
+            cr = rating['cr']
+            xp = engine.encounter_xp(encounter)[1]
+        summary = {
+            'name': encounter.get('name') or '',
+            'chapter': encounter.get('chapter') or '',
+            'state': encounter.get('state'),
+            'cr': cr,
+            'crValue': cr_value(cr) or 0,
+            'xp': xp,
+            'difficulty2014': rating['difficulty2014'],
+            'difficulty2024': rating['difficulty2024'],
+            'initiative': {},
+            'playerDamage': {},
+            'enemyDamage': 0,
+            'otherDamage': 0,
+        }
+        if summary['state'] not in ACTIVE_STATES:
+            return summary
+
+        enemy_hp_lost = 0
+        for combatant in encounter.get('combatants') or []:
+            if _is_player(combatant):
+                name = names.get(combatant.get('dndBeyondUrl'))
+                if name is None:
+                    continue
+                summary['initiative'].setdefault(name, []).append(_number(combatant.get('initiative')))
+                summary['playerDamage'][name] = summary['playerDamage'].get(name, 0) + _number(combatant.get('dmg'))
+            else:
+                summary['enemyDamage'] += _number(combatant.get('dmg'))
+                enemy_hp_lost += max(0, _number(combatant.get('maxHp')) - _number(combatant.get('hp')))
+        # Damage to enemies that no player was credited with
+        tracked = sum(_number(c.get('dmg')) for c in encounter.get('combatants') or [] if _is_player(c))
+        summary['otherDamage'] = max(0, enemy_hp_lost - tracked)
+        return summary
+
+    def _encounter_summary(self, encounter, players, players_key, engine):
+        key = (json.dumps(encounter, sort_keys=True), players_key, engine)
+        with self._lock:
+            summary = self._encounters.get(key)
+        if summary is None:
+            summary = self.summarize_encounter(encounter, players, engine)
+            with self._lock:
+                self._remember(self._encounters, key, summary, self.encounter_cache_size)
+        return summary
+
+    def build(self, adventure, engine, completed_only=False, version=None):
+        """Statistics for a stored adventure.
+
+        ``version`` identifies the stored file (e.g. its mtime and size); when
+        given, the result is cached for that version.
+        """
+        result_key = (version, completed_only, engine) if version is not None else None
+        if result_key is not None:
+            with self._lock:
+                cached = self._results.get(result_key)
+            if self.on_lookup is not None:
+                self.on_lookup(cached is not None)
+            if cached is not None:
+                return cached
+
+        players = adventure.get('players') or []
+        players_key = json.dumps(players, sort_keys=True)
+        player_names = [p.get('name') or '' for p in players]
+        encounters = adventure.get('encounters') or []
+        if completed_only:
+            encounters = [e for e in encounters if e.get('state') == 'complete']
+
+        initiative = {name: [] for name in player_names}
+        damage_totals = {name: 0 for name in player_names}
+        rows = []
+        cumulative_xp = 0
+        for number, encounter in enumerate(encounters, start=1):
+            summary = self._encounter_summary(encounter, players, players_key, engine)
+            cumulative_xp += summary['xp']
+            for name, rolls in summary['initiative'].items():
+                initiative.setdefault(name, []).extend(rolls)
+            for name, damage in summary['playerDamage'].items():
+                damage_totals[name] = damage_totals.get(name, 0) + damage
+            rows.append({
+                **{k: v for k, v in summary.items() if k != 'initiative'},
+                'number': number,
+                'cumulativeXpPerPlayer': cumulative_xp / (len(players) or 1),
+            })
+
+        result = {
+            'success': True,
+            'name': adventure.get('name') or '',
+            'players': player_names,
+            'completedOnly': completed_only,
+            'encounters': rows,
+            'initiative': initiative,
+            'damageTotals': damage_totals,
+        }
+        if result_key is not None:
+            with self._lock:
+                self._remember(self._results, result_key, result, self.result_cache_size)
+        return result
+
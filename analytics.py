@@ -0,0 +1,220 @@
+"""Cross-campaign analytics store (SQLite).
+
+Every adventure save feeds its encounter outcomes into one database, so
+questions spanning campaigns ("average rounds per encounter by CR") are
+indexed queries instead of a pass over every adventure file.
+
+Tables:
+
+- ``encounters``: one row per encounter (keyed by adventure and position)
+  with its state, rounds, CR and XP, plus a hash of the stored encounter.
+- ``combatants``: one row per combatant in an encounter. Each row holds the
+  initiative, damage dealt (``dmg``), damage taken (max HP minus HP),
+  healing, and whether a monster was killed (HP 0).
+
+Writes are incremental. ``record_adventure()`` hashes each stored encounter
+and rewrites only the encounters whose hash changed, so an autosave after
+one hit touches one encounter's rows.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from difficulty import xp_for_cr
+from monster_search import cr_value
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS encounters (
+    adventure TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    name TEXT,
+    chapter TEXT,
+    state TEXT,
+    rounds INTEGER,
+    cr TEXT,
+    cr_value REAL,
+    xp INTEGER,
+    monsters INTEGER,
+    players INTEGER,
+    PRIMARY KEY (adventure, position)
+);
+CREATE INDEX IF NOT EXISTS encounters_state_cr ON encounters (state, cr_value);
+CREATE TABLE IF NOT EXISTS combatants (
+    adventure TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    monster_id TEXT,
+    initiative INTEGER,
+    damage_dealt INTEGER,
+    damage_taken INTEGER,
+    healing INTEGER,
+    killed INTEGER,
+    PRIMARY KEY (adventure, position, slot)
+);
+CREATE INDEX IF NOT EXISTS combatants_kind_name ON combatants (kind, name);
+"""
+
+# Encounters that were actually run
+PLAYED_STATES = ('started', 'complete')
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def encounter_hash(encounter, players_key):
+    data = json.dumps(encounter, sort_keys=True) + players_key
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class AnalyticsStore:
+    """Encounter outcomes from every adventure, in a SQLite file at ``path``.
+
+    ``restore(adventure)`` expands a stored adventure (the app's
+    ``restore_adventure_from_storage``), which fills in monster HP defaults.
+    """
+
+    def __init__(self, path, restore):
+        self.path = str(path)
+        self.restore = restore
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            # WAL lets queries read while a save is writing
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """A connection that commits on success and is always closed."""
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # Writes
+
+    def _encounter_rows(self, adventure, position, digest, encounter, players, engine):
+        restored = self.restore({'players': players, 'encounters': [encounter]})
+        encounter = restored['encounters'][0]
+        names = {p['dndBeyondUrl']: p['name'] for p in restored['players'] if p.get('dndBeyondUrl')}
+
+        custom_cr = encounter.get('totalCR')
+        if custom_cr not in (None, ''):
+            cr = str(custom_cr)
+            xp = xp_for_cr(cr)
+        else:
+            cr = engine.encounter_cr(encounter)
+            xp = engine.encounter_xp(encounter)[1]
+
+        state = encounter.get('state')
+        combatants = []
+        for slot, combatant in enumerate(encounter.get('combatants') or []):
+            is_player = 'name' not in combatant
+            max_hp = _number(combatant.get('maxHp'))
+            hp = _number(combatant.get('hp'))
+            url = combatant.get('dndBeyondUrl') or ''
+            combatants.append((
+                adventure, position, slot,
+                'player' if is_player else 'monster',
+                names.get(url, '') if is_player else combatant.get('name') or '',
+                None if is_player else (url.rsplit('/', 1)[-1] or None),
+                _number(combatant.get('initiative')),
+                _number(combatant.get('dmg')),
+                max(0, max_hp - hp),
+                _number(combatant.get('heal')),
+                int(not is_player and max_hp > 0 and hp <= 0),
+            ))
+        rounds = _number(encounter.get('currentRound')) if state in PLAYED_STATES else 0
+        row = (adventure, position, digest, encounter.get('name') or '', encounter.get('chapter') or '',
+               state, rounds, cr, cr_value(cr), xp,
+               sum(1 for c in combatants if c[3] == 'monster'),
+               sum(1 for c in combatants if c[3] == 'player'))
+        return row, combatants
+
+    def record_adventure(self, name, data, engine):
+        """Store the outcomes of a saved adventure; returns how many encounters were rewritten."""
+        players = data.get('players') or []
+        players_key = json.dumps(players, sort_keys=True)
+        encounters = data.get('encounters') or []
+        digests = [encounter_hash(e, players_key) for e in encounters]
+
+        with self._lock, self._connect() as db:
+            stored = dict(db.execute('SELECT position, hash FROM encounters WHERE adventure = ?', (name,)))
+            changed = [i for i, digest in enumerate(digests) if stored.get(i) != digest]
+            db.execute('DELETE FROM encounters WHERE adventure = ? AND position >= ?', (name, len(encounters)))
+            db.execute('DELETE FROM combatants WHERE adventure = ? AND position >= ?', (name, len(encounters)))
+            for position in changed:
+                row, combatants = self._encounter_rows(name, position, digests[position],
+                                                       encounters[position], players, engine)
+                db.execute('DELETE FROM combatants WHERE adventure = ? AND position = ?', (name, position))
+                db.execute('INSERT OR REPLACE INTO encounters VALUES (?,?,?,?,?,?,?,?,?,?,?,?)', row)
+                db.executemany('INSERT INTO combatants VALUES (?,?,?,?,?,?,?,?,?,?,?)', combatants)
+        return len(changed)
+
+    def forget_adventure(self, name):
+        with self._lock, self._connect() as db:
+            db.execute('DELETE FROM encounters WHERE adventure = ?', (name,))
+            db.execute('DELETE FROM combatants WHERE adventure = ?', (name,))
+
+    # Queries
+
+    def _query(self, sql, params=()):
+        with self._connect() as db:
+            return [dict(row) for row in db.execute(sql, params)]
+
+    @staticmethod
+    def _state_filter(states):
+        placeholders = ','.join('?' for _ in states)
+        return f'e.state IN ({placeholders})', list(states)
+
+    def rounds_by_cr(self, states=('complete',)):
+        """Encounter count and average rounds for each encounter CR."""
+        where, params = self._state_filter(states)
+        return self._query(f"""
+            SELECT e.cr AS cr, COUNT(*) AS encounters, AVG(e.rounds) AS avgRounds,
+                   AVG(e.monsters) AS avgMonsters
+            FROM encounters e WHERE {where}
+            GROUP BY e.cr, e.cr_value ORDER BY e.cr_value
+        """, params)
+
+    def monsters(self, states=('complete',), limit=50):
+        """Per-monster appearances, kills and damage, most frequent first."""
+        where, params = self._state_filter(states)
+        return self._query(f"""
+            SELECT c.name AS name, MIN(c.monster_id) AS monsterId, COUNT(*) AS appearances,
+                   SUM(c.killed) AS kills, AVG(c.damage_dealt) AS avgDamageDealt,
+                   AVG(c.damage_taken) AS avgDamageTaken
+            FROM combatants c JOIN encounters e USING (adventure, position)
+            WHERE c.kind = 'monster' AND {where}
+            GROUP BY c.name ORDER BY appearances DESC, c.name LIMIT ?
+        """, params + [limit])
+
+    def players(self, states=('complete',)):
+        """Per-player (by adventure) initiative and damage across encounters."""
+        where, params = self._state_filter(states)
+        return self._query(f"""
+            SELECT c.adventure AS adventure, c.name AS name, COUNT(*) AS encounters,
+                   AVG(c.initiative) AS avgInitiative, SUM(c.damage_dealt) AS damageDealt,
+                   SUM(c.damage_taken) AS damageTaken, SUM(c.healing) AS healing
+            FROM combatants c JOIN encounters e USING (adventure, position)
+            WHERE c.kind = 'player' AND {where}
+            GROUP BY c.adventure, c.name ORDER BY c.adventure, c.name
+        """, params)
+
+    def adventures(self):
+        """Per-adventure encounter counts, rounds played and XP awarded."""
+        return self._query("""
+            SELECT adventure, COUNT(*) AS encounters,
+                   SUM(state = 'complete') AS completed,
+                   SUM(CASE WHEN state = 'complete' THEN rounds ELSE 0 END) AS rounds,
+                   SUM(CASE WHEN state = 'complete' THEN xp ELSE 0 END) AS xp
+            FROM encounters GROUP BY adventure ORDER BY adventure
+        """)
@@ -2,31 +2,68 @@ from flask import Flask, render_template, request, jsonify, session
 import json
 import os
 from pathlib import Path
-import requests
 from functools import lru_cache
 import time
-from bs4 import BeautifulSoup
 import re
 import logging
 import secrets
+import threading
+
+import http_cache
+import metrics
+import profiling
+from logs import get_logger
+from adventure_stats import AdventureStatistics
+from analytics import PLAYED_STATES, AnalyticsStore
+from character_sync import CharacterSync
+from difficulty import DifficultyEngine, cr_for_xp, encounter_multiplier, is_player, xp_for_cr
+from jobs import JobConflict, JobKind, JobManager
+from events import AdventureEvents, EventStreamsFull
+from journal import AdventureJournal, RevisionConflict, UndoError, diff
+from monster_search import MonsterIndex, cr_value
+from music_library import MusicLibrary
+from music_streaming import (VARIANT_BITRATE, VARIANT_FORMATS, FileSpan, current_variant,
+                             find_encoder, transcode, variant_path)
+from ratelimit import THROTTLE_STATUSES, UpstreamLimiter
+
+# ``requests`` and BeautifulSoup are imported inside the functions that talk
+# to D&D Beyond. Together they account for most of this module's import time,
+# and scripts/tests that never scrape shouldn't have to pay for them.
 
 app = Flask(__name__)
 # Generate a secret key for sessions (regenerates on restart)
 app.secret_key = secrets.token_hex(32)
+# Opt-in cProfile capture (X-Profile: 1, ?profile=1 or --profile); installed
+# first so the profile covers the other hooks, compression included
+profiling.init_app(app, lambda: CACHE_DIR / "profiles",
+                   skip=('list_profiles', 'get_profile'))
+# Request latency histograms for /metrics; before http_cache so the time
+# includes compression (after_request hooks run in reverse order)
+metrics.init_app(app)
+# Compression, ETags and static asset caching for every response
+http_cache.init_app(app)
 
 # Suppress Flask auto-refresh logging for spectator view
-log = logging.getLogger('werkzeug')
-log.setLevel(logging.ERROR)
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
+# Per-subsystem loggers (see logs.py); scraping detail is DEBUG, so silent by default
+server_log = get_logger('server')
+cookie_log = get_logger('cookies')
+upstream_log = get_logger('upstream')
+monster_log = get_logger('monsters')
+character_log = get_logger('characters')
+adventure_log = get_logger('adventures')
+
+# Importing this module must not touch the filesystem. Directories, the
+# bundled monster index and saved cookies are set up by init_runtime(), which
+# runs on the first request (or is called explicitly by scripts).
 DATA_DIR = Path("adventures")
-DATA_DIR.mkdir(exist_ok=True)
 
 # Local music library used for encounter background music. Files dropped in
 # here are served by the /music/<filename> route and listed via /api/music.
 # The directory is gitignored because tracks are large and licensed; users
 # bring their own (see README "Encounter Music").
 MUSIC_DIR = Path("music")
-MUSIC_DIR.mkdir(exist_ok=True)
 
 # Audio file extensions exposed to the UI. Browsers vary; .mp3/.ogg cover
 # everything mainstream, but accept the common alternatives too so users
@@ -34,31 +71,80 @@ MUSIC_DIR.mkdir(exist_ok=True)
 MUSIC_EXTENSIONS = {'.mp3', '.ogg', '.oga', '.m4a', '.aac', '.wav', '.flac', '.opus', '.webm'}
 
 CACHE_DIR = Path(".cache")
-CACHE_DIR.mkdir(exist_ok=True)
 MONSTERS_CACHE = CACHE_DIR / "monsters.json"
 COOKIES_CACHE = CACHE_DIR / "cookies.json"
 MONSTER_DETAILS_DIR = CACHE_DIR / "monsters"
-MONSTER_DETAILS_DIR.mkdir(exist_ok=True)
 IMAGES_CACHE_DIR = CACHE_DIR / "images"
-IMAGES_CACHE_DIR.mkdir(exist_ok=True)
 
 # Bundled monster index (committed to the repo). If the user doesn't have a
 # local scraped cache yet, copy this in so they get a working library on
 # first run instead of waiting minutes for a fresh scrape.
 BUNDLED_MONSTERS = Path("data") / "monsters.json"
-if not MONSTERS_CACHE.exists() and BUNDLED_MONSTERS.exists():
-    try:
-        import shutil
-        shutil.copyfile(BUNDLED_MONSTERS, MONSTERS_CACHE)
-        with open(MONSTERS_CACHE, 'r', encoding='utf-8') as _f:
-            _bundle_count = len(json.load(_f))
-        print(f"Bootstrapped {MONSTERS_CACHE} from bundled {BUNDLED_MONSTERS} ({_bundle_count} monsters)")
-    except Exception as _e:
-        print(f"Could not bootstrap monster cache from bundle: {_e}")
+
+# D&D Beyond endpoints and request headers. Shared by the Flask views and the
+# async server (asgi.py) so both talk to upstream the same way.
+DNDBEYOND_BASE_URL = 'https://www.dndbeyond.com'
+CHARACTER_API_URL = 'https://character-service.dndbeyond.com/character/v5/character/{character_id}'
+CHARACTER_API_PARAMS = {'includeCustomItems': 'true'}
+CHARACTER_API_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Origin': 'https://www.dndbeyond.com',
+    'Referer': 'https://www.dndbeyond.com/',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-site'
+}
+MONSTER_LIST_PARAMS = {'filter-partnered-content': 'f'}  # Only official content
+MONSTER_LIST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+}
+# D&D Beyond has about 173 pages of monsters (20 per page = ~3460 monsters)
+MONSTER_LIST_MAX_PAGES = 200  # Safety limit
+MONSTER_PAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36 Edg/144.0.0.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br, zstd',
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache',
+    'Priority': 'u=0, i',
+    'Sec-Ch-Ua': '"Not(A:Brand";v="8", "Chromium";v="144", "Microsoft Edge";v="144"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"Windows"',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1'
+}
+# Sent with the monster page request after the homepage visit
+MONSTER_PAGE_REFERER_HEADERS = {'Referer': 'https://www.dndbeyond.com/', 'Sec-Fetch-Site': 'same-origin'}
+
+MONSTER_LIST_CACHE_MAX_AGE = 2592000  # 30 days (60*60*24*30)
+MONSTER_CACHE_MAX_AGE = 2592000  # 30 days
+CHARACTER_CACHE_MAX_AGE = 3600  # 1 hour
+
+MONSTER_SEARCH_MAX_LIMIT = 100  # Most results /api/monsters/search returns
+MONSTER_LIST_FIELDS = ('cr', 'type', 'size', 'alignment', 'url', 'isLegacy', 'noAccess')
+MONSTER_LIST_DEFAULT_PER_PAGE = 100
+MONSTER_LIST_MAX_PER_PAGE = 1000
+MONSTER_LIST_RESPONSE_CACHE_SIZE = 16  # Encoded /api/dndbeyond/monsters bodies kept in memory
+
+# Every upstream request is paced by this per-host token bucket, which slows
+# down on 429s/slow responses and speeds back up on success (see
+# ratelimit.py). Settings come from app.config['UPSTREAM_RATE_LIMIT'].
+UPSTREAM_LIMITER = UpstreamLimiter()
 
 # Store D&D Beyond cookies
 DNDBEYOND_COOKIES = {}
 
+# Set once init_runtime() has completed for this process.
+_runtime_initialized = False
+_runtime_lock = threading.Lock()
+
 
 def parse_signed_int(text, default=None):
     """Parse an integer from text, tolerating Unicode minus/plus variants.
@@ -165,22 +251,186 @@ def parse_cookies_input(cookies_input):
     raise ValueError(f'Unsupported cookie input type: {type(cookies_input).__name__}')
 
 
-# Load cookies from cache if available
-if COOKIES_CACHE.exists():
+def ensure_directories():
+    """Create the data, music and cache directories if they don't exist yet."""
+    for directory in (DATA_DIR, MUSIC_DIR, CACHE_DIR, MONSTER_DETAILS_DIR, IMAGES_CACHE_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+
+
+def bootstrap_monster_cache():
+    """Seed the monster cache from the bundled index if no cache exists yet.
+
+    Returns True when the bundle was copied in.
+    """
+    if MONSTERS_CACHE.exists() or not BUNDLED_MONSTERS.exists():
+        return False
+    try:
+        import shutil
+        MONSTERS_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(BUNDLED_MONSTERS, MONSTERS_CACHE)
+        monster_log.info("Bootstrapped %s from bundled %s", MONSTERS_CACHE, BUNDLED_MONSTERS)
+        return True
+    except Exception as e:
+        monster_log.warning("Could not bootstrap monster cache from bundle: %s", e)
+        return False
+
+
+def load_cached_cookies():
+    """Load D&D Beyond cookies from the cookie cache into DNDBEYOND_COOKIES.
+
+    Malformed files saved by older versions are rewritten in the clean
+    ``{name: value}`` shape.
+    """
+    global DNDBEYOND_COOKIES
+    if not COOKIES_CACHE.exists():
+        return DNDBEYOND_COOKIES
     try:
         with open(COOKIES_CACHE, 'r', encoding='utf-8') as f:
             raw = json.load(f)
         DNDBEYOND_COOKIES, fmt = parse_cookies_input(raw)
-        print(f"Loaded {len(DNDBEYOND_COOKIES)} cookies from cache ({fmt})")
+        cookie_log.info("Loaded %d cookies from cache (%s)", len(DNDBEYOND_COOKIES), fmt)
         # If the file was malformed, rewrite it in the clean shape
         if raw != DNDBEYOND_COOKIES:
-            print("Migrating cookies.json to clean key-value format")
+            cookie_log.info("Migrating cookies.json to clean key-value format")
             with open(COOKIES_CACHE, 'w', encoding='utf-8') as f:
                 json.dump(DNDBEYOND_COOKIES, f, indent=2)
     except Exception as e:
-        print(f"Error loading cookies from {COOKIES_CACHE}: {e}")
-        print("Ignoring cached cookies; re-import via Settings to fix.")
+        cookie_log.warning("Error loading cookies from %s: %s. Ignoring cached cookies; re-import via Settings to fix.",
+                           COOKIES_CACHE, e)
         DNDBEYOND_COOKIES = {}
+    return DNDBEYOND_COOKIES
+
+
+def init_runtime():
+    """Prepare on-disk state: directories, bundled monster index and cookies.
+
+    Idempotent and thread-safe. The server calls this lazily on the first
+    request; scripts that use the scraping functions directly should call it
+    themselves before doing any work.
+    """
+    global _runtime_initialized
+    if _runtime_initialized:
+        return
+    with _runtime_lock:
+        if _runtime_initialized:
+            return
+        ensure_directories()
+        bootstrap_monster_cache()
+        load_cached_cookies()
+        _runtime_initialized = True
+
+
+def create_app(config=None):
+    """Application factory.
+
+    Applies ``config`` on top of the defaults and returns the app. Runtime
+    state is not touched here; see init_runtime(). Set ``LAZY_INIT`` to
+    False to skip the first-request initialization (the test suite does this
+    and manages its own directories).
+    """
+    if config:
+        app.config.update(config)
+    if app.config.get('UPSTREAM_RATE_LIMIT'):
+        UPSTREAM_LIMITER.configure(**app.config['UPSTREAM_RATE_LIMIT'])
+    ADVENTURE_EVENTS.max_streams = app.config['EVENT_STREAMS']
+    ADVENTURE_EVENTS.max_summary_streams = app.config['SPECTATOR_EVENT_STREAMS']
+    return app
+
+
+app.config.setdefault('LAZY_INIT', True)
+# Keep fetched D&D Beyond pages in .cache when parsing needs debugging
+app.config.setdefault('SAVE_DEBUG_HTML', False)
+# Send D&D Beyond requests to this base URL instead (a local stand-in for
+# load and regression testing; see upstream_url())
+app.config.setdefault('UPSTREAM_URL', None)
+# Seconds between folding adventure journals into their snapshots (0: only
+# at shutdown; see journal.py)
+app.config.setdefault('JOURNAL_COMPACT_INTERVAL', 60)
+# Live adventure event streams that may be open at once (each holds a server
+# thread), and seconds before one ends and the browser reconnects (see events.py).
+# DM and spectator streams are capped separately.
+app.config.setdefault('EVENT_STREAMS', 8)
+app.config.setdefault('SPECTATOR_EVENT_STREAMS', 4)
+app.config.setdefault('EVENT_STREAM_LIFETIME', 300)
+
+
+@app.before_request
+def _init_runtime_on_first_request():
+    if not _runtime_initialized and app.config.get('LAZY_INIT', True):
+        init_runtime()
+
+def save_debug_html(filename, html):
+    """Write a fetched page to .cache for debugging, if SAVE_DEBUG_HTML is on"""
+    if not app.config.get('SAVE_DEBUG_HTML'):
+        return
+    debug_file = CACHE_DIR / filename
+    with open(debug_file, 'w', encoding='utf-8') as f:
+        f.write(html)
+    monster_log.info("Saved debug HTML to %s", debug_file)
+
+def avatar_cache_path(avatar_url):
+    """Local cache file for an avatar URL (hash of the URL plus its extension)"""
+    import hashlib
+    url_hash = hashlib.md5(avatar_url.encode()).hexdigest()
+    
+    # Get file extension from URL
+    ext = '.jpeg'
+    if '.png' in avatar_url.lower():
+        ext = '.png'
+    elif '.jpg' in avatar_url.lower():
+        ext = '.jpg'
+    elif '.webp' in avatar_url.lower():
+        ext = '.webp'
+    
+    return IMAGES_CACHE_DIR / f"{url_hash}{ext}"
+
+def upstream_url(url):
+    """Where a D&D Beyond URL is actually fetched from.
+
+    With ``UPSTREAM_URL`` set (``--upstream-url``), requests for any
+    dndbeyond.com host go to that base URL instead, keeping their path and
+    query. This points the app at a local stand-in such as
+    benchmarks/fake_dndbeyond.py. URLs stored in adventures and caches
+    keep the real D&D Beyond form.
+    """
+    base = app.config.get('UPSTREAM_URL')
+    if not base:
+        return url
+    from urllib.parse import urlsplit, urlunsplit
+    parts = urlsplit(url)
+    host = parts.hostname or ''
+    if host != 'dndbeyond.com' and not host.endswith('.dndbeyond.com'):
+        return url
+    target = urlsplit(base)
+    return urlunsplit((target.scheme, target.netloc, target.path.rstrip('/') + parts.path,
+                       parts.query, parts.fragment))
+
+def upstream_get(get, url, retries=2, **kwargs):
+    """GET ``url`` with ``get`` (requests.get or a Session's get), paced by UPSTREAM_LIMITER.
+    
+    The response status and latency are fed back to the limiter. Throttling
+    responses (429/503) are retried up to ``retries`` times once the host's
+    backoff pause has passed. D&D Beyond URLs are redirected to
+    ``UPSTREAM_URL`` when it is set (see upstream_url()).
+    """
+    import requests
+    url = upstream_url(url)
+    for attempt in range(retries + 1):
+        UPSTREAM_LIMITER.wait(url)
+        started = time.monotonic()
+        try:
+            response = get(url, **kwargs)
+        except requests.RequestException:
+            UPSTREAM_LIMITER.record(url, None, time.monotonic() - started)
+            metrics.record_upstream(url, None, time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        UPSTREAM_LIMITER.record(url, response.status_code, elapsed, response.headers.get('Retry-After'))
+        metrics.record_upstream(url, response.status_code, elapsed)
+        if response.status_code not in THROTTLE_STATUSES or attempt == retries:
+            return response
+        upstream_log.warning("HTTP %s from %s - backing off and retrying", response.status_code, url)
+    return response
 
 def cache_avatar_image(avatar_url):
     """Download and cache an avatar image, return local path"""
@@ -188,40 +438,30 @@ def cache_avatar_image(avatar_url):
         return None
     
     try:
-        # Extract filename from URL (use hash for unique identification)
-        import hashlib
-        url_hash = hashlib.md5(avatar_url.encode()).hexdigest()
-        
-        # Get file extension from URL
-        ext = '.jpeg'
-        if '.png' in avatar_url.lower():
-            ext = '.png'
-        elif '.jpg' in avatar_url.lower():
-            ext = '.jpg'
-        elif '.webp' in avatar_url.lower():
-            ext = '.webp'
-        
-        filename = f"{url_hash}{ext}"
-        cache_path = IMAGES_CACHE_DIR / filename
+        import requests
+        cache_path = avatar_cache_path(avatar_url)
+        filename = cache_path.name
         
         # Return local path if already cached (instant)
         if cache_path.exists():
+            metrics.record_cache('avatar', 'hit')
             return f"/cached/images/{filename}"
+        metrics.record_cache('avatar', 'miss')
         
         # Download the image
-        print(f"  Downloading avatar: {avatar_url}")
-        response = requests.get(avatar_url, timeout=10)
+        upstream_log.debug("Downloading avatar: %s", avatar_url)
+        response = upstream_get(requests.get, avatar_url, timeout=10)
         
         if response.status_code == 200:
             with open(cache_path, 'wb') as f:
                 f.write(response.content)
             return f"/cached/images/{filename}"
         else:
-            print(f"  Failed to download avatar: HTTP {response.status_code}")
+            upstream_log.warning("Failed to download avatar %s: HTTP %s", avatar_url, response.status_code)
             return avatar_url  # Return original URL as fallback
             
     except Exception as e:
-        print(f"  Error caching avatar: {e}")
+        upstream_log.warning("Error caching avatar %s: %s", avatar_url, e)
         return avatar_url  # Return original URL as fallback
 
 @app.route('/cached/images/<path:filename>')
@@ -230,35 +470,117 @@ def serve_cached_image(filename):
     from flask import send_from_directory
     return send_from_directory(IMAGES_CACHE_DIR, filename)
 
+def file_span_response(path, mimetype):
+    """Stream a file with validators and single-range support (``206``).
+
+    The body is a FileSpan, which goes out with sendfile under werkzeug's
+    servers instead of being read through Python.
+    """
+    from werkzeug.http import http_date
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'{stat.st_mtime_ns:x}-{size:x}'
+    start, stop = 0, size
+    status = 200
+    
+    # A range only applies if If-Range (when sent) still matches this file
+    if_range = request.headers.get('If-Range')
+    byte_range = request.range
+    if (byte_range and len(byte_range.ranges) == 1
+            and (not if_range or if_range.strip('"') == etag or if_range == http_date(stat.st_mtime))):
+        span = byte_range.range_for_length(size)
+        if span is None:
+            response = app.response_class(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, stop = span
+        status = 206
+    
+    response = app.response_class(FileSpan(path, start, stop - start, request.environ),
+                                  status=status, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = stop - start
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/music/<path:filename>')
 def serve_music(filename):
     """Serve a music file from the local music library.
 
-    Files are served with conditional/range support by Flask, which lets the
-    browser seek and stream long tracks efficiently.
+    Supports range requests, so the browser can seek and stream long
+    tracks, and is sent with sendfile where the server allows it.
+    ``?quality=low`` serves the track's low-bitrate variant (``format=opus``
+    or ``mp3`` picks which, if both exist) when the music-variants job has
+    encoded one, and the original otherwise.
     """
-    from flask import send_from_directory, abort
+    import mimetypes
+    from flask import abort
+    from werkzeug.security import safe_join
     # Reject anything that isn't an allowed audio file - this also doubles
-    # as a coarse guard against directory traversal (send_from_directory
-    # already prevents '..', but we don't want to expose other file types).
+    # as a coarse guard against directory traversal (safe_join already
+    # prevents '..', but we don't want to expose other file types).
     if Path(filename).suffix.lower() not in MUSIC_EXTENSIONS:
         abort(404)
-    return send_from_directory(MUSIC_DIR.resolve(), filename, conditional=True)
+    path = safe_join(str(MUSIC_DIR.resolve()), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    
+    if request.args.get('quality') == 'low':
+        preferred = request.args.get('format')
+        formats = sorted(VARIANT_FORMATS, key=lambda f: f != preferred)
+        for variant_format in formats:
+            variant = current_variant(CACHE_DIR / "music_variants", path, filename, variant_format)
+            if variant:
+                path, mimetype = str(variant), VARIANT_FORMATS[variant_format][1]
+                break
+    return file_span_response(path, mimetype)
+
+_music_library = None
+_music_library_lock = threading.Lock()
+
+def get_music_library():
+    """Index of the music library (cached in .cache/music_index.json)"""
+    global _music_library
+    index_path = CACHE_DIR / "music_index.json"
+    with _music_library_lock:
+        if (_music_library is None or _music_library.root != MUSIC_DIR
+                or _music_library.index_path != index_path):
+            _music_library = MusicLibrary(MUSIC_DIR, MUSIC_EXTENSIONS, index_path)
+        return _music_library
+
+def music_response(version, payload):
+    """JSON response validated by the library version, so a repeat load is a 304"""
+    response = jsonify(payload)
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/music', methods=['GET'])
 def list_music():
     """List available music files in the local library.
 
-    Returns a sorted list of filenames (just the basename) the UI can use
-    to populate the chapter/encounter music selectors.
+    Returns a sorted list of paths relative to the library (files in
+    subfolders as ``folder/track.mp3``) the UI can use to populate the
+    chapter/encounter music selectors. ``refresh=1`` rescans immediately.
     """
-    if not MUSIC_DIR.exists():
-        return jsonify([])
-    files = sorted(
-        f.name for f in MUSIC_DIR.iterdir()
-        if f.is_file() and f.suffix.lower() in MUSIC_EXTENSIONS
-    )
-    return jsonify(files)
+    version, tracks, _ = get_music_library().snapshot(force=request.args.get('refresh') == '1')
+    return music_response(version, [t['path'] for t in tracks])
+
+@app.route('/api/music/library', methods=['GET'])
+def music_library():
+    """The music library with metadata: ``{version, tracks, playlists}``.
+
+    Each track has path, title, duration (seconds), bitrate (kbps) and
+    size; each playlist (.m3u/.m3u8 in the library) has name, path and
+    its tracks' paths. ``refresh=1`` rescans immediately.
+    """
+    version, tracks, playlists = get_music_library().snapshot(force=request.args.get('refresh') == '1')
+    return music_response(version, {'version': version, 'tracks': tracks, 'playlists': playlists})
 
 @app.route('/api/dndbeyond/set-cookies', methods=['POST'])
 def set_dndbeyond_cookies():
@@ -270,16 +592,14 @@ def set_dndbeyond_cookies():
     try:
         parsed, fmt = parse_cookies_input(cookies_input)
     except ValueError as e:
-        print(f"Rejected cookie input: {e}")
+        cookie_log.warning("Rejected cookie input: %s", e)
         return jsonify({"success": False, "error": str(e)}), 400
 
     DNDBEYOND_COOKIES = parsed
-    print(f"Detected {fmt} ({len(DNDBEYOND_COOKIES)} cookies)")
-
     with open(COOKIES_CACHE, 'w', encoding='utf-8') as f:
         json.dump(DNDBEYOND_COOKIES, f, indent=2)
 
-    print(f"Stored {len(DNDBEYOND_COOKIES)} cookies and saved to cache")
+    cookie_log.info("Stored %d cookies (%s) and saved to cache", len(DNDBEYOND_COOKIES), fmt)
     return jsonify({"success": True, "count": len(DNDBEYOND_COOKIES)})
 
 @app.route('/api/dndbeyond/clear-cookies', methods=['POST'])
@@ -292,7 +612,7 @@ def clear_dndbeyond_cookies():
     if COOKIES_CACHE.exists():
         COOKIES_CACHE.unlink()
     
-    print("Cleared D&D Beyond cookies and cache file")
+    cookie_log.info("Cleared D&D Beyond cookies and cache file")
     return jsonify({"success": True})
 
 @app.route('/api/dndbeyond/cookie-status', methods=['GET'])
@@ -305,6 +625,114 @@ def check_cookie_status():
         "cookieCount": len(DNDBEYOND_COOKIES)
     })
 
+def monster_list_cache_age():
+    """Age in seconds of the monster index cache if it's fresh, else None."""
+    try:
+        cache_age = time.time() - MONSTERS_CACHE.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    return cache_age if cache_age < MONSTER_LIST_CACHE_MAX_AGE else None
+
+def save_monster_list(all_monsters):
+    """Write a freshly scraped monster index to the cache."""
+    with open(MONSTERS_CACHE, 'w', encoding='utf-8') as f:
+        json.dump(all_monsters, f, indent=2)
+    monster_log.info("Cached %d monsters to %s", len(all_monsters), MONSTERS_CACHE)
+
+def parse_monster_list_page(html, all_monsters, page=None):
+    """Parse one page of the D&D Beyond monster listing into ``all_monsters``.
+
+    Returns the number of monster items found on the page (0 means the
+    listing has run out).
+    """
+    from bs4 import BeautifulSoup
+    
+    if page == 1:
+        save_debug_html("monsters_page_debug.html", html)
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Find all monster list items using the data-slug attribute
+    monster_items = soup.select('[data-slug][data-type="monsters"]')
+    
+    monster_log.debug("Found %d items on page %s", len(monster_items), page)
+    
+    for item in monster_items:
+        try:
+            # Extract monster name from .monster-name .name a
+            name_elem = item.select_one('.monster-name .name a, .monster-name a')
+            if not name_elem:
+                continue
+            
+            name = name_elem.get_text(strip=True)
+            # Remove quotes if present
+            name = name.strip('"')
+            if not name:
+                continue
+            
+            # Check for legacy badge
+            is_legacy = False
+            badge_elem = item.select_one('.badge .badge-label#legacy-badge')
+            if badge_elem or name_elem.get('aria-describedby') == 'legacy-badge':
+                is_legacy = True
+            
+            # Extract URL from the same link
+            monster_url = name_elem.get('href')
+            if monster_url and monster_url.startswith('/'):
+                monster_url = f"https://www.dndbeyond.com{monster_url}"
+            else:
+                # Fallback: use data-slug
+                slug = item.get('data-slug', '')
+                monster_url = f"https://www.dndbeyond.com/monsters/{slug}"
+            
+            # Extract CR from .monster-challenge
+            cr_text = '0'
+            cr_elem = item.select_one('.monster-challenge span')
+            if cr_elem:
+                cr_text = cr_elem.get_text(strip=True)
+            
+            # Extract Type from .monster-type
+            monster_type = ''
+            type_elem = item.select_one('.monster-type .type')
+            if type_elem:
+                monster_type = type_elem.get_text(strip=True)
+            
+            # Extract Size from .monster-size
+            size = ''
+            size_elem = item.select_one('.monster-size span')
+            if size_elem:
+                size = size_elem.get_text(strip=True)
+            
+            # Extract Alignment from .monster-alignment
+            alignment = ''
+            align_elem = item.select_one('.monster-alignment span')
+            if align_elem:
+                alignment = align_elem.get_text(strip=True)
+            
+            # If this is a legacy monster and we already have a non-legacy version, skip it
+            if is_legacy and name in all_monsters and not all_monsters[name].get('isLegacy', False):
+                monster_log.debug("Skipping legacy version of %s (already have newer version)", name)
+                continue
+            
+            # If this is NOT legacy and we already have a legacy version, replace it
+            if not is_legacy and name in all_monsters and all_monsters[name].get('isLegacy', False):
+                monster_log.debug("Replacing legacy version of %s with newer version", name)
+            
+            all_monsters[name] = {
+                'cr': cr_text,
+                'type': monster_type,
+                'size': size,
+                'alignment': alignment,
+                'url': monster_url,
+                'isLegacy': is_legacy
+            }
+            
+        except Exception as e:
+            monster_log.warning("Error parsing monster item: %s", e)
+            continue
+    
+    return len(monster_items)
+
 @app.route('/api/dndbeyond/monsters', methods=['GET'])
 def get_dndbeyond_monsters():
     """Scrape monsters from D&D Beyond and cache them.
@@ -315,728 +743,715 @@ def get_dndbeyond_monsters():
                        pages that only need the library opportunistically (e.g.
                        the statistics page) and don't want to block on a 3+
                        minute first-time scrape.
+      page, per_page   Return one page of the (filtered, sorted) library.
+      sort, order      ``name`` or ``cr``, ``asc`` or ``desc`` (default:
+                       library order).
+      type, size, cr, min_cr, max_cr, legacy, no_access
+                       Filters, as for /api/monsters/search.
+      fields           Comma-separated monster fields to include.
+
+    Responses carry an ETag for the library version (304 on a match) and
+    are gzipped when the client accepts it.
     """
     cache_only = request.args.get('cache_only', '').lower() in ('1', 'true', 'yes')
 
     try:
+        try:
+            listing = _monster_listing_args()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
         # Check if we have cached data and it's recent (less than 30 days old)
-        if MONSTERS_CACHE.exists():
-            cache_age = time.time() - MONSTERS_CACHE.stat().st_mtime
-            if cache_age < 2592000:  # 30 days (60*60*24*30)
-                print(f"Loading monsters from cache (age: {cache_age/86400:.1f} days)")
-                with open(MONSTERS_CACHE, 'r', encoding='utf-8') as f:
-                    cached_data = json.load(f)
-                return jsonify({'success': True, 'monsters': cached_data, 'count': len(cached_data), 'cached': True})
+        cache_age = monster_list_cache_age()
+        if cache_age is not None:
+            monster_log.debug("Loading monsters from cache (age: %.1f days)", cache_age / 86400)
+            return monster_list_response(listing, cached=True)
 
         # No usable cache. If the caller explicitly opted out of a fresh
         # scrape, return an empty-but-successful payload immediately instead
         # of blocking for minutes.
         if cache_only:
-            print("cache_only=true and no cached monsters - returning empty list")
+            monster_log.debug("cache_only=true and no cached monsters - returning empty list")
             return jsonify({'success': True, 'monsters': {}, 'count': 0, 'cached': False, 'scraped': False})
 
         # Need to scrape - check if we have cookies
         if not DNDBEYOND_COOKIES:
-            print("No cookies available for scraping")
+            monster_log.warning("No cookies available for scraping")
             return jsonify({'success': False, 'error': 'No authentication cookies available'})
         
-        print(f"Scraping monsters from D&D Beyond using {len(DNDBEYOND_COOKIES)} cookies...")
+        monster_log.info("Scraping monsters from D&D Beyond using %d cookies", len(DNDBEYOND_COOKIES))
+        import requests
         
         all_monsters = {}
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
-        }
         
-        # D&D Beyond has about 173 pages of monsters (20 per page = ~3460 monsters)
         # We'll scrape all pages
         page = 1
-        max_pages = 200  # Safety limit (actual is around 173)
         consecutive_empty = 0  # Track consecutive empty pages
         
-        while page <= max_pages:
-            url = 'https://www.dndbeyond.com/monsters'
-            params = {
-                'filter-partnered-content': 'f',  # Only official content
-                'page': page
-            }
+        while page <= MONSTER_LIST_MAX_PAGES:
+            params = dict(MONSTER_LIST_PARAMS, page=page)
             
-            print(f"Scraping page {page}...")
-            response = requests.get(url, params=params, headers=headers, cookies=DNDBEYOND_COOKIES, timeout=15)
+            monster_log.debug("Scraping page %d", page)
+            response = upstream_get(requests.get, f'{DNDBEYOND_BASE_URL}/monsters', params=params,
+                                    headers=MONSTER_LIST_HEADERS, cookies=DNDBEYOND_COOKIES, timeout=15)
             
             if response.status_code != 200:
-                print(f"Page {page} returned status {response.status_code}")
+                monster_log.warning("Page %d returned status %s", page, response.status_code)
                 break
             
-            # Save first page for debugging
-            if page == 1:
-                debug_file = CACHE_DIR / "monsters_page_debug.html"
-                with open(debug_file, 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                print(f"Saved debug HTML to {debug_file}")
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all monster list items using the data-slug attribute
-            monster_items = soup.select('[data-slug][data-type="monsters"]')
-            
-            print(f"Found {len(monster_items)} items on page {page}")
-            
-            if not monster_items:
+            if not parse_monster_list_page(response.text, all_monsters, page):
                 consecutive_empty += 1
                 if consecutive_empty >= 3:  # Stop after 3 empty pages
-                    print(f"3 consecutive empty pages, stopping")
+                    monster_log.debug("3 consecutive empty pages, stopping")
                     break
                 page += 1
                 continue
             else:
                 consecutive_empty = 0
             
-            for item in monster_items:
-                try:
-                    # Extract monster name from .monster-name .name a
-                    name_elem = item.select_one('.monster-name .name a, .monster-name a')
-                    if not name_elem:
-                        continue
-                    
-                    name = name_elem.get_text(strip=True)
-                    # Remove quotes if present
-                    name = name.strip('"')
-                    if not name:
-                        continue
-                    
-                    # Check for legacy badge
-                    is_legacy = False
-                    badge_elem = item.select_one('.badge .badge-label#legacy-badge')
-                    if badge_elem or name_elem.get('aria-describedby') == 'legacy-badge':
-                        is_legacy = True
-                    
-                    # Extract URL from the same link
-                    monster_url = name_elem.get('href')
-                    if monster_url and monster_url.startswith('/'):
-                        monster_url = f"https://www.dndbeyond.com{monster_url}"
-                    else:
-                        # Fallback: use data-slug
-                        slug = item.get('data-slug', '')
-                        monster_url = f"https://www.dndbeyond.com/monsters/{slug}"
-                    
-                    # Extract CR from .monster-challenge
-                    cr_text = '0'
-                    cr_elem = item.select_one('.monster-challenge span')
-                    if cr_elem:
-                        cr_text = cr_elem.get_text(strip=True)
-                    
-                    # Extract Type from .monster-type
-                    monster_type = ''
-                    type_elem = item.select_one('.monster-type .type')
-                    if type_elem:
-                        monster_type = type_elem.get_text(strip=True)
-                    
-                    # Extract Size from .monster-size
-                    size = ''
-                    size_elem = item.select_one('.monster-size span')
-                    if size_elem:
-                        size = size_elem.get_text(strip=True)
-                    
-                    # Extract Alignment from .monster-alignment
-                    alignment = ''
-                    align_elem = item.select_one('.monster-alignment span')
-                    if align_elem:
-                        alignment = align_elem.get_text(strip=True)
-                    
-                    # If this is a legacy monster and we already have a non-legacy version, skip it
-                    if is_legacy and name in all_monsters and not all_monsters[name].get('isLegacy', False):
-                        print(f"  Skipping legacy version of {name} (already have newer version)")
-                        continue
-                    
-                    # If this is NOT legacy and we already have a legacy version, replace it
-                    if not is_legacy and name in all_monsters and all_monsters[name].get('isLegacy', False):
-                        print(f"  Replacing legacy version of {name} with newer version")
-                    
-                    all_monsters[name] = {
-                        'cr': cr_text,
-                        'type': monster_type,
-                        'size': size,
-                        'alignment': alignment,
-                        'url': monster_url,
-                        'isLegacy': is_legacy
-                    }
-                    
-                except Exception as e:
-                    print(f"Error parsing monster item: {e}")
-                    continue
-            
-            # Move to next page
+            # Move to next page (upstream_get paces the requests)
             page += 1
-            
-            # Add a small delay to be respectful to the server
-            if page <= max_pages:
-                time.sleep(0.3)  # 300ms between pages
         
-        print(f"Scraped {len(all_monsters)} monsters total")
+        monster_log.info("Scraped %d monsters total", len(all_monsters))
         
         if all_monsters:
             # Save to cache
-            with open(MONSTERS_CACHE, 'w', encoding='utf-8') as f:
-                json.dump(all_monsters, f, indent=2)
-            print(f"Cached monsters to {MONSTERS_CACHE}")
+            save_monster_list(all_monsters)
             
-            return jsonify({'success': True, 'monsters': all_monsters, 'count': len(all_monsters), 'cached': False})
+            return monster_list_response(listing, cached=False)
         else:
             return jsonify({'success': False, 'error': 'No monsters found on page'})
     
     except Exception as e:
-        print(f"Error scraping monsters: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        monster_log.exception("Error scraping monsters: %s", e)
         return jsonify({'success': False, 'error': str(e)})
 
+def build_character_details(api_data):
+    """Turn a D&D Beyond character API response into the tracker's character payload.
+
+    ``avatarUrl`` is left pointing at D&D Beyond; callers cache the image.
+    Returns None if the API reported failure.
+    """
+    if not api_data.get('success'):
+        return None
+    
+    char_data = api_data.get('data', {})
+    
+    # Extract ability scores (stats array has IDs 1-6 for STR/DEX/CON/INT/WIS/CHA)
+    stats = {stat['id']: stat['value'] for stat in char_data.get('stats', [])}
+    abilities = {
+        'str': stats.get(1, 10),
+        'dex': stats.get(2, 10),
+        'con': stats.get(3, 10),
+        'int': stats.get(4, 10),
+        'wis': stats.get(5, 10),
+        'cha': stats.get(6, 10)
+    }
+    
+    # Calculate ability modifiers
+    def calc_modifier(score):
+        return (score - 10) // 2
+    
+    ability_mods = {k: calc_modifier(v) for k, v in abilities.items()}
+    
+    # Get character classes
+    classes = []
+    for cls in char_data.get('classes', []):
+        class_def = cls.get('definition', {})
+        classes.append({
+            'name': class_def.get('name', 'Unknown'),
+            'level': cls.get('level', 1)
+        })
+    
+    # Calculate total level
+    total_level = sum(c['level'] for c in classes)
+    
+    # Get race
+    race_def = char_data.get('race', {}).get('baseRaceName', '')
+    if not race_def:
+        race_def = char_data.get('race', {}).get('fullName', 'Unknown')
+    
+    # Calculate AC (from bonusStats and modifiers)
+    ac = 10 + ability_mods['dex']  # Base AC
+    # TODO: Add armor/shield bonuses from inventory
+    
+    # Get HP
+    base_hp = char_data.get('baseHitPoints', 0)
+    bonus_hp = char_data.get('bonusHitPoints', 0) or 0
+    override_hp = char_data.get('overrideHitPoints')
+    max_hp = override_hp if override_hp else (base_hp + bonus_hp)
+    current_hp = max_hp - char_data.get('removedHitPoints', 0)
+    
+    # Get speed
+    speed = char_data.get('race', {}).get('weightSpeeds', {}).get('normal', {}).get('walk', 30)
+    
+    # Calculate initiative (DEX modifier)
+    initiative = ability_mods['dex']
+    
+    # Calculate passive perception (10 + WIS mod + proficiency if proficient)
+    proficiency_bonus = 2 + (total_level - 1) // 4
+    passive_perception = 10 + ability_mods['wis']
+    # TODO: Add proficiency if skilled in Perception
+    
+    # Extract avatar URL
+    avatar_url = None
+    decorations = char_data.get('decorations', {})
+    if decorations:
+        # Try avatarUrl field
+        avatar_url = decorations.get('avatarUrl')
+        # If not found, try themeColor with avatar construction
+        if not avatar_url and decorations.get('avatarId'):
+            avatar_id = decorations.get('avatarId')
+            # D&D Beyond avatar URL pattern
+            avatar_url = f"https://www.dndbeyond.com/avatars/{avatar_id}/avatar.jpg"
+    
+    # Fallback to checking if there's a direct avatarUrl in character data
+    if not avatar_url:
+        avatar_url = char_data.get('avatarUrl')
+    
+    # Build character details
+    return {
+        'success': True,
+        'name': char_data.get('name', 'Unknown'),
+        'race': race_def,
+        'classes': classes,
+        'level': total_level,
+        'abilities': abilities,
+        'ability_modifiers': ability_mods,
+        'ac': ac,
+        'hp': {'current': current_hp, 'max': max_hp, 'temp': char_data.get('temporaryHitPoints', 0)},
+        'speed': speed,
+        'initiative': initiative,
+        'passive_perception': passive_perception,
+        'proficiency_bonus': proficiency_bonus,
+        'avatarUrl': avatar_url,
+        'timestamp': time.time()
+    }
+
+_character_sync = None
+_character_sync_lock = threading.Lock()
+
+def get_character_sync():
+    """Character cache and conditional refresh (.cache/characters)"""
+    global _character_sync
+    cache_dir = CACHE_DIR / "characters"
+    with _character_sync_lock:
+        if _character_sync is None or _character_sync.cache_dir != cache_dir:
+            _character_sync = CharacterSync(cache_dir, build_character_details, CHARACTER_CACHE_MAX_AGE)
+        return _character_sync
+
+# Character sync statuses as cache results, for /metrics
+CHARACTER_CACHE_RESULTS = {'fresh': 'hit', 'not-modified': 'revalidated', 'unchanged': 'revalidated',
+                           'updated': 'miss', 'error': 'error'}
+
+def record_character_cache(status):
+    metrics.record_cache('character', CHARACTER_CACHE_RESULTS.get(status, 'error'))
+
+def fetch_character(character_id, conditional_headers):
+    """Call the D&D Beyond character service (with any If-None-Match/If-Modified-Since)"""
+    import requests
+    api_url = CHARACTER_API_URL.format(character_id=character_id)
+    character_log.debug("Calling D&D Beyond API: %s", api_url)
+    return upstream_get(requests.get, api_url, params=CHARACTER_API_PARAMS,
+                        headers=dict(CHARACTER_API_HEADERS, **conditional_headers),
+                        cookies=DNDBEYOND_COOKIES, timeout=10)
+
+def localize_character_avatar(character_details):
+    """Point a character at its locally cached avatar image (downloading it if needed)"""
+    avatar_url = character_details.get('avatarUrl')
+    if avatar_url and not avatar_url.startswith('/cached/images/'):
+        character_log.debug("Found character avatar: %s", avatar_url)
+        cached_avatar = cache_avatar_image(avatar_url)
+        if cached_avatar:
+            character_details['avatarUrl'] = cached_avatar
+
+def character_id_from_url(character_url):
+    """Character ID from /profile/username/characters/ID, /characters/ID or a bare ID"""
+    return character_url.rstrip('/').split('/')[-1]
+
 @app.route('/api/dndbeyond/character/<path:character_url>', methods=['GET'])
 def get_character_details(character_url):
     """Fetch character stats from D&D Beyond API"""
     try:
         from urllib.parse import unquote
-        character_url = unquote(character_url)
-        
-        # Extract character ID from URL
-        # Formats: /profile/username/characters/ID or /characters/ID
-        character_id = character_url.rstrip('/').split('/')[-1]
-        
-        print(f"Fetching character details for ID: {character_id}")
-        
-        # Check cache first
-        cache_file = CACHE_DIR / "characters" / f"{character_id}.json"
-        cache_file.parent.mkdir(exist_ok=True)
+        character_id = character_id_from_url(unquote(character_url))
         
-        if cache_file.exists():
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-            
-            # Check if cache is less than 1 hour old
-            if 'timestamp' in cached_data:
-                cache_age = time.time() - cached_data['timestamp']
-                if cache_age < 3600:  # 1 hour
-                    print(f"Using cached character data (age: {cache_age:.0f}s)")
-                    
-                    # Cache avatar image if present and not already a local path
-                    if 'avatarUrl' in cached_data and cached_data['avatarUrl']:
-                        if not cached_data['avatarUrl'].startswith('/cached/images/'):
-                            cached_avatar = cache_avatar_image(cached_data['avatarUrl'])
-                            if cached_avatar:
-                                cached_data['avatarUrl'] = cached_avatar
-                    
-                    return jsonify(cached_data)
-        
-        # Call D&D Beyond character API
-        api_url = f"https://character-service.dndbeyond.com/character/v5/character/{character_id}"
-        params = {'includeCustomItems': 'true'}
-        
-        # Add headers to match browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Origin': 'https://www.dndbeyond.com',
-            'Referer': 'https://www.dndbeyond.com/',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-site'
-        }
-        
-        print(f"Calling D&D Beyond API: {api_url}")
-        response = requests.get(api_url, params=params, headers=headers, cookies=DNDBEYOND_COOKIES, timeout=10)
-        response.raise_for_status()
-        
-        api_data = response.json()
-        
-        if not api_data.get('success'):
+        # Served from cache for an hour, then refreshed with a conditional request
+        try:
+            character_details, status = get_character_sync().sync(character_id, fetch_character,
+                                                                  finish=localize_character_avatar)
+        except Exception:
+            record_character_cache('error')
+            raise
+        record_character_cache(status)
+        if character_details is None:
             return jsonify({'success': False, 'error': 'API returned unsuccessful response'})
         
-        char_data = api_data.get('data', {})
-        
-        # Extract ability scores (stats array has IDs 1-6 for STR/DEX/CON/INT/WIS/CHA)
-        stats = {stat['id']: stat['value'] for stat in char_data.get('stats', [])}
-        abilities = {
-            'str': stats.get(1, 10),
-            'dex': stats.get(2, 10),
-            'con': stats.get(3, 10),
-            'int': stats.get(4, 10),
-            'wis': stats.get(5, 10),
-            'cha': stats.get(6, 10)
-        }
-        
-        # Calculate ability modifiers
-        def calc_modifier(score):
-            return (score - 10) // 2
-        
-        ability_mods = {k: calc_modifier(v) for k, v in abilities.items()}
-        
-        # Get character classes
-        classes = []
-        for cls in char_data.get('classes', []):
-            class_def = cls.get('definition', {})
-            classes.append({
-                'name': class_def.get('name', 'Unknown'),
-                'level': cls.get('level', 1)
-            })
-        
-        # Calculate total level
-        total_level = sum(c['level'] for c in classes)
-        
-        # Get race
-        race_def = char_data.get('race', {}).get('baseRaceName', '')
-        if not race_def:
-            race_def = char_data.get('race', {}).get('fullName', 'Unknown')
-        
-        # Calculate AC (from bonusStats and modifiers)
-        ac = 10 + ability_mods['dex']  # Base AC
-        # TODO: Add armor/shield bonuses from inventory
-        
-        # Get HP
-        base_hp = char_data.get('baseHitPoints', 0)
-        bonus_hp = char_data.get('bonusHitPoints', 0) or 0
-        override_hp = char_data.get('overrideHitPoints')
-        max_hp = override_hp if override_hp else (base_hp + bonus_hp)
-        current_hp = max_hp - char_data.get('removedHitPoints', 0)
-        
-        # Get speed
-        speed = char_data.get('race', {}).get('weightSpeeds', {}).get('normal', {}).get('walk', 30)
-        
-        # Calculate initiative (DEX modifier)
-        initiative = ability_mods['dex']
-        
-        # Calculate passive perception (10 + WIS mod + proficiency if proficient)
-        proficiency_bonus = 2 + (total_level - 1) // 4
-        passive_perception = 10 + ability_mods['wis']
-        # TODO: Add proficiency if skilled in Perception
-        
-        # Extract avatar URL
-        avatar_url = None
-        decorations = char_data.get('decorations', {})
-        if decorations:
-            # Try avatarUrl field
-            avatar_url = decorations.get('avatarUrl')
-            # If not found, try themeColor with avatar construction
-            if not avatar_url and decorations.get('avatarId'):
-                avatar_id = decorations.get('avatarId')
-                # D&D Beyond avatar URL pattern
-                avatar_url = f"https://www.dndbeyond.com/avatars/{avatar_id}/avatar.jpg"
-        
-        # Fallback to checking if there's a direct avatarUrl in character data
-        if not avatar_url:
-            avatar_url = char_data.get('avatarUrl')
-        
-        if avatar_url:
-            print(f"  Found character avatar: {avatar_url}")
-            # Cache the avatar image locally
-            cached_avatar = cache_avatar_image(avatar_url)
-            avatar_url = cached_avatar if cached_avatar else avatar_url
-        
-        # Build character details
-        character_details = {
-            'success': True,
-            'name': char_data.get('name', 'Unknown'),
-            'race': race_def,
-            'classes': classes,
-            'level': total_level,
-            'abilities': abilities,
-            'ability_modifiers': ability_mods,
-            'ac': ac,
-            'hp': {'current': current_hp, 'max': max_hp, 'temp': char_data.get('temporaryHitPoints', 0)},
-            'speed': speed,
-            'initiative': initiative,
-            'passive_perception': passive_perception,
-            'proficiency_bonus': proficiency_bonus,
-            'avatarUrl': avatar_url,
-            'timestamp': time.time()
-        }
-        
-        # Cache the result
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(character_details, f, indent=2)
-        
-        print(f"Successfully fetched character: {character_details['name']}")
+        if status == 'fresh':
+            localize_character_avatar(character_details)
+        character_log.debug("Character %s (%s): %s", character_id, character_details['name'], status)
         return jsonify(character_details)
     
     except Exception as e:
-        print(f"Error in character endpoint: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        character_log.exception("Error in character endpoint: %s", e)
         return jsonify({'success': False, 'error': str(e)})
 
+MAX_CHARACTER_BATCH = 50
+
+def character_batch_response(character_ids, force=False, stream=False):
+    """Sync several characters at once: cached ones right away, stale ones in parallel.
+
+    Returns ``{success, characters: {id: details}, status: {id: status}}``;
+    a character that couldn't be loaded has status ``error`` and its error
+    in ``characters``. With ``stream`` the results are sent as NDJSON, one
+    ``{id, status, character}`` line per character as soon as it's ready.
+    """
+    def results():
+        for character_id, details, status in get_character_sync().iter_sync(
+                character_ids, fetch_character, finish=localize_character_avatar, force=force):
+            record_character_cache(status)
+            if status == 'fresh':
+                localize_character_avatar(details)
+            yield character_id, details, status
+
+    if stream:
+        def lines():
+            for character_id, details, status in results():
+                yield json.dumps({'id': character_id, 'status': status, 'character': details}) + '\n'
+        return app.response_class(lines(), mimetype='application/x-ndjson')
+
+    characters, statuses = {}, {}
+    for character_id, details, status in results():
+        characters[character_id] = details
+        statuses[character_id] = status
+    return jsonify({'success': True, 'characters': characters, 'status': statuses})
+
+@app.route('/api/dndbeyond/characters', methods=['POST'])
+def get_characters_batch():
+    """Load a whole party in one request.
+
+    Body: ``{"ids": [...]}`` with character IDs or URLs, and optionally
+    ``"force": true``. ``?stream=1`` streams the results as NDJSON.
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not all(isinstance(i, (str, int)) for i in ids):
+        return jsonify({'success': False, 'error': 'ids must be a list of character IDs or URLs'}), 400
+    if len(ids) > MAX_CHARACTER_BATCH:
+        return jsonify({'success': False, 'error': f'At most {MAX_CHARACTER_BATCH} characters per request'}), 400
+    
+    from urllib.parse import unquote
+    character_ids = [character_id_from_url(unquote(str(i))) for i in ids if str(i).strip()]
+    stream = request.args.get('stream', '').lower() in ('1', 'true')
+    return character_batch_response(character_ids, bool(data.get('force')), stream)
+
+def legacy_character_details(character_details):
+    """The character-old response shape, derived from the shared character model"""
+    classes = ' / '.join(c['name'] for c in character_details.get('classes', []))
+    modifiers = character_details.get('ability_modifiers', {})
+    hp = character_details.get('hp', {})
+    details = {
+        'name': character_details.get('name'),
+        'summary': f"Level {character_details.get('level', 0)} {character_details.get('race', '')} {classes}".strip(),
+        'abilities': {ability: {'score': score, 'modifier': modifiers.get(ability, (score - 10) // 2)}
+                      for ability, score in character_details.get('abilities', {}).items()},
+        'ac': character_details.get('ac'),
+        'hp': hp.get('current'),
+        'maxHp': hp.get('max'),
+        'speed': character_details.get('speed'),
+        'initiativeBonus': character_details.get('initiative'),
+        'passivePerception': character_details.get('passive_perception'),
+    }
+    if character_details.get('avatarUrl'):
+        details['avatarUrl'] = character_details['avatarUrl']
+    return details
+
 @app.route('/api/dndbeyond/character-old/<path:character_url>', methods=['GET'])
 def get_character_details_old(character_url):
-    """Fetch detailed character stats from D&D Beyond character sheet"""
+    """Legacy character endpoint, kept for old clients.
+
+    Served from the same cached character model as /api/dndbeyond/character
+    (the character sheet is no longer scraped), in the old
+    ``{success, details, cached}`` shape.
+    """
     try:
-        # Decode the URL-encoded path
         from urllib.parse import unquote
-        character_url = unquote(character_url)
-        
-        # Ensure URL is properly formatted
-        if not character_url.startswith('http'):
-            # If it looks like profile/username/characters/id or characters/id
-            if '/' in character_url:
-                if character_url.startswith('profile/') or character_url.startswith('characters/'):
-                    character_url = f"https://www.dndbeyond.com/{character_url}"
-                else:
-                    # Assume it's username/characters/id format
-                    character_url = f"https://www.dndbeyond.com/profile/{character_url}"
-            else:
-                # Just a character ID
-                character_url = f"https://www.dndbeyond.com/characters/{character_url}"
-        
-        print(f"Fetching character details from: {character_url}")
-        
-        # Generate cache filename from character ID
-        character_id = character_url.split('/')[-1]  # Get last part of URL
-        cache_file = CACHE_DIR / "characters" / f"{character_id}.json"
-        cache_file.parent.mkdir(exist_ok=True)
-        
-        # Check cache first
-        if cache_file.exists():
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-            
-            # Check if cache is less than 1 day old (characters change more often than monsters)
-            if 'timestamp' in cached_data:
-                cache_age = time.time() - cached_data['timestamp']
-                if cache_age < 86400:  # 24 hours in seconds
-                    print(f"Returning cached details for {character_id} (age: {cache_age/3600:.1f} hours)")
-                    return jsonify({'success': True, 'details': cached_data.get('data', {}), 'cached': True})
-        
-        # Need to scrape
-        if not DNDBEYOND_COOKIES:
-            print("No cookies available for fetching character details")
-            return jsonify({'success': False, 'error': 'No authentication cookies available'})
-        
-        print(f"Scraping character page with {len(DNDBEYOND_COOKIES)} cookies...")
-        
-        # Use a session to properly handle cookies
-        session = requests.Session()
-        
-        # Add all cookies to the session
-        for cookie_name, cookie_value in DNDBEYOND_COOKIES.items():
-            session.cookies.set(cookie_name, cookie_value, domain='.dndbeyond.com')
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
-        }
-        
-        response = session.get(character_url, headers=headers, timeout=15, allow_redirects=True)
-        
-        if response.status_code != 200:
-            error_msg = f'HTTP {response.status_code}'
-            print(f"Failed to fetch character page: {error_msg}")
-            return jsonify({'success': False, 'error': error_msg})
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Save debug HTML for first character fetch
-        debug_file = CACHE_DIR / f"character_debug_{character_id}.html"
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        print(f"Saved debug HTML to {debug_file}")
+        character_id = character_id_from_url(unquote(character_url))
+        try:
+            character_details, status = get_character_sync().sync(character_id, fetch_character,
+                                                                  finish=localize_character_avatar)
+        except Exception:
+            record_character_cache('error')
+            raise
+        record_character_cache(status)
+        if character_details is None:
+            return jsonify({'success': False, 'error': 'API returned unsuccessful response'})
+        if status == 'fresh':
+            localize_character_avatar(character_details)
+        return jsonify({'success': True, 'details': legacy_character_details(character_details),
+                        'cached': status != 'updated'})
+    
+    except Exception as e:
+        character_log.exception("Error fetching character details: %s", e)
+        return jsonify({'success': False, 'error': str(e)})
+
+_monster_index = None
+_monster_index_key = None
+_monster_index_lock = threading.Lock()
+_difficulty_engine = None
+
+def get_monster_index():
+    """Search index over the cached monster list, rebuilt when the cache file changes.
+
+    Returns None if the monster list hasn't been loaded yet.
+    """
+    global _monster_index, _monster_index_key
+    try:
+        stat = MONSTERS_CACHE.stat()
+    except FileNotFoundError:
+        return None
+    key = (str(MONSTERS_CACHE), stat.st_mtime_ns, stat.st_size)
+    with _monster_index_lock:
+        if _monster_index_key != key:
+            with open(MONSTERS_CACHE, 'r', encoding='utf-8') as f:
+                all_monsters = json.load(f)
+            _monster_index = MonsterIndex(all_monsters, version=f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+            _monster_index_key = key
+            monster_log.info("Built monster search index (%d monsters)", len(_monster_index))
+        return _monster_index
+
+@app.route('/api/dndbeyond/monster/search/<monster_name>', methods=['GET'])
+def search_monster_by_name(monster_name):
+    """Look up a monster by name in the cached monster list (instance numbers and small typos are ignored)"""
+    try:
+        from urllib.parse import unquote
+        monster_name = unquote(monster_name).strip()
         
-        details = {}
+        index = get_monster_index()
+        if index is None:
+            return jsonify({'success': False, 'error': 'Monster list not loaded. Please load monsters first.'})
         
-        # Extract character name
-        name_elem = soup.select_one('.ddbc-character-name')
-        if name_elem:
-            details['name'] = name_elem.get_text(strip=True)
-            print(f"  Found character name: {details['name']}")
+        monster_data = index.lookup(monster_name)
+        if monster_data is None:
+            monster_log.debug("Monster %r not found", monster_name)
+            return jsonify({'success': False, 'error': f'Monster "{monster_name}" not found in cached list'})
         
-        # Extract race/class/level from character summary
-        summary_elem = soup.select_one('.ddbc-character-summary__classes')
-        if summary_elem:
-            summary_text = summary_elem.get_text(strip=True)
-            details['summary'] = summary_text  # e.g., "Level 1 Tiefling Rogue"
-            print(f"  Found summary: {summary_text}")
+        name = monster_data['name']
+        monster_log.debug("Found monster: %s -> %s (%s match)", name, monster_data['url'], monster_data['match'])
         
-        # Extract ability scores from the stat block
-        ability_names = ['str', 'dex', 'con', 'int', 'wis', 'cha']
-        details['abilities'] = {}
+        # Also fetch full details if possible
+        monster_url = monster_data['url']
+        monster_id = monster_url.split('/')[-1]
+        details_cache = MONSTER_DETAILS_DIR / f"{monster_id}.json"
         
-        for ability in ability_names:
-            ability_elem = soup.select_one(f'.ddbc-ability-summary--{ability}')
-            if ability_elem:
-                score_elem = ability_elem.select_one('.ddbc-ability-summary__primary')
-                modifier_elem = ability_elem.select_one('.ddbc-ability-summary__secondary')
-                
-                if score_elem and modifier_elem:
-                    score = parse_signed_int(score_elem.get_text(strip=True), default=0)
-                    modifier = parse_signed_int(modifier_elem.get_text(strip=True), default=0)
-                    
-                    details['abilities'][ability] = {
-                        'score': score,
-                        'modifier': modifier
-                    }
+        details = None
+        if details_cache.exists():
+            with open(details_cache, 'r', encoding='utf-8') as f:
+                details = json.load(f)
         
-        if details['abilities']:
-            print(f"  Found {len(details['abilities'])} ability scores")
+        return jsonify({
+            'success': True,
+            'url': monster_data['url'],
+            'name': name,
+            'match': monster_data['match'],
+            'cr': monster_data.get('cr'),
+            'type': monster_data.get('type'),
+            'size': monster_data.get('size'),
+            'alignment': monster_data.get('alignment'),
+            'id': monster_id,
+            'details': details
+        })
         
-        # Extract AC from character summary
-        ac_elem = soup.select_one('.ddbc-armor-class-box__value')
-        if ac_elem:
-            ac_text = ac_elem.get_text(strip=True)
-            ac_match = re.search(r'(\d+)', ac_text)
-            if ac_match:
-                details['ac'] = int(ac_match.group(1))
-                print(f"  Found AC: {details['ac']}")
-        
-        # Extract HP from character summary  
-        hp_elem = soup.select_one('.ddbc-health-summary__hp-number')
-        if hp_elem:
-            hp_text = hp_elem.get_text(strip=True)
-            hp_match = re.search(r'(\d+)', hp_text)
-            if hp_match:
-                details['hp'] = int(hp_match.group(1))
-                details['maxHp'] = details['hp']  # Current max HP
-                print(f"  Found HP: {details['hp']}")
-        
-        # Extract Speed
-        speed_elem = soup.select_one('.ddbc-speed-box__value')
-        if speed_elem:
-            speed_text = speed_elem.get_text(strip=True)
-            speed_match = re.search(r'(\d+)', speed_text)
-            if speed_match:
-                details['speed'] = int(speed_match.group(1))
-                print(f"  Found Speed: {details['speed']}")
-        
-        # Extract Initiative Bonus
-        init_elem = soup.select_one('.ddbc-initiative-box__value')
-        if init_elem:
-            init_text = init_elem.get_text(strip=True)
-            init_match = re.search(r'([+-]?\d+)', init_text)
-            if init_match:
-                details['initiativeBonus'] = int(init_match.group(1))
-                print(f"  Found Initiative: {details['initiativeBonus']}")
-        
-        # Extract Passive Perception
-        pp_elem = soup.select_one('.ddbc-passive-perception-box__value')
-        if pp_elem:
-            pp_text = pp_elem.get_text(strip=True)
-            pp_match = re.search(r'(\d+)', pp_text)
-            if pp_match:
-                details['passivePerception'] = int(pp_match.group(1))
-                print(f"  Found Passive Perception: {details['passivePerception']}")
-            if pp_match:
-                details['passivePerception'] = int(pp_match.group(1))
-        
-        # Extract Skills
-        skills = []
-        skill_items = soup.select('.ddbc-skills-list__item')
-        for item in skill_items:
-            skill_name_elem = item.select_one('.ddbc-skills-list__label')
-            skill_bonus_elem = item.select_one('.ddbc-skills-list__value')
-            
-            if skill_name_elem and skill_bonus_elem:
-                skill_name = skill_name_elem.get_text(strip=True)
-                skill_bonus = skill_bonus_elem.get_text(strip=True)
-                skills.append(f"{skill_name} {skill_bonus}")
-        
-        if skills:
-            details['skills'] = ', '.join(skills)
-        
-        # Extract Saving Throws
-        saves = []
-        save_items = soup.select('.ddbc-saving-throws-summary__ability')
-        for item in save_items:
-            save_name_elem = item.select_one('.ddbc-saving-throws-summary__ability-name')
-            save_bonus_elem = item.select_one('.ddbc-saving-throws-summary__ability-modifier')
-            
-            if save_name_elem and save_bonus_elem:
-                save_name = save_name_elem.get_text(strip=True).upper()[:3]
-                save_bonus = save_bonus_elem.get_text(strip=True)
-                saves.append(f"{save_name} {save_bonus}")
-        
-        if saves:
-            details['savingThrows'] = ', '.join(saves)
-        
-        # Extract Proficiencies
-        prof_elems = soup.select('.ddbc-proficiency-groups__item')
-        proficiencies = {}
-        for elem in prof_elems:
-            prof_label = elem.select_one('.ddbc-proficiency-groups__label')
-            prof_list = elem.select_one('.ddbc-proficiency-groups__list')
-            
-            if prof_label and prof_list:
-                label = prof_label.get_text(strip=True).rstrip(':')
-                items = prof_list.get_text(strip=True)
-                proficiencies[label] = items
-        
-        if proficiencies:
-            details['proficiencies'] = proficiencies
-            print(f"  Found {len(proficiencies)} proficiency categories")
-        
-        # Extract Features & Traits
-        features = []
-        feature_items = soup.select('.ddbc-feature-list__item, .ct-feature-snippet')
-        for item in feature_items[:10]:  # Limit to first 10 features to avoid too much data
-            name_elem = item.select_one('.ddbc-feature-list__item-name, .ct-feature-snippet__heading')
-            desc_elem = item.select_one('.ddbc-feature-list__item-description, .ct-feature-snippet__content')
-            
-            if name_elem:
-                name = name_elem.get_text(strip=True)
-                description = desc_elem.get_text(strip=True) if desc_elem else ''
-                # Truncate long descriptions
-                if len(description) > 200:
-                    description = description[:200] + '...'
-                features.append({'name': name, 'description': description})
-        
-        if features:
-            details['features'] = features
-            print(f"  Found {len(features)} features")
-        
-        print(f"Extracted character details with {len(details)} fields: {list(details.keys())}")
-        
-        # Cache the details
-        cache_data = {
-            'url': character_url,
-            'data': details,
-            'timestamp': time.time()
-        }
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=2)
-        
-        print(f"Cached to {cache_file}")
-        
-        return jsonify({'success': True, 'details': details, 'cached': False})
-    
     except Exception as e:
-        print(f"Error fetching character details: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        monster_log.exception("Error searching for monster: %s", e)
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/dndbeyond/monster/search/<monster_name>', methods=['GET'])
-def search_monster_by_name(monster_name):
-    """Search for a monster by name in the cached monsters dictionary"""
+def _list_arg(name):
+    """A comma-separated (or repeated) query argument as a list, or None if absent"""
+    values = [v.strip() for raw in request.args.getlist(name) for v in raw.split(',') if v.strip()]
+    return values or None
+
+@app.route('/api/monsters/search', methods=['GET'])
+def search_monsters():
+    """Ranked prefix/fuzzy search over the monster library.
+
+    Query args: ``q``, ``limit`` (default 20), ``cr`` (comma-separated),
+    ``min_cr``/``max_cr``, ``type``, ``size`` and ``legacy`` (true/false).
+    An empty ``q`` lists the monsters matching the filters by CR.
+    """
+    query = request.args.get('q', '')
     try:
-        from urllib.parse import unquote
-        monster_name = unquote(monster_name).strip()
-        
-        print(f"Searching for monster: {monster_name}")
-        
-        # Check if monsters are cached
-        if not MONSTERS_CACHE.exists():
-            return jsonify({'success': False, 'error': 'Monster list not loaded. Please load monsters first.'})
-        
-        # Load monsters from cache (stored as dict with name as key)
-        with open(MONSTERS_CACHE, 'r', encoding='utf-8') as f:
-            all_monsters = json.load(f)
-        
-        # Search for exact match (case-insensitive)
-        for name, monster_data in all_monsters.items():
-            if name.lower() == monster_name.lower():
-                print(f"Found monster: {name} -> {monster_data['url']}")
-                
-                # Also fetch full details if possible
-                monster_url = monster_data['url']
-                monster_id = monster_url.split('/')[-1]
-                details_cache = MONSTER_DETAILS_DIR / f"{monster_id}.json"
-                
-                details = None
-                if details_cache.exists():
-                    with open(details_cache, 'r', encoding='utf-8') as f:
-                        details = json.load(f)
-                    print(f"Found cached details for {name}")
-                
-                return jsonify({
-                    'success': True,
-                    'url': monster_data['url'],
-                    'name': name,
-                    'cr': monster_data.get('cr'),
-                    'type': monster_data.get('type'),
-                    'size': monster_data.get('size'),
-                    'alignment': monster_data.get('alignment'),
-                    'id': monster_id,
-                    'details': details
-                })
-        
-        # No exact match found
-        print(f"Monster '{monster_name}' not found. Available monsters sample: {list(all_monsters.keys())[:5]}")
-        return jsonify({'success': False, 'error': f'Monster "{monster_name}" not found in cached list'})
-        
-    except Exception as e:
-        print(f"Error searching for monster: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)})
+        limit = min(max(int(request.args.get('limit', 20)), 1), MONSTER_SEARCH_MAX_LIMIT)
+        filters = _monster_filter_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    index = get_monster_index()
+    if index is None:
+        return jsonify({'success': False, 'error': 'Monster list not loaded. Please load monsters first.'})
+    
+    results, total = index.search(query, limit=limit, **filters)
+    return jsonify({'success': True, 'query': query, 'results': results, 'count': len(results),
+                    'total': total, 'librarySize': len(index)})
+
+def _monster_filter_args():
+    """Filters shared by the monster search and listing endpoints (raises ValueError)"""
+    filters = {'cr': _list_arg('cr'), 'type': _list_arg('type'), 'size': _list_arg('size')}
+    for bound in ('min_cr', 'max_cr'):
+        value = request.args.get(bound)
+        filters[bound] = cr_value(value) if value else None
+        if value and filters[bound] is None:
+            raise ValueError(f'{bound} must be a CR like 5 or 1/4')
+    legacy = request.args.get('legacy')
+    filters['legacy'] = legacy.lower() == 'true' if legacy else None
+    return filters
+
+def _monster_listing_args():
+    """Parse the /api/dndbeyond/monsters listing arguments (raises ValueError)"""
+    args = request.args
+    no_access = args.get('no_access')
+    order = args.get('order', 'asc').lower()
+    listing = {
+        'filters': _monster_filter_args(),
+        'no_access': no_access.lower() == 'true' if no_access else None,
+        'sort': args.get('sort'),
+        'descending': order == 'desc',
+        'fields': _list_arg('fields'),
+    }
+    if listing['sort'] not in (None, 'name', 'cr'):
+        raise ValueError("sort must be 'name' or 'cr'")
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    unknown = set(listing['fields'] or ()) - set(MONSTER_LIST_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    if 'page' in args or 'per_page' in args:
+        try:
+            listing['page'] = int(args.get('page', 1))
+            listing['per_page'] = int(args.get('per_page', MONSTER_LIST_DEFAULT_PER_PAGE))
+        except ValueError:
+            raise ValueError('page and per_page must be whole numbers')
+        if listing['page'] < 1 or not 1 <= listing['per_page'] <= MONSTER_LIST_MAX_PER_PAGE:
+            raise ValueError(f'page must be at least 1 and per_page between 1 and {MONSTER_LIST_MAX_PER_PAGE}')
+    return listing
+
+# Monster IDs whose detail pages redirect to the marketplace (content we don't own)
+_monster_access = {'dir': None, 'blocked': set(), 'tag': ''}
+_monster_access_lock = threading.Lock()
+
+def _blocked_monster_ids():
+    """The blocked ID set for the current MONSTER_DETAILS_DIR (call with the lock held)"""
+    details_dir = str(MONSTER_DETAILS_DIR)
+    if _monster_access['dir'] != details_dir:
+        blocked = set()
+        for path in MONSTER_DETAILS_DIR.glob('*.json'):
+            # Error entries are tiny, so full stat blocks don't need reading
+            if path.stat().st_size > 2048:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if entry.get('error') and not entry.get('data'):
+                blocked.add(path.stem)
+        _monster_access.update(dir=details_dir, blocked=blocked)
+        _update_monster_access_tag()
+    return _monster_access['blocked']
+
+def _update_monster_access_tag():
+    import hashlib
+    joined = '\n'.join(sorted(_monster_access['blocked']))
+    _monster_access['tag'] = hashlib.md5(joined.encode()).hexdigest()[:8]
+
+def monster_access_state():
+    """``(blocked monster IDs, tag)``; the tag changes whenever the set does"""
+    with _monster_access_lock:
+        return frozenset(_blocked_monster_ids()), _monster_access['tag']
+
+def record_monster_access(cache_file, accessible):
+    """Note whether a monster's page was accessible (for the no_access listing filter)"""
+    with _monster_access_lock:
+        blocked = _blocked_monster_ids()
+        monster_id = cache_file.stem
+        if accessible and monster_id in blocked:
+            blocked.discard(monster_id)
+        elif not accessible and monster_id not in blocked:
+            blocked.add(monster_id)
+        else:
+            return
+        _update_monster_access_tag()
+
+def build_monster_listing(index, blocked_ids, listing):
+    """Filter, sort, paginate and project the monster library for /api/dndbeyond/monsters"""
+    blocked = {name for name in index.names
+               if index.monsters[name].get('url', '').rstrip('/').split('/')[-1] in blocked_ids}
+    names = index.select(sort=listing['sort'], descending=listing['descending'],
+                         only=blocked if listing['no_access'] is True else None,
+                         exclude=blocked if listing['no_access'] is False else None,
+                         **listing['filters'])
+    payload = {'success': True, 'total': len(names)}
+    if 'page' in listing:
+        per_page = listing['per_page']
+        start = (listing['page'] - 1) * per_page
+        payload.update(page=listing['page'], perPage=per_page, pages=-(-len(names) // per_page))
+        names = names[start:start + per_page]
+    
+    fields = listing['fields']
+    monsters = {}
+    for name in names:
+        monster = index.monsters[name]
+        if name in blocked:
+            monster = dict(monster, noAccess=True)
+        if fields:
+            monster = {field: monster.get(field, False if field == 'noAccess' else None) for field in fields}
+        monsters[name] = monster
+    payload['monsters'] = monsters
+    payload['count'] = len(monsters)
+    return payload
+
+# Recently served library bodies, keyed by ETag + query + encoding
+_monster_list_responses = {}
+_monster_list_responses_lock = threading.Lock()
+
+def monster_list_response(listing, cached):
+    """The library listing with a version ETag (304 when unchanged), compressed if accepted"""
+    index = get_monster_index()
+    blocked_ids, access_tag = monster_access_state()
+    etag = f'monsters-{index.version}-{access_tag}'
+    
+    encoding = http_cache.negotiate_encoding(request)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        key = (etag, cached, request.query_string, encoding)
+        with _monster_list_responses_lock:
+            body = _monster_list_responses.get(key)
+        if body is None:
+            payload = build_monster_listing(index, blocked_ids, listing)
+            payload['cached'] = cached
+            payload['version'] = etag
+            # Keep the requested order; jsonify() would sort the names
+            body = app.json.dumps(payload, sort_keys=False).encode('utf-8')
+            if encoding:
+                body = http_cache.compress(body, encoding)
+            with _monster_list_responses_lock:
+                _monster_list_responses[key] = body
+                while len(_monster_list_responses) > MONSTER_LIST_RESPONSE_CACHE_SIZE:
+                    _monster_list_responses.pop(next(iter(_monster_list_responses)))
+        response = app.response_class(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag, weak=True)
+    # Let browsers keep the body but revalidate it on every load
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def resolve_monster_url(monster_url):
+    """Normalize a monster URL or slug and find its details cache file.
+
+    Returns ``(monster_url, monster_id, cache_file)``.
+    """
+    # Ensure URL is properly formatted
+    if not monster_url.startswith('http'):
+        # If it's a short form, add the full monsters prefix
+        if not monster_url.startswith('monsters/'):
+            monster_url = f"{DNDBEYOND_BASE_URL}/monsters/{monster_url}"
+        else:
+            monster_url = f"{DNDBEYOND_BASE_URL}/{monster_url}"
+    
+    # Generate cache filename from monster ID
+    monster_id = monster_url.split('/')[-1]  # e.g., "16835-cultist"
+    cache_file = MONSTER_DETAILS_DIR / f"{monster_id}.json"
+    
+    # If the client sent a bare slug ("acolyte") or display name ("Acolyte")
+    # without the numeric prefix, try to find an existing cache file that
+    # ends with "-<slug>.json" before falling through to a live scrape.
+    # Matches the "<numericId>-<slug>.json" convention used by this endpoint.
+    if not cache_file.exists() and not re.match(r'^\d+-', monster_id):
+        slug_lower = monster_id.lower().replace(' ', '-')
+        try:
+            candidates = sorted(MONSTER_DETAILS_DIR.glob(f"*-{slug_lower}.json"))
+            if candidates:
+                cache_file = candidates[0]
+                monster_id = cache_file.stem
+                monster_url = f"{DNDBEYOND_BASE_URL}/monsters/{monster_id}"
+                monster_log.debug("Resolved bare slug to cached entry: %s", monster_id)
+        except Exception as e:
+            monster_log.warning("Slug resolution failed: %s", e)
+    
+    return monster_url, monster_id, cache_file
+
+def read_cache_entry(cache_file, max_age):
+    """Load a timestamped JSON cache file.
+
+    Returns ``(entry, age)``. ``entry`` is None if the file is missing, has
+    no timestamp or is older than ``max_age`` seconds; ``age`` is None if
+    there is no timestamp to go by.
+    """
+    if not cache_file.exists():
+        return None, None
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    if 'timestamp' not in entry:
+        return None, None
+    age = time.time() - entry['timestamp']
+    return (entry if age < max_age else None), age
+
+def remember_monster_avatar(cache_file, cached_data, cached_avatar):
+    """Point a cached monster at its locally cached avatar image.
+
+    Persists the local path back into the monster cache so future loads skip
+    the remote URL entirely. Does nothing unless the download succeeded.
+    """
+    if not cached_avatar or not cached_avatar.startswith('/cached/images/'):
+        return
+    cached_data['data']['avatarUrl'] = cached_avatar
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cached_data, f, indent=2)
+    except Exception as persist_err:
+        monster_log.warning("Failed to persist cached avatar path: %s", persist_err)
 
 @app.route('/api/dndbeyond/monster/<path:monster_url>', methods=['GET'])
 def get_monster_details(monster_url):
     """Fetch detailed monster stats from D&D Beyond (JIT)"""
-    import time
+    # Decode the URL-encoded path
+    from urllib.parse import unquote
+    return jsonify(fetch_monster_details(unquote(monster_url)))
+
+def fetch_monster_details(monster_url):
+    """Monster details payload for a monster URL or slug, scraping on a cache miss.
+
+    Returns the JSON-ready dict served by /api/dndbeyond/monster (also used
+    by background jobs).
+    """
     start_time = time.time()
     try:
-        # Decode the URL-encoded path
-        from urllib.parse import unquote
-        monster_url = unquote(monster_url)
-        
-        # Ensure URL is properly formatted
-        if not monster_url.startswith('http'):
-            # If it's a short form, add the full monsters prefix
-            if not monster_url.startswith('monsters/'):
-                monster_url = f"https://www.dndbeyond.com/monsters/{monster_url}"
-            else:
-                monster_url = f"https://www.dndbeyond.com/{monster_url}"
-        
-        # Generate cache filename from monster ID
-        monster_id = monster_url.split('/')[-1]  # e.g., "16835-cultist"
-        cache_file = MONSTER_DETAILS_DIR / f"{monster_id}.json"
-        
-        # If the client sent a bare slug ("acolyte") or display name ("Acolyte")
-        # without the numeric prefix, try to find an existing cache file that
-        # ends with "-<slug>.json" before falling through to a live scrape.
-        # Matches the "<numericId>-<slug>.json" convention used by this endpoint.
-        if not cache_file.exists() and not re.match(r'^\d+-', monster_id):
-            slug_lower = monster_id.lower().replace(' ', '-')
-            try:
-                candidates = sorted(MONSTER_DETAILS_DIR.glob(f"*-{slug_lower}.json"))
-                if candidates:
-                    cache_file = candidates[0]
-                    monster_id = cache_file.stem
-                    monster_url = f"https://www.dndbeyond.com/monsters/{monster_id}"
-                    print(f"  Resolved bare slug to cached entry: {monster_id}")
-            except Exception as e:
-                print(f"  Slug resolution failed: {e}")
-        
-        # Check cache first
-        if cache_file.exists():
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
+        monster_url, monster_id, cache_file = resolve_monster_url(monster_url)
+        
+        # Check cache first (30 days)
+        cached_data, cache_age = read_cache_entry(cache_file, MONSTER_CACHE_MAX_AGE)
+        metrics.record_cache('monster', 'hit' if cached_data is not None else 'miss')
+        if cached_data is not None:
+            monster_log.debug("Returning cached details for %s (age: %.1f days) [cache read: %.0fms]",
+                              monster_id, cache_age / 86400, (time.time() - start_time) * 1000)
+            details = cached_data.get('data', {})
             
-            # Check if cache is less than 30 days old
-            if 'timestamp' in cached_data:
-                cache_age = time.time() - cached_data['timestamp']
-                if cache_age < 2592000:  # 30 days in seconds
-                    cache_read_time = time.time()
-                    print(f"Returning cached details for {monster_id} (age: {cache_age/86400:.1f} days) [cache read: {(cache_read_time - start_time)*1000:.0f}ms]")
-                    details = cached_data.get('data', {})
-                    
-                    # Lazily cache avatar image on the load path: first serve of a
-                    # monster fetches+stores the image, subsequent serves short-circuit
-                    # via the existence check inside cache_avatar_image().
-                    if 'avatarUrl' in details and details['avatarUrl']:
-                        if not details['avatarUrl'].startswith('/cached/images/'):
-                            cached_avatar = cache_avatar_image(details['avatarUrl'])
-                            if cached_avatar and cached_avatar.startswith('/cached/images/'):
-                                details['avatarUrl'] = cached_avatar
-                                # Persist the local path back into the monster cache so
-                                # future loads skip the remote URL entirely.
-                                cached_data['data'] = details
-                                try:
-                                    with open(cache_file, 'w', encoding='utf-8') as f:
-                                        json.dump(cached_data, f, indent=2)
-                                except Exception as persist_err:
-                                    print(f"  Warning: failed to persist cached avatar path: {persist_err}")
-                    
-                    return jsonify({'success': True, 'details': details, 'cached': True})
-                else:
-                    print(f"Cache expired for {monster_id} (age: {cache_age/86400:.1f} days)")
+            # Lazily cache avatar image on the load path: first serve of a
+            # monster fetches+stores the image, subsequent serves short-circuit
+            # via the existence check inside cache_avatar_image().
+            if details.get('avatarUrl') and not details['avatarUrl'].startswith('/cached/images/'):
+                remember_monster_avatar(cache_file, cached_data, cache_avatar_image(details['avatarUrl']))
+            
+            return {'success': True, 'details': details, 'cached': True}
+        elif cache_age is not None:
+            monster_log.debug("Cache expired for %s (age: %.1f days)", monster_id, cache_age / 86400)
         
         # Need to scrape
+        import requests
+
         # Use a session to properly handle cookies and redirects
         session = requests.Session()
         
@@ -1045,967 +1460,898 @@ def get_monster_details(monster_url):
             for cookie_name, cookie_value in DNDBEYOND_COOKIES.items():
                 session.cookies.set(cookie_name, cookie_value, domain='.dndbeyond.com')
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36 Edg/144.0.0.0',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br, zstd',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache',
-            'Priority': 'u=0, i',
-            'Sec-Ch-Ua': '"Not(A:Brand";v="8", "Chromium";v="144", "Microsoft Edge";v="144"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"Windows"',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        headers = dict(MONSTER_PAGE_HEADERS)
         
         # Visit homepage first to establish session (like a browser would)
         try:
-            session.get('https://www.dndbeyond.com/', headers=headers, timeout=10)
+            upstream_get(session.get, f'{DNDBEYOND_BASE_URL}/', headers=headers, timeout=10)
         except Exception as e:
-            print(f"  Warning: Homepage visit failed: {e}")
+            monster_log.warning("Homepage visit failed: %s", e)
         
         # Update headers to include Referer (showing we came from D&D Beyond)
-        headers['Referer'] = 'https://www.dndbeyond.com/'
-        headers['Sec-Fetch-Site'] = 'same-origin'
+        headers.update(MONSTER_PAGE_REFERER_HEADERS)
         
         # Now try to fetch the monster page with the established session
-        print(f"\n{'='*80}")
-        print(f"FETCHING: {monster_url}")
-        print(f"Session cookies: {len(session.cookies)}")
-        print(f"{'='*80}")
-        
-        response = session.get(monster_url, headers=headers, timeout=15, allow_redirects=True)
-        
-        # Diagnostic output
-        print(f"  Status Code: {response.status_code}")
-        print(f"  Final URL: {response.url}")
-        print(f"  Content-Encoding: {response.headers.get('Content-Encoding', 'none')}")
-        print(f"  Content-Type: {response.headers.get('Content-Type', 'none')}")
-        print(f"  Content-Length: {len(response.content)} bytes")
+        monster_log.info("Fetching %s", monster_url, extra={'monster_id': monster_id})
+        response = upstream_get(session.get, monster_url, headers=headers, timeout=15, allow_redirects=True)
+        monster_log.debug("%s: HTTP %s, final URL %s, %s %s, %d bytes, %d session cookies",
+                          monster_id, response.status_code, response.url,
+                          response.headers.get('Content-Encoding', 'identity'),
+                          response.headers.get('Content-Type', 'none'), len(response.content), len(session.cookies))
         
         # Ensure content is decoded properly
         response.encoding = response.apparent_encoding or 'utf-8'
         
         if response.status_code != 200:
             error_msg = f'HTTP {response.status_code}'
-            print(f"  ❌ ERROR: {error_msg}")
-            return jsonify({'success': False, 'error': error_msg})
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Check if we got redirected to marketplace or got an invalid page
-        page_title = soup.find('title')
-        if page_title:
-            title_text = page_title.get_text().lower()
-            print(f"  Page Title: '{title_text}'")
-            # Check for various error/redirect indicators
-            if 'shop' in title_text or 'marketplace' in title_text:
-                error_msg = 'Monster page redirected to marketplace - may not be accessible'
-                print(f"  ❌ REDIRECT ERROR: {error_msg}")
-                print(f"  💡 This usually means cookies are expired or invalid")
-                # Save error to cache to avoid repeated attempts
-                cache_data = {
-                    'url': monster_url,
-                    'data': {},
-                    'error': error_msg,
-                    'timestamp': time.time()
-                }
-                with open(cache_file, 'w') as f:
-                    json.dump(cache_data, f)
-                return jsonify({'success': False, 'error': error_msg, 'auth_failed': True})
-        
-        # Check for main stat blocks to verify we got a valid monster page
-        stat_block_2014 = soup.find('div', class_='mon-stat-block')
-        stat_block_2024 = soup.find('div', class_='mon-stat-block-2024')
+            monster_log.warning("Fetching %s failed: %s", monster_url, error_msg)
+            return {'success': False, 'error': error_msg}
         
-        if stat_block_2014:
-            print(f"  ✓ Found 2014 format stat block")
-        if stat_block_2024:
-            print(f"  ✓ Found 2024 format stat block")
-        
-        if not stat_block_2014 and not stat_block_2024:
-            print(f"  ⚠️  WARNING: No stat block found in page")
-        
-        details = {}
-        
-        # Mark new format version
-        details['formatVersion'] = 2
-        
-        # Check for legacy badge on the monster details page
-        is_legacy = False
-        legacy_badge = soup.select_one('.badge .badge-label#legacy-badge, [aria-label="legacy"]')
-        if legacy_badge:
-            is_legacy = True
-            print(f"  Detected LEGACY monster")
-        
-        details['isLegacy'] = is_legacy
-        
-        # Helper function to normalize Unicode characters to ASCII equivalents
-        def normalize_text(text):
-            """Replace Unicode characters with ASCII equivalents and fix missing spaces"""
-            if not text:
-                return text
-            # Replace curly quotes
-            text = text.replace('\u2018', "'")  # Left single quote
-            text = text.replace('\u2019', "'")  # Right single quote
-            text = text.replace('\u201c', '"')  # Left double quote
-            text = text.replace('\u201d', '"')  # Right double quote
-            # Replace dashes
-            text = text.replace('\u2013', '-')  # En dash
-            text = text.replace('\u2014', '-')  # Em dash
-            # Replace other common characters
-            text = text.replace('\u2026', '...')  # Ellipsis
-            
-            # Fix common missing spaces between words
-            # Handle lowercase followed by uppercase (camelCase)
-            text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-            
-            # Fix missing spaces around numbers (while preserving dice notation and D20 system references)
-            # First, protect dice notation and D20 references
-            text = re.sub(r'(\d+)d(\d+)', r'\1‡DICE‡\2', text, flags=re.I)  # Protect XdY dice notation
-            text = re.sub(r'([^a-z]|^)(D)(\d+)', r'\1\2‡NUM‡\3', text, flags=re.I)  # Protect D20, D10, etc. (uppercase D + number)
-            # Protect ordinal numbers (1st, 2nd, 3rd, 4th, etc.)
-            text = re.sub(r'(\d+)(st|nd|rd|th)', r'\1‡ORD‡\2', text, flags=re.I)  # Protect 1st, 2nd, 3rd, etc.
-            # Now add spaces between letters and digits (but not between D and ‡NUM‡)
-            text = re.sub(r'([a-z])(\d)', r'\1 \2', text, flags=re.I)  # letter followed by digit
-            text = re.sub(r'(\d)([a-z])', r'\1 \2', text, flags=re.I)  # digit followed by letter
-            # Restore protected patterns (may have spaces around markers now)
-            text = re.sub(r'(\d+)\s*‡DICE‡\s*(\d+)', r'\1d\2', text)
-            text = re.sub(r'(D)\s*‡NUM‡\s*(\d+)', r'\1\2', text, flags=re.I)
-            text = re.sub(r'(\d+)\s*‡ORD‡\s*(st|nd|rd|th)', r'\1\2', text, flags=re.I)
-            
-            # Fix missing space after colons (but not in time formats like "5:30" or URLs)
-            # Handle :The, :DC, :any, etc.
-            text = re.sub(r':([A-Z][a-z])', r': \1', text)  # :The → : The
-            text = re.sub(r':([A-Z]{2,})', r': \1', text)  # :DC → : DC
-            text = re.sub(r':(\d+\()', r': \1', text)  # :7(1d6) → : 7(1d6)
-            text = re.sub(r':\+(\d+)', r': +\1', text)  # :+6 → : +6
-            
-            # Fix missing space after commas in certain contexts
-            text = re.sub(r',\+(\d+)', r', +\1', text)  # DC 14,+6 → DC 14, +6
-            
-            # Fix specific D&D Beyond text concatenation issues
-            # These need to be done carefully to avoid breaking valid compound words
-            text = re.sub(r'Pointsgained', 'Points gained', text)
-            text = re.sub(r'Pointsrequired', 'Points required', text)
-            text = re.sub(r'Concentrationor', 'Concentration or', text)
-            text = re.sub(r'Concentrationand', 'Concentration and', text)
-            text = re.sub(r'Concentrationuntil', 'Concentration until', text)
-            text = re.sub(r'Hitsgained', 'Hits gained', text)
-            text = re.sub(r'hasDisadvantageon', 'has Disadvantage on', text)
-            text = re.sub(r'Disadvantageon', 'Disadvantage on', text)
-            text = re.sub(r'hasAdvantageon', 'has Advantage on', text)
-            text = re.sub(r'Advantageon', 'Advantage on', text)
-            text = re.sub(r'WhileBloodied', 'While Bloodied', text)
-            text = re.sub(r'creatureGrappledby', 'creature Grappled by', text)
-            
-            # Fix missing space before parentheses in certain contexts
-            text = re.sub(r'(\w)\(Recharge', r'\1 (Recharge', text)  # Lightning Breath(Recharge → Lightning Breath (Recharge
-            text = re.sub(r'(\w)\(Costs', r'\1 (Costs', text)  # Action(Costs → Action (Costs
-            
-            # Fix "being" + condition concatenations
-            text = re.sub(r'beingcharmed', 'being charmed', text, flags=re.I)
-            text = re.sub(r'beingfrightened', 'being frightened', text, flags=re.I)
-            text = re.sub(r'beingpoisoned', 'being poisoned', text, flags=re.I)
-            text = re.sub(r'beingparalyzed', 'being paralyzed', text, flags=re.I)
-            text = re.sub(r'beingstunned', 'being stunned', text, flags=re.I)
-            text = re.sub(r'beingrestrained', 'being restrained', text, flags=re.I)
-            text = re.sub(r'beinggrappled', 'being grappled', text, flags=re.I)
-            text = re.sub(r'beingblinded', 'being blinded', text, flags=re.I)
-            text = re.sub(r'beingdeafened', 'being deafened', text, flags=re.I)
-            text = re.sub(r'beingincapacitated', 'being incapacitated', text, flags=re.I)
-            text = re.sub(r'beingpetrified', 'being petrified', text, flags=re.I)
-            text = re.sub(r'beinginvisible', 'being invisible', text, flags=re.I)
-            text = re.sub(r'beingprone', 'being prone', text, flags=re.I)
-            
-            # Fix "the" + condition concatenations
-            text = re.sub(r'thePoisoned', 'the Poisoned', text)
-            text = re.sub(r'theCharmed', 'the Charmed', text)
-            text = re.sub(r'theFrightened', 'the Frightened', text)
-            text = re.sub(r'theParalyzed', 'the Paralyzed', text)
-            text = re.sub(r'theStunned', 'the Stunned', text)
-            text = re.sub(r'theRestrained', 'the Restrained', text)
-            text = re.sub(r'theGrappled', 'the Grappled', text)
-            text = re.sub(r'theBlinded', 'the Blinded', text)
-            text = re.sub(r'theDeafened', 'the Deafened', text)
-            text = re.sub(r'theIncapacitated', 'the Incapacitated', text)
-            text = re.sub(r'thePetrified', 'the Petrified', text)
-            text = re.sub(r'theInvisible', 'the Invisible', text)
-            text = re.sub(r'theProne', 'the Prone', text)
-            
-            # Fix condition names with "condition" suffix
-            text = re.sub(r'Incapacitatedcondition', 'Incapacitated condition', text)
-            text = re.sub(r'Deafenedcondition', 'Deafened condition', text) 
-            text = re.sub(r'Blindedcondition', 'Blinded condition', text)
-            text = re.sub(r'Pronecon dition', 'Prone condition', text)
-            text = re.sub(r'Stunnedcondition', 'Stunned condition', text)
-            text = re.sub(r'Paralyzedcondition', 'Paralyzed condition', text)
-            text = re.sub(r'Frightenedcondition', 'Frightened condition', text)
-            text = re.sub(r'Restrainedcondition', 'Restrained condition', text)
-            text = re.sub(r'Grappledcondition', 'Grappled condition', text)
-            text = re.sub(r'Poisonedcondition', 'Poisoned condition', text)
-            text = re.sub(r'Charmedcondition', 'Charmed condition', text)
-            text = re.sub(r'Invisiblecondition', 'Invisible condition', text)
-            text = re.sub(r'Exhaustioncondition', 'Exhaustion condition', text)
-            text = re.sub(r'Petrifiedcondition', 'Petrified condition', text)
-            
-            # Generic fix for "word+gained/required/until" patterns (but avoid "on" as it breaks words like Dragon, action, Poison)
-            text = re.sub(r'([a-z])gained\b', r'\1 gained', text, flags=re.I)
-            text = re.sub(r'([a-z])required\b', r'\1 required', text, flags=re.I)
-            text = re.sub(r'([a-z])until\b', r'\1 until', text, flags=re.I)
-            
-            # Fix space before opening parenthesis when missing
-            text = re.sub(r'([a-zA-Z])\(', r'\1 (', text)
-            
-            return text
-        
-        # Helper function to parse action descriptions into structured data
-        def parse_action(name, description):
-            """Parse action description into structured fields.
-            
-            Returns dict with structured fields if parseable, or None for special actions.
-            Description is NOT stored - all info should be regeneratable from structured fields.
-            """
-            action = {'name': name}
-            
-            # Check for dual-mode (Melee or Ranged) - handle both 2014 format
-            # ("Melee or Ranged Weapon Attack") and 2024 format
-            # ("Melee or Ranged Attack Roll"). Also tolerates "orRanged" without space.
-            if re.search(r'Melee\s*or\s*Ranged\s+(?:Weapon\s+Attack|Attack\s+Roll)', description, re.I):
-                # Will be split into two separate actions by caller
-                action['isDualMode'] = True
-                action['_originalDescription'] = description  # Temporarily store for splitting
-                return action
-            
-            # Check for Melee Weapon Attack
-            if re.search(r'Melee\s+Weapon\s+Attack', description, re.I):
-                action['type'] = 'Melee Weapon Attack'
-                
-                # Extract hit bonus
-                hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
-                if hit_match:
-                    action['hit'] = int(hit_match.group(1))
-                
-                # Extract reach
-                reach_match = re.search(r'reach\s+(\d+)\s*ft', description, re.I)
-                if reach_match:
-                    action['reach'] = f"{reach_match.group(1)} ft."
-                
-                # Extract targets
-                target_match = re.search(r'(one|two|three|\d+)\s+target', description, re.I)
-                if target_match:
-                    action['targets'] = target_match.group(1)
-                
-                # Extract damage - handle multiple damage types
-                damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)', description)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
-                    
-                    # Check for additional damage ("plus X (YdZ) type damage")
-                    plus_damage = re.search(r'plus\s+(\d+)\s*\(([^)]+)\)\s*(\w+)\s+damage', description, re.I)
-                    if plus_damage:
-                        action['damage2'] = f"{plus_damage.group(1)} ({plus_damage.group(2)}) {plus_damage.group(3)}"
-                        
-                        # Extract extra text after the second damage (if present)
-                        extra_start_pos = plus_damage.end()
-                        extra_text = description[extra_start_pos:].strip('. \t\n')
-                        if extra_text and len(extra_text) > 0:
-                            action['extra'] = extra_text
-                    else:
-                        # Check for alternative damage (e.g., two-handed)
-                        alt_damage = re.search(r'or\s+(\d+)\s*\(([^)]+)\)\s*(\w+)\s+damage\s+if\s+used\s+with\s+two\s+hands', description, re.I)
-                        if alt_damage:
-                            action['damage2'] = f"{alt_damage.group(1)} ({alt_damage.group(2)}) {alt_damage.group(3)} if used with two hands"
-                        else:
-                            # No second damage, extract extra text after first damage
-                            first_damage_match = re.search(r'Hit:\s*\d+\s*\([^)]+\)\s*\w+\s+damage', description, re.I)
-                            if first_damage_match:
-                                extra_start_pos = first_damage_match.end()
-                                extra_text = description[extra_start_pos:].strip('. \t\n')
-                                if extra_text and len(extra_text) > 0:
-                                    action['extra'] = extra_text
-                
-                return action
-            
-            # Check for Melee Spell Attack (similar to Melee Weapon Attack)
-            if re.search(r'Melee\s+Spell\s+Attack', description, re.I):
-                action['type'] = 'Melee Spell Attack'
-                
-                # Extract hit bonus
-                hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
-                if hit_match:
-                    action['hit'] = int(hit_match.group(1))
-                
-                # Extract reach
-                reach_match = re.search(r'reach\s+(\d+)\s*ft', description, re.I)
-                if reach_match:
-                    action['reach'] = f"{reach_match.group(1)} ft."
-                
-                # Extract targets
-                target_match = re.search(r'(one|two|three|\d+)\s+(target|creature)', description, re.I)
-                if target_match:
-                    action['targets'] = target_match.group(1)
-                
-                # Extract damage
-                damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)', description)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
-                    
-                    # Extract extra text after damage
+        return parse_monster_page(response.text, monster_url, cache_file)
+    
+    except Exception as e:
+        monster_log.exception("Error fetching monster details: %s", e)
+        return {'success': False, 'error': str(e)}
+
+# Helper function to normalize Unicode characters to ASCII equivalents
+def normalize_text(text):
+    """Replace Unicode characters with ASCII equivalents and fix missing spaces"""
+    if not text:
+        return text
+    # Replace curly quotes
+    text = text.replace('\u2018', "'")  # Left single quote
+    text = text.replace('\u2019', "'")  # Right single quote
+    text = text.replace('\u201c', '"')  # Left double quote
+    text = text.replace('\u201d', '"')  # Right double quote
+    # Replace dashes
+    text = text.replace('\u2013', '-')  # En dash
+    text = text.replace('\u2014', '-')  # Em dash
+    # Replace other common characters
+    text = text.replace('\u2026', '...')  # Ellipsis
+
+    # Fix common missing spaces between words
+    # Handle lowercase followed by uppercase (camelCase)
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+
+    # Fix missing spaces around numbers (while preserving dice notation and D20 system references)
+    # First, protect dice notation and D20 references
+    text = re.sub(r'(\d+)d(\d+)', r'\1‡DICE‡\2', text, flags=re.I)  # Protect XdY dice notation
+    text = re.sub(r'([^a-z]|^)(D)(\d+)', r'\1\2‡NUM‡\3', text, flags=re.I)  # Protect D20, D10, etc. (uppercase D + number)
+    # Protect ordinal numbers (1st, 2nd, 3rd, 4th, etc.)
+    text = re.sub(r'(\d+)(st|nd|rd|th)', r'\1‡ORD‡\2', text, flags=re.I)  # Protect 1st, 2nd, 3rd, etc.
+    # Now add spaces between letters and digits (but not between D and ‡NUM‡)
+    text = re.sub(r'([a-z])(\d)', r'\1 \2', text, flags=re.I)  # letter followed by digit
+    text = re.sub(r'(\d)([a-z])', r'\1 \2', text, flags=re.I)  # digit followed by letter
+    # Restore protected patterns (may have spaces around markers now)
+    text = re.sub(r'(\d+)\s*‡DICE‡\s*(\d+)', r'\1d\2', text)
+    text = re.sub(r'(D)\s*‡NUM‡\s*(\d+)', r'\1\2', text, flags=re.I)
+    text = re.sub(r'(\d+)\s*‡ORD‡\s*(st|nd|rd|th)', r'\1\2', text, flags=re.I)
+
+    # Fix missing space after colons (but not in time formats like "5:30" or URLs)
+    # Handle :The, :DC, :any, etc.
+    text = re.sub(r':([A-Z][a-z])', r': \1', text)  # :The → : The
+    text = re.sub(r':([A-Z]{2,})', r': \1', text)  # :DC → : DC
+    text = re.sub(r':(\d+\()', r': \1', text)  # :7(1d6) → : 7(1d6)
+    text = re.sub(r':\+(\d+)', r': +\1', text)  # :+6 → : +6
+
+    # Fix missing space after commas in certain contexts
+    text = re.sub(r',\+(\d+)', r', +\1', text)  # DC 14,+6 → DC 14, +6
+
+    # Fix specific D&D Beyond text concatenation issues
+    # These need to be done carefully to avoid breaking valid compound words
+    text = re.sub(r'Pointsgained', 'Points gained', text)
+    text = re.sub(r'Pointsrequired', 'Points required', text)
+    text = re.sub(r'Concentrationor', 'Concentration or', text)
+    text = re.sub(r'Concentrationand', 'Concentration and', text)
+    text = re.sub(r'Concentrationuntil', 'Concentration until', text)
+    text = re.sub(r'Hitsgained', 'Hits gained', text)
+    text = re.sub(r'hasDisadvantageon', 'has Disadvantage on', text)
+    text = re.sub(r'Disadvantageon', 'Disadvantage on', text)
+    text = re.sub(r'hasAdvantageon', 'has Advantage on', text)
+    text = re.sub(r'Advantageon', 'Advantage on', text)
+    text = re.sub(r'WhileBloodied', 'While Bloodied', text)
+    text = re.sub(r'creatureGrappledby', 'creature Grappled by', text)
+
+    # Fix missing space before parentheses in certain contexts
+    text = re.sub(r'(\w)\(Recharge', r'\1 (Recharge', text)  # Lightning Breath(Recharge → Lightning Breath (Recharge
+    text = re.sub(r'(\w)\(Costs', r'\1 (Costs', text)  # Action(Costs → Action (Costs
+
+    # Fix "being" + condition concatenations
+    text = re.sub(r'beingcharmed', 'being charmed', text, flags=re.I)
+    text = re.sub(r'beingfrightened', 'being frightened', text, flags=re.I)
+    text = re.sub(r'beingpoisoned', 'being poisoned', text, flags=re.I)
+    text = re.sub(r'beingparalyzed', 'being paralyzed', text, flags=re.I)
+    text = re.sub(r'beingstunned', 'being stunned', text, flags=re.I)
+    text = re.sub(r'beingrestrained', 'being restrained', text, flags=re.I)
+    text = re.sub(r'beinggrappled', 'being grappled', text, flags=re.I)
+    text = re.sub(r'beingblinded', 'being blinded', text, flags=re.I)
+    text = re.sub(r'beingdeafened', 'being deafened', text, flags=re.I)
+    text = re.sub(r'beingincapacitated', 'being incapacitated', text, flags=re.I)
+    text = re.sub(r'beingpetrified', 'being petrified', text, flags=re.I)
+    text = re.sub(r'beinginvisible', 'being invisible', text, flags=re.I)
+    text = re.sub(r'beingprone', 'being prone', text, flags=re.I)
+
+    # Fix "the" + condition concatenations
+    text = re.sub(r'thePoisoned', 'the Poisoned', text)
+    text = re.sub(r'theCharmed', 'the Charmed', text)
+    text = re.sub(r'theFrightened', 'the Frightened', text)
+    text = re.sub(r'theParalyzed', 'the Paralyzed', text)
+    text = re.sub(r'theStunned', 'the Stunned', text)
+    text = re.sub(r'theRestrained', 'the Restrained', text)
+    text = re.sub(r'theGrappled', 'the Grappled', text)
+    text = re.sub(r'theBlinded', 'the Blinded', text)
+    text = re.sub(r'theDeafened', 'the Deafened', text)
+    text = re.sub(r'theIncapacitated', 'the Incapacitated', text)
+    text = re.sub(r'thePetrified', 'the Petrified', text)
+    text = re.sub(r'theInvisible', 'the Invisible', text)
+    text = re.sub(r'theProne', 'the Prone', text)
+
+    # Fix condition names with "condition" suffix
+    text = re.sub(r'Incapacitatedcondition', 'Incapacitated condition', text)
+    text = re.sub(r'Deafenedcondition', 'Deafened condition', text) 
+    text = re.sub(r'Blindedcondition', 'Blinded condition', text)
+    text = re.sub(r'Pronecon dition', 'Prone condition', text)
+    text = re.sub(r'Stunnedcondition', 'Stunned condition', text)
+    text = re.sub(r'Paralyzedcondition', 'Paralyzed condition', text)
+    text = re.sub(r'Frightenedcondition', 'Frightened condition', text)
+    text = re.sub(r'Restrainedcondition', 'Restrained condition', text)
+    text = re.sub(r'Grappledcondition', 'Grappled condition', text)
+    text = re.sub(r'Poisonedcondition', 'Poisoned condition', text)
+    text = re.sub(r'Charmedcondition', 'Charmed condition', text)
+    text = re.sub(r'Invisiblecondition', 'Invisible condition', text)
+    text = re.sub(r'Exhaustioncondition', 'Exhaustion condition', text)
+    text = re.sub(r'Petrifiedcondition', 'Petrified condition', text)
+
+    # Generic fix for "word+gained/required/until" patterns (but avoid "on" as it breaks words like Dragon, action, Poison)
+    text = re.sub(r'([a-z])gained\b', r'\1 gained', text, flags=re.I)
+    text = re.sub(r'([a-z])required\b', r'\1 required', text, flags=re.I)
+    text = re.sub(r'([a-z])until\b', r'\1 until', text, flags=re.I)
+
+    # Fix space before opening parenthesis when missing
+    text = re.sub(r'([a-zA-Z])\(', r'\1 (', text)
+
+    return text
+
+# Helper function to parse action descriptions into structured data
+def parse_action(name, description):
+    """Parse action description into structured fields.
+
+    Returns dict with structured fields if parseable, or None for special actions.
+    Description is NOT stored - all info should be regeneratable from structured fields.
+    """
+    action = {'name': name}
+
+    # Check for dual-mode (Melee or Ranged) - handle both 2014 format
+    # ("Melee or Ranged Weapon Attack") and 2024 format
+    # ("Melee or Ranged Attack Roll"). Also tolerates "orRanged" without space.
+    if re.search(r'Melee\s*or\s*Ranged\s+(?:Weapon\s+Attack|Attack\s+Roll)', description, re.I):
+        # Will be split into two separate actions by caller
+        action['isDualMode'] = True
+        action['_originalDescription'] = description  # Temporarily store for splitting
+        return action
+
+    # Check for Melee Weapon Attack
+    if re.search(r'Melee\s+Weapon\s+Attack', description, re.I):
+        action['type'] = 'Melee Weapon Attack'
+
+        # Extract hit bonus
+        hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
+        if hit_match:
+            action['hit'] = int(hit_match.group(1))
+
+        # Extract reach
+        reach_match = re.search(r'reach\s+(\d+)\s*ft', description, re.I)
+        if reach_match:
+            action['reach'] = f"{reach_match.group(1)} ft."
+
+        # Extract targets
+        target_match = re.search(r'(one|two|three|\d+)\s+target', description, re.I)
+        if target_match:
+            action['targets'] = target_match.group(1)
+
+        # Extract damage - handle multiple damage types
+        damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)', description)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
+
+            # Check for additional damage ("plus X (YdZ) type damage")
+            plus_damage = re.search(r'plus\s+(\d+)\s*\(([^)]+)\)\s*(\w+)\s+damage', description, re.I)
+            if plus_damage:
+                action['damage2'] = f"{plus_damage.group(1)} ({plus_damage.group(2)}) {plus_damage.group(3)}"
+
+                # Extract extra text after the second damage (if present)
+                extra_start_pos = plus_damage.end()
+                extra_text = description[extra_start_pos:].strip('. \t\n')
+                if extra_text and len(extra_text) > 0:
+                    action['extra'] = extra_text
+            else:
+                # Check for alternative damage (e.g., two-handed)
+                alt_damage = re.search(r'or\s+(\d+)\s*\(([^)]+)\)\s*(\w+)\s+damage\s+if\s+used\s+with\s+two\s+hands', description, re.I)
+                if alt_damage:
+                    action['damage2'] = f"{alt_damage.group(1)} ({alt_damage.group(2)}) {alt_damage.group(3)} if used with two hands"
+                else:
+                    # No second damage, extract extra text after first damage
                     first_damage_match = re.search(r'Hit:\s*\d+\s*\([^)]+\)\s*\w+\s+damage', description, re.I)
                     if first_damage_match:
                         extra_start_pos = first_damage_match.end()
                         extra_text = description[extra_start_pos:].strip('. \t\n')
                         if extra_text and len(extra_text) > 0:
                             action['extra'] = extra_text
-                
-                return action
-            
-            # Check for Ranged Weapon Attack
-            if re.search(r'Ranged\s+Weapon\s+Attack', description, re.I):
-                action['type'] = 'Ranged Weapon Attack'
-                
-                # Extract hit bonus
-                hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
-                if hit_match:
-                    action['hit'] = int(hit_match.group(1))
-                
-                # Extract range - handle both "range X/Y ft" and "ranged X ft./Y ft."
-                range_match = re.search(r'ranged?\s+(\d+)\s*(?:ft\.?)?\s*/\s*(\d+)\s*ft', description, re.I)
-                if range_match:
-                    action['range'] = f"{range_match.group(1)}/{range_match.group(2)} ft."
-                
-                # Extract targets
-                target_match = re.search(r'(one|two|three|\d+)\s+target', description, re.I)
-                if target_match:
-                    action['targets'] = target_match.group(1)
-                
-                # Extract damage and any additional effect text
-                damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
-                    # Capture any additional text after damage type (e.g., "of a type chosen by...")
-                    extra_text = damage_match.group(4).strip()
-                    if extra_text and not extra_text.startswith('.'):
-                        action['extra'] = extra_text.lstrip(',. ')
-                
-                return action
-            
-            # Check for Ranged Spell Attack (similar to Ranged Weapon Attack)
-            if re.search(r'Ranged\s+Spell\s+Attack', description, re.I):
-                action['type'] = 'Ranged Spell Attack'
-                
-                # Extract hit bonus
-                hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
-                if hit_match:
-                    action['hit'] = int(hit_match.group(1))
-                
-                # Extract range
-                range_match = re.search(r'ranged?\s+(\d+)\s*(?:ft\.?)?\s*/\s*(\d+)\s*ft', description, re.I)
-                if range_match:
-                    action['range'] = f"{range_match.group(1)}/{range_match.group(2)} ft."
-                
-                # Extract targets
-                target_match = re.search(r'(one|two|three|\d+)\s+(target|creature)', description, re.I)
-                if target_match:
-                    action['targets'] = target_match.group(1)
-                
-                # Extract damage
-                damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
-                    # Capture any additional text after damage type
-                    extra_text = damage_match.group(4).strip()
-                    if extra_text and not extra_text.startswith('.'):
-                        action['extra'] = extra_text.lstrip(',. ')
-                
-                return action
-            
-            # Check for Melee Attack (2024 format)
-            if re.search(r'Melee\s+Attack\s+Roll', description, re.I):
-                action['type'] = 'Melee Attack'
-                
-                # Extract hit bonus
-                hit_match = re.search(r'\+(\d+)\s*,\s*reach', description)
-                if hit_match:
-                    action['hit'] = int(hit_match.group(1))
-                
-                # Extract reach
-                reach_match = re.search(r'reach\s+(\d+)\s*ft', description, re.I)
-                if reach_match:
-                    action['reach'] = f"{reach_match.group(1)} ft."
-                
-                # Extract damage and any additional effect text
-                damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
-                    # Capture any additional text after damage type
-                    extra_text = damage_match.group(4).strip()
-                    if extra_text and not extra_text.startswith('.'):
-                        extra_text = extra_text.lstrip(',. ')
-                        # Remove leading "damage" word if present
-                        if extra_text.lower().startswith('damage'):
-                            extra_text = extra_text[6:].lstrip(',. ')
-                        if extra_text:
-                            action['extra'] = extra_text
-                
-                return action
-            
-            # Check for Ranged Attack (2024 format)
-            if re.search(r'Ranged\s+Attack\s+Roll', description, re.I):
-                action['type'] = 'Ranged Attack'
-                
-                # Extract hit bonus
-                hit_match = re.search(r'\+(\d+)\s*,\s*range', description)
-                if hit_match:
-                    action['hit'] = int(hit_match.group(1))
-                
-                # Extract range
-                range_match = re.search(r'range\s+(\d+)/(\d+)\s*ft', description, re.I)
-                if range_match:
-                    action['range'] = f"{range_match.group(1)}/{range_match.group(2)} ft."
-                
-                # Extract damage and any additional effect text
-                damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
-                    # Capture any additional text after damage type
-                    extra_text = damage_match.group(4).strip()
-                    if extra_text and not extra_text.startswith('.'):
-                        extra_text = extra_text.lstrip(',. ')
-                        # Remove leading "damage" word if present
-                        if extra_text.lower().startswith('damage'):
-                            extra_text = extra_text[6:].lstrip(',. ')
-                        if extra_text:
-                            action['extra'] = extra_text
-                
-                return action
-            
-            # Check for Saving Throw attacks
-            save_match = re.search(r'(Strength|Dexterity|Constitution|Intelligence|Wisdom|Charisma)\s+Saving\s+Throw.*?DC\s+(\d+)', description, re.I)
-            if save_match:
-                action['type'] = 'Saving Throw'
-                action['save'] = {
-                    'ability': save_match.group(1),
-                    'dc': int(save_match.group(2))
-                }
-                
-                # Extract area of effect (e.g., "each creature in a 60-foot Cone" or "60-foot-long, 5-foot-wide Line")
-                area_match = re.search(r'each\s+creature\s+in\s+(?:an?\s+)?([^.]+?\.)', description, re.I)
-                if area_match:
-                    action['area'] = area_match.group(1).strip('.')
-                
-                # Extract damage
-                damage_match = re.search(r'(Failure|Success)?:?\s*(\d+)\s*\(([^)]+)\)\s*(\w+)', description)
-                if damage_match:
-                    action['damage'] = f"{damage_match.group(2)} ({damage_match.group(3)}) {damage_match.group(4)}"
-                
-                # Extract full effect description for failures
-                failure_match = re.search(r'Failure:\s*(.+?)(?=Success:|Failure\s+or\s+Success:|$)', description, re.I | re.DOTALL)
-                if failure_match:
-                    effect_text = failure_match.group(1).strip()
-                    
-                    # Remove damage text from the beginning if present
-                    effect_text = re.sub(r'^\d+\s*\([^)]+\)\s*\w+\s*damage\.?\s*', '', effect_text, flags=re.I)
-                    
-                    # Remove leading connectors like ", and" or ", " left over from damage removal
-                    effect_text = re.sub(r'^,\s*and\s+', '', effect_text, flags=re.I)
-                    effect_text = re.sub(r'^,\s+', '', effect_text)
-                    
-                    # Only store if there's actual effect text remaining
-                    if effect_text:
-                        action['failureEffect'] = effect_text
-                
-                # Check for "Failure or Success" combined effect first
-                both_match = re.search(r'Failure\s+or\s+Success:\s*(.+?)$', description, re.I | re.DOTALL)
-                if both_match:
-                    both_text = both_match.group(1).strip()
-                    # Store in both fields since it applies to both cases
-                    if 'failureEffect' in action:
-                        action['failureEffect'] += ' ' + both_text
-                    else:
-                        action['failureEffect'] = both_text
-                    if 'successEffect' in action:
-                        action['successEffect'] += ' ' + both_text
-                    else:
-                        action['successEffect'] = both_text
-                else:
-                    # Only look for standalone "Success:" if there's no "Failure or Success:"
-                    success_match = re.search(r'Success:\s*(.+?)$', description, re.I | re.DOTALL)
-                    if success_match:
-                        success_text = success_match.group(1).strip()
-                        action['successEffect'] = success_text
-                
-                # Check for half damage on success
-                if re.search(r'Success:\s*Half\s+damage', description, re.I):
-                    action['halfDamageOnSave'] = True
-                
-                return action
-            
-            # If we can't parse it, mark as special action
-            return None
-        
-        # Helper function to find stat labels (supports both 2014 and 2024 formats)
-        def find_stat_label(soup_obj, label_pattern):
-            """Find a stat label using both old (2014) and new (2024) class names"""
-            # Try 2014 format first
-            label = soup_obj.find('span', class_='mon-stat-block__attribute-label', string=re.compile(label_pattern, re.I))
-            if label:
-                return label, 'old'
-            # Try 2024 format
-            label = soup_obj.find('span', class_='mon-stat-block-2024__attribute-label', string=re.compile(label_pattern, re.I))
-            if label:
-                return label, 'new'
-            return None, None
-        
-        # Helper function to find tidbit labels (for skills, saves, etc.)
-        def find_tidbit_label(soup_obj, label_pattern):
-            """Find a tidbit label (works for both 2014 and 2024)"""
-            # Try 2024 format first
-            label_2024 = soup_obj.find('span', class_='mon-stat-block-2024__tidbit-label', string=re.compile(label_pattern, re.I))
-            if label_2024:
-                return label_2024, 'new'
-            # Try 2014 format
-            label_2014 = soup_obj.find('span', class_='mon-stat-block__tidbit-label', string=re.compile(label_pattern, re.I))
-            if label_2014:
-                return label_2014, 'old'
-            return None, None
-        
-        # Extract monster name
-        name_elem = (
-            soup.find('div', class_='mon-stat-block-2024__name') or
-            soup.find('div', class_='mon-stat-block__name') or
-            soup.find('h1', class_='mon-stat-block-2024__name') or
-            soup.find('span', class_='mon-stat-block__name') or
-            soup.find('h1', class_='mon-stat-block__name')
-        )
-        if name_elem:
-            details['name'] = normalize_text(name_elem.get_text(strip=True))
-            print(f"  Found Name: {details['name']}")
-        
-        # Extract Type/Size/Alignment (e.g., "Huge Dragon (Metallic), Chaotic Good")
-        # This appears in different places depending on format
-        # Try multiple selectors as D&D Beyond structure varies
-        type_size_elem = (
-            soup.find('div', class_='mon-stat-block-2024__meta') or
-            soup.find('div', class_='mon-stat-block__meta') or
-            soup.find('span', class_='mon-stat-block-2024__type') or 
-            soup.find('span', class_='mon-stat-block__type') or
-            soup.find('div', class_='mon-stat-block-2024__type') or
-            soup.find('div', class_='mon-stat-block__type') or
-            soup.find('p', class_='mon-stat-block-2024__type') or
-            soup.find('p', class_='mon-stat-block__type')
-        )
-        if type_size_elem:
-            type_text = normalize_text(type_size_elem.get_text(strip=True))
-            if type_text:
-                details['typeAndAlignment'] = type_text
-                print(f"  Found Type: {type_text}")
-        
-        # Extract AC with type
-        ac_label, ac_format = find_stat_label(soup, r'Armor\s+Class|^AC$')
-        if ac_label:
-            # Choose class prefix based on format
-            prefix = 'mon-stat-block-2024' if ac_format == 'new' else 'mon-stat-block'
-            # For 2024 format, use __attribute-value (contains clean AC number)
-            # For legacy format, use __attribute-value (same structure)
-            ac_elem = ac_label.find_next_sibling('span', class_=f'{prefix}__attribute-value')
-            if ac_elem:
-                # For 2024, the value is directly in the ac_elem text
-                # For legacy, it's in a nested __attribute-data-value span
-                ac_value_elem = ac_elem.find('span', class_=f'{prefix}__attribute-data-value')
-                if ac_value_elem:
-                    # Legacy format: extract from nested span
-                    ac_text = ac_value_elem.get_text(strip=True)
-                else:
-                    # 2024 format: value is directly in ac_elem
-                    ac_text = ac_elem.get_text(strip=True)
-                
-                ac_match = re.search(r'(\d+)', ac_text)
-                if ac_match:
-                    details['ac'] = int(ac_match.group(1))
-                
-                ac_extra = ac_elem.find('span', class_=f'{prefix}__attribute-data-extra')
-                if ac_extra:
-                    details['acType'] = ac_extra.get_text(strip=True).strip('()')
-                if 'ac' in details:
-                    print(f"  Found AC: {details['ac']}{' (' + details.get('acType', '') + ')' if 'acType' in details else ''}")
-        
-        # Extract HP with hit dice
-        hp_label, hp_format = find_stat_label(soup, r'Hit\s+Points|^HP$')
-        if hp_label:
-            prefix = 'mon-stat-block-2024' if hp_format == 'new' else 'mon-stat-block'
-            if hp_format == 'new':
-                hp_elem = hp_label.find_next_sibling('span', class_=f'{prefix}__attribute-data')
+
+        return action
+
+    # Check for Melee Spell Attack (similar to Melee Weapon Attack)
+    if re.search(r'Melee\s+Spell\s+Attack', description, re.I):
+        action['type'] = 'Melee Spell Attack'
+
+        # Extract hit bonus
+        hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
+        if hit_match:
+            action['hit'] = int(hit_match.group(1))
+
+        # Extract reach
+        reach_match = re.search(r'reach\s+(\d+)\s*ft', description, re.I)
+        if reach_match:
+            action['reach'] = f"{reach_match.group(1)} ft."
+
+        # Extract targets
+        target_match = re.search(r'(one|two|three|\d+)\s+(target|creature)', description, re.I)
+        if target_match:
+            action['targets'] = target_match.group(1)
+
+        # Extract damage
+        damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)', description)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
+
+            # Extract extra text after damage
+            first_damage_match = re.search(r'Hit:\s*\d+\s*\([^)]+\)\s*\w+\s+damage', description, re.I)
+            if first_damage_match:
+                extra_start_pos = first_damage_match.end()
+                extra_text = description[extra_start_pos:].strip('. \t\n')
+                if extra_text and len(extra_text) > 0:
+                    action['extra'] = extra_text
+
+        return action
+
+    # Check for Ranged Weapon Attack
+    if re.search(r'Ranged\s+Weapon\s+Attack', description, re.I):
+        action['type'] = 'Ranged Weapon Attack'
+
+        # Extract hit bonus
+        hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
+        if hit_match:
+            action['hit'] = int(hit_match.group(1))
+
+        # Extract range - handle both "range X/Y ft" and "ranged X ft./Y ft."
+        range_match = re.search(r'ranged?\s+(\d+)\s*(?:ft\.?)?\s*/\s*(\d+)\s*ft', description, re.I)
+        if range_match:
+            action['range'] = f"{range_match.group(1)}/{range_match.group(2)} ft."
+
+        # Extract targets
+        target_match = re.search(r'(one|two|three|\d+)\s+target', description, re.I)
+        if target_match:
+            action['targets'] = target_match.group(1)
+
+        # Extract damage and any additional effect text
+        damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
+            # Capture any additional text after damage type (e.g., "of a type chosen by...")
+            extra_text = damage_match.group(4).strip()
+            if extra_text and not extra_text.startswith('.'):
+                action['extra'] = extra_text.lstrip(',. ')
+
+        return action
+
+    # Check for Ranged Spell Attack (similar to Ranged Weapon Attack)
+    if re.search(r'Ranged\s+Spell\s+Attack', description, re.I):
+        action['type'] = 'Ranged Spell Attack'
+
+        # Extract hit bonus
+        hit_match = re.search(r'\+(\d+)\s*to\s+hit', description)
+        if hit_match:
+            action['hit'] = int(hit_match.group(1))
+
+        # Extract range
+        range_match = re.search(r'ranged?\s+(\d+)\s*(?:ft\.?)?\s*/\s*(\d+)\s*ft', description, re.I)
+        if range_match:
+            action['range'] = f"{range_match.group(1)}/{range_match.group(2)} ft."
+
+        # Extract targets
+        target_match = re.search(r'(one|two|three|\d+)\s+(target|creature)', description, re.I)
+        if target_match:
+            action['targets'] = target_match.group(1)
+
+        # Extract damage
+        damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
+            # Capture any additional text after damage type
+            extra_text = damage_match.group(4).strip()
+            if extra_text and not extra_text.startswith('.'):
+                action['extra'] = extra_text.lstrip(',. ')
+
+        return action
+
+    # Check for Melee Attack (2024 format)
+    if re.search(r'Melee\s+Attack\s+Roll', description, re.I):
+        action['type'] = 'Melee Attack'
+
+        # Extract hit bonus
+        hit_match = re.search(r'\+(\d+)\s*,\s*reach', description)
+        if hit_match:
+            action['hit'] = int(hit_match.group(1))
+
+        # Extract reach
+        reach_match = re.search(r'reach\s+(\d+)\s*ft', description, re.I)
+        if reach_match:
+            action['reach'] = f"{reach_match.group(1)} ft."
+
+        # Extract damage and any additional effect text
+        damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
+            # Capture any additional text after damage type
+            extra_text = damage_match.group(4).strip()
+            if extra_text and not extra_text.startswith('.'):
+                extra_text = extra_text.lstrip(',. ')
+                # Remove leading "damage" word if present
+                if extra_text.lower().startswith('damage'):
+                    extra_text = extra_text[6:].lstrip(',. ')
+                if extra_text:
+                    action['extra'] = extra_text
+
+        return action
+
+    # Check for Ranged Attack (2024 format)
+    if re.search(r'Ranged\s+Attack\s+Roll', description, re.I):
+        action['type'] = 'Ranged Attack'
+
+        # Extract hit bonus
+        hit_match = re.search(r'\+(\d+)\s*,\s*range', description)
+        if hit_match:
+            action['hit'] = int(hit_match.group(1))
+
+        # Extract range
+        range_match = re.search(r'range\s+(\d+)/(\d+)\s*ft', description, re.I)
+        if range_match:
+            action['range'] = f"{range_match.group(1)}/{range_match.group(2)} ft."
+
+        # Extract damage and any additional effect text
+        damage_match = re.search(r'Hit:\s*(\d+)\s*\(([^)]+)\)\s*(\w+)(.*)$', description, re.DOTALL)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(1)} ({damage_match.group(2)}) {damage_match.group(3)}"
+            # Capture any additional text after damage type
+            extra_text = damage_match.group(4).strip()
+            if extra_text and not extra_text.startswith('.'):
+                extra_text = extra_text.lstrip(',. ')
+                # Remove leading "damage" word if present
+                if extra_text.lower().startswith('damage'):
+                    extra_text = extra_text[6:].lstrip(',. ')
+                if extra_text:
+                    action['extra'] = extra_text
+
+        return action
+
+    # Check for Saving Throw attacks
+    save_match = re.search(r'(Strength|Dexterity|Constitution|Intelligence|Wisdom|Charisma)\s+Saving\s+Throw.*?DC\s+(\d+)', description, re.I)
+    if save_match:
+        action['type'] = 'Saving Throw'
+        action['save'] = {
+            'ability': save_match.group(1),
+            'dc': int(save_match.group(2))
+        }
+
+        # Extract area of effect (e.g., "each creature in a 60-foot Cone" or "60-foot-long, 5-foot-wide Line")
+        area_match = re.search(r'each\s+creature\s+in\s+(?:an?\s+)?([^.]+?\.)', description, re.I)
+        if area_match:
+            action['area'] = area_match.group(1).strip('.')
+
+        # Extract damage
+        damage_match = re.search(r'(Failure|Success)?:?\s*(\d+)\s*\(([^)]+)\)\s*(\w+)', description)
+        if damage_match:
+            action['damage'] = f"{damage_match.group(2)} ({damage_match.group(3)}) {damage_match.group(4)}"
+
+        # Extract full effect description for failures
+        failure_match = re.search(r'Failure:\s*(.+?)(?=Success:|Failure\s+or\s+Success:|$)', description, re.I | re.DOTALL)
+        if failure_match:
+            effect_text = failure_match.group(1).strip()
+
+            # Remove damage text from the beginning if present
+            effect_text = re.sub(r'^\d+\s*\([^)]+\)\s*\w+\s*damage\.?\s*', '', effect_text, flags=re.I)
+
+            # Remove leading connectors like ", and" or ", " left over from damage removal
+            effect_text = re.sub(r'^,\s*and\s+', '', effect_text, flags=re.I)
+            effect_text = re.sub(r'^,\s+', '', effect_text)
+
+            # Only store if there's actual effect text remaining
+            if effect_text:
+                action['failureEffect'] = effect_text
+
+        # Check for "Failure or Success" combined effect first
+        both_match = re.search(r'Failure\s+or\s+Success:\s*(.+?)$', description, re.I | re.DOTALL)
+        if both_match:
+            both_text = both_match.group(1).strip()
+            # Store in both fields since it applies to both cases
+            if 'failureEffect' in action:
+                action['failureEffect'] += ' ' + both_text
             else:
-                hp_elem = hp_label.find_next_sibling('span', class_=f'{prefix}__attribute-data')
-            if hp_elem:
-                hp_value = hp_elem.find('span', class_=f'{prefix}__attribute-data-value')
-                if hp_value:
-                    hp_match = re.search(r'(\d+)', hp_value.get_text(strip=True))
-                    if hp_match:
-                        details['hp'] = int(hp_match.group(1))
-                hp_extra = hp_elem.find('span', class_=f'{prefix}__attribute-data-extra')
-                if hp_extra:
-                    details['hitDice'] = hp_extra.get_text(strip=True).strip('()')
-                if 'hp' in details:
-                    print(f"  Found HP: {details['hp']}{' (' + details.get('hitDice', '') + ')' if 'hitDice' in details else ''}")
-        
-        # Extract Speed
-        speed_label, speed_format = find_stat_label(soup, r'Speed')
-        if speed_label:
-            prefix = 'mon-stat-block-2024' if speed_format == 'new' else 'mon-stat-block'
-            speed_elem = speed_label.find_next_sibling('span', class_=f'{prefix}__attribute-data')
-            if speed_elem:
-                speed_text = speed_elem.get_text(strip=True)
-                details['speed'] = speed_text
-                print(f"  Found Speed: {speed_text}")
-        
-        # Extract Ability Scores
-        ability_names = ['str', 'dex', 'con', 'int', 'wis', 'cha']
-        
-        # Try 2024 format first (stat tables)
-        stats_section = soup.find('div', class_='mon-stat-block-2024__stats')
-        if stats_section:
-            stat_tables = stats_section.find_all('table', class_='stat-table')
-            if stat_tables:
-                details['abilities'] = {}
-                for table in stat_tables:
-                    rows = table.find('tbody').find_all('tr')
-                    for row in rows:
-                        cells = row.find_all(['th', 'td'])
-                        if len(cells) >= 4:
-                            ability_name = cells[0].get_text(strip=True).lower()
-                            score = parse_signed_int(cells[1].get_text(strip=True), default=10)
-                            # cells[2] is the ability modifier; D&D Beyond may
-                            # render negatives with the Unicode minus sign.
-                            modifier = parse_signed_int(cells[2].get_text(strip=True), default=0)
-                            # cells[3] is the saving throw modifier
-                            if ability_name in ability_names:
-                                details['abilities'][ability_name] = score
-                details['initBonus'] = details['abilities']['dex']
-                if details['initBonus'] >= 10:
-                    details['initBonus'] = (details['initBonus'] - 10) // 2
-                else:
-                    details['initBonus'] = -((10 - details['initBonus'] + 1) // 2)
-                print(f"  Found Abilities (2024): STR {details['abilities']['str']}, DEX {details['abilities']['dex']}, CON {details['abilities']['con']}, INT {details['abilities']['int']}, WIS {details['abilities']['wis']}, CHA {details['abilities']['cha']}")
-                print(f"  Initiative Modifier: {details['initBonus']:+d}")
+                action['failureEffect'] = both_text
+            if 'successEffect' in action:
+                action['successEffect'] += ' ' + both_text
+            else:
+                action['successEffect'] = both_text
         else:
-            # Try legacy 2014 format
-            stat_scores = soup.find_all('span', class_='ability-block__score')
-            stat_modifiers = soup.find_all('span', class_='ability-block__modifier')
-            
-            if len(stat_scores) >= 6:
-                details['abilities'] = {}
-                for i, ability in enumerate(ability_names):
-                    score = parse_signed_int(stat_scores[i].get_text(strip=True), default=10)
-                    details['abilities'][ability] = score
-                # Calculate initiative from dex
-                dex = details['abilities']['dex']
-                details['initBonus'] = (dex - 10) // 2
-                print(f"  Found Abilities (2014): STR {details['abilities']['str']}, DEX {details['abilities']['dex']}, CON {details['abilities']['con']}, INT {details['abilities']['int']}, WIS {details['abilities']['wis']}, CHA {details['abilities']['cha']}")
-                print(f"  Initiative Modifier: {details['initBonus']:+d}")
-        
-        # Extract Saving Throws
-        saves_label, saves_format = find_tidbit_label(soup, r'Saving Throws')
-        if saves_label:
-            prefix = 'mon-stat-block-2024' if saves_format == 'new' else 'mon-stat-block'
-            saves_data = saves_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if saves_data:
-                details['savingThrows'] = saves_data.get_text(strip=True)
-                print(f"  Found Saving Throws: {details['savingThrows']}")
-        
-        # Extract Skills
-        skills_label, skills_format = find_tidbit_label(soup, r'Skills')
-        if skills_label:
-            prefix = 'mon-stat-block-2024' if skills_format == 'new' else 'mon-stat-block'
-            skills_data = skills_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if skills_data:
-                skills_text = skills_data.get_text(strip=True)
-                # Parse skills into array: "Athletics+5,Perception+2" or "Athletics +5, Perception +2"
-                skills_array = []
-                # Split by comma
-                skill_parts = skills_text.split(',')
-                for part in skill_parts:
-                    part = part.strip()
-                    # Match skill name and modifier: "Athletics +5" or "Athletics+5"
-                    match = re.search(r'([A-Za-z\s]+?)\s*([+\-])\s*(\d+)', part)
-                    if match:
-                        skill_name = match.group(1).strip()
-                        sign = match.group(2)
-                        mod_value = int(match.group(3))
-                        if sign == '-':
-                            mod_value = -mod_value
-                        skills_array.append({'skill': skill_name, 'mod': mod_value})
-                details['skills'] = skills_array
-                print(f"  Found Skills: {len(skills_array)} skills parsed")
-        
-        # Extract Damage Vulnerabilities
-        vuln_label, vuln_format = find_tidbit_label(soup, r'Damage Vulnerabilities')
-        if vuln_label:
-            prefix = 'mon-stat-block-2024' if vuln_format == 'new' else 'mon-stat-block'
-            vuln_data = vuln_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if vuln_data:
-                details['damageVulnerabilities'] = vuln_data.get_text(strip=True)
-                print(f"  Found Vulnerabilities: {details['damageVulnerabilities']}")
-        
-        # Extract Damage Resistances
-        resist_label, resist_format = find_tidbit_label(soup, r'Damage Resistances')
-        if resist_label:
-            prefix = 'mon-stat-block-2024' if resist_format == 'new' else 'mon-stat-block'
-            resist_data = resist_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if resist_data:
-                details['damageResistances'] = normalize_text(resist_data.get_text(strip=True))
-                print(f"  Found Resistances: {details['damageResistances']}")
-        
-        # Extract Damage Immunities
-        immune_label, immune_format = find_tidbit_label(soup, r'Damage Immunities')
-        if immune_label:
-            prefix = 'mon-stat-block-2024' if immune_format == 'new' else 'mon-stat-block'
-            immune_data = immune_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if immune_data:
-                details['damageImmunities'] = normalize_text(immune_data.get_text(strip=True))
-                print(f"  Found Immunities: {details['damageImmunities']}")
-        
-        # Extract Condition Immunities
-        cond_label, cond_format = find_tidbit_label(soup, r'Condition Immunities')
-        if cond_label:
-            prefix = 'mon-stat-block-2024' if cond_format == 'new' else 'mon-stat-block'
-            cond_data = cond_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if cond_data:
-                details['conditionImmunities'] = normalize_text(cond_data.get_text(strip=True))
-                print(f"  Found Condition Immunities: {details['conditionImmunities']}")
-        
-        # Extract Senses
-        senses_label, senses_format = find_tidbit_label(soup, r'Senses')
-        if senses_label:
-            prefix = 'mon-stat-block-2024' if senses_format == 'new' else 'mon-stat-block'
-            senses_data = senses_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if senses_data:
-                senses_text = normalize_text(senses_data.get_text(strip=True))
-                # Parse senses into array by splitting on comma
-                senses_array = []
-                for sense in senses_text.split(','):
-                    sense = sense.strip()
-                    # Fix spacing for common senses (e.g., "Darkvision60 ft." -> "Darkvision 60 ft.")
-                    sense = re.sub(r'(Darkvision|Blindsight|Tremorsense|Truesight)(\d)', r'\1 \2', sense)
-                    senses_array.append(sense)
-                details['senses'] = senses_array
-                print(f"  Found Senses: {len(senses_array)} senses")
-        
-        # Extract Languages
-        lang_label, lang_format = find_tidbit_label(soup, r'Languages')
-        if lang_label:
-            prefix = 'mon-stat-block-2024' if lang_format == 'new' else 'mon-stat-block'
-            lang_data = lang_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if lang_data:
-                details['languages'] = normalize_text(lang_data.get_text(strip=True))
-                print(f"  Found Languages: {details['languages']}")
-        
-        # Extract Challenge Rating
-        cr_label, cr_format = find_tidbit_label(soup, r'Challenge|^CR$')
-        if cr_label:
-            prefix = 'mon-stat-block-2024' if cr_format == 'new' else 'mon-stat-block'
-            cr_data = cr_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
-            if cr_data:
-                cr_text = cr_data.get_text(strip=True)
-                cr_match = re.search(r'([\d/]+)', cr_text)
-                if cr_match:
-                    details['cr'] = cr_match.group(1)
-                if 'cr' in details:
-                    print(f"  Found CR: {details.get('cr', 'N/A')}")
-        
-        # Extract Proficiency Bonus specially (if present)
-        prof_label = soup.find('span', class_='mon-stat-block-2024__tidbit-label', string=re.compile(r'^Proficiency\s+Bonus$', re.I))
-        if not prof_label:
-            prof_label = soup.find('span', class_='mon-stat-block__tidbit-label', string=re.compile(r'^Proficiency\s+Bonus$', re.I))
-        if prof_label:
-            prof_data = prof_label.find_next_sibling('span')
-            if prof_data:
-                prof_text = prof_data.get_text(strip=True)
-                # Extract just the number from something like "+5"
-                prof_match = re.search(r'\+?(\d+)', prof_text)
-                if prof_match:
-                    details['profBonus'] = int(prof_match.group(1))
-                    print(f"  Found Proficiency Bonus: +{details['profBonus']}")
-        
-        # Extract Traits (Special Abilities) from description blocks
-        traits = []
-        spellcasting_from_traits = None
-        
+            # Only look for standalone "Success:" if there's no "Failure or Success:"
+            success_match = re.search(r'Success:\s*(.+?)$', description, re.I | re.DOTALL)
+            if success_match:
+                success_text = success_match.group(1).strip()
+                action['successEffect'] = success_text
+
+        # Check for half damage on success
+        if re.search(r'Success:\s*Half\s+damage', description, re.I):
+            action['halfDamageOnSave'] = True
+
+        return action
+
+    # If we can't parse it, mark as special action
+    return None
+
+
+def parse_monster_page(html, monster_url, cache_file):
+    """Parse a D&D Beyond monster page and write the result to ``cache_file``.
+
+    Returns the JSON payload for /api/dndbeyond/monster. Pure CPU and disk
+    work, so the async server can run it in an executor.
+    """
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Check if we got redirected to marketplace or got an invalid page
+    page_title = soup.find('title')
+    if page_title:
+        title_text = page_title.get_text().lower()
+        monster_log.debug("Page title: %r", title_text)
+        # Check for various error/redirect indicators
+        if 'shop' in title_text or 'marketplace' in title_text:
+            error_msg = 'Monster page redirected to marketplace - may not be accessible'
+            monster_log.warning("%s: %s (cookies are usually expired or invalid)", monster_url, error_msg)
+            # Save error to cache to avoid repeated attempts
+            cache_data = {
+                'url': monster_url,
+                'data': {},
+                'error': error_msg,
+                'timestamp': time.time()
+            }
+            with open(cache_file, 'w') as f:
+                json.dump(cache_data, f)
+            record_monster_access(cache_file, False)
+            return {'success': False, 'error': error_msg, 'auth_failed': True}
+    
+    # Check for main stat blocks to verify we got a valid monster page
+    stat_block_2014 = soup.find('div', class_='mon-stat-block')
+    stat_block_2024 = soup.find('div', class_='mon-stat-block-2024')
+    
+    if stat_block_2014:
+        monster_log.debug("Found 2014 format stat block")
+    if stat_block_2024:
+        monster_log.debug("Found 2024 format stat block")
+    
+    if not stat_block_2014 and not stat_block_2024:
+        monster_log.warning("No stat block found in %s", monster_url)
+    
+    details = {}
+    
+    # Mark new format version
+    details['formatVersion'] = 2
+    
+    # Check for legacy badge on the monster details page
+    is_legacy = False
+    legacy_badge = soup.select_one('.badge .badge-label#legacy-badge, [aria-label="legacy"]')
+    if legacy_badge:
+        is_legacy = True
+        monster_log.debug("Detected legacy monster")
+    
+    details['isLegacy'] = is_legacy
+    
+    # Helper function to find stat labels (supports both 2014 and 2024 formats)
+    def find_stat_label(soup_obj, label_pattern):
+        """Find a stat label using both old (2014) and new (2024) class names"""
+        # Try 2014 format first
+        label = soup_obj.find('span', class_='mon-stat-block__attribute-label', string=re.compile(label_pattern, re.I))
+        if label:
+            return label, 'old'
+        # Try 2024 format
+        label = soup_obj.find('span', class_='mon-stat-block-2024__attribute-label', string=re.compile(label_pattern, re.I))
+        if label:
+            return label, 'new'
+        return None, None
+    
+    # Helper function to find tidbit labels (for skills, saves, etc.)
+    def find_tidbit_label(soup_obj, label_pattern):
+        """Find a tidbit label (works for both 2014 and 2024)"""
         # Try 2024 format first
-        stat_block_2024 = soup.find('div', class_='mon-stat-block-2024')
-        
-        if stat_block_2024:
-            # Look for description blocks that are NOT Actions/Bonus Actions/Reactions/Legendary Actions
-            desc_blocks = stat_block_2024.find_all('div', class_='mon-stat-block-2024__description-block')
-            for block in desc_blocks:
-                heading = block.find('div', class_='mon-stat-block-2024__description-block-heading')
-                if heading:
-                    heading_text = heading.get_text(strip=True)
-                    # Skip action-type blocks
-                    if not re.search(r'^(Actions?|Bonus\s+Actions?|Reactions?|Legendary\s+Actions?)$', heading_text, re.I):
-                        # This is a trait block - extract all paragraphs
-                        content_div = block.find('div', class_='mon-stat-block-2024__description-block-content')
-                        if content_div:
-                            trait_paragraphs = content_div.find_all('p')
-                            for p in trait_paragraphs:
-                                strong = p.find('strong')
-                                if strong:
-                                    name = normalize_text(strong.get_text(strip=True).rstrip('.'))
-                                    description = normalize_text(p.get_text(strip=True))
-                                    if description.startswith(name):
-                                        description = description[len(name):].lstrip('. ')
-                                    
-                                    # Check if this is Spellcasting
-                                    if re.search(r'^Spellcasting', name, re.I):
-                                        # Extract spellcasting separately with following lists/paragraphs
-                                        # Get any following list items OR paragraphs
-                                        next_elem = p.find_next_sibling()
-                                        while next_elem:
-                                            if next_elem.name in ['ul', 'ol']:
-                                                # List items - these are the spell lists
-                                                for li in next_elem.find_all('li'):
-                                                    description += ' ' + normalize_text(li.get_text(strip=True))
-                                                next_elem = next_elem.find_next_sibling()
-                                            elif next_elem.name == 'p':
-                                                # Check if it has a strong tag (would be next trait)
-                                                p_strong = next_elem.find('strong')
-                                                if p_strong:
-                                                    # This is a new trait, stop
-                                                    break
-                                                # No strong - this paragraph continues spellcasting
-                                                description += ' ' + normalize_text(next_elem.get_text(strip=True))
-                                                next_elem = next_elem.find_next_sibling()
-                                            else:
-                                                break
-                                        spellcasting_from_traits = {'name': name, 'description': description}
-                                    else:
-                                        traits.append({'name': name, 'description': description})
+        label_2024 = soup_obj.find('span', class_='mon-stat-block-2024__tidbit-label', string=re.compile(label_pattern, re.I))
+        if label_2024:
+            return label_2024, 'new'
+        # Try 2014 format
+        label_2014 = soup_obj.find('span', class_='mon-stat-block__tidbit-label', string=re.compile(label_pattern, re.I))
+        if label_2014:
+            return label_2014, 'old'
+        return None, None
+    
+    # Extract monster name
+    name_elem = (
+        soup.find('div', class_='mon-stat-block-2024__name') or
+        soup.find('div', class_='mon-stat-block__name') or
+        soup.find('h1', class_='mon-stat-block-2024__name') or
+        soup.find('span', class_='mon-stat-block__name') or
+        soup.find('h1', class_='mon-stat-block__name')
+    )
+    if name_elem:
+        details['name'] = normalize_text(name_elem.get_text(strip=True))
+        monster_log.debug("Found name: %s", details['name'])
+    
+    # Extract Type/Size/Alignment (e.g., "Huge Dragon (Metallic), Chaotic Good")
+    # This appears in different places depending on format
+    # Try multiple selectors as D&D Beyond structure varies
+    type_size_elem = (
+        soup.find('div', class_='mon-stat-block-2024__meta') or
+        soup.find('div', class_='mon-stat-block__meta') or
+        soup.find('span', class_='mon-stat-block-2024__type') or 
+        soup.find('span', class_='mon-stat-block__type') or
+        soup.find('div', class_='mon-stat-block-2024__type') or
+        soup.find('div', class_='mon-stat-block__type') or
+        soup.find('p', class_='mon-stat-block-2024__type') or
+        soup.find('p', class_='mon-stat-block__type')
+    )
+    if type_size_elem:
+        type_text = normalize_text(type_size_elem.get_text(strip=True))
+        if type_text:
+            details['typeAndAlignment'] = type_text
+            monster_log.debug("Found type: %s", type_text)
+    
+    # Extract AC with type
+    ac_label, ac_format = find_stat_label(soup, r'Armor\s+Class|^AC$')
+    if ac_label:
+        # Choose class prefix based on format
+        prefix = 'mon-stat-block-2024' if ac_format == 'new' else 'mon-stat-block'
+        # For 2024 format, use __attribute-value (contains clean AC number)
+        # For legacy format, use __attribute-value (same structure)
+        ac_elem = ac_label.find_next_sibling('span', class_=f'{prefix}__attribute-value')
+        if ac_elem:
+            # For 2024, the value is directly in the ac_elem text
+            # For legacy, it's in a nested __attribute-data-value span
+            ac_value_elem = ac_elem.find('span', class_=f'{prefix}__attribute-data-value')
+            if ac_value_elem:
+                # Legacy format: extract from nested span
+                ac_text = ac_value_elem.get_text(strip=True)
+            else:
+                # 2024 format: value is directly in ac_elem
+                ac_text = ac_elem.get_text(strip=True)
+            
+            ac_match = re.search(r'(\d+)', ac_text)
+            if ac_match:
+                details['ac'] = int(ac_match.group(1))
+            
+            ac_extra = ac_elem.find('span', class_=f'{prefix}__attribute-data-extra')
+            if ac_extra:
+                details['acType'] = ac_extra.get_text(strip=True).strip('()')
+            if 'ac' in details:
+                monster_log.debug("Found AC: %s %s", details['ac'], details.get('acType', ''))
+    
+    # Extract HP with hit dice
+    hp_label, hp_format = find_stat_label(soup, r'Hit\s+Points|^HP$')
+    if hp_label:
+        prefix = 'mon-stat-block-2024' if hp_format == 'new' else 'mon-stat-block'
+        if hp_format == 'new':
+            hp_elem = hp_label.find_next_sibling('span', class_=f'{prefix}__attribute-data')
         else:
-            # Legacy 2014 format - look for paragraphs before Actions heading
-            # Find all description blocks that come before Actions
-            desc_blocks = soup.find_all('div', class_='mon-stat-block__description-block')
-            for block in desc_blocks:
-                heading = block.find('div', class_='mon-stat-block__description-block-heading')
-                if heading:
-                    heading_text = heading.get_text(strip=True)
-                    # Skip action-type blocks
-                    if not re.search(r'^(Actions?|Bonus\s+Actions?|Reactions?|Legendary\s+Actions?)$', heading_text, re.I):
-                        content_div = block.find('div', class_='mon-stat-block__description-block-content')
-                        if content_div:
-                            trait_paragraphs = content_div.find_all('p')
-                            for p in trait_paragraphs:
-                                strong = p.find('strong')
-                                if strong:
-                                    name = normalize_text(strong.get_text(strip=True).rstrip('.'))
-                                    description = normalize_text(p.get_text(strip=True))
-                                    if description.startswith(name):
-                                        description = description[len(name):].lstrip('. ')
-                                    
-                                    # Check if this is Spellcasting
-                                    if re.search(r'^Spellcasting', name, re.I):
-                                        # Extract spellcasting separately with following lists/paragraphs
-                                        # Get any following list items OR paragraphs
-                                        next_elem = p.find_next_sibling()
-                                        while next_elem:
-                                            if next_elem.name in ['ul', 'ol']:
-                                                # List items - these are the spell lists
-                                                for li in next_elem.find_all('li'):
-                                                    description += ' ' + normalize_text(li.get_text(strip=True))
-                                                next_elem = next_elem.find_next_sibling()
-                                            elif next_elem.name == 'p':
-                                                # Check if it has a strong tag (would be next trait)
-                                                p_strong = next_elem.find('strong')
-                                                if p_strong:
-                                                    # This is a new trait, stop
-                                                    break
-                                                # No strong - this paragraph continues spellcasting
-                                                description += ' ' + normalize_text(next_elem.get_text(strip=True))
-                                                next_elem = next_elem.find_next_sibling()
-                                            else:
-                                                break
-                                        spellcasting_from_traits = {'name': name, 'description': description}
-                                    else:
-                                        traits.append({'name': name, 'description': description})
-        
-        if traits:
-            details['traits'] = traits
-            print(f"  Found {len(traits)} Traits")
-        
-        # Extract Actions
-        raw_actions = []
-        
-        # Try 2024 format first
-        if stat_block_2024:
-            desc_blocks = stat_block_2024.find_all('div', class_='mon-stat-block-2024__description-block')
-            for block in desc_blocks:
-                heading = block.find('div', class_='mon-stat-block-2024__description-block-heading')
-                if heading and re.search(r'^Actions\s*$', heading.get_text(strip=True), re.I):
+            hp_elem = hp_label.find_next_sibling('span', class_=f'{prefix}__attribute-data')
+        if hp_elem:
+            hp_value = hp_elem.find('span', class_=f'{prefix}__attribute-data-value')
+            if hp_value:
+                hp_match = re.search(r'(\d+)', hp_value.get_text(strip=True))
+                if hp_match:
+                    details['hp'] = int(hp_match.group(1))
+            hp_extra = hp_elem.find('span', class_=f'{prefix}__attribute-data-extra')
+            if hp_extra:
+                details['hitDice'] = hp_extra.get_text(strip=True).strip('()')
+            if 'hp' in details:
+                monster_log.debug("Found HP: %s %s", details['hp'], details.get('hitDice', ''))
+    
+    # Extract Speed
+    speed_label, speed_format = find_stat_label(soup, r'Speed')
+    if speed_label:
+        prefix = 'mon-stat-block-2024' if speed_format == 'new' else 'mon-stat-block'
+        speed_elem = speed_label.find_next_sibling('span', class_=f'{prefix}__attribute-data')
+        if speed_elem:
+            speed_text = speed_elem.get_text(strip=True)
+            details['speed'] = speed_text
+            monster_log.debug("Found speed: %s", speed_text)
+    
+    # Extract Ability Scores
+    ability_names = ['str', 'dex', 'con', 'int', 'wis', 'cha']
+    
+    # Try 2024 format first (stat tables)
+    stats_section = soup.find('div', class_='mon-stat-block-2024__stats')
+    if stats_section:
+        stat_tables = stats_section.find_all('table', class_='stat-table')
+        if stat_tables:
+            details['abilities'] = {}
+            for table in stat_tables:
+                rows = table.find('tbody').find_all('tr')
+                for row in rows:
+                    cells = row.find_all(['th', 'td'])
+                    if len(cells) >= 4:
+                        ability_name = cells[0].get_text(strip=True).lower()
+                        score = parse_signed_int(cells[1].get_text(strip=True), default=10)
+                        # cells[2] is the ability modifier; D&D Beyond may
+                        # render negatives with the Unicode minus sign.
+                        modifier = parse_signed_int(cells[2].get_text(strip=True), default=0)
+                        # cells[3] is the saving throw modifier
+                        if ability_name in ability_names:
+                            details['abilities'][ability_name] = score
+            details['initBonus'] = details['abilities']['dex']
+            if details['initBonus'] >= 10:
+                details['initBonus'] = (details['initBonus'] - 10) // 2
+            else:
+                details['initBonus'] = -((10 - details['initBonus'] + 1) // 2)
+            monster_log.debug("Found abilities (2024): %s, initiative %+d", details['abilities'], details['initBonus'])
+    else:
+        # Try legacy 2014 format
+        stat_scores = soup.find_all('span', class_='ability-block__score')
+        stat_modifiers = soup.find_all('span', class_='ability-block__modifier')
+        
+        if len(stat_scores) >= 6:
+            details['abilities'] = {}
+            for i, ability in enumerate(ability_names):
+                score = parse_signed_int(stat_scores[i].get_text(strip=True), default=10)
+                details['abilities'][ability] = score
+            # Calculate initiative from dex
+            dex = details['abilities']['dex']
+            details['initBonus'] = (dex - 10) // 2
+            monster_log.debug("Found abilities (2014): %s, initiative %+d", details['abilities'], details['initBonus'])
+    
+    # Extract Saving Throws
+    saves_label, saves_format = find_tidbit_label(soup, r'Saving Throws')
+    if saves_label:
+        prefix = 'mon-stat-block-2024' if saves_format == 'new' else 'mon-stat-block'
+        saves_data = saves_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if saves_data:
+            details['savingThrows'] = saves_data.get_text(strip=True)
+            monster_log.debug("Found saving throws: %s", details['savingThrows'])
+    
+    # Extract Skills
+    skills_label, skills_format = find_tidbit_label(soup, r'Skills')
+    if skills_label:
+        prefix = 'mon-stat-block-2024' if skills_format == 'new' else 'mon-stat-block'
+        skills_data = skills_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if skills_data:
+            skills_text = skills_data.get_text(strip=True)
+            # Parse skills into array: "Athletics+5,Perception+2" or "Athletics +5, Perception +2"
+            skills_array = []
+            # Split by comma
+            skill_parts = skills_text.split(',')
+            for part in skill_parts:
+                part = part.strip()
+                # Match skill name and modifier: "Athletics +5" or "Athletics+5"
+                match = re.search(r'([A-Za-z\s]+?)\s*([+\-])\s*(\d+)', part)
+                if match:
+                    skill_name = match.group(1).strip()
+                    sign = match.group(2)
+                    mod_value = int(match.group(3))
+                    if sign == '-':
+                        mod_value = -mod_value
+                    skills_array.append({'skill': skill_name, 'mod': mod_value})
+            details['skills'] = skills_array
+            monster_log.debug("Found %d skills", len(skills_array))
+    
+    # Extract Damage Vulnerabilities
+    vuln_label, vuln_format = find_tidbit_label(soup, r'Damage Vulnerabilities')
+    if vuln_label:
+        prefix = 'mon-stat-block-2024' if vuln_format == 'new' else 'mon-stat-block'
+        vuln_data = vuln_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if vuln_data:
+            details['damageVulnerabilities'] = vuln_data.get_text(strip=True)
+            monster_log.debug("Found vulnerabilities: %s", details['damageVulnerabilities'])
+    
+    # Extract Damage Resistances
+    resist_label, resist_format = find_tidbit_label(soup, r'Damage Resistances')
+    if resist_label:
+        prefix = 'mon-stat-block-2024' if resist_format == 'new' else 'mon-stat-block'
+        resist_data = resist_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if resist_data:
+            details['damageResistances'] = normalize_text(resist_data.get_text(strip=True))
+            monster_log.debug("Found resistances: %s", details['damageResistances'])
+    
+    # Extract Damage Immunities
+    immune_label, immune_format = find_tidbit_label(soup, r'Damage Immunities')
+    if immune_label:
+        prefix = 'mon-stat-block-2024' if immune_format == 'new' else 'mon-stat-block'
+        immune_data = immune_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if immune_data:
+            details['damageImmunities'] = normalize_text(immune_data.get_text(strip=True))
+            monster_log.debug("Found immunities: %s", details['damageImmunities'])
+    
+    # Extract Condition Immunities
+    cond_label, cond_format = find_tidbit_label(soup, r'Condition Immunities')
+    if cond_label:
+        prefix = 'mon-stat-block-2024' if cond_format == 'new' else 'mon-stat-block'
+        cond_data = cond_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if cond_data:
+            details['conditionImmunities'] = normalize_text(cond_data.get_text(strip=True))
+            monster_log.debug("Found condition immunities: %s", details['conditionImmunities'])
+    
+    # Extract Senses
+    senses_label, senses_format = find_tidbit_label(soup, r'Senses')
+    if senses_label:
+        prefix = 'mon-stat-block-2024' if senses_format == 'new' else 'mon-stat-block'
+        senses_data = senses_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if senses_data:
+            senses_text = normalize_text(senses_data.get_text(strip=True))
+            # Parse senses into array by splitting on comma
+            senses_array = []
+            for sense in senses_text.split(','):
+                sense = sense.strip()
+                # Fix spacing for common senses (e.g., "Darkvision60 ft." -> "Darkvision 60 ft.")
+                sense = re.sub(r'(Darkvision|Blindsight|Tremorsense|Truesight)(\d)', r'\1 \2', sense)
+                senses_array.append(sense)
+            details['senses'] = senses_array
+            monster_log.debug("Found %d senses", len(senses_array))
+    
+    # Extract Languages
+    lang_label, lang_format = find_tidbit_label(soup, r'Languages')
+    if lang_label:
+        prefix = 'mon-stat-block-2024' if lang_format == 'new' else 'mon-stat-block'
+        lang_data = lang_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if lang_data:
+            details['languages'] = normalize_text(lang_data.get_text(strip=True))
+            monster_log.debug("Found languages: %s", details['languages'])
+    
+    # Extract Challenge Rating
+    cr_label, cr_format = find_tidbit_label(soup, r'Challenge|^CR$')
+    if cr_label:
+        prefix = 'mon-stat-block-2024' if cr_format == 'new' else 'mon-stat-block'
+        cr_data = cr_label.find_next_sibling('span', class_=f'{prefix}__tidbit-data')
+        if cr_data:
+            cr_text = cr_data.get_text(strip=True)
+            cr_match = re.search(r'([\d/]+)', cr_text)
+            if cr_match:
+                details['cr'] = cr_match.group(1)
+            if 'cr' in details:
+                monster_log.debug("Found CR: %s", details.get('cr', 'N/A'))
+    
+    # Extract Proficiency Bonus specially (if present)
+    prof_label = soup.find('span', class_='mon-stat-block-2024__tidbit-label', string=re.compile(r'^Proficiency\s+Bonus$', re.I))
+    if not prof_label:
+        prof_label = soup.find('span', class_='mon-stat-block__tidbit-label', string=re.compile(r'^Proficiency\s+Bonus$', re.I))
+    if prof_label:
+        prof_data = prof_label.find_next_sibling('span')
+        if prof_data:
+            prof_text = prof_data.get_text(strip=True)
+            # Extract just the number from something like "+5"
+            prof_match = re.search(r'\+?(\d+)', prof_text)
+            if prof_match:
+                details['profBonus'] = int(prof_match.group(1))
+                monster_log.debug("Found proficiency bonus: %+d", details['profBonus'])
+    
+    # Extract Traits (Special Abilities) from description blocks
+    traits = []
+    spellcasting_from_traits = None
+    
+    # Try 2024 format first
+    stat_block_2024 = soup.find('div', class_='mon-stat-block-2024')
+    
+    if stat_block_2024:
+        # Look for description blocks that are NOT Actions/Bonus Actions/Reactions/Legendary Actions
+        desc_blocks = stat_block_2024.find_all('div', class_='mon-stat-block-2024__description-block')
+        for block in desc_blocks:
+            heading = block.find('div', class_='mon-stat-block-2024__description-block-heading')
+            if heading:
+                heading_text = heading.get_text(strip=True)
+                # Skip action-type blocks
+                if not re.search(r'^(Actions?|Bonus\s+Actions?|Reactions?|Legendary\s+Actions?)$', heading_text, re.I):
+                    # This is a trait block - extract all paragraphs
                     content_div = block.find('div', class_='mon-stat-block-2024__description-block-content')
                     if content_div:
-                        action_paragraphs = content_div.find_all('p')
-                        processed_paragraphs = set()  # Track which paragraphs have been processed
-                        
-                        for p in action_paragraphs:
-                            # Skip if already processed as part of spellcasting
-                            if p in processed_paragraphs:
-                                continue
-                                
+                        trait_paragraphs = content_div.find_all('p')
+                        for p in trait_paragraphs:
                             strong = p.find('strong')
                             if strong:
                                 name = normalize_text(strong.get_text(strip=True).rstrip('.'))
-                                
-                                # Skip standalone spell list indicators - they should have been merged with Spellcasting
-                                if re.match(r'^(At[\s-]?Will|At[\s-]?will|\d+/[Dd]ay(\s+[Ee]ach)?):?$', name, re.I):
-                                    continue
-                                
-                                # Fix spacing before parentheses
-                                name = re.sub(r'(\S)\(', r'\1 (', name)  # Add space before (
                                 description = normalize_text(p.get_text(strip=True))
                                 if description.startswith(name):
                                     description = description[len(name):].lstrip('. ')
                                 
-                                # For Spellcasting, also get any following list items OR paragraphs without strong
+                                # Check if this is Spellcasting
                                 if re.search(r'^Spellcasting', name, re.I):
+                                    # Extract spellcasting separately with following lists/paragraphs
+                                    # Get any following list items OR paragraphs
                                     next_elem = p.find_next_sibling()
                                     while next_elem:
                                         if next_elem.name in ['ul', 'ol']:
-                                            # List items
+                                            # List items - these are the spell lists
                                             for li in next_elem.find_all('li'):
                                                 description += ' ' + normalize_text(li.get_text(strip=True))
+                                            next_elem = next_elem.find_next_sibling()
                                         elif next_elem.name == 'p':
-                                            # Check if it has a strong element
+                                            # Check if it has a strong tag (would be next trait)
                                             p_strong = next_elem.find('strong')
                                             if p_strong:
-                                                # Check if the strong tag is a spell list indicator (At Will, X/Day, etc.)
-                                                strong_text = p_strong.get_text(strip=True)
-                                                if re.match(r'^(At[\s-]?Will|At[\s-]?will|\d+/[Dd]ay(\s+[Ee]ach)?):?$', strong_text, re.I):
-                                                    # This is a spell list continuation, include it and mark as processed
-                                                    description += ' ' + normalize_text(next_elem.get_text(strip=True))
-                                                    processed_paragraphs.add(next_elem)
-                                                else:
-                                                    # This is a different action, stop
-                                                    break
-                                            else:
-                                                # Paragraph without strong - part of spellcasting description
-                                                description += ' ' + normalize_text(next_elem.get_text(strip=True))
+                                                # This is a new trait, stop
+                                                break
+                                            # No strong - this paragraph continues spellcasting
+                                            description += ' ' + normalize_text(next_elem.get_text(strip=True))
+                                            next_elem = next_elem.find_next_sibling()
                                         else:
-                                            # Some other element, stop
                                             break
-                                        next_elem = next_elem.find_next_sibling()
+                                    spellcasting_from_traits = {'name': name, 'description': description}
+                                else:
+                                    traits.append({'name': name, 'description': description})
+    else:
+        # Legacy 2014 format - look for paragraphs before Actions heading
+        # Find all description blocks that come before Actions
+        desc_blocks = soup.find_all('div', class_='mon-stat-block__description-block')
+        for block in desc_blocks:
+            heading = block.find('div', class_='mon-stat-block__description-block-heading')
+            if heading:
+                heading_text = heading.get_text(strip=True)
+                # Skip action-type blocks
+                if not re.search(r'^(Actions?|Bonus\s+Actions?|Reactions?|Legendary\s+Actions?)$', heading_text, re.I):
+                    content_div = block.find('div', class_='mon-stat-block__description-block-content')
+                    if content_div:
+                        trait_paragraphs = content_div.find_all('p')
+                        for p in trait_paragraphs:
+                            strong = p.find('strong')
+                            if strong:
+                                name = normalize_text(strong.get_text(strip=True).rstrip('.'))
+                                description = normalize_text(p.get_text(strip=True))
+                                if description.startswith(name):
+                                    description = description[len(name):].lstrip('. ')
                                 
-                                raw_actions.append({'name': name, 'description': description})
-        else:
-            # Legacy 2014 format
-            actions_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'^Actions\s*$', re.I))
-            if actions_heading:
-                content_div = actions_heading.find_next_sibling('div', class_='mon-stat-block__description-block-content')
+                                # Check if this is Spellcasting
+                                if re.search(r'^Spellcasting', name, re.I):
+                                    # Extract spellcasting separately with following lists/paragraphs
+                                    # Get any following list items OR paragraphs
+                                    next_elem = p.find_next_sibling()
+                                    while next_elem:
+                                        if next_elem.name in ['ul', 'ol']:
+                                            # List items - these are the spell lists
+                                            for li in next_elem.find_all('li'):
+                                                description += ' ' + normalize_text(li.get_text(strip=True))
+                                            next_elem = next_elem.find_next_sibling()
+                                        elif next_elem.name == 'p':
+                                            # Check if it has a strong tag (would be next trait)
+                                            p_strong = next_elem.find('strong')
+                                            if p_strong:
+                                                # This is a new trait, stop
+                                                break
+                                            # No strong - this paragraph continues spellcasting
+                                            description += ' ' + normalize_text(next_elem.get_text(strip=True))
+                                            next_elem = next_elem.find_next_sibling()
+                                        else:
+                                            break
+                                    spellcasting_from_traits = {'name': name, 'description': description}
+                                else:
+                                    traits.append({'name': name, 'description': description})
+    
+    if traits:
+        details['traits'] = traits
+        monster_log.debug("Found %d traits", len(traits))
+    
+    # Extract Actions
+    raw_actions = []
+    
+    # Try 2024 format first
+    if stat_block_2024:
+        desc_blocks = stat_block_2024.find_all('div', class_='mon-stat-block-2024__description-block')
+        for block in desc_blocks:
+            heading = block.find('div', class_='mon-stat-block-2024__description-block-heading')
+            if heading and re.search(r'^Actions\s*$', heading.get_text(strip=True), re.I):
+                content_div = block.find('div', class_='mon-stat-block-2024__description-block-content')
                 if content_div:
                     action_paragraphs = content_div.find_all('p')
                     processed_paragraphs = set()  # Track which paragraphs have been processed
@@ -2059,127 +2405,78 @@ def get_monster_details(monster_url):
                                     next_elem = next_elem.find_next_sibling()
                             
                             raw_actions.append({'name': name, 'description': description})
-        
-        # Parse actions into structured format
-        actions = []
-        special_actions = []
-        spellcasting = None
-        
-        for raw_action in raw_actions:
-            # Check if this is spellcasting
-            if re.search(r'^Spellcasting', raw_action['name'], re.I):
-                # Use the description from raw_action which should have spell lists appended
-                spell_content_text = raw_action['description']
-                
-                # Extract just the intro text for description (before spell lists)
-                intro_match = re.search(r'^(.+?)(?=At[\s-]?[Ww]ill:|\d+/[Dd]ay|$)', spell_content_text, re.I | re.DOTALL)
-                if intro_match:
-                    spell_intro = intro_match.group(1).strip().rstrip(':')
-                else:
-                    spell_intro = spell_content_text
-                
-                # Extract spellcasting info
-                spell_info = {'description': spell_intro}
-                
-                # Try to extract spell save DC
-                dc_match = re.search(r'spell\s+save\s+DC\s+(\d+)', spell_content_text, re.I)
-                if dc_match:
-                    spell_info['spellSaveDC'] = int(dc_match.group(1))
-                
-                # Try to extract spell attack bonus
-                attack_match = re.search(r'\+(\d+)\s+to\s+hit\s+with\s+spell\s+attacks', spell_content_text, re.I)
-                if attack_match:
-                    spell_info['spellAttackBonus'] = int(attack_match.group(1))
-                
-                # Try to extract spellcasting ability
-                ability_match = re.search(r'using\s+(Strength|Dexterity|Constitution|Intelligence|Wisdom|Charisma)\s+as\s+the\s+spellcasting\s+ability', spell_content_text, re.I)
-                if ability_match:
-                    spell_info['spellcastingAbility'] = ability_match.group(1)
-                
-                # Extract spell lists
-                spell_lists = {}
-                
-                # At will spells (handles both "At will:" and "At-will:" and multiline)
-                at_will_match = re.search(r'At[\s-]?will:\s*([^\n]+?)(?=\n|$|\d+/day)', spell_content_text, re.I | re.DOTALL)
-                if at_will_match:
-                    spells_text = at_will_match.group(1).strip()
-                    # Split by comma, handling spell names with parentheses
-                    spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
-                    # Normalize spell names: add space before parentheses
-                    spells = [re.sub(r'(\S)\(', r'\1 (', spell) for spell in spells]
-                    if spells:
-                        spell_lists['atWill'] = spells
-                
-                # X/day each spells  
-                for match in re.finditer(r'(\d+)/day\s+each:\s*([^\n]+?)(?=\n|$|\d+/day)', spell_content_text, re.I | re.DOTALL):
-                    uses = match.group(1)
-                    spells_text = match.group(2).strip()
-                    spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
-                    # Normalize spell names: add space before parentheses
-                    spells = [re.sub(r'(\S)\(', r'\1 (', spell) for spell in spells]
-                    if spells:
-                        spell_lists[f'{uses}PerDay'] = spells
-                
-                if spell_lists:
-                    spell_info['spells'] = spell_lists
+    else:
+        # Legacy 2014 format
+        actions_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'^Actions\s*$', re.I))
+        if actions_heading:
+            content_div = actions_heading.find_next_sibling('div', class_='mon-stat-block__description-block-content')
+            if content_div:
+                action_paragraphs = content_div.find_all('p')
+                processed_paragraphs = set()  # Track which paragraphs have been processed
                 
-                spellcasting = spell_info
-                continue
-            
-            parsed = parse_action(raw_action['name'], raw_action['description'])
-            
-            if parsed is None:
-                # Special action (Multiattack, etc.) - no structured fields
-                special_actions.append({'name': raw_action['name'], 'description': raw_action['description']})
-            elif parsed.get('isDualMode'):
-                # Split dual-mode weapon into melee and ranged. Handles both
-                # 2014 format ("Melee or Ranged Weapon Attack: ... reach X ft.
-                # or range Y/Z ft.") and 2024 format ("Melee or Ranged Attack
-                # Roll: +N, reach X ft. or range Y/Z ft.").
-                desc = parsed['_originalDescription']
-
-                # Create melee version
-                melee_name = f"{parsed['name']} (Melee)"
-                melee_desc = re.sub(r'Melee\s*or\s*Ranged\s+Weapon\s+Attack', 'Melee Weapon Attack', desc, flags=re.I)
-                melee_desc = re.sub(r'Melee\s*or\s*Ranged\s+Attack\s+Roll', 'Melee Attack Roll', melee_desc, flags=re.I)
-                # Remove the "or range(d) X ft./Y ft." part for melee
-                melee_desc = re.sub(r'\s+or\s+ranged?\s+\d+\s*(?:ft\.?)?\s*/\s*\d+\s*ft\.?', '', melee_desc, flags=re.I)
-                melee_parsed = parse_action(melee_name, melee_desc)
-                if melee_parsed and not melee_parsed.get('isDualMode'):
-                    actions.append(melee_parsed)
-
-                # Create ranged version
-                ranged_name = f"{parsed['name']} (Ranged)"
-                ranged_desc = re.sub(r'Melee\s*or\s*Ranged\s+Weapon\s+Attack', 'Ranged Weapon Attack', desc, flags=re.I)
-                ranged_desc = re.sub(r'Melee\s*or\s*Ranged\s+Attack\s+Roll', 'Ranged Attack Roll', ranged_desc, flags=re.I)
-                # Remove the "reach X ft. or " part for ranged (keep the actual range)
-                ranged_desc = re.sub(r'reach\s+\d+\s*ft\.?\s+or\s+', '', ranged_desc, flags=re.I)
-                ranged_parsed = parse_action(ranged_name, ranged_desc)
-                if ranged_parsed and not ranged_parsed.get('isDualMode'):
-                    actions.append(ranged_parsed)
-            else:
-                # Regular parsed action
-                actions.append(parsed)
-        
-        if actions:
-            details['actions'] = actions
-            print(f"  Found {len(actions)} Actions (parsed)")
-        
-        # Handle spellcasting from actions or traits
-        if spellcasting:
-            details['spellcasting'] = spellcasting
-            spell_count = sum(len(spells) for spells in spellcasting.get('spells', {}).values())
-            print(f"  Found Spellcasting ({spell_count} spells)")
-        elif spellcasting_from_traits:
-            # Parse spellcasting from traits section
-            spell_content_text = spellcasting_from_traits['description']
-            
-            # DEBUG: Print spell text to see format
-            print(f"  DEBUG Spell text (first 300 chars): {spell_content_text[:300]}")
+                for p in action_paragraphs:
+                    # Skip if already processed as part of spellcasting
+                    if p in processed_paragraphs:
+                        continue
+                        
+                    strong = p.find('strong')
+                    if strong:
+                        name = normalize_text(strong.get_text(strip=True).rstrip('.'))
+                        
+                        # Skip standalone spell list indicators - they should have been merged with Spellcasting
+                        if re.match(r'^(At[\s-]?Will|At[\s-]?will|\d+/[Dd]ay(\s+[Ee]ach)?):?$', name, re.I):
+                            continue
+                        
+                        # Fix spacing before parentheses
+                        name = re.sub(r'(\S)\(', r'\1 (', name)  # Add space before (
+                        description = normalize_text(p.get_text(strip=True))
+                        if description.startswith(name):
+                            description = description[len(name):].lstrip('. ')
+                        
+                        # For Spellcasting, also get any following list items OR paragraphs without strong
+                        if re.search(r'^Spellcasting', name, re.I):
+                            next_elem = p.find_next_sibling()
+                            while next_elem:
+                                if next_elem.name in ['ul', 'ol']:
+                                    # List items
+                                    for li in next_elem.find_all('li'):
+                                        description += ' ' + normalize_text(li.get_text(strip=True))
+                                elif next_elem.name == 'p':
+                                    # Check if it has a strong element
+                                    p_strong = next_elem.find('strong')
+                                    if p_strong:
+                                        # Check if the strong tag is a spell list indicator (At Will, X/Day, etc.)
+                                        strong_text = p_strong.get_text(strip=True)
+                                        if re.match(r'^(At[\s-]?Will|At[\s-]?will|\d+/[Dd]ay(\s+[Ee]ach)?):?$', strong_text, re.I):
+                                            # This is a spell list continuation, include it and mark as processed
+                                            description += ' ' + normalize_text(next_elem.get_text(strip=True))
+                                            processed_paragraphs.add(next_elem)
+                                        else:
+                                            # This is a different action, stop
+                                            break
+                                    else:
+                                        # Paragraph without strong - part of spellcasting description
+                                        description += ' ' + normalize_text(next_elem.get_text(strip=True))
+                                else:
+                                    # Some other element, stop
+                                    break
+                                next_elem = next_elem.find_next_sibling()
+                        
+                        raw_actions.append({'name': name, 'description': description})
+    
+    # Parse actions into structured format
+    actions = []
+    special_actions = []
+    spellcasting = None
+    
+    for raw_action in raw_actions:
+        # Check if this is spellcasting
+        if re.search(r'^Spellcasting', raw_action['name'], re.I):
+            # Use the description from raw_action which should have spell lists appended
+            spell_content_text = raw_action['description']
             
             # Extract just the intro text for description (before spell lists)
-            # Stop at "Cantrips (", "At will:", "1st level", etc.
-            intro_match = re.search(r'^(.+?)(?=Cantrips?\s*\(|At[\s-]?[Ww]ill:|\d+(?:st|nd|rd|th)\s+level|\d+/[Dd]ay|$)', spell_content_text, re.I | re.DOTALL)
+            intro_match = re.search(r'^(.+?)(?=At[\s-]?[Ww]ill:|\d+/[Dd]ay|$)', spell_content_text, re.I | re.DOTALL)
             if intro_match:
                 spell_intro = intro_match.group(1).strip().rstrip(':')
             else:
@@ -2199,100 +2496,175 @@ def get_monster_details(monster_url):
                 spell_info['spellAttackBonus'] = int(attack_match.group(1))
             
             # Try to extract spellcasting ability
-            ability_match = re.search(r'using\s+(Strength|Dexterity|Constitution|Intelligence|Wisdom|Charisma)\s+as\s+(?:her|his|its|their)\s+spellcasting\s+ability', spell_content_text, re.I)
+            ability_match = re.search(r'using\s+(Strength|Dexterity|Constitution|Intelligence|Wisdom|Charisma)\s+as\s+the\s+spellcasting\s+ability', spell_content_text, re.I)
             if ability_match:
                 spell_info['spellcastingAbility'] = ability_match.group(1)
             
             # Extract spell lists
             spell_lists = {}
             
-            # Cantrips (at will)
-            cantrip_match = re.search(r'Cantrips?\s*\([^)]*\):\s*([^\n]+?)(?=\d+(?:st|nd|rd|th)\s+level|$)', spell_content_text, re.I | re.DOTALL)
-            if cantrip_match:
-                spells_text = cantrip_match.group(1).strip()
-                spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
-                if spells:
-                    spell_lists['cantrips'] = spells
-            
-            # Leveled spells (1st level (4 slots): ...)
-            for level in range(1, 10):
-                # Match "1st level (3 slots): spell1, spell2"
-                level_suffix = 'st' if level == 1 else 'nd' if level == 2 else 'rd' if level == 3 else 'th'
-                level_pattern = rf'{level}{level_suffix}\s+level\s*\([^)]*\):\s*([^\n]+?)(?=\d+(?:st|nd|rd|th)\s+level|$)'
-                level_match = re.search(level_pattern, spell_content_text, re.I | re.DOTALL)
-                if level_match:
-                    spells_text = level_match.group(1).strip()
-                    spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
-                    if spells:
-                        spell_lists[f'level{level}'] = spells
-            
-            # At will spells (alternative format)
-            at_will_match = re.search(r'At[\s-]?will:\s*([^\n]+?)(?=\d+/day|$)', spell_content_text, re.I)
-            if at_will_match and 'cantrips' not in spell_lists:
+            # At will spells (handles both "At will:" and "At-will:" and multiline)
+            at_will_match = re.search(r'At[\s-]?will:\s*([^\n]+?)(?=\n|$|\d+/day)', spell_content_text, re.I | re.DOTALL)
+            if at_will_match:
                 spells_text = at_will_match.group(1).strip()
+                # Split by comma, handling spell names with parentheses
                 spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
+                # Normalize spell names: add space before parentheses
+                spells = [re.sub(r'(\S)\(', r'\1 (', spell) for spell in spells]
                 if spells:
                     spell_lists['atWill'] = spells
             
-            # X/day each spells
-            for match in re.finditer(r'(\d+)/day(?:\s+each)?:\s*([^\n]+)', spell_content_text, re.I):
+            # X/day each spells  
+            for match in re.finditer(r'(\d+)/day\s+each:\s*([^\n]+?)(?=\n|$|\d+/day)', spell_content_text, re.I | re.DOTALL):
                 uses = match.group(1)
-                spells = [s.strip() for s in match.group(2).split(',')]
-                spell_lists[f'{uses}PerDay'] = spells
+                spells_text = match.group(2).strip()
+                spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
+                # Normalize spell names: add space before parentheses
+                spells = [re.sub(r'(\S)\(', r'\1 (', spell) for spell in spells]
+                if spells:
+                    spell_lists[f'{uses}PerDay'] = spells
             
             if spell_lists:
                 spell_info['spells'] = spell_lists
             
-            details['spellcasting'] = spell_info
-            spell_count = sum(len(spells) for spells in spell_info.get('spells', {}).values())
-            print(f"  Found Spellcasting from Traits ({spell_count} spells)")
-        
-        if special_actions:
-            details['specialActions'] = special_actions
-            print(f"  Found {len(special_actions)} Special Actions")
-        
-        # Extract Bonus Actions
-        bonus_actions = []
+            spellcasting = spell_info
+            continue
         
-        # Try 2024 format first
-        if stat_block_2024:
-            desc_blocks = stat_block_2024.find_all('div', class_='mon-stat-block-2024__description-block')
-            for block in desc_blocks:
-                heading = block.find('div', class_='mon-stat-block-2024__description-block-heading')
-                if heading and re.search(r'^Bonus\s+Actions?\s*$', heading.get_text(strip=True), re.I):
-                    content_div = block.find('div', class_='mon-stat-block-2024__description-block-content')
-                    if content_div:
-                        action_paragraphs = content_div.find_all('p')
-                        for p in action_paragraphs:
-                            strong = p.find('strong')
-                            if strong:
-                                name = normalize_text(strong.get_text(strip=True).rstrip('.'))
-                                # Fix spacing before parentheses
-                                name = re.sub(r'(\S)\(', r'\1 (', name)
-                                description = normalize_text(p.get_text(strip=True))
-                                if description.startswith(name):
-                                    description = description[len(name):].lstrip('. ')
-                                
-                                # Check for additional paragraphs (without strong) that belong to this action
-                                next_elem = p.find_next_sibling()
-                                while next_elem:
-                                    if next_elem.name == 'p':
-                                        # Check if it has a strong element (would be next action)
-                                        if next_elem.find('strong'):
-                                            break
-                                        # Otherwise, it's part of this action's description
-                                        description += ' ' + normalize_text(next_elem.get_text(strip=True))
-                                    else:
-                                        # Some other element, stop
-                                        break
-                                    next_elem = next_elem.find_next_sibling()
-                                
-                                bonus_actions.append({'name': name, 'description': description})
+        parsed = parse_action(raw_action['name'], raw_action['description'])
+        
+        if parsed is None:
+            # Special action (Multiattack, etc.) - no structured fields
+            special_actions.append({'name': raw_action['name'], 'description': raw_action['description']})
+        elif parsed.get('isDualMode'):
+            # Split dual-mode weapon into melee and ranged. Handles both
+            # 2014 format ("Melee or Ranged Weapon Attack: ... reach X ft.
+            # or range Y/Z ft.") and 2024 format ("Melee or Ranged Attack
+            # Roll: +N, reach X ft. or range Y/Z ft.").
+            desc = parsed['_originalDescription']
+
+            # Create melee version
+            melee_name = f"{parsed['name']} (Melee)"
+            melee_desc = re.sub(r'Melee\s*or\s*Ranged\s+Weapon\s+Attack', 'Melee Weapon Attack', desc, flags=re.I)
+            melee_desc = re.sub(r'Melee\s*or\s*Ranged\s+Attack\s+Roll', 'Melee Attack Roll', melee_desc, flags=re.I)
+            # Remove the "or range(d) X ft./Y ft." part for melee
+            melee_desc = re.sub(r'\s+or\s+ranged?\s+\d+\s*(?:ft\.?)?\s*/\s*\d+\s*ft\.?', '', melee_desc, flags=re.I)
+            melee_parsed = parse_action(melee_name, melee_desc)
+            if melee_parsed and not melee_parsed.get('isDualMode'):
+                actions.append(melee_parsed)
+
+            # Create ranged version
+            ranged_name = f"{parsed['name']} (Ranged)"
+            ranged_desc = re.sub(r'Melee\s*or\s*Ranged\s+Weapon\s+Attack', 'Ranged Weapon Attack', desc, flags=re.I)
+            ranged_desc = re.sub(r'Melee\s*or\s*Ranged\s+Attack\s+Roll', 'Ranged Attack Roll', ranged_desc, flags=re.I)
+            # Remove the "reach X ft. or " part for ranged (keep the actual range)
+            ranged_desc = re.sub(r'reach\s+\d+\s*ft\.?\s+or\s+', '', ranged_desc, flags=re.I)
+            ranged_parsed = parse_action(ranged_name, ranged_desc)
+            if ranged_parsed and not ranged_parsed.get('isDualMode'):
+                actions.append(ranged_parsed)
         else:
-            # Legacy 2014 format
-            bonus_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'^Bonus\s+Actions?\s*$', re.I))
-            if bonus_heading:
-                content_div = bonus_heading.find_next_sibling('div', class_='mon-stat-block__description-block-content')
+            # Regular parsed action
+            actions.append(parsed)
+    
+    if actions:
+        details['actions'] = actions
+        monster_log.debug("Found %d actions", len(actions))
+    
+    # Handle spellcasting from actions or traits
+    if spellcasting:
+        details['spellcasting'] = spellcasting
+        spell_count = sum(len(spells) for spells in spellcasting.get('spells', {}).values())
+        monster_log.debug("Found spellcasting (%d spells)", spell_count)
+    elif spellcasting_from_traits:
+        # Parse spellcasting from traits section
+        spell_content_text = spellcasting_from_traits['description']
+        
+        # DEBUG: Print spell text to see format
+        monster_log.debug("Spell text (first 300 chars): %s", spell_content_text[:300])
+        
+        # Extract just the intro text for description (before spell lists)
+        # Stop at "Cantrips (", "At will:", "1st level", etc.
+        intro_match = re.search(r'^(.+?)(?=Cantrips?\s*\(|At[\s-]?[Ww]ill:|\d+(?:st|nd|rd|th)\s+level|\d+/[Dd]ay|$)', spell_content_text, re.I | re.DOTALL)
+        if intro_match:
+            spell_intro = intro_match.group(1).strip().rstrip(':')
+        else:
+            spell_intro = spell_content_text
+        
+        # Extract spellcasting info
+        spell_info = {'description': spell_intro}
+        
+        # Try to extract spell save DC
+        dc_match = re.search(r'spell\s+save\s+DC\s+(\d+)', spell_content_text, re.I)
+        if dc_match:
+            spell_info['spellSaveDC'] = int(dc_match.group(1))
+        
+        # Try to extract spell attack bonus
+        attack_match = re.search(r'\+(\d+)\s+to\s+hit\s+with\s+spell\s+attacks', spell_content_text, re.I)
+        if attack_match:
+            spell_info['spellAttackBonus'] = int(attack_match.group(1))
+        
+        # Try to extract spellcasting ability
+        ability_match = re.search(r'using\s+(Strength|Dexterity|Constitution|Intelligence|Wisdom|Charisma)\s+as\s+(?:her|his|its|their)\s+spellcasting\s+ability', spell_content_text, re.I)
+        if ability_match:
+            spell_info['spellcastingAbility'] = ability_match.group(1)
+        
+        # Extract spell lists
+        spell_lists = {}
+        
+        # Cantrips (at will)
+        cantrip_match = re.search(r'Cantrips?\s*\([^)]*\):\s*([^\n]+?)(?=\d+(?:st|nd|rd|th)\s+level|$)', spell_content_text, re.I | re.DOTALL)
+        if cantrip_match:
+            spells_text = cantrip_match.group(1).strip()
+            spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
+            if spells:
+                spell_lists['cantrips'] = spells
+        
+        # Leveled spells (1st level (4 slots): ...)
+        for level in range(1, 10):
+            # Match "1st level (3 slots): spell1, spell2"
+            level_suffix = 'st' if level == 1 else 'nd' if level == 2 else 'rd' if level == 3 else 'th'
+            level_pattern = rf'{level}{level_suffix}\s+level\s*\([^)]*\):\s*([^\n]+?)(?=\d+(?:st|nd|rd|th)\s+level|$)'
+            level_match = re.search(level_pattern, spell_content_text, re.I | re.DOTALL)
+            if level_match:
+                spells_text = level_match.group(1).strip()
+                spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
+                if spells:
+                    spell_lists[f'level{level}'] = spells
+        
+        # At will spells (alternative format)
+        at_will_match = re.search(r'At[\s-]?will:\s*([^\n]+?)(?=\d+/day|$)', spell_content_text, re.I)
+        if at_will_match and 'cantrips' not in spell_lists:
+            spells_text = at_will_match.group(1).strip()
+            spells = [s.strip() for s in re.split(r',\s*(?![^()]*\))', spells_text) if s.strip()]
+            if spells:
+                spell_lists['atWill'] = spells
+        
+        # X/day each spells
+        for match in re.finditer(r'(\d+)/day(?:\s+each)?:\s*([^\n]+)', spell_content_text, re.I):
+            uses = match.group(1)
+            spells = [s.strip() for s in match.group(2).split(',')]
+            spell_lists[f'{uses}PerDay'] = spells
+        
+        if spell_lists:
+            spell_info['spells'] = spell_lists
+        
+        details['spellcasting'] = spell_info
+        spell_count = sum(len(spells) for spells in spell_info.get('spells', {}).values())
+        monster_log.debug("Found spellcasting from traits (%d spells)", spell_count)
+    
+    if special_actions:
+        details['specialActions'] = special_actions
+        monster_log.debug("Found %d special actions", len(special_actions))
+    
+    # Extract Bonus Actions
+    bonus_actions = []
+    
+    # Try 2024 format first
+    if stat_block_2024:
+        desc_blocks = stat_block_2024.find_all('div', class_='mon-stat-block-2024__description-block')
+        for block in desc_blocks:
+            heading = block.find('div', class_='mon-stat-block-2024__description-block-heading')
+            if heading and re.search(r'^Bonus\s+Actions?\s*$', heading.get_text(strip=True), re.I):
+                content_div = block.find('div', class_='mon-stat-block-2024__description-block-content')
                 if content_div:
                     action_paragraphs = content_div.find_all('p')
                     for p in action_paragraphs:
@@ -2320,168 +2692,451 @@ def get_monster_details(monster_url):
                                 next_elem = next_elem.find_next_sibling()
                             
                             bonus_actions.append({'name': name, 'description': description})
-        
-        if bonus_actions:
-            details['bonusActions'] = bonus_actions
-            print(f"  Found {len(bonus_actions)} Bonus Actions")
-        
-        # Extract Legendary Actions
-        legendary_actions = []
-        legendary_uses = None
-        
-        # Try both 2024 and 2014 formats
-        legendary_heading = soup.find('div', class_='mon-stat-block-2024__description-block-heading', string=re.compile(r'Legendary\s+Actions?', re.I))
-        if not legendary_heading:
-            legendary_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'Legendary\s+Actions?', re.I))
-        
-        if legendary_heading:
-            # Determine format based on which heading was found
-            is_2024 = 'mon-stat-block-2024' in str(legendary_heading.get('class'))
-            content_class = 'mon-stat-block-2024__description-block-content' if is_2024 else 'mon-stat-block__description-block-content'
-            
-            # Get the description paragraph (might be before the first action)
-            content_div = legendary_heading.find_next_sibling('div', class_=content_class)
+    else:
+        # Legacy 2014 format
+        bonus_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'^Bonus\s+Actions?\s*$', re.I))
+        if bonus_heading:
+            content_div = bonus_heading.find_next_sibling('div', class_='mon-stat-block__description-block-content')
             if content_div:
-                # First paragraph might contain uses information
-                first_p = content_div.find('p')
-                if first_p and not first_p.find('strong'):
-                    desc_text = normalize_text(first_p.get_text(strip=True))
-                    # Try to extract uses from description like "Legendary Action Uses: 3 (4 in Lair)"
-                    uses_match = re.search(r'Legendary\s+Action\s+Uses:\s*([^.]+)', desc_text, re.I)
-                    if uses_match:
-                        legendary_uses = uses_match.group(1).strip()
-                
-                # Find all action paragraphs
                 action_paragraphs = content_div.find_all('p')
                 for p in action_paragraphs:
                     strong = p.find('strong')
                     if strong:
                         name = normalize_text(strong.get_text(strip=True).rstrip('.'))
+                        # Fix spacing before parentheses
+                        name = re.sub(r'(\S)\(', r'\1 (', name)
                         description = normalize_text(p.get_text(strip=True))
                         if description.startswith(name):
                             description = description[len(name):].lstrip('. ')
                         
-                        # Try to parse as structured action
-                        parsed = parse_action(name, description)
-                        if parsed and not parsed.get('isDualMode'):
-                            # Successfully parsed into structured format
-                            legendary_actions.append(parsed)
-                        else:
-                            # Keep as description-only
-                            legendary_actions.append({'name': name, 'description': description})
-        
-        if legendary_actions:
-            legendary_data = {'actions': legendary_actions}
-            if legendary_uses:
-                legendary_data['uses'] = legendary_uses
-            details['legendaryActions'] = legendary_data
-            print(f"  Found {len(legendary_actions)} Legendary Actions{' (uses: ' + legendary_uses + ')' if legendary_uses else ''}")
-        
-        # Extract Reactions
-        reactions = []
-        reactions_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'^Reactions\s*$', re.I))
-        if reactions_heading:
-            content_div = reactions_heading.find_next_sibling('div', class_='mon-stat-block__description-block-content')
-            if content_div:
-                action_paragraphs = content_div.find_all('p')
-                for p in action_paragraphs:
-                    strong = p.find('strong')
-                    if strong:
-                        name = strong.get_text(strip=True).rstrip('.')
-                        description = p.get_text(strip=True)
-                        if description.startswith(name):
-                            description = description[len(name):].lstrip('. ')
-                        reactions.append({'name': name, 'description': description})
-        
-        if reactions:
-            details['reactions'] = reactions
-            print(f"  Found {len(reactions)} Reactions")
-        
-        # Extract avatar/image URL
-        avatar_url = None
-        # Try multiple selectors for monster images
-        avatar_selectors = [
-            'div.detail-content img',
-            'div.more-info-content img',
-            'div.monster-image img',
-            'img.monster-avatar',
-            'div.primary-content img',
-            'article img'
-        ]
-        
-        for selector in avatar_selectors:
-            img_elem = soup.select_one(selector)
-            if img_elem and img_elem.get('src'):
-                src = img_elem.get('src')
-                # Make sure it's a real image URL (not icons or UI elements)
-                if any(keyword in src.lower() for keyword in ['/avatars/', '/monsters/', 'monster', 'creature', '.jpg', '.jpeg', '.png', '.webp']):
-                    # Ensure it's an absolute URL
-                    if src.startswith('//'):
-                        avatar_url = 'https:' + src
-                    elif src.startswith('/'):
-                        avatar_url = 'https://www.dndbeyond.com' + src
-                    elif src.startswith('http'):
-                        avatar_url = src
+                        # Check for additional paragraphs (without strong) that belong to this action
+                        next_elem = p.find_next_sibling()
+                        while next_elem:
+                            if next_elem.name == 'p':
+                                # Check if it has a strong element (would be next action)
+                                if next_elem.find('strong'):
+                                    break
+                                # Otherwise, it's part of this action's description
+                                description += ' ' + normalize_text(next_elem.get_text(strip=True))
+                            else:
+                                # Some other element, stop
+                                break
+                            next_elem = next_elem.find_next_sibling()
+                        
+                        bonus_actions.append({'name': name, 'description': description})
+    
+    if bonus_actions:
+        details['bonusActions'] = bonus_actions
+        monster_log.debug("Found %d bonus actions", len(bonus_actions))
+    
+    # Extract Legendary Actions
+    legendary_actions = []
+    legendary_uses = None
+    
+    # Try both 2024 and 2014 formats
+    legendary_heading = soup.find('div', class_='mon-stat-block-2024__description-block-heading', string=re.compile(r'Legendary\s+Actions?', re.I))
+    if not legendary_heading:
+        legendary_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'Legendary\s+Actions?', re.I))
+    
+    if legendary_heading:
+        # Determine format based on which heading was found
+        is_2024 = 'mon-stat-block-2024' in str(legendary_heading.get('class'))
+        content_class = 'mon-stat-block-2024__description-block-content' if is_2024 else 'mon-stat-block__description-block-content'
+        
+        # Get the description paragraph (might be before the first action)
+        content_div = legendary_heading.find_next_sibling('div', class_=content_class)
+        if content_div:
+            # First paragraph might contain uses information
+            first_p = content_div.find('p')
+            if first_p and not first_p.find('strong'):
+                desc_text = normalize_text(first_p.get_text(strip=True))
+                # Try to extract uses from description like "Legendary Action Uses: 3 (4 in Lair)"
+                uses_match = re.search(r'Legendary\s+Action\s+Uses:\s*([^.]+)', desc_text, re.I)
+                if uses_match:
+                    legendary_uses = uses_match.group(1).strip()
+            
+            # Find all action paragraphs
+            action_paragraphs = content_div.find_all('p')
+            for p in action_paragraphs:
+                strong = p.find('strong')
+                if strong:
+                    name = normalize_text(strong.get_text(strip=True).rstrip('.'))
+                    description = normalize_text(p.get_text(strip=True))
+                    if description.startswith(name):
+                        description = description[len(name):].lstrip('. ')
                     
-                    if avatar_url:
-                        # Prefer larger resolution if available
-                        if '?' in avatar_url:
-                            # Remove query parameters that limit size
-                            avatar_url = avatar_url.split('?')[0]
-                        print(f"  Found avatar: {avatar_url}")
-                        break
-        
-        if avatar_url:
-            # Cache the avatar image locally (disabled for bulk processing)
-            # cached_avatar_url = cache_avatar_image(avatar_url)
-            # details['avatarUrl'] = cached_avatar_url if cached_avatar_url else avatar_url
-            details['avatarUrl'] = avatar_url
-        
-        if not details:
-            print("  WARNING: No stats found on page - selectors may need updating")
-            # Save a debug file
-            debug_file = CACHE_DIR / f"monster_debug_{monster_url.split('/')[-1]}.html"
-            with open(debug_file, 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            print(f"  Saved debug HTML to {debug_file}")
-        
-        # Log what was extracted
-        print(f"\n  EXTRACTED DATA:")
-        print(f"    Format Version: {details.get('formatVersion', 'NOT SET')}")
-        print(f"    AC: {details.get('ac', 'NOT FOUND')}")
-        print(f"    HP: {details.get('hp', 'NOT FOUND')}")
-        print(f"    Initiative: {details.get('init', 'NOT FOUND')}")
-        print(f"    Abilities: {'YES' if details.get('abilities') else 'NO'}")
-        print(f"    Skills: {len(details.get('skills', []))} found")
-        print(f"    Senses: {len(details.get('senses', []))} found")
-        print(f"    Actions: {len(details.get('actions', []))} found")
-        print(f"    Special Actions: {len(details.get('specialActions', []))} found")
-        print(f"    Is Legacy: {details.get('isLegacy', False)}")
-        
-        if not details.get('ac') and not details.get('hp'):
-            print(f"  ⚠️  WARNING: No core stats extracted - data may be incomplete")
-        else:
-            print(f"  ✓ Successfully extracted monster stats")
+                    # Try to parse as structured action
+                    parsed = parse_action(name, description)
+                    if parsed and not parsed.get('isDualMode'):
+                        # Successfully parsed into structured format
+                        legendary_actions.append(parsed)
+                    else:
+                        # Keep as description-only
+                        legendary_actions.append({'name': name, 'description': description})
+    
+    if legendary_actions:
+        legendary_data = {'actions': legendary_actions}
+        if legendary_uses:
+            legendary_data['uses'] = legendary_uses
+        details['legendaryActions'] = legendary_data
+        monster_log.debug("Found %d legendary actions (uses: %s)", len(legendary_actions), legendary_uses or '-')
+    
+    # Extract Reactions
+    reactions = []
+    reactions_heading = soup.find('div', class_='mon-stat-block__description-block-heading', string=re.compile(r'^Reactions\s*$', re.I))
+    if reactions_heading:
+        content_div = reactions_heading.find_next_sibling('div', class_='mon-stat-block__description-block-content')
+        if content_div:
+            action_paragraphs = content_div.find_all('p')
+            for p in action_paragraphs:
+                strong = p.find('strong')
+                if strong:
+                    name = strong.get_text(strip=True).rstrip('.')
+                    description = p.get_text(strip=True)
+                    if description.startswith(name):
+                        description = description[len(name):].lstrip('. ')
+                    reactions.append({'name': name, 'description': description})
+    
+    if reactions:
+        details['reactions'] = reactions
+        monster_log.debug("Found %d reactions", len(reactions))
+    
+    # Extract avatar/image URL
+    avatar_url = None
+    # Try multiple selectors for monster images
+    avatar_selectors = [
+        'div.detail-content img',
+        'div.more-info-content img',
+        'div.monster-image img',
+        'img.monster-avatar',
+        'div.primary-content img',
+        'article img'
+    ]
+    
+    for selector in avatar_selectors:
+        img_elem = soup.select_one(selector)
+        if img_elem and img_elem.get('src'):
+            src = img_elem.get('src')
+            # Make sure it's a real image URL (not icons or UI elements)
+            if any(keyword in src.lower() for keyword in ['/avatars/', '/monsters/', 'monster', 'creature', '.jpg', '.jpeg', '.png', '.webp']):
+                # Ensure it's an absolute URL
+                if src.startswith('//'):
+                    avatar_url = 'https:' + src
+                elif src.startswith('/'):
+                    avatar_url = 'https://www.dndbeyond.com' + src
+                elif src.startswith('http'):
+                    avatar_url = src
+                
+                if avatar_url:
+                    # Prefer larger resolution if available
+                    if '?' in avatar_url:
+                        # Remove query parameters that limit size
+                        avatar_url = avatar_url.split('?')[0]
+                    monster_log.debug("Found avatar: %s", avatar_url)
+                    break
+    
+    if avatar_url:
+        # Cache the avatar image locally (disabled for bulk processing)
+        # cached_avatar_url = cache_avatar_image(avatar_url)
+        # details['avatarUrl'] = cached_avatar_url if cached_avatar_url else avatar_url
+        details['avatarUrl'] = avatar_url
+    
+    if not details:
+        monster_log.warning("No stats found on %s - selectors may need updating", monster_url)
+        save_debug_html(f"monster_debug_{monster_url.split('/')[-1]}.html", html)
+    
+    # Log what was extracted
+    if not details.get('ac') and not details.get('hp'):
+        monster_log.warning("No core stats extracted from %s - data may be incomplete", monster_url)
+    elif monster_log.isEnabledFor(logging.DEBUG):
+        monster_log.debug("Extracted %s: AC %s, HP %s, %d skills, %d senses, %d actions, %d special actions",
+                          monster_url, details.get('ac'), details.get('hp'), len(details.get('skills', [])),
+                          len(details.get('senses', [])), len(details.get('actions', [])),
+                          len(details.get('specialActions', [])),
+                          extra={'format_version': details.get('formatVersion'), 'legacy': details.get('isLegacy', False)})
+    
+    # Cache the details with timestamp in individual file
+    cache_data = {
+        'url': monster_url,
+        'data': details,
+        'timestamp': time.time()
+    }
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache_data, f, indent=2)
+    
+    record_monster_access(cache_file, True)
+    monster_log.debug("Cached to %s", cache_file)
+    
+    return {'success': True, 'details': details, 'cached': False}
+
+def _job_monster_list(ctx):
+    """Scrape the full D&D Beyond monster listing, checkpointing after every page."""
+    import requests
+    if not DNDBEYOND_COOKIES:
+        raise RuntimeError('No authentication cookies available')
+    
+    checkpoint = ctx.checkpoint
+    all_monsters = checkpoint.setdefault('monsters', {})
+    while checkpoint.get('page', 1) <= MONSTER_LIST_MAX_PAGES:
+        page = checkpoint.get('page', 1)
+        ctx.throttle()
+        monster_log.debug("Scraping page %d", page)
+        response = upstream_get(requests.get, f'{DNDBEYOND_BASE_URL}/monsters', params=dict(MONSTER_LIST_PARAMS, page=page),
+                                headers=MONSTER_LIST_HEADERS, cookies=DNDBEYOND_COOKIES, timeout=15)
+        if response.status_code != 200:
+            monster_log.warning("Page %d returned status %s", page, response.status_code)
+            break
         
-        # Cache the details with timestamp in individual file
-        cache_data = {
-            'url': monster_url,
-            'data': details,
-            'timestamp': time.time()
+        with ctx.lock:
+            found = parse_monster_list_page(response.text, all_monsters, page)
+            checkpoint['emptyPages'] = 0 if found else checkpoint.get('emptyPages', 0) + 1
+            checkpoint['page'] = page + 1
+        ctx.advance()
+        if checkpoint['emptyPages'] >= 3:  # Stop after 3 empty pages
+            break
+    
+    if not all_monsters:
+        raise RuntimeError('No monsters found on page')
+    save_monster_list(all_monsters)
+    return {'count': len(all_monsters), 'pages': checkpoint['page'] - 1}
+
+def _job_monster_details(ctx):
+    """Fetch and cache details for every monster in the library (or params.names)."""
+    with open(MONSTERS_CACHE, 'r', encoding='utf-8') as f:
+        all_monsters = json.load(f)
+    names = ctx.params.get('names')
+    items = [(name, data['url']) for name, data in all_monsters.items()
+             if data.get('url') and (not names or name in names)]
+    
+    def fetch(item):
+        name, url = item
+        _, _, cache_file = resolve_monster_url(url)
+        if read_cache_entry(cache_file, MONSTER_CACHE_MAX_AGE)[0] is None:
+            ctx.throttle()
+        result = fetch_monster_details(url)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error', 'Unknown error'))
+    
+    ctx.map(items, key=lambda item: item[0], fn=fetch)
+    return {'monsters': len(items), 'failed': len(ctx.checkpoint['failed'])}
+
+def _job_check_urls(ctx):
+    """Probe D&D Beyond monster IDs (params.ids) for pages we can access."""
+    import requests
+    monster_ids = [str(monster_id) for monster_id in ctx.params.get('ids') or []]
+    if not monster_ids:
+        raise ValueError('params.ids must list the monster IDs to check')
+    
+    session = requests.Session()
+    for name, value in DNDBEYOND_COOKIES.items():
+        session.cookies.set(name, value)
+    
+    def probe(monster_id):
+        ctx.throttle()
+        url = f"{DNDBEYOND_BASE_URL}/monsters/{monster_id}"
+        response = upstream_get(session.get, url, headers=MONSTER_LIST_HEADERS, timeout=5, allow_redirects=True)
+        # A redirect to the marketplace means we don't have access
+        valid = (response.status_code == 200 and '/monsters/' in response.url
+                 and '/marketplace/' not in response.url)
+        return {
+            'status': response.status_code,
+            'finalUrl': response.url,
+            'slug': response.url.split('/monsters/')[-1].split('?')[0] if valid else None,
+            'valid': valid
         }
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=2)
-        
-        print(f"  💾 Cached to {cache_file}")
-        print(f"{'='*80}\n")
-        
-        return jsonify({'success': True, 'details': details, 'cached': False})
     
-    except Exception as e:
-        print(f"Error fetching monster details: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)})
+    ctx.map(monster_ids, key=str, fn=probe)
+    results = ctx.checkpoint['results']
+    return {'checked': len(results), 'valid': sum(1 for r in results.values() if r['valid'])}
+
+def _job_cache_avatars(ctx):
+    """Download avatar images referenced by cached monsters and characters."""
+    def remote_avatar(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        # Monster caches wrap the details in 'data'; character caches don't
+        avatar = (entry.get('data') or {}).get('avatarUrl') if 'data' in entry else entry.get('avatarUrl')
+        if avatar and not avatar.startswith('/cached/images/'):
+            return entry, avatar
+        return entry, None
+    
+    cache_files = sorted(MONSTER_DETAILS_DIR.glob('*.json')) + sorted((CACHE_DIR / "characters").glob('*.json'))
+    items = [path for path in cache_files if remote_avatar(path)[1]]
+    
+    def cache(cache_file):
+        entry, avatar = remote_avatar(cache_file)
+        if not avatar:
+            return
+        if not avatar_cache_path(avatar).exists():
+            ctx.throttle()
+        local_path = cache_avatar_image(avatar)
+        if not local_path or not local_path.startswith('/cached/images/'):
+            raise RuntimeError(f'Could not download {avatar}')
+        if 'data' in entry:
+            remember_monster_avatar(cache_file, entry, local_path)
+        else:
+            entry['avatarUrl'] = local_path
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, indent=2)
+    
+    ctx.map(items, key=lambda path: f"{path.parent.name}/{path.name}", fn=cache)
+    return {'avatars': len(items), 'failed': len(ctx.checkpoint['failed'])}
+
+def _job_music_variants(ctx):
+    """Encode low-bitrate copies of music tracks for slow connections (needs ffmpeg).
+
+    params: ``formats`` (default all of VARIANT_FORMATS) and ``bitrate`` in
+    kbps. Tracks already at or below that bitrate are skipped, as are
+    variants that are newer than their track.
+    """
+    encoder = find_encoder()
+    if encoder is None:
+        raise RuntimeError('ffmpeg was not found; install it to encode music variants')
+    formats = ctx.params.get('formats') or list(VARIANT_FORMATS)
+    unknown = [f for f in formats if f not in VARIANT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown variant formats: {', '.join(unknown)}")
+    bitrate = int(ctx.params.get('bitrate') or VARIANT_BITRATE)
+    variants_dir = CACHE_DIR / "music_variants"
+    
+    _, tracks, _ = get_music_library().snapshot(force=True)
+    items = [(track['path'], variant_format) for track in tracks for variant_format in formats
+             if track['bitrate'] is None or track['bitrate'] > bitrate]
+    
+    def encode(item):
+        track, variant_format = item
+        source = MUSIC_DIR / track
+        if current_variant(variants_dir, source, track, variant_format):
+            return
+        ctx.check_cancelled()
+        transcode(encoder, source, variant_path(variants_dir, track, variant_format), variant_format, bitrate)
+    
+    ctx.map(items, key=lambda item: f'{item[0]}:{item[1]}', fn=encode)
+    return {'variants': len(items), 'failed': len(ctx.checkpoint['failed'])}
+
+# Background job kinds: default and max workers. Request pacing comes from
+# UPSTREAM_LIMITER, so jobs run as fast as D&D Beyond tolerates; a job can
+# still cap itself lower with params.rate.
+JOB_KINDS = {
+    'monster-list': JobKind(_job_monster_list, concurrency=1,
+                            description='Scrape the full monster listing into the library'),
+    'monster-details': JobKind(_job_monster_details, concurrency=8, max_concurrency=15,
+                               description='Fetch and cache details for every monster in the library'),
+    'check-urls': JobKind(_job_check_urls, concurrency=10, max_concurrency=50,
+                          description='Check which monster IDs (params.ids) are accessible'),
+    'avatars': JobKind(_job_cache_avatars, concurrency=4, max_concurrency=8,
+                       description='Download avatar images for cached monsters and characters'),
+    'music-variants': JobKind(_job_music_variants, concurrency=2, max_concurrency=8,
+                              description='Encode low-bitrate Opus/MP3 copies of music tracks (needs ffmpeg)'),
+}
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """The JobManager for the current cache directory, created on first use."""
+    global _job_manager
+    jobs_dir = CACHE_DIR / "jobs"
+    with _job_manager_lock:
+        if _job_manager is None or _job_manager.jobs_dir != jobs_dir:
+            _job_manager = JobManager(jobs_dir, JOB_KINDS, profiles_dir=CACHE_DIR / "profiles",
+                                      limiter=UPSTREAM_LIMITER)
+        return _job_manager
+
+def shutdown_jobs(timeout=10.0):
+    """Checkpoint and stop running jobs so they can be resumed after a restart."""
+    if _job_manager is not None:
+        _job_manager.shutdown(timeout)
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List background jobs (newest first) and the kinds that can be started"""
+    kinds = {name: kind.description for name, kind in JOB_KINDS.items()}
+    return jsonify({'success': True, 'jobs': get_job_manager().list(), 'kinds': kinds})
+
+@app.route('/api/jobs', methods=['POST'])
+def start_job():
+    """Start a background job. Body: {"kind": "...", "params": {...}}
+
+    ``params.profile`` (or profiling this request, or ``--profile``) runs
+    the job under cProfile.
+    """
+    from flask import g
+    data = request.get_json(silent=True) or {}
+    params = dict(data.get('params') or {})
+    if 'profile_session' in g or app.config.get('PROFILE'):
+        params['profile'] = True
+    try:
+        job = get_job_manager().start(data.get('kind'), params)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except JobConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'job': job}), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and progress. ?checkpoint=true includes per-item results."""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    response = {'success': True, 'job': job}
+    if request.args.get('checkpoint', '').lower() in ('1', 'true', 'yes'):
+        response['checkpoint'] = manager.checkpoint(job_id)
+    return jsonify(response)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Stop a running job, keeping its checkpoint for a later resume"""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Restart a cancelled, interrupted or failed job from its checkpoint"""
+    try:
+        job = get_job_manager().resume(job_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except JobConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job}), 202
+
+@app.route('/api/upstream/limits', methods=['GET'])
+def get_upstream_limits():
+    """Current per-host upstream rate limits and their recent history"""
+    return jsonify({'success': True, 'settings': UPSTREAM_LIMITER.settings, 'hosts': UPSTREAM_LIMITER.stats(),
+                    'caps': UPSTREAM_LIMITER.caps()})
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request/job profiles, newest first"""
+    return jsonify({'success': True, 'profiles': profiling.list_profiles(CACHE_DIR / "profiles")})
+
+@app.route('/api/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """A profile's summary (text), or the raw pstats file with ?format=prof"""
+    from flask import send_from_directory
+    if not profiling.valid_name(name):
+        return jsonify({'success': False, 'error': 'Invalid profile name'}), 400
+    raw = request.args.get('format') == 'prof'
+    filename = f"{name}.prof" if raw else f"{name}.txt"
+    if not (CACHE_DIR / "profiles" / filename).exists():
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    return send_from_directory(CACHE_DIR / "profiles", filename, as_attachment=raw,
+                               mimetype='application/octet-stream' if raw else 'text/plain')
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request latencies, cache hit rates, upstream calls and save sizes (Prometheus text format)"""
+    response = app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+    response.cache_control.no_store = True
+    return response
 
 @app.route('/')
 def index():
@@ -2508,13 +3163,7 @@ def get_current_encounter():
     try:
         return _get_current_encounter_impl()
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"\n{'='*80}")
-        print(f"ERROR in /api/current-encounter:")
-        print(f"{'='*80}")
-        print(error_details)
-        print(f"{'='*80}\n")
+        adventure_log.exception("Error in /api/current-encounter")
         # Return error as JSON so spectator can see it
         return jsonify({
             'active': False,
@@ -2522,6 +3171,17 @@ def get_current_encounter():
             'error_type': type(e).__name__
         }), 200  # Return 200 so the JS can parse the JSON
 
+@app.route('/api/current-encounter/events')
+def get_current_encounter_events():
+    """Server-Sent Events naming each adventure as it changes, so the
+    spectator view refetches /api/current-encounter only when needed.
+    Carries no adventure contents - NO PIN REQUIRED."""
+    try:
+        subscription = ADVENTURE_EVENTS.subscribe()
+    except EventStreamsFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    return event_stream_response(subscription, [])
+
 def _get_current_encounter_impl():
     """Implementation of get_current_encounter with error handling wrapper"""
     
@@ -2556,16 +3216,17 @@ def _get_current_encounter_impl():
                 pass
         return None
     
-    # Find the most recently modified adventure file
-    adventure_files = list(DATA_DIR.glob("*.json"))
-    if not adventure_files:
+    # Find the most recently modified adventure (saves land in its journal)
+    journal = get_adventure_journal()
+    latest_adventure = journal.latest()
+    if latest_adventure is None:
         return jsonify({'active': False, 'message': 'No adventures found'})
     
-    # Get the most recently modified adventure
-    latest_adventure = max(adventure_files, key=lambda f: f.stat().st_mtime)
-    
-    with open(latest_adventure, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # The state kept since the last save or poll (restored into a copy below)
+    try:
+        data = journal.peek(latest_adventure)
+    except FileNotFoundError:
+        return jsonify({'active': False, 'message': 'No adventures found'})
     
     # Find active or most recent encounter
     active_encounter = None
@@ -2725,6 +3386,60 @@ def get_server_info():
         'port': request.environ.get('SERVER_PORT', '5000')
     })
 
+_adventure_journal = None
+_adventure_journal_lock = threading.Lock()
+
+def get_adventure_journal():
+    """The AdventureJournal for the current adventures directory, created on first use."""
+    global _adventure_journal
+    with _adventure_journal_lock:
+        if _adventure_journal is None or _adventure_journal.directory != DATA_DIR:
+            if _adventure_journal is not None:
+                _adventure_journal.stop(compact=False)
+            _adventure_journal = AdventureJournal(DATA_DIR)
+            if app.config.get('JOURNAL_COMPACT_INTERVAL'):
+                _adventure_journal.start(app.config['JOURNAL_COMPACT_INTERVAL'])
+        return _adventure_journal
+
+def shutdown_journal():
+    """Fold every adventure's journal into its snapshot before exiting."""
+    if _adventure_journal is not None:
+        _adventure_journal.stop()
+
+# Browsers watching adventures for changes (see events.py)
+ADVENTURE_EVENTS = AdventureEvents()
+
+def publish_adventure_change(name, revision, state, source=None):
+    """Tell the browsers watching an adventure that it is now ``state`` (in
+    storage form) at ``revision``. DM interfaces get the changes since the
+    previous revision when the last one published is still held; streams
+    opened under a PIN version that no longer matches are locked out."""
+    payload = {'revision': revision, 'base': revision - 1}
+    if source:
+        payload['source'] = source
+    if ADVENTURE_EVENTS.watched(name):
+        restored = event_state(state)
+        last = ADVENTURE_EVENTS.last_state(name)
+        if last is not None and last[0] == payload['base']:
+            payload['changes'] = diff(last[1], restored)
+        ADVENTURE_EVENTS.remember(name, revision, restored)
+    publish_adventure_event(name, 'change', payload, allowed=lambda verified: pin_accepts(state, verified))
+
+def publish_adventure_event(name, kind, payload, allowed=None):
+    metrics.LIVE_EVENTS.inc(ADVENTURE_EVENTS.publish(name, kind, payload, allowed), kind=kind)
+
+def event_state(state):
+    """A stored adventure as change events describe it: as the DM interface
+    loads it, without the PIN (which is never sent in an event)"""
+    restored = restore_adventure_from_storage(state)
+    restored.pop('pin', None)
+    return restored
+
+def read_adventure(name):
+    """An adventure's current state in storage form: its snapshot with the
+    journal replayed. Raises FileNotFoundError."""
+    return get_adventure_journal().load(name)
+
 @app.route('/api/adventures', methods=['GET'])
 def list_adventures():
     """List all adventure files"""
@@ -2734,13 +3449,11 @@ def list_adventures():
 @app.route('/api/adventure/<name>/verify-pin', methods=['POST'])
 def verify_adventure_pin(name):
     """Verify PIN for a protected adventure"""
-    filepath = DATA_DIR / f"{name}.json"
-    if not filepath.exists():
+    try:
+        data = read_adventure(name)
+    except FileNotFoundError:
         return jsonify({"error": "Adventure not found"}), 404
     
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-    
     adventure_pin = data.get('pin')
     if not adventure_pin:
         # No PIN required
@@ -2763,13 +3476,11 @@ def verify_adventure_pin(name):
 @app.route('/api/adventure/<name>/check-pin', methods=['GET'])
 def check_adventure_pin_status(name):
     """Check if an adventure requires PIN and if it's been verified"""
-    filepath = DATA_DIR / f"{name}.json"
-    if not filepath.exists():
+    try:
+        data = read_adventure(name)
+    except FileNotFoundError:
         return jsonify({"error": "Adventure not found"}), 404
     
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-    
     has_pin = 'pin' in data and data['pin']
     verified_adventures = session.get('verified_adventures', {})
     current_pin_version = data.get('pinVersion', 0)
@@ -2793,14 +3504,16 @@ def invalidate_adventure_sessions(name):
 
 @app.route('/api/adventure/<name>', methods=['GET'])
 def get_adventure(name):
-    """Load an adventure file"""
-    filepath = DATA_DIR / f"{name}.json"
-    if not filepath.exists():
+    """Load an adventure file.
+
+    The response carries the adventure's ``revision``; saves send it back so
+    edits from another tab or device aren't overwritten.
+    """
+    try:
+        data, revision = get_adventure_journal().read(name)
+    except FileNotFoundError:
         return jsonify({"error": "Adventure not found"}), 404
     
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-    
     # Check if this is a read-only request (e.g., for statistics page)
     readonly = request.args.get('readonly', 'false').lower() == 'true'
     
@@ -2820,7 +3533,7 @@ def get_adventure(name):
             }), 403
     
     # Restore full URLs after loading
-    data = restore_adventure_from_storage(data)
+    data = adventure_with_revision(data, revision)
     
     # For read-only requests, remove sensitive data like PIN
     if readonly:
@@ -2833,93 +3546,41 @@ def get_adventure(name):
     
     return jsonify(data)
 
+def _cached_monster_cr(monster_id):
+    """CR from a monster's details cache file (for monsters outside the library)"""
+    cache_file = MONSTER_DETAILS_DIR / f"{monster_id}.json"
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('data', {}).get('cr', '') or ''
+    except (OSError, ValueError):
+        return ''
+
+def get_difficulty_engine():
+    """Difficulty engine over the current monster index, rebuilt when the index is"""
+    global _difficulty_engine
+    index = get_monster_index()
+    with _monster_index_lock:
+        if _difficulty_engine is None or _difficulty_engine.index is not index:
+            _difficulty_engine = DifficultyEngine(index, fallback_cr=_cached_monster_cr)
+        return _difficulty_engine
+
 def calculate_default_encounter_cr(encounter):
-    """Calculate the default CR for an encounter based on its monsters"""
-    # CR to XP mapping
-    CR_TO_XP = {
-        '0': 10, '1/8': 25, '1/4': 50, '1/2': 100,
-        '1': 200, '2': 450, '3': 700, '4': 1100, '5': 1800,
-        '6': 2300, '7': 2900, '8': 3900, '9': 5000, '10': 5900,
-        '11': 7200, '12': 8400, '13': 10000, '14': 11500, '15': 13000,
-        '16': 15000, '17': 18000, '18': 20000, '19': 22000, '20': 25000,
-        '21': 33000, '22': 41000, '23': 50000, '24': 62000, '25': 75000,
-        '26': 90000, '27': 105000, '28': 120000, '29': 135000, '30': 155000
-    }
-    
-    XP_TO_CR = [
-        (10, '0'), (25, '1/8'), (50, '1/4'), (100, '1/2'),
-        (200, '1'), (450, '2'), (700, '3'), (1100, '4'), (1800, '5'),
-        (2300, '6'), (2900, '7'), (3900, '8'), (5000, '9'), (5900, '10'),
-        (7200, '11'), (8400, '12'), (10000, '13'), (11500, '14'), (13000, '15'),
-        (15000, '16'), (18000, '17'), (20000, '18'), (22000, '19'), (25000, '20'),
-        (33000, '21'), (41000, '22'), (50000, '23'), (62000, '24'), (75000, '25'),
-        (90000, '26'), (105000, '27'), (120000, '28'), (135000, '29'), (155000, '30')
-    ]
-    
-    combatants = encounter.get('combatants', [])
-    if not combatants:
-        return '0'
-    
-    # Filter to only monsters (not players)
-    # Players have numeric IDs, monsters have id with dashes or no id
-    monsters = []
-    for combatant in combatants:
-        combatant_id = combatant.get('id', '')
-        # If id is pure digits, it's a player, skip it
-        if combatant_id and combatant_id.isdigit():
-            continue
-        # Otherwise it's a monster
-        monsters.append(combatant)
-    
+    """The default CR a saved encounter's totalCR is compared against.
+
+    Only monsters' cached details (by D&D Beyond ID) are used, as adventures
+    have always been saved: a combatant's own ``cr`` is stripped on save and
+    names aren't looked up, so the same encounter gets the same default
+    before and after a reload, and files saved earlier keep their totalCR.
+    """
+    monsters = [c for c in encounter.get('combatants') or [] if not is_player(c)]
     if not monsters:
         return '0'
-    
-    # Calculate total base XP
-    total_xp = 0
+    base_xp = 0
     for combatant in monsters:
-        cr = ''
-        
-        # Try to get CR from monster cache if we have an ID
-        combatant_id = combatant.get('id', '')
-        if combatant_id and '-' in combatant_id:
-            cache_file = MONSTER_DETAILS_DIR / f"{combatant_id}.json"
-            if cache_file.exists():
-                try:
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        cached = json.load(f)
-                        cr = cached.get('data', {}).get('cr', '')
-                except Exception:
-                    pass
-        
-        # Get XP for this CR
-        xp = CR_TO_XP.get(cr, 0)
-        total_xp += xp
-    
-    # Apply multiplier based on number of monsters
-    monster_count = len(monsters)
-    if monster_count == 0:
-        multiplier = 1
-    elif monster_count == 1:
-        multiplier = 1
-    elif monster_count == 2:
-        multiplier = 1.5
-    elif 3 <= monster_count <= 6:
-        multiplier = 2
-    elif 7 <= monster_count <= 10:
-        multiplier = 2.5
-    elif 11 <= monster_count <= 14:
-        multiplier = 3
-    else:
-        multiplier = 4
-    
-    adjusted_xp = round(total_xp * multiplier)
-    
-    # Convert adjusted XP back to CR
-    for xp_threshold, cr_value in reversed(XP_TO_CR):
-        if adjusted_xp >= xp_threshold:
-            return cr_value
-    
-    return '0'
+        combatant_id = str(combatant.get('id') or '')
+        if '-' in combatant_id:
+            base_xp += xp_for_cr(_cached_monster_cr(combatant_id))
+    return cr_for_xp(round(base_xp * encounter_multiplier(len(monsters))))
 
 def clean_adventure_for_storage(data):
     """Remove CR fields, shorten URLs, strip empty values, and remove default HP/AC before saving"""
@@ -3270,46 +3931,297 @@ def restore_adventure_from_storage(data):
     
     return data
 
+adventure_statistics = AdventureStatistics(
+    restore_adventure_from_storage,
+    on_lookup=lambda hit: metrics.record_cache('adventure', 'hit' if hit else 'miss'))
+
+@app.route('/api/adventure/<name>/sync-characters', methods=['POST'])
+def sync_adventure_characters(name):
+    """Refresh every player of an adventure from D&D Beyond, several at a time.
+
+    Body (optional): ``{"force": true}`` to check characters that are still
+    fresh. Unchanged characters are confirmed with a conditional request or
+    a payload hash and aren't rebuilt.
+    """
+    try:
+        data = read_adventure(name)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Adventure not found"}), 404
+    
+    character_ids = [character_id_from_url(p['dndBeyondUrl'])
+                     for p in data.get('players', []) if p.get('dndBeyondUrl')]
+    force = bool((request.get_json(silent=True) or {}).get('force'))
+    return character_batch_response(character_ids, force)
+
+@app.route('/api/adventure/<name>/statistics', methods=['GET'])
+def get_adventure_statistics(name):
+    """Chart data for the statistics page (cached per adventure file version)"""
+    journal = get_adventure_journal()
+    try:
+        version = journal.version(name)
+        data = journal.load(name)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Adventure not found"}), 404
+    
+    # Without the PIN, only completed encounters are shown
+    completed_only = request.args.get('completed', 'false').lower() == 'true'
+    if data.get('pin'):
+        verified_adventures = session.get('verified_adventures', {})
+        current_pin_version = data.get('pinVersion', 0)
+        if name not in verified_adventures or verified_adventures.get(name) != current_pin_version:
+            completed_only = True
+    
+    stats = adventure_statistics.build(data, get_difficulty_engine(), completed_only=completed_only,
+                                       version=version)
+    return jsonify(stats)
+
+_analytics_store = None
+_analytics_lock = threading.Lock()
+
+def get_analytics_store():
+    """The cross-campaign analytics database (.cache/analytics.sqlite3)"""
+    global _analytics_store
+    path = CACHE_DIR / "analytics.sqlite3"
+    with _analytics_lock:
+        if _analytics_store is None or _analytics_store.path != str(path):
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _analytics_store = AnalyticsStore(path, restore_adventure_from_storage)
+        return _analytics_store
+
+def record_adventure_analytics(name, data):
+    """Feed a saved adventure's encounter outcomes into the analytics store"""
+    try:
+        get_analytics_store().record_adventure(name, data, get_difficulty_engine())
+    except Exception as e:
+        # Analytics must never make a save fail
+        adventure_log.warning("Error recording analytics for %s: %s", name, e)
+
+def _analytics_states():
+    """Encounter states to include: ``state=complete`` (default), ``played`` or a list"""
+    states = _list_arg('state') or ['complete']
+    if states == ['played']:
+        return PLAYED_STATES
+    return tuple(states)
+
+@app.route('/api/analytics/rounds-by-cr', methods=['GET'])
+def analytics_rounds_by_cr():
+    """Average rounds (and monsters) per encounter, grouped by encounter CR"""
+    return jsonify({'success': True, 'results': get_analytics_store().rounds_by_cr(_analytics_states())})
+
+@app.route('/api/analytics/monsters', methods=['GET'])
+def analytics_monsters():
+    """Appearances, kills and damage per monster across all campaigns"""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 1000)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    return jsonify({'success': True, 'results': get_analytics_store().monsters(_analytics_states(), limit)})
+
+@app.route('/api/analytics/players', methods=['GET'])
+def analytics_players():
+    """Initiative, damage and healing per player in each adventure"""
+    return jsonify({'success': True, 'results': get_analytics_store().players(_analytics_states())})
+
+@app.route('/api/analytics/adventures', methods=['GET'])
+def analytics_adventures():
+    """Encounters, rounds and XP per adventure"""
+    return jsonify({'success': True, 'results': get_analytics_store().adventures()})
+
+@app.route('/api/analytics/rebuild', methods=['POST'])
+def rebuild_analytics():
+    """Load every adventure file into the analytics store (for adventures not saved since it was added)"""
+    store = get_analytics_store()
+    engine = get_difficulty_engine()
+    updated = {}
+    for filepath in sorted(DATA_DIR.glob("*.json")):
+        try:
+            updated[filepath.stem] = store.record_adventure(filepath.stem, read_adventure(filepath.stem), engine)
+        except (OSError, ValueError) as e:
+            adventure_log.warning("Skipping %s in analytics rebuild: %s", filepath.name, e)
+    return jsonify({'success': True, 'adventures': len(updated), 'encountersUpdated': sum(updated.values())})
+
 @app.route('/api/adventure/<name>', methods=['POST'])
 def save_adventure(name):
-    """Save an adventure file (auto-save)"""
-    filepath = DATA_DIR / f"{name}.json"
+    """Save an adventure (auto-save).
+
+    Only the changes since the last save are written, as one entry in the
+    adventure's journal (see journal.py).
+    
+    The body's ``revision`` is the revision it was loaded (or last saved)
+    at. If another tab or device has saved since, the two are merged when
+    they changed different encounters, players or settings; the response
+    then has ``merged: true``, the merged ``adventure`` and the ``changes``
+    (journal operations) the merge made to what was sent. Overlapping
+    edits get a 409 with the current adventure. Saves without a revision
+    replace the adventure as before.
     
+    Browsers watching the adventure get the changes as an event (see
+    get_adventure_events()); an ``X-Client-Id`` header names the saving tab
+    in it, so that tab can skip its own changes.
+    """
     # Check if the adventure requires PIN and if this session is validated
-    if filepath.exists():
-        with open(filepath, 'r') as f:
-            existing_data = json.load(f)
-            adventure_pin = existing_data.get('pin')
-            
-            if adventure_pin:
-                # Verify this session has been validated with current PIN version
-                verified_adventures = session.get('verified_adventures', {})
-                current_pin_version = existing_data.get('pinVersion', 0)
-                
-                if name not in verified_adventures or verified_adventures.get(name) != current_pin_version:
-                    return jsonify({
-                        "error": "Unauthorized: PIN verification required",
-                        "requiresPin": True
-                    }), 403
+    try:
+        existing_data = get_adventure_journal().peek(name)
+    except FileNotFoundError:
+        existing_data = None
+    if existing_data and not adventure_pin_verified(name, existing_data):
+        return jsonify({
+            "error": "Unauthorized: PIN verification required",
+            "requiresPin": True
+        }), 403
     
     data = request.json
+    revision = data.pop('revision', None)
+    if revision is not None and (not isinstance(revision, int) or isinstance(revision, bool) or revision < 0):
+        return jsonify({"success": False, "error": "revision must be a non-negative integer"}), 400
     
     # Clean data before saving
     cleaned_data = clean_adventure_for_storage(data)
     
-    with open(filepath, 'w') as f:
-        json.dump(cleaned_data, f, indent=2)
+    journal = get_adventure_journal()
+    try:
+        saved = journal.save(name, cleaned_data, revision=revision)
+    except RevisionConflict as e:
+        metrics.SAVE_CONFLICTS.inc(result='conflict')
+        current, current_revision = journal.read(name)
+        return jsonify({
+            "success": False,
+            "error": "The adventure was changed in another tab or device",
+            "conflicts": e.conflicts,
+            "revision": current_revision,
+            "adventure": adventure_with_revision(current, current_revision)
+        }), 409
+    metrics.SAVE_BYTES.observe(saved.written)
     
-    return jsonify({"success": True})
+    response = {"success": True, "revision": saved.revision}
+    if saved.merged:
+        metrics.SAVE_CONFLICTS.inc(result='merged')
+        response['merged'] = True
+        response['adventure'] = adventure_with_revision(journal.peek(name), saved.revision)
+        # What the other saves added, for a tab that has been edited since sending
+        response['changes'] = diff(restore_adventure_from_storage(cleaned_data),
+                                   restore_adventure_from_storage(journal.peek(name)))
+    if saved.written:
+        stored = journal.peek(name)
+        record_adventure_analytics(name, stored)
+        publish_adventure_change(name, saved.revision, stored, request.headers.get('X-Client-Id', '')[:64])
+    
+    return jsonify(response)
+
+def adventure_with_revision(data, revision):
+    """A stored adventure as the DM interface loads it, with its revision"""
+    data = restore_adventure_from_storage(data)
+    data['revision'] = revision
+    return data
+
+def adventure_pin_verified(name, data):
+    """Whether this session may change the adventure (it has no PIN, or the
+    session verified the current one)"""
+    return pin_accepts(data, session.get('verified_adventures', {}).get(name))
+
+def pin_accepts(data, verified_version):
+    """Whether a session that verified ``verified_version`` of the
+    adventure's PIN (None: never) may see ``data``"""
+    if not data.get('pin'):
+        return True
+    return verified_version is not None and verified_version == data.get('pinVersion', 0)
+
+@app.route('/api/adventure/<name>/history', methods=['GET'])
+def get_adventure_history(name):
+    """Recorded saves, newest first: ``{seq, time, changes}`` (plus ``undo``
+    for entries that reverted an earlier one). ``?limit=`` (default 100).
+    With ``?at=<seq>``, returns the adventure as it was after that save
+    instead, for replaying a session."""
+    journal = get_adventure_journal()
+    try:
+        data = journal.load(name)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Adventure not found"}), 404
+    if not adventure_pin_verified(name, data):
+        return jsonify({"success": False, "error": "PIN required", "requiresPin": True}), 403
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 10000)
+        at = int(request.args['at']) if 'at' in request.args else None
+    except ValueError:
+        return jsonify({"success": False, "error": "limit and at must be integers"}), 400
+    
+    if at is not None:
+        try:
+            state = journal.state_at(name, at)
+        except UndoError as e:
+            return jsonify({"success": False, "error": str(e)}), 409
+        return jsonify({"success": True, "seq": at, "adventure": restore_adventure_from_storage(state)})
+    
+    entries = journal.entries(name)
+    return jsonify({"success": True, "total": len(entries), "entries": entries[::-1][:limit]})
+
+@app.route('/api/adventure/<name>/undo', methods=['POST'])
+def undo_adventure_save(name):
+    """Revert the latest save that hasn't been undone yet. The revert is
+    itself recorded in the journal. Returns the restored adventure."""
+    journal = get_adventure_journal()
+    try:
+        data = journal.load(name)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Adventure not found"}), 404
+    if not adventure_pin_verified(name, data):
+        return jsonify({"success": False, "error": "PIN required", "requiresPin": True}), 403
+    try:
+        state, undone, revision = journal.undo(name)
+    except UndoError as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    record_adventure_analytics(name, state)
+    publish_adventure_change(name, revision, state)
+    return jsonify({"success": True, "undone": undone, "revision": revision,
+                    "adventure": adventure_with_revision(state, revision)})
+
+def event_stream_response(subscription, initial):
+    """A Server-Sent Events response for ``subscription``"""
+    response = app.response_class(
+        subscription.stream(initial, lifetime=app.config['EVENT_STREAM_LIFETIME']),
+        mimetype='text/event-stream')
+    response.cache_control.no_store = True
+    # Don't let a reverse proxy hold events back
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/adventure/<name>/events', methods=['GET'])
+def get_adventure_events(name):
+    """Live changes to an adventure, as Server-Sent Events (see events.py).
+
+    Starts with a ``revision`` event giving the current revision; a client
+    that loaded an older one should reload. Then each save by another tab
+    or device arrives as a ``change`` event with the operations to apply.
+    When the PIN changes, a stream opened under the old one gets ``locked``
+    and ends.
+    503 when every stream slot is taken; poll instead.
+    """
+    journal = get_adventure_journal()
+    try:
+        data, revision = journal.read(name)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Adventure not found"}), 404
+    if not adventure_pin_verified(name, data):
+        return jsonify({"success": False, "error": "PIN required", "requiresPin": True}), 403
+    try:
+        subscription = ADVENTURE_EVENTS.subscribe(name, session.get('verified_adventures', {}).get(name))
+    except EventStreamsFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    last = ADVENTURE_EVENTS.last_state(name)
+    if last is None or last[0] != revision:
+        ADVENTURE_EVENTS.remember(name, revision, event_state(data))
+    return event_stream_response(subscription, [('revision', {'adventure': name, 'revision': revision})])
 
 @app.route('/api/adventure/<name>', methods=['DELETE'])
 def delete_adventure(name):
-    """Delete an adventure file"""
-    filepath = DATA_DIR / f"{name}.json"
-    if filepath.exists():
-        filepath.unlink()
-        return jsonify({"success": True})
-    return jsonify({"error": "Adventure not found"}), 404
+    """Delete an adventure file (with its journal and history)"""
+    try:
+        get_adventure_journal().delete(name)
+    except FileNotFoundError:
+        return jsonify({"error": "Adventure not found"}), 404
+    get_analytics_store().forget_adventure(name)
+    publish_adventure_event(name, 'deleted', {})
+    return jsonify({"success": True})
 
 @app.route('/api/adventure', methods=['POST'])
 def create_adventure():
@@ -3329,8 +4241,8 @@ def create_adventure():
         "encounters": []
     }
     
-    with open(filepath, 'w') as f:
-        json.dump(initial_data, f, indent=2)
+    get_adventure_journal().create(name, initial_data)
+    publish_adventure_event(name, 'change', {'revision': 0})
     
     return jsonify({"success": True})
 
@@ -3338,6 +4250,9 @@ if __name__ == '__main__':
     # Allow custom port via environment variable
     import os
     import sys
+    # Modules that ``import app`` (asgi.py) must get this running module,
+    # not a second copy without the configuration and runtime set up below
+    sys.modules.setdefault('app', sys.modules[__name__])
     import argparse
     import threading
     from werkzeug.serving import make_server
@@ -3348,12 +4263,63 @@ if __name__ == '__main__':
                         action='store_true',
                         dest='enable_upnp',
                         help='Enable UPnP port forwarding and dynamic DNS updates (off by default)')
+    parser.add_argument('--production',
+                        action='store_true',
+                        help='Serve from a bounded worker pool instead of one thread per connection')
+    parser.add_argument('--async', action='store_true', dest='async_mode',
+                        help='Serve with an asyncio event loop (ASGI, needs uvicorn and httpx) so slow D&D Beyond fetches don\'t hold threads')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='Worker threads shared by the HTTP and HTTPS listeners (production and async modes, default 16)')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help='Requests that may wait for a free worker before new ones get 503 (production mode, default 64)')
+    parser.add_argument('--keep-alive', type=float, default=5.0,
+                        help='Seconds an idle connection is held open waiting for a request (production mode, default 5)')
+    parser.add_argument('--shutdown-timeout', type=float, default=10.0,
+                        help='Seconds to let in-flight requests finish on shutdown (production mode, default 10)')
+    parser.add_argument('--upstream-rate', type=float, default=None,
+                        help='Starting D&D Beyond requests/second per host; adapts to 429s and slow responses (default 5)')
+    parser.add_argument('--upstream-url', default=None,
+                        help='Send D&D Beyond requests to this base URL instead, e.g. a local stand-in started with python -m benchmarks.fake_dndbeyond')
+    parser.add_argument('--snapshot-interval', type=float, default=60.0,
+                        help='Seconds between folding adventure save journals into their JSON snapshots (0: only at shutdown, default 60)')
+    parser.add_argument('--event-streams', type=int, default=8,
+                        help='Live change streams for DM pages that may be open at once; each holds a worker thread (default 8)')
+    parser.add_argument('--spectator-streams', type=int, default=4,
+                        help='Live change streams for spectator views that may be open at once, separate from --event-streams (default 4)')
+    parser.add_argument('--save-debug-html', action='store_true',
+                        help='Keep fetched D&D Beyond pages in .cache when parsing finds nothing (for debugging selectors)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile every request and background job into .cache/profiles (slow; see /api/profiles)')
+    parser.add_argument('--log-level', default='info', choices=['debug', 'info', 'warning', 'error'],
+                        help='Server log level; debug shows per-page and per-field scraping detail (default info)')
+    parser.add_argument('--log-format', default='text', choices=['text', 'json'],
+                        help='Log line format on stderr: text, or one JSON object per line (default text)')
     args = parser.parse_args()
+    if args.production and args.async_mode:
+        parser.error('--production and --async are mutually exclusive')
+    if (args.production or args.async_mode) and args.event_streams + args.spectator_streams >= args.workers:
+        parser.error('--event-streams plus --spectator-streams must be below --workers: '
+                     'each open stream holds a worker for its whole life')
+    
+    import logs
+    logs.configure(args.log_level, json_format=args.log_format == 'json')
     
     print("="*50)
     print("D&D Encounter Tracker Server")
     print("="*50)
     
+    # Do the one-time setup up front so its output lands in the startup log
+    # instead of in the middle of the first request.
+    config = {'SAVE_DEBUG_HTML': args.save_debug_html, 'PROFILE': args.profile,
+              'JOURNAL_COMPACT_INTERVAL': args.snapshot_interval, 'EVENT_STREAMS': args.event_streams,
+              'SPECTATOR_EVENT_STREAMS': args.spectator_streams}
+    if args.upstream_rate:
+        config['UPSTREAM_RATE_LIMIT'] = {'rate': args.upstream_rate}
+    if args.upstream_url:
+        config['UPSTREAM_URL'] = args.upstream_url
+    app = create_app(config)
+    init_runtime()
+    
     # Get local IP for display
     import socket
     try:
@@ -3387,7 +4353,9 @@ if __name__ == '__main__':
     
     if not https_enabled:
         print("ℹ️  No SSL certificate - HTTP only mode")
-    
+    if args.upstream_url:
+        print(f"ℹ️  D&D Beyond requests go to {args.upstream_url}")
+
     print()
     
     # Setup external access (DDNS + UPnP) - only if enabled via command line flag
@@ -3423,26 +4391,61 @@ if __name__ == '__main__':
     print("Starting servers...")
     print()
     
+    if args.async_mode:
+        # One event loop serves both listeners; upstream fetches are awaited
+        # and parsing runs on a small executor (see asgi.py).
+        try:
+            from asgi import serve
+            import uvicorn, httpx
+        except ImportError as e:
+            print(f"❌ Async mode needs uvicorn and httpx (pip install uvicorn httpx): {e}")
+            sys.exit(1)
+        listeners = [('HTTP', '0.0.0.0', 5000, None)]
+        if https_enabled:
+            listeners.append(('HTTPS', '0.0.0.0', 8443, ssl_context))
+        print(f"Async mode: {args.workers} executor threads")
+        print()
+        print("Press Ctrl+C to stop all servers")
+        print("="*50)
+        print()
+        serve(listeners, workers=args.workers)
+        ADVENTURE_EVENTS.close()
+        shutdown_jobs()
+        shutdown_journal()
+        print("Done!")
+        sys.exit(0)
+    
     servers = []
+    production_server = None
+    
+    if args.production:
+        from serving import ProductionServer
+        production_server = ProductionServer(app, workers=args.workers,
+                                             queue_size=args.queue_size,
+                                             keep_alive=args.keep_alive)
+        print(f"Production mode: {args.workers} workers, queue of {args.queue_size}, "
+              f"{args.keep_alive:g}s keep-alive")
+    
+    def start_server(name, port, ssl_context=None):
+        if production_server:
+            server = production_server.add_listener(name, '0.0.0.0', port, ssl_context=ssl_context)
+        else:
+            server = make_server('0.0.0.0', port, app, threaded=True, ssl_context=ssl_context)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+        servers.append((name, port, server))
+        print(f"✓ {name} server running on port {port}")
     
     # Start HTTP server on port 5000 (always available)
     try:
-        http_server = make_server('0.0.0.0', 5000, app, threaded=True)
-        http_thread = threading.Thread(target=http_server.serve_forever, daemon=True)
-        http_thread.start()
-        servers.append(('HTTP', 5000, http_server))
-        print(f"✓ HTTP server running on port 5000")
+        start_server('HTTP', 5000)
     except Exception as e:
         print(f"✗ Failed to start HTTP server: {e}")
     
     # Start HTTPS server on port 8443 if certificate available
     if https_enabled:
         try:
-            https_server = make_server('0.0.0.0', 8443, app, threaded=True, ssl_context=ssl_context)
-            https_thread = threading.Thread(target=https_server.serve_forever, daemon=True)
-            https_thread.start()
-            servers.append(('HTTPS', 8443, https_server))
-            print(f"✓ HTTPS server running on port 8443")
+            start_server('HTTPS', 8443, ssl_context=ssl_context)
         except Exception as e:
             print(f"✗ Failed to start HTTPS server: {e}")
     
@@ -3450,6 +4453,15 @@ if __name__ == '__main__':
         print("❌ No servers could be started!")
         sys.exit(1)
     
+    if production_server:
+        production_server.start()
+        # Service managers stop us with SIGTERM; treat it like Ctrl+C so
+        # in-flight requests get to finish.
+        import signal
+        def _raise_keyboard_interrupt(signum, frame):
+            raise KeyboardInterrupt
+        signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    
     print()
     print("Press Ctrl+C to stop all servers")
     print("="*50)
@@ -3462,8 +4474,19 @@ if __name__ == '__main__':
             time.sleep(1)
     except KeyboardInterrupt:
         print("\n\nStopping servers...")
-        for name, port, server in servers:
-            print(f"  Stopping {name} server on port {port}...")
-            server.shutdown()
+        # End live event streams so they don't hold up the shutdown
+        ADVENTURE_EVENTS.close()
+        if production_server:
+            print(f"  Waiting up to {args.shutdown_timeout:g}s for in-flight requests...")
+            if not production_server.shutdown(timeout=args.shutdown_timeout):
+                print("  ⚠️  Some requests were still running and were abandoned")
+        else:
+            for name, port, server in servers:
+                print(f"  Stopping {name} server on port {port}...")
+                server.shutdown()
+        # Running jobs are checkpointed and left resumable
+        shutdown_jobs()
+        # Fold unsaved journal entries into the adventure snapshots
+        shutdown_journal()
         print("Done!")
 
@@ -0,0 +1,460 @@
+"""Async (ASGI) serving mode for the encounter tracker.
+
+Every D&D Beyond call in the Flask views (monster pages, the monster
+listing, the character API, avatar downloads) holds a server thread for the
+whole upstream round trip - up to 15 seconds. ``AsyncApp`` serves the same
+routes from an event loop instead:
+
+- The upstream routes (``/api/dndbeyond/monsters`` when the library has to
+  be scraped, ``/api/dndbeyond/character/<url>`` and
+  ``/api/dndbeyond/monster/<url>``) have native async handlers. Network I/O goes through an async HTTP client
+  (httpx), so a slow fetch costs a coroutine rather than a thread. HTML/JSON
+  parsing and cache file I/O run on a small executor, reusing the same
+  helpers as the Flask views (``parse_monster_page``,
+  ``build_character_details``, ...), so both modes return identical payloads.
+- Every other route is passed to the Flask app, run on a separate executor
+  so it can't be starved by parsing work.
+
+Run it with ``python app.py --async`` (uses uvicorn) or point any ASGI
+server at ``asgi:application``. Requires ``httpx`` and ``uvicorn``; neither
+is needed to import this module.
+"""
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote
+
+from werkzeug.wrappers import Request
+
+import app as tracker
+import http_cache
+import metrics
+from logs import get_logger
+from ratelimit import THROTTLE_STATUSES
+
+server_log = get_logger('server')
+upstream_log = get_logger('upstream')
+monster_log = get_logger('monsters')
+character_log = get_logger('characters')
+
+# Connection pool size for upstream requests
+UPSTREAM_MAX_CONNECTIONS = 20
+
+_DONE = object()
+# Returned by a native handler to have the Flask app answer instead
+_USE_FLASK = object()
+
+# Route patterns of the native handlers, as the Flask views label them in /metrics
+NATIVE_ROUTES = {
+    'monster_list': '/api/dndbeyond/monsters',
+    'character_details': '/api/dndbeyond/character/<path:character_url>',
+    'monster_details': '/api/dndbeyond/monster/<path:monster_url>',
+}
+
+
+def _cookie_header(cookies):
+    return '; '.join(f'{name}={value}' for name, value in cookies.items())
+
+
+def build_environ(scope, body):
+    """Build a WSGI environ from an ASGI HTTP scope and the request body."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # PEP 3333: PATH_INFO carries the raw bytes decoded as latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # The body has already been read in full (chunked uploads included)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ.pop('HTTP_TRANSFER_ENCODING', None)
+    return environ
+
+
+class AsyncApp:
+    """ASGI application serving the tracker with async upstream I/O.
+
+    ``http_client`` is an httpx.AsyncClient-compatible object (``await
+    client.get(url, ...)``). One is created on first use if not given.
+    """
+
+    def __init__(self, flask_app=None, workers=8, http_client=None):
+        self.flask_app = flask_app or tracker.app
+        self.workers = workers
+        self.cpu_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi-cpu')
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi-wsgi')
+        self._client = http_client
+        self._owns_client = http_client is None
+        self._closed = False
+
+    # ASGI entry point
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        handler, arg = self._route(scope)
+        if handler is None:
+            await self._call_wsgi(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        if not tracker._runtime_initialized and self.flask_app.config.get('LAZY_INIT', True):
+            await self._cpu(tracker.init_runtime)
+        try:
+            payload = await handler(scope, arg)
+        except Exception as e:
+            server_log.exception("Error in async upstream handler: %s", e)
+            payload = {'success': False, 'error': str(e)}
+        if payload is _USE_FLASK:
+            await self._call_wsgi(scope, receive, send)
+            return
+        status = await self._send_json(scope, send, payload)
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - started, method=scope['method'],
+                                         route=NATIVE_ROUTES[handler.__name__], status=status)
+
+    def _route(self, scope):
+        """Return the native handler for a request, or (None, None) to use Flask."""
+        if scope['method'] not in ('GET', 'HEAD'):
+            return None, None
+        path = scope['path']
+        if path == '/api/dndbeyond/monsters':
+            return self.monster_list, None
+        prefix = '/api/dndbeyond/character/'
+        if path.startswith(prefix) and len(path) > len(prefix):
+            return self.character_details, path[len(prefix):]
+        prefix = '/api/dndbeyond/monster/'
+        if path.startswith(prefix) and len(path) > len(prefix):
+            rest = path[len(prefix):]
+            # /monster/search/<name> is a separate (cache-only) Flask route
+            if rest.startswith('search/') and '/' not in rest[len('search/'):]:
+                return None, None
+            return self.monster_details, rest
+        return None, None
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def aclose(self):
+        """Close the upstream client and executors. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+        self.cpu_executor.shutdown(wait=False)
+        self.wsgi_executor.shutdown(wait=False)
+
+    # Helpers
+
+    def client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=UPSTREAM_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    async def upstream_get(self, url, retries=2, **kwargs):
+        """Async counterpart of app.upstream_get(): paced by the shared UPSTREAM_LIMITER."""
+        limiter = tracker.UPSTREAM_LIMITER
+        url = tracker.upstream_url(url)
+        for attempt in range(retries + 1):
+            delay = limiter.reserve(url)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = time.monotonic()
+            try:
+                response = await self.client().get(url, **kwargs)
+            except Exception:
+                limiter.record(url, None, time.monotonic() - started)
+                metrics.record_upstream(url, None, time.monotonic() - started)
+                raise
+            elapsed = time.monotonic() - started
+            limiter.record(url, response.status_code, elapsed, response.headers.get('Retry-After'))
+            metrics.record_upstream(url, response.status_code, elapsed)
+            if response.status_code not in THROTTLE_STATUSES or attempt == retries:
+                return response
+            upstream_log.warning("HTTP %s from %s - backing off and retrying", response.status_code, url)
+        return response
+
+    async def _cpu(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_executor, fn, *args)
+
+    async def _send_json(self, scope, send, payload):
+        # Serialize exactly like jsonify() so both modes return the same bytes,
+        # with the same ETag/compression the Flask after_request hook adds
+        response = self.flask_app.json.response(payload)
+        response = http_cache.finalize_response(response, Request(build_environ(scope, b'')), self.flask_app)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                        for k, v in response.headers.to_wsgi_list()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+        return response.status_code
+
+    async def _call_wsgi(self, scope, receive, send):
+        """Run a request through the Flask app on the WSGI executor."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        environ = build_environ(scope, b''.join(chunks))
+
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+            return lambda data: started.setdefault('written', []).append(data)
+
+        iterable = await loop.run_in_executor(self.wsgi_executor, self.flask_app, environ, start_response)
+        try:
+            iterator = iter(iterable)
+            # Pull the body one chunk at a time so large files (music) stream
+            chunk = await loop.run_in_executor(self.wsgi_executor, next, iterator, _DONE)
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                            for k, v in started['headers']],
+            })
+            for data in started.pop('written', []):
+                await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+            while chunk is not _DONE:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.wsgi_executor, next, iterator, _DONE)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.wsgi_executor, close)
+
+    async def cache_avatar_image(self, avatar_url):
+        """Async counterpart of app.cache_avatar_image()."""
+        if not avatar_url:
+            return None
+        try:
+            cache_path = tracker.avatar_cache_path(avatar_url)
+            local_path = f"/cached/images/{cache_path.name}"
+            if cache_path.exists():
+                metrics.record_cache('avatar', 'hit')
+                return local_path
+            metrics.record_cache('avatar', 'miss')
+
+            upstream_log.debug("Downloading avatar: %s", avatar_url)
+            response = await self.upstream_get(avatar_url, timeout=10)
+            if response.status_code == 200:
+                await self._cpu(cache_path.write_bytes, response.content)
+                return local_path
+            upstream_log.warning("Failed to download avatar %s: HTTP %s", avatar_url, response.status_code)
+            return avatar_url
+        except Exception as e:
+            upstream_log.warning("Error caching avatar %s: %s", avatar_url, e)
+            return avatar_url
+
+    # Native upstream routes (same payloads as the Flask views)
+
+    async def monster_list(self, scope, _):
+        # Listing the cached library (filters, pages, ETag, gzip) is quick,
+        # so Flask serves it; only a scrape needs the async client
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        cache_only = query.get('cache_only', [''])[0].lower() in ('1', 'true', 'yes')
+        if cache_only or tracker.monster_list_cache_age() is not None:
+            return _USE_FLASK
+
+        cookies = tracker.DNDBEYOND_COOKIES
+        if not cookies:
+            monster_log.warning("No cookies available for scraping")
+            return {'success': False, 'error': 'No authentication cookies available'}
+
+        monster_log.info("Scraping monsters from D&D Beyond using %d cookies", len(cookies))
+        headers = dict(tracker.MONSTER_LIST_HEADERS, Cookie=_cookie_header(cookies))
+        all_monsters = {}
+        page = 1
+        consecutive_empty = 0
+        while page <= tracker.MONSTER_LIST_MAX_PAGES:
+            monster_log.debug("Scraping page %d", page)
+            response = await self.upstream_get(
+                f'{tracker.DNDBEYOND_BASE_URL}/monsters',
+                params=dict(tracker.MONSTER_LIST_PARAMS, page=page), headers=headers, timeout=15)
+            if response.status_code != 200:
+                monster_log.warning("Page %d returned status %s", page, response.status_code)
+                break
+
+            found = await self._cpu(tracker.parse_monster_list_page, response.text, all_monsters, page)
+            if not found:
+                consecutive_empty += 1
+                if consecutive_empty >= 3:
+                    monster_log.debug("3 consecutive empty pages, stopping")
+                    break
+            else:
+                consecutive_empty = 0
+
+            page += 1
+
+        monster_log.info("Scraped %d monsters total", len(all_monsters))
+        if not all_monsters:
+            return {'success': False, 'error': 'No monsters found on page'}
+        await self._cpu(tracker.save_monster_list, all_monsters)
+        return _USE_FLASK
+
+    async def character_details(self, scope, character_url):
+        character_id = tracker.character_id_from_url(unquote(character_url))
+
+        sync = await self._cpu(tracker.get_character_sync)
+        cached_data, cache_age = await self._cpu(sync.cached, character_id)
+        if cached_data is not None:
+            tracker.record_character_cache('fresh')
+            character_log.debug("Character %s: fresh (age: %.0fs)", character_id, cache_age)
+            avatar_url = cached_data.get('avatarUrl')
+            if avatar_url and not avatar_url.startswith('/cached/images/'):
+                cached_avatar = await self.cache_avatar_image(avatar_url)
+                if cached_avatar:
+                    cached_data['avatarUrl'] = cached_avatar
+            return cached_data
+
+        api_url = tracker.CHARACTER_API_URL.format(character_id=character_id)
+        character_log.debug("Calling D&D Beyond API: %s", api_url)
+        conditional = await self._cpu(sync.request_headers, character_id)
+        headers = dict(tracker.CHARACTER_API_HEADERS, Cookie=_cookie_header(tracker.DNDBEYOND_COOKIES), **conditional)
+        response = await self.upstream_get(api_url, params=tracker.CHARACTER_API_PARAMS, headers=headers, timeout=10)
+
+        character_details, status, record = await self._cpu(sync.apply_response, character_id, response)
+        tracker.record_character_cache(status)
+        if character_details is None:
+            return {'success': False, 'error': 'API returned unsuccessful response'}
+        if status == 'updated':
+            avatar_url = character_details['avatarUrl']
+            if avatar_url:
+                character_log.debug("Found character avatar: %s", avatar_url)
+                cached_avatar = await self.cache_avatar_image(avatar_url)
+                character_details['avatarUrl'] = cached_avatar if cached_avatar else avatar_url
+            await self._cpu(sync.save, character_id, character_details, record)
+        character_log.debug("Character %s (%s): %s", character_id, character_details['name'], status)
+        return character_details
+
+    async def monster_details(self, scope, monster_url):
+        monster_url, monster_id, cache_file = await self._cpu(tracker.resolve_monster_url, unquote(monster_url))
+
+        cached_data, cache_age = await self._cpu(tracker.read_cache_entry, cache_file, tracker.MONSTER_CACHE_MAX_AGE)
+        metrics.record_cache('monster', 'hit' if cached_data is not None else 'miss')
+        if cached_data is not None:
+            monster_log.debug("Returning cached details for %s (age: %.1f days)", monster_id, cache_age / 86400)
+            details = cached_data.get('data', {})
+            if details.get('avatarUrl') and not details['avatarUrl'].startswith('/cached/images/'):
+                cached_avatar = await self.cache_avatar_image(details['avatarUrl'])
+                await self._cpu(tracker.remember_monster_avatar, cache_file, cached_data, cached_avatar)
+            return {'success': True, 'details': details, 'cached': True}
+        elif cache_age is not None:
+            monster_log.debug("Cache expired for %s (age: %.1f days)", monster_id, cache_age / 86400)
+
+        cookies = dict(tracker.DNDBEYOND_COOKIES)
+        headers = dict(tracker.MONSTER_PAGE_HEADERS)
+        # Only ask for encodings the client can always decode
+        headers['Accept-Encoding'] = 'gzip, deflate'
+
+        # Visit homepage first to establish session (like a browser would)
+        try:
+            home = await self.upstream_get(f'{tracker.DNDBEYOND_BASE_URL}/',
+                                           headers=dict(headers, Cookie=_cookie_header(cookies)), timeout=10)
+            cookies.update(home.cookies)
+        except Exception as e:
+            monster_log.warning("Homepage visit failed: %s", e)
+
+        headers.update(tracker.MONSTER_PAGE_REFERER_HEADERS)
+        headers['Cookie'] = _cookie_header(cookies)
+        monster_log.info("Fetching %s", monster_url, extra={'monster_id': monster_id})
+        response = await self.upstream_get(monster_url, headers=headers, timeout=15)
+        if response.status_code != 200:
+            error_msg = f'HTTP {response.status_code}'
+            monster_log.warning("Fetching %s failed: %s", monster_url, error_msg)
+            return {'success': False, 'error': error_msg}
+
+        return await self._cpu(tracker.parse_monster_page, response.text, monster_url, cache_file)
+
+
+def create_asgi_app(flask_app=None, workers=8, http_client=None):
+    """Build the ASGI application (see ``AsyncApp``)."""
+    return AsyncApp(flask_app, workers=workers, http_client=http_client)
+
+
+def serve(listeners, workers=8):
+    """Serve the async app with uvicorn until interrupted.
+
+    ``listeners`` is a list of ``(name, host, port, ssl_context)`` where
+    ``ssl_context`` is None or a ``(cert_path, key_path)`` tuple, as used by
+    app.py for the HTTP and HTTPS ports.
+    """
+    import uvicorn
+
+    application = create_asgi_app(workers=workers)
+
+    async def main():
+        servers = []
+        for name, host, port, ssl_context in listeners:
+            certfile, keyfile = ssl_context or (None, None)
+            config = uvicorn.Config(application, host=host, port=port,
+                                    ssl_certfile=certfile, ssl_keyfile=keyfile,
+                                    lifespan='on', log_level='warning')
+            servers.append(uvicorn.Server(config))
+            print(f"  ✓ {name} server started on port {port} (async)")
+        await asyncio.gather(*(server.serve() for server in servers))
+
+    asyncio.run(main())
+
+
+_application = None
+
+
+def __getattr__(name):
+    """``application`` (for ``asgi:application``) is built on first use, not on import."""
+    global _application
+    if name == 'application':
+        if _application is None:
+            _application = create_asgi_app()
+        return _application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1 @@
+"""Offline benchmark suite; run with ``python -m benchmarks`` (see __main__.py)."""
@@ -0,0 +1,110 @@
+"""Run the benchmark suite.
+
+Usage:
+    # Run everything; results go to .cache/benchmarks/latest.json
+    python -m benchmarks
+
+    # Save this run as the baseline, then compare a later run against it
+    # (exits with status 1 if anything got more than --threshold slower)
+    python -m benchmarks --save-baseline
+    python -m benchmarks --compare
+
+    # Only the parser benchmarks, fewer rounds
+    python -m benchmarks -k parser --quick
+
+Everything runs offline from recorded fixtures; no D&D Beyond access or
+running server is needed.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from benchmarks import harness, suite
+
+RESULTS_DIR = suite.PROJECT_ROOT / '.cache' / 'benchmarks'
+QUICK_ROUNDS = 2
+
+
+def _print_result(name, summary):
+    line = (f"{name:<42} {harness.format_time(summary['per_op']):>10}/op "
+            f"{summary['ops_per_sec']:>12,.1f} ops/s  ±{summary['stdev'] / summary['median']:.0%}")
+    extra = summary.get('extra')
+    if extra and 'p95' in extra:
+        line += f"  p50 {harness.format_time(extra['p50'])}  p95 {harness.format_time(extra['p95'])}"
+    print(line, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite.')
+    parser.add_argument('-k', dest='filter', default=None,
+                        help='Only run benchmarks whose name contains this text')
+    parser.add_argument('--quick', action='store_true',
+                        help=f'Run {QUICK_ROUNDS} rounds per benchmark (for a smoke test, not for comparisons)')
+    parser.add_argument('--pollers', default='1,8,32',
+                        help='Concurrent spectator pollers to benchmark, comma separated (default: 1,8,32)')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='Requests per spectator poller (default: 20)')
+    parser.add_argument('--scale', type=int, default=4,
+                        help='Repeat the bundled adventure this many times for the large storage benchmarks (default: 4)')
+    parser.add_argument('--synthetic', default='50,200,500',
+                        help='Encounter counts of the generated adventures to save, load, spectate and chart, '
+                             'comma separated; empty to skip (default: 50,200,500)')
+    parser.add_argument('--output', type=Path, default=RESULTS_DIR / 'latest.json',
+                        help='Where to write the JSON results (default: .cache/benchmarks/latest.json)')
+    parser.add_argument('--save-baseline', nargs='?', type=Path, const=RESULTS_DIR / 'baseline.json',
+                        metavar='PATH', help='Also save the results as the baseline')
+    parser.add_argument('--compare', nargs='?', type=Path, const=RESULTS_DIR / 'baseline.json',
+                        metavar='PATH', help='Compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=harness.DEFAULT_THRESHOLD,
+                        help='Slowdown that counts as a regression (default: 0.20 = 20%%)')
+    parser.add_argument('--json', action='store_true', help='Print the results document to stdout')
+    args = parser.parse_args(argv)
+
+    pollers = [int(n) for n in args.pollers.split(',') if n.strip()]
+    synthetic = [int(n) for n in args.synthetic.split(',') if n.strip()]
+    benchmarks = suite.build(pollers=pollers, requests_per_poller=args.requests, scale=args.scale,
+                             synthetic=synthetic)
+    if args.filter:
+        benchmarks = [b for b in benchmarks if args.filter in b.name]
+    if not benchmarks:
+        parser.error(f'no benchmarks match {args.filter!r}')
+
+    baseline = None
+    if args.compare:
+        if not args.compare.exists():
+            parser.error(f'no baseline at {args.compare}; create one with --save-baseline')
+        baseline = harness.load_results(args.compare)
+
+    with suite.workspace():
+        results = harness.run(benchmarks, rounds=QUICK_ROUNDS if args.quick else None,
+                              progress=_print_result)
+
+    document = harness.write_results(args.output, results)
+    print(f'\nResults written to {args.output}', file=sys.stderr)
+    if args.save_baseline:
+        harness.write_results(args.save_baseline, results)
+        print(f'Baseline saved to {args.save_baseline}', file=sys.stderr)
+    if args.json:
+        print(json.dumps(document, indent=2))
+
+    if baseline is None:
+        return 0
+    rows = harness.compare(results, baseline, args.threshold)
+    print(f'\nCompared with {args.compare} (threshold {args.threshold:.0%}):', file=sys.stderr)
+    for name, before, after, ratio, status in rows:
+        change = f'{ratio - 1:+.1%}' if ratio is not None else ''
+        print(f'{name:<42} {harness.format_time(before):>10} -> {harness.format_time(after):>10} '
+              f'{change:>8}  {status}', file=sys.stderr)
+    regressions = [row[0] for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    import logs
+    # The throttled runs log every 429 and retry as a warning; keep the table readable
+    logs.configure('ERROR')
+    sys.exit(main())
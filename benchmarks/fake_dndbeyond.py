@@ -0,0 +1,325 @@
+"""A local stand-in for D&D Beyond, for load and regression testing offline.
+
+Serves recorded data on the paths the app fetches:
+
+- ``GET /``: the homepage visit before a monster page (sets a session cookie).
+- ``GET /monsters?page=N``: the monster listing, rendered from the bundled
+  library (``data/monsters.json``) in D&D Beyond's list markup, 20 per page.
+- ``GET /monsters/<id-slug>``: a recorded page from ``pages_dir`` if there
+  is one (``<id-slug>.html``), otherwise the recorded 2024 stat block
+  renamed for that monster. Library entries marked ``noAccess`` redirect to
+  the marketplace, as D&D Beyond does for unowned content.
+- ``GET /character/v5/character/<id>``: the character service.
+  ``pages_dir/character-<id>.json`` if recorded, otherwise a generated
+  character. Responses carry an ``ETag`` and answer ``If-None-Match`` with
+  ``304``.
+- ``GET /avatars/...``: a placeholder image.
+
+Faults are configurable and drawn from a seeded random generator, so a run
+can be repeated:
+
+- ``latency`` (+ up to ``jitter``) seconds before every response.
+- ``error_rate``: fraction of requests answered ``500``.
+- ``throttle_rate``: fraction answered ``429`` with ``Retry-After``.
+- ``rate_limit``: requests/second (burst of the same size) above which
+  requests get ``429`` with ``Retry-After``, like the real site under load.
+
+``GET /_stats`` returns request counts by route and status.
+
+Usage:
+    python -m benchmarks.fake_dndbeyond --port 8765 --latency 0.05 --rate-limit 10
+    python app.py --upstream-url http://127.0.0.1:8765
+"""
+import argparse
+import hashlib
+import html
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+MONSTER_LIBRARY = Path(__file__).resolve().parent.parent / 'data' / 'monsters.json'
+TEMPLATE_PAGE = 'adult-red-dragon.html'
+TEMPLATE_NAME = 'Adult Red Dragon'
+TEMPLATE_SLUG = '5194866-adult-red-dragon'
+PER_PAGE = 20
+
+# 1x1 transparent PNG
+AVATAR_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000001e221bc33000000'
+    '0049454e44ae426082')
+
+_CHARACTER_PATH = re.compile(r'^/character/v5/character/(\d+)$')
+
+
+class FakeDndBeyond:
+    """The stand-in server; ``start()`` runs it on a background thread."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 rate_limit=None, retry_after=1, seed=0, pages_dir=FIXTURES_DIR, monsters=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.pages_dir = Path(pages_dir)
+        if monsters is None:
+            with open(MONSTER_LIBRARY, 'r', encoding='utf-8') as f:
+                monsters = json.load(f)
+        self.monsters = sorted(monsters.items())
+        self._by_slug = {info['url'].rstrip('/').rsplit('/', 1)[-1]: (name, info)
+                         for name, info in self.monsters if info.get('url')}
+        template = self.pages_dir / TEMPLATE_PAGE
+        if not template.exists():
+            template = FIXTURES_DIR / TEMPLATE_PAGE
+        self._template = template.read_text(encoding='utf-8')
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(rate_limit or 0)
+        self._refilled = time.monotonic()
+        self._stats = {'requests': 0, 'routes': {}, 'statuses': {}}
+        self._server = None
+        self._thread = None
+
+    # --- lifecycle ---
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve in a background thread; returns the base URL (``--upstream-url``)."""
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-dndbeyond', daemon=True)
+        self._thread.start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        if self._server is None:
+            self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    # --- faults ---
+
+    def _fault(self, now):
+        """The status to fail this request with (429/500), or None."""
+        with self._lock:
+            if self.rate_limit:
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+                self._refilled = now
+                if self._tokens < 1:
+                    return 429
+                self._tokens -= 1
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                return 500
+            return None
+
+    def _delay(self):
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+    def _count(self, route, status):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['routes'][route] = self._stats['routes'].get(route, 0) + 1
+            key = str(status)
+            self._stats['statuses'][key] = self._stats['statuses'].get(key, 0) + 1
+
+    # --- content ---
+
+    def list_page(self, page):
+        start = (page - 1) * PER_PAGE
+        items = []
+        for name, info in self.monsters[start:start + PER_PAGE]:
+            slug = info.get('url', '').rstrip('/').rsplit('/', 1)[-1]
+            legacy = ' aria-describedby="legacy-badge"' if info.get('isLegacy') else ''
+            items.append(
+                f'<div class="info" data-slug="{html.escape(slug)}" data-type="monsters">'
+                f'<div class="monster-challenge"><span>{html.escape(str(info.get("cr", "0")))}</span></div>'
+                f'<div class="monster-name"><span class="name"><a class="link" href="/monsters/{html.escape(slug)}"{legacy}>'
+                f'{html.escape(name)}</a></span></div>'
+                f'<div class="monster-type"><span class="type">{html.escape(info.get("type", ""))}</span></div>'
+                f'<div class="monster-size"><span>{html.escape(info.get("size", ""))}</span></div>'
+                f'<div class="monster-alignment"><span>{html.escape(info.get("alignment", ""))}</span></div>'
+                '</div>')
+        return ('<!DOCTYPE html><html><head><title>Monsters - D&amp;D Beyond</title></head><body>'
+                f'<div class="listing-body">{"".join(items)}</div></body></html>')
+
+    def monster_page(self, slug):
+        """``(status, body, location)`` for a monster page."""
+        recorded = self.pages_dir / f'{slug}.html'
+        if re.match(r'^[\w-]+$', slug) and recorded.exists():
+            return 200, recorded.read_text(encoding='utf-8'), None
+        entry = self._by_slug.get(slug)
+        if entry is None:
+            return 404, '<html><head><title>Page Not Found</title></head><body></body></html>', None
+        name, info = entry
+        if info.get('noAccess'):
+            return 302, '', f'/marketplace?monster={slug}'
+        page = self._template.replace(TEMPLATE_SLUG, slug).replace(TEMPLATE_NAME, html.escape(name))
+        return 200, page, None
+
+    def character(self, character_id):
+        recorded = self.pages_dir / f'character-{character_id}.json'
+        if recorded.exists():
+            return recorded.read_text(encoding='utf-8')
+        seed = int(character_id)
+        payload = {'success': True, 'data': {
+            'id': seed,
+            'name': f'Adventurer {character_id}',
+            'stats': [{'id': i, 'value': 8 + (seed // 7 ** i) % 10} for i in range(1, 7)],
+            'classes': [{'definition': {'name': ('Fighter', 'Wizard', 'Rogue', 'Cleric')[seed % 4]},
+                         'level': 1 + seed % 20}],
+            'race': {'baseRaceName': ('Human', 'Elf', 'Dwarf', 'Halfling')[seed % 4],
+                     'weightSpeeds': {'normal': {'walk': 30}}},
+            'baseHitPoints': 10 + seed % 90,
+            'removedHitPoints': 0,
+            'decorations': {'avatarUrl': f'https://www.dndbeyond.com/avatars/{character_id}/avatar.png'},
+        }}
+        return json.dumps(payload)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, route, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.fake._count(route, status)
+
+    def do_GET(self):
+        fake = self.fake
+        parts = urlsplit(self.path)
+        path = parts.path
+        if path == '/_stats':
+            body = json.dumps(fake.stats())
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+            return
+
+        character = _CHARACTER_PATH.match(path)
+        if path == '/':
+            route = 'home'
+        elif path == '/monsters':
+            route = 'list'
+        elif path.startswith('/monsters/'):
+            route = 'monster'
+        elif character:
+            route = 'character'
+        elif path.startswith('/avatars/'):
+            route = 'avatar'
+        elif path.startswith('/marketplace'):
+            route = 'marketplace'
+        else:
+            route = 'other'
+
+        time.sleep(fake._delay())
+        fault = fake._fault(time.monotonic())
+        if fault == 429:
+            return self._send(route, 429, 'Too Many Requests', 'text/plain',
+                              {'Retry-After': str(fake.retry_after)})
+        if fault == 500:
+            return self._send(route, 500, 'Internal Server Error', 'text/plain')
+
+        if route == 'home':
+            return self._send(route, 200, '<html><head><title>D&amp;D Beyond</title></head><body></body></html>',
+                              headers={'Set-Cookie': 'fake-session=1; Path=/'})
+        if route == 'list':
+            try:
+                page = int(parse_qs(parts.query).get('page', ['1'])[0])
+            except ValueError:
+                page = 1
+            return self._send(route, 200, fake.list_page(max(page, 1)))
+        if route == 'monster':
+            status, body, location = fake.monster_page(path[len('/monsters/'):].rstrip('/'))
+            return self._send(route, status, body, headers={'Location': location} if location else None)
+        if route == 'marketplace':
+            return self._send(route, 200, '<html><head><title>Marketplace - D&amp;D Beyond</title></head><body></body></html>')
+        if route == 'character':
+            body = fake.character(character.group(1))
+            etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                return self._send(route, 304, b'', 'application/json', {'ETag': etag})
+            return self._send(route, 200, body, 'application/json', {'ETag': etag})
+        if route == 'avatar':
+            return self._send(route, 200, AVATAR_PNG, 'image/png')
+        return self._send(route, 404, 'Not Found', 'text/plain')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for D&D Beyond.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before every response (default 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered 429')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests/second above which requests are answered 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for latency jitter and faults')
+    parser.add_argument('--pages', type=Path, default=FIXTURES_DIR,
+                        help='Directory of recorded <id-slug>.html pages and character-<id>.json files')
+    args = parser.parse_args(argv)
+
+    fake = FakeDndBeyond(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                         throttle_rate=args.throttle_rate, rate_limit=args.rate_limit,
+                         retry_after=args.retry_after, seed=args.seed, pages_dir=args.pages)
+    url = fake.start(args.host, args.port)
+    print(f'Fake D&D Beyond serving {len(fake.monsters)} monsters on {url}')
+    print(f'Point the app at it with: python app.py --upstream-url {url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Timing, result files and baseline comparison for the benchmark suite.
+
+A ``Benchmark`` has a ``setup()`` that returns the callable to time, so
+loading fixtures and building inputs stays out of the measurement. Each
+round calls it ``number`` times. A callable that does several operations
+per call (parses every action in a fixture, makes a burst of requests)
+reports how many as its batch size, and ``per_op`` is the median round
+time divided by ``number * batch``. ``per_op`` is what gets compared
+against a baseline.
+
+Result files are JSON::
+
+    {"meta": {"python": ..., "platform": ..., "commit": ..., "created": ...},
+     "results": {"parser.normalize_text": {"per_op": ..., "ops_per_sec": ...,
+                                          "min": ..., "median": ..., ...}}}
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+# A benchmark is reported as a regression when it is this much slower
+DEFAULT_THRESHOLD = 0.20
+
+
+class Benchmark:
+    """One named workload.
+
+    ``setup()`` returns the zero-argument callable to time, or
+    ``(callable, batch)`` when each call performs ``batch`` operations.
+
+    If the callable returns a dict, the one from the last round is kept as
+    ``extra`` in the results (latency percentiles, sizes, ...).
+    """
+
+    def __init__(self, name, setup, number=1, rounds=5):
+        self.name = name
+        self.setup = setup
+        self.number = number
+        self.rounds = rounds
+
+
+def measure(fn, number=1, rounds=5, warmup=1, batch=1):
+    """Time ``rounds`` rounds of ``number`` calls; returns the summary dict."""
+    extra = None
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            extra = fn()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    result = {
+        'number': number,
+        'rounds': rounds,
+        'min': min(timings),
+        'median': median,
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'batch': batch,
+        'per_op': median / (number * batch),
+        'ops_per_sec': number * batch / median if median else None,
+    }
+    if isinstance(extra, dict):
+        result['extra'] = extra
+    return result
+
+
+def run(benchmarks, rounds=None, progress=None):
+    """Run ``benchmarks``; returns ``{name: summary}``.
+
+    ``rounds`` overrides every benchmark's own round count (``--quick``).
+    ``progress(name, summary)`` is called after each one.
+    """
+    results = {}
+    for bench in benchmarks:
+        fn, batch = bench.setup(), 1
+        if isinstance(fn, tuple):
+            fn, batch = fn
+        results[bench.name] = measure(fn, bench.number, rounds or bench.rounds, batch=batch)
+        if progress:
+            progress(bench.name, results[bench.name])
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5, cwd=Path(__file__).parent).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path, results):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': _commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    return document
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare per-operation medians with a baseline's.
+
+    Returns one ``(name, baseline_per_op, per_op, ratio, status)`` row per
+    benchmark in ``results``; status is ``regression``, ``improvement``,
+    ``ok`` or ``new`` (not in the baseline).
+    """
+    rows = []
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if not before:
+            rows.append((name, None, summary['per_op'], None, 'new'))
+            continue
+        ratio = summary['per_op'] / before['per_op']
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, before['per_op'], summary['per_op'], ratio, status))
+    return rows
+
+
+def format_time(seconds):
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
@@ -0,0 +1,426 @@
+"""The benchmarks: parser, storage transforms, spectator endpoint, monster search.
+
+Everything runs offline against recorded data:
+
+- ``benchmarks/fixtures/*.html``: D&D Beyond monster pages, one per stat
+  block format (2024 and legacy 2014).
+- ``adventures/Tyranny of Dragons.zip``: the bundled campaign, optionally
+  repeated ``scale`` times to make a larger adventure.
+- ``data/monsters.json``: the bundled monster library.
+
+The app's data and cache directories point at a temporary workspace while
+the suite runs, with the monster cache warmed from the parsed fixtures.
+The ``upstream.*`` benchmarks fetch from a local stand-in for D&D Beyond
+(``fake_dndbeyond.py``) with simulated latency and rate limiting.
+"""
+import copy
+import itertools
+import json
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from benchmarks.fake_dndbeyond import FakeDndBeyond
+from benchmarks.harness import Benchmark
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+ADVENTURE_ARCHIVE = PROJECT_ROOT / 'adventures' / 'Tyranny of Dragons.zip'
+MONSTER_LIBRARY = PROJECT_ROOT / 'data' / 'monsters.json'
+
+# Recorded pages: fixture file -> the URL it was fetched from
+MONSTER_PAGES = {
+    'adult-red-dragon.html': 'https://www.dndbeyond.com/monsters/5194866-adult-red-dragon',
+    'goblin-boss.html': 'https://www.dndbeyond.com/monsters/16908-goblin-boss',
+}
+
+# Exact, prefix, word prefix, substring and misspelled lookups
+SEARCH_QUERIES = [
+    'Goblin', 'Adult Red Dragon', 'Beholder', 'Goblin Boss 2', 'gob', 'adult',
+    'red drag', 'lich', 'dragon', 'zombie', 'Owlbaer', 'Tarrasque', 'beholdr',
+    'yuan-ti', 'mind flayer', 'kobold', 'ancient', 'skeleton', 'giant spider', 'Dragn',
+]
+
+_PATHS = ('DATA_DIR', 'CACHE_DIR', 'COOKIES_CACHE', 'MONSTERS_CACHE',
+          'MONSTER_DETAILS_DIR', 'IMAGES_CACHE_DIR', 'MUSIC_DIR')
+
+# Closed when the workspace is; setups register servers and settings to undo here
+_cleanup = None
+
+
+@contextmanager
+def workspace():
+    """Point the app's data and cache directories at a temporary directory."""
+    global _cleanup
+    import app as flask_app
+
+    root = Path(tempfile.mkdtemp(prefix='dndenc-bench-'))
+    original = {name: getattr(flask_app, name) for name in _PATHS}
+    flask_app.DATA_DIR = root / 'adventures'
+    flask_app.CACHE_DIR = root / '.cache'
+    flask_app.COOKIES_CACHE = flask_app.CACHE_DIR / 'cookies.json'
+    flask_app.MONSTERS_CACHE = flask_app.CACHE_DIR / 'monsters.json'
+    flask_app.MONSTER_DETAILS_DIR = flask_app.CACHE_DIR / 'monsters'
+    flask_app.IMAGES_CACHE_DIR = flask_app.CACHE_DIR / 'images'
+    flask_app.MUSIC_DIR = root / 'music'
+    for directory in (flask_app.DATA_DIR, flask_app.MONSTER_DETAILS_DIR,
+                      flask_app.IMAGES_CACHE_DIR, flask_app.CACHE_DIR / 'characters', flask_app.MUSIC_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    try:
+        with ExitStack() as _cleanup:
+            yield root
+    finally:
+        _cleanup = None
+        for name, value in original.items():
+            setattr(flask_app, name, value)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def adventures_dir(label):
+    """Point DATA_DIR at an empty directory of its own.
+
+    The spectator view shows the most recently saved adventure, so each
+    benchmark that serves one gets a directory holding only its own.
+    """
+    import app as flask_app
+
+    directory = flask_app.CACHE_DIR.parent / 'adventures' / label
+    directory.mkdir(parents=True, exist_ok=True)
+    flask_app.DATA_DIR = directory
+    return directory
+
+
+def load_pages():
+    return {name: (FIXTURES_DIR / name).read_text(encoding='utf-8') for name in MONSTER_PAGES}
+
+
+def load_adventure(scale=1):
+    """The bundled campaign in storage form, its encounters repeated ``scale`` times."""
+    with zipfile.ZipFile(ADVENTURE_ARCHIVE) as archive:
+        name = next(n for n in archive.namelist() if n.endswith('.json'))
+        data = json.loads(archive.read(name))
+    encounters = data['encounters']
+    data['encounters'] = []
+    for copy_index in range(scale):
+        for encounter in encounters:
+            encounter = copy.deepcopy(encounter)
+            if copy_index:
+                encounter['name'] = f"{encounter.get('name', '')} ({copy_index + 1})"
+            data['encounters'].append(encounter)
+    return data
+
+
+def monster_ids(data):
+    ids = set()
+    for encounter in data.get('encounters', []):
+        for combatant in encounter.get('combatants', []):
+            combatant_id = str(combatant.get('id', ''))
+            if combatant_id and not combatant_id.isdigit():
+                ids.add(combatant_id)
+    return ids
+
+
+def warm_monster_cache(data):
+    """Give every monster in ``data`` a details cache entry, as on a server that has fetched them."""
+    import app as flask_app
+
+    html = load_pages()['adult-red-dragon.html']
+    template = flask_app.MONSTER_DETAILS_DIR / '_template.json'
+    flask_app.parse_monster_page(html, MONSTER_PAGES['adult-red-dragon.html'], template)
+    for monster_id in monster_ids(data):
+        shutil.copyfile(template, flask_app.MONSTER_DETAILS_DIR / f'{monster_id}.json')
+    template.unlink()
+
+
+def text_samples():
+    """(name, description) pairs from every stat block paragraph in the fixtures."""
+    from bs4 import BeautifulSoup
+
+    samples = []
+    for html in load_pages().values():
+        for paragraph in BeautifulSoup(html, 'html.parser').find_all('p'):
+            strong = paragraph.find('strong')
+            name = strong.get_text(strip=True).rstrip('.') if strong else ''
+            samples.append((name, paragraph.get_text(strip=True)))
+    return samples
+
+
+# --- parser ---
+
+def bench_normalize_text():
+    from app import normalize_text
+
+    texts = [text for pair in text_samples() for text in pair if text]
+
+    def run():
+        for text in texts:
+            normalize_text(text)
+    return run, len(texts)
+
+
+def bench_parse_action():
+    from app import normalize_text, parse_action
+
+    actions = []
+    for name, text in text_samples():
+        if name:
+            text = normalize_text(text)
+            actions.append((normalize_text(name), text[len(name):].lstrip('. ')))
+
+    def run():
+        for name, description in actions:
+            parse_action(name, description)
+    return run, len(actions)
+
+
+def bench_monster_page(fixture):
+    def setup():
+        import app as flask_app
+
+        html = load_pages()[fixture]
+        url = MONSTER_PAGES[fixture]
+        cache_file = flask_app.MONSTER_DETAILS_DIR / f"{url.rsplit('/', 1)[-1]}.json"
+
+        def run():
+            result = flask_app.parse_monster_page(html, url, cache_file)
+            if not result.get('success'):
+                raise RuntimeError(f'{fixture} no longer parses: {result.get("error")}')
+        return run
+    return setup
+
+
+# --- storage transforms ---
+
+def bench_clean_adventure(scale):
+    def setup():
+        import app as flask_app
+
+        stored = load_adventure(scale)
+        warm_monster_cache(stored)
+        restored = flask_app.restore_adventure_from_storage(stored)
+
+        def run():
+            flask_app.clean_adventure_for_storage(restored)
+            return {'encounters': len(restored['encounters'])}
+        return run
+    return setup
+
+
+def bench_restore_adventure(scale):
+    def setup():
+        import app as flask_app
+
+        stored = load_adventure(scale)
+        warm_monster_cache(stored)
+
+        def run():
+            flask_app.restore_adventure_from_storage(stored)
+            return {'encounters': len(stored['encounters'])}
+        return run
+    return setup
+
+
+# --- spectator endpoint ---
+
+def bench_current_encounter(pollers, requests_per_poller):
+    """``pollers`` threads each make ``requests_per_poller`` GETs, as phones at the table do."""
+    def setup():
+        import app as flask_app
+
+        data = load_adventure()
+        # The spectator view shows the started encounter; use the last one with combatants
+        encounter = [e for e in data['encounters'] if e.get('combatants')][-1]
+        encounter['state'] = 'started'
+        warm_monster_cache(data)
+        with open(adventures_dir(f'spectator-{pollers}') / 'Tyranny of Dragons.json', 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        flask_app.create_app({'LAZY_INIT': False})
+
+        def poll(latencies, errors, lock):
+            client = flask_app.app.test_client()
+            mine = []
+            failed = 0
+            for _ in range(requests_per_poller):
+                start = time.perf_counter()
+                response = client.get('/api/current-encounter')
+                mine.append(time.perf_counter() - start)
+                if response.status_code != 200 or not response.get_json().get('active'):
+                    failed += 1
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        def run():
+            latencies, errors, lock = [], [], threading.Lock()
+            threads = [threading.Thread(target=poll, args=(latencies, errors, lock)) for _ in range(pollers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if sum(errors):
+                raise RuntimeError(f'{sum(errors)} spectator requests failed')
+            cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            return {'pollers': pollers, 'requests': len(latencies),
+                    'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+        return run, pollers * requests_per_poller
+    return setup
+
+
+# --- synthetic large adventures ---
+
+def bench_synthetic(encounters, operation):
+    """Save, load, spectate or chart a generated adventure of ``encounters`` encounters."""
+    def setup():
+        import app as flask_app
+        from adventure_stats import AdventureStatistics
+        from benchmarks.synthetic import generate_adventure, write_adventure
+
+        name = f'Synthetic {encounters}'
+        adventure = generate_adventure(name, encounters=encounters)
+        path = write_adventure(adventure, adventures_dir(f'synthetic-{operation}-{encounters}') / f'{name}.json')
+        size = {'encounters': encounters, 'bytes': path.stat().st_size,
+                'combatants': sum(len(e['combatants']) for e in adventure['encounters'])}
+        flask_app.create_app({'LAZY_INIT': False})
+        client = flask_app.app.test_client()
+
+        def request(method, url, **kwargs):
+            response = client.open(url, method=method, **kwargs)
+            if response.status_code != 200:
+                raise RuntimeError(f'{method} {url}: HTTP {response.status_code}')
+            return size
+
+        if operation == 'save':
+            # Each save is one hit point change, as an autosave during play
+            target = next(e for e in adventure['encounters'] if e['state'] == 'started')['combatants'][0]
+            bodies = []
+            for hp in (target['maxHp'], target['maxHp'] - 1):
+                target['hp'] = hp
+                bodies.append(json.dumps(adventure))
+            saves = itertools.cycle(bodies)
+            return lambda: request('POST', f'/api/adventure/{name}', data=next(saves),
+                                   content_type='application/json')
+        if operation == 'load':
+            return lambda: request('GET', f'/api/adventure/{name}')
+        if operation == 'spectator':
+            return lambda: request('GET', '/api/current-encounter')
+        if operation == 'statistics':
+            return lambda: request('GET', f'/api/adventure/{name}/statistics')
+        # Statistics computed from scratch, as for the first view after a save
+        with open(path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        engine = flask_app.get_difficulty_engine()
+
+        def build():
+            AdventureStatistics(flask_app.restore_adventure_from_storage).build(stored, engine)
+            return size
+        return build
+    return setup
+
+
+# --- upstream fetches ---
+
+def bench_fetch_monsters(monsters=24, workers=6, latency=0.01, rate_limit=None):
+    """Fetch ``monsters`` uncached monster pages from the stand-in with ``workers`` threads.
+
+    With ``rate_limit`` the stand-in answers 429 above that many requests
+    per second, so the run includes the limiter's backoff and retries.
+    """
+    def setup():
+        import app as flask_app
+
+        fake = _cleanup.enter_context(FakeDndBeyond(latency=latency, rate_limit=rate_limit, retry_after=0))
+        urls = [info['url'] for _, info in fake.monsters[:monsters]]
+        limiter = flask_app.UPSTREAM_LIMITER
+        settings = dict(limiter.settings)
+        upstream = flask_app.app.config.get('UPSTREAM_URL')
+        _cleanup.callback(limiter.configure, **settings)
+        _cleanup.callback(flask_app.app.config.__setitem__, 'UPSTREAM_URL', upstream)
+        flask_app.app.config['UPSTREAM_URL'] = fake.url
+
+        def fetch(url):
+            return flask_app.fetch_monster_details(url).get('success', False)
+
+        def run():
+            for path in flask_app.MONSTER_DETAILS_DIR.glob('*.json'):
+                path.unlink()
+            limiter.configure(rate=50.0, burst=10, max_rate=200.0, cooldown=0.2)
+            before = fake.stats()['statuses']
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = sum(pool.map(fetch, urls))
+            if fetched != len(urls):
+                raise RuntimeError(f'only {fetched} of {len(urls)} monsters fetched')
+            statuses = fake.stats()['statuses']
+            return {'workers': workers,
+                    'requests': sum(statuses.values()) - sum(before.values()),
+                    'throttled': statuses.get('429', 0) - before.get('429', 0)}
+        return run, monsters
+    return setup
+
+
+# --- monster search ---
+
+def load_library():
+    with open(MONSTER_LIBRARY, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def bench_build_index():
+    from monster_search import MonsterIndex
+
+    monsters = load_library()
+    return lambda: MonsterIndex(monsters)
+
+
+def bench_search():
+    from monster_search import MonsterIndex
+
+    index = MonsterIndex(load_library())
+
+    def run():
+        for query in SEARCH_QUERIES:
+            index.search(query)
+    return run, len(SEARCH_QUERIES)
+
+
+def build(pollers=(1, 8, 32), requests_per_poller=20, scale=4, synthetic=(50, 200, 500)):
+    """The full suite.
+
+    ``scale`` sizes the large-adventure storage benchmarks; ``synthetic``
+    lists the encounter counts of the generated adventures to save, load,
+    spectate and chart (40 combatants and 20 players each).
+    """
+    benchmarks = [
+        Benchmark('parser.normalize_text', bench_normalize_text, number=20),
+        Benchmark('parser.parse_action', bench_parse_action, number=50),
+        Benchmark('parser.monster_page_2024', bench_monster_page('adult-red-dragon.html'), number=5),
+        Benchmark('parser.monster_page_2014', bench_monster_page('goblin-boss.html'), number=5),
+        Benchmark('storage.clean_adventure', bench_clean_adventure(1), number=3),
+        Benchmark('storage.restore_adventure', bench_restore_adventure(1), number=3),
+    ]
+    if scale > 1:
+        benchmarks += [
+            Benchmark(f'storage.clean_adventure_x{scale}', bench_clean_adventure(scale)),
+            Benchmark(f'storage.restore_adventure_x{scale}', bench_restore_adventure(scale)),
+        ]
+    benchmarks += [
+        Benchmark(f'spectator.current_encounter_{n}_pollers', bench_current_encounter(n, requests_per_poller))
+        for n in pollers
+    ]
+    for encounters in synthetic:
+        benchmarks += [
+            Benchmark(f'synthetic.{operation}_{encounters}', bench_synthetic(encounters, operation), rounds=3)
+            for operation in ('save', 'load', 'spectator', 'statistics', 'statistics_cold')
+        ]
+    benchmarks += [
+        Benchmark('upstream.fetch_monsters', bench_fetch_monsters(), rounds=3),
+        Benchmark('upstream.fetch_monsters_throttled', bench_fetch_monsters(rate_limit=40), rounds=3),
+        Benchmark('search.build_index', bench_build_index),
+        Benchmark('search.queries', bench_search, number=20),
+    ]
+    return benchmarks
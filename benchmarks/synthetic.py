@@ -0,0 +1,246 @@
+"""Synthetic large adventures for scale testing.
+
+``generate_adventure()`` builds an adventure the way the tracker's UI holds
+it (full D&D Beyond URLs, every combatant field), so saving it goes through
+the same ``clean_adventure_for_storage()`` a real save does. Monsters come
+from the bundled monster index, picked by CR for the party's level. The
+campaign is played in order: the first ``complete`` fraction of encounters
+are finished (damage, healing, conditions, rolled initiative), the next
+``started`` are in progress, and the rest are unstarted.
+
+Everything is drawn from a seeded generator, so the same arguments give the
+same adventure.
+
+Usage:
+    # Write "Synthetic Adventure.json" into adventures/
+    python -m benchmarks.synthetic --encounters 500 --combatants 40 --players 20
+
+    # Elsewhere, mostly unplayed
+    python -m benchmarks.synthetic --encounters 200 --complete 0.1 -o /tmp/big.json
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+
+MONSTER_LIBRARY = Path(__file__).resolve().parent.parent / 'data' / 'monsters.json'
+MONSTER_PREFIX = 'https://www.dndbeyond.com/monsters/'
+CHARACTER_PREFIX = 'https://www.dndbeyond.com/characters/'
+FIRST_CHARACTER_ID = 200000000
+ENCOUNTERS_PER_CHAPTER = 10
+
+CLASSES = ('Barbarian', 'Bard', 'Cleric', 'Druid', 'Fighter', 'Monk', 'Paladin',
+           'Ranger', 'Rogue', 'Sorcerer', 'Warlock', 'Wizard')
+RACES = ('Dragonborn', 'Dwarf', 'Elf', 'Gnome', 'Half-Orc', 'Halfling', 'Human', 'Tiefling', 'Tortle')
+CONDITIONS = ('Blinded', 'Charmed', 'Frightened', 'Grappled', 'Poisoned', 'Prone', 'Restrained', 'Stunned')
+PLACES = ('Keep', 'Road', 'Camp', 'Hatchery', 'Tower', 'Crypt', 'Marsh', 'Harbor', 'Mine', 'Temple',
+          'Bridge', 'Forest', 'Caves', 'Ruins', 'Village', 'Pass')
+WORDS = ('the', 'smoke', 'shadows', 'drift', 'across', 'broken', 'stone', 'while', 'distant', 'drums',
+         'echo', 'through', 'cold', 'air', 'and', 'something', 'moves', 'beyond', 'torchlight', 'a',
+         'narrow', 'ledge', 'overlooks', 'cavern', 'heaped', 'with', 'refuse', 'old', 'bones', 'glint')
+SKILLS = ('perception', 'insight', 'investigation', 'stealth', 'athletics', 'arcana')
+
+
+def load_library():
+    with open(MONSTER_LIBRARY, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _sentence(rng, words):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _paragraph(rng, sentences):
+    return ' '.join(_sentence(rng, rng.randint(8, 18)) for _ in range(sentences))
+
+
+def _modifier(score):
+    return (score - 10) // 2
+
+
+def _monster_stats(cr):
+    """Rough HP, AC and initiative bonus for a CR (the library only has CR)."""
+    return max(4, int(15 * cr + 7)), 11 + int(min(cr, 24) // 3), min(5, int(cr // 4))
+
+
+def _player(rng, index, level):
+    character_id = str(FIRST_CHARACTER_ID + index)
+    abilities = {name: rng.randint(8, 18) for name in ('str', 'dex', 'con', 'int', 'wis', 'cha')}
+    hit_points = level * (6 + _modifier(abilities['con'])) + 4
+    return {
+        'name': f'Hero {index + 1}',
+        'playerName': f'Player {index + 1}',
+        'dndBeyondUrl': CHARACTER_PREFIX + character_id,
+        'class': rng.choice(CLASSES),
+        'race': rng.choice(RACES),
+        'level': level,
+        'ac': rng.randint(12, 19),
+        'maxHp': max(hit_points, level + 4),
+        'speed': 30,
+        'initiativeBonus': _modifier(abilities['dex']),
+        'abilityScores': abilities,
+        'passivePerception': 10 + _modifier(abilities['wis']),
+        'passiveInsight': 10 + _modifier(abilities['wis']),
+        'passiveInvestigation': 10 + _modifier(abilities['int']),
+        'skillProficiencies': {skill: True for skill in rng.sample(SKILLS, 2)},
+        'notes': '',
+    }
+
+
+def _play(rng, combatant, state):
+    """Give a combatant the marks of a played (or playing) encounter."""
+    combatant['initiative'] = rng.randint(1, 20) + combatant.get('initiativeBonus', 0)
+    if state == 'unstarted':
+        return
+    share = 1.0 if state == 'complete' else rng.random()
+    damage = rng.randint(0, combatant['maxHp'] + 10)
+    combatant['dmg'] = int(rng.randint(0, 40) * share)
+    combatant['hp'] = max(combatant['maxHp'] - int(damage * share), 0)
+    if rng.random() < 0.2:
+        combatant['heal'] = rng.randint(1, 15)
+    if rng.random() < 0.15:
+        combatant['conditions'] = [rng.choice(CONDITIONS)]
+    if rng.random() < 0.1:
+        combatant['notes'] = _sentence(rng, 6)
+
+
+def generate_adventure(name='Synthetic Adventure', encounters=500, combatants=40, players=20,
+                       level=5, complete=0.6, started=1, seed=0, library=None):
+    """An adventure of ``encounters`` encounters, each with the whole party and
+    enough monsters to make ``combatants`` combatants (at least one monster).
+
+    ``complete`` is the fraction of encounters already played and
+    ``started`` how many after those are in progress.
+    """
+    from monster_search import MonsterIndex, cr_value
+
+    rng = random.Random(seed)
+    library = load_library() if library is None else library
+    index = MonsterIndex(library)
+    candidates = [n for n in index.select(max_cr=max(level + 2, 1)) if library[n].get('url')]
+    if not candidates:
+        raise ValueError('No monsters in the library to build encounters from')
+
+    party = [_player(rng, i, level) for i in range(players)]
+    chapters = [f'Chapter {i + 1}: The {PLACES[i % len(PLACES)]}'
+                for i in range(max(1, -(-encounters // ENCOUNTERS_PER_CHAPTER)))]
+    completed = int(encounters * complete)
+    identified = set()
+    encounter_list = []
+    for number in range(encounters):
+        if number < completed:
+            state = 'complete'
+        elif number < completed + started:
+            state = 'started'
+        else:
+            state = 'unstarted'
+        monster_count = max(1, combatants - players)
+        kinds = rng.sample(candidates, min(len(candidates), rng.randint(1, 4)))
+        roster = []
+        for slot in range(monster_count):
+            roster.append(kinds[slot % len(kinds)])
+        roster.sort(key=kinds.index)
+
+        encounter_combatants = []
+        for player in party:
+            combatant = {
+                'dndBeyondUrl': player['dndBeyondUrl'],
+                'name': player['name'],
+                'ac': player['ac'],
+                'maxHp': player['maxHp'],
+                'hp': player['maxHp'],
+                'initiativeBonus': player['initiativeBonus'],
+                'dmg': 0,
+                'heal': 0,
+                'notes': '',
+            }
+            _play(rng, combatant, state)
+            encounter_combatants.append(combatant)
+        counts = {kind: roster.count(kind) for kind in kinds}
+        seen = {}
+        for kind in roster:
+            info = library[kind]
+            seen[kind] = seen.get(kind, 0) + 1
+            hit_points, armor_class, init_bonus = _monster_stats(cr_value(info.get('cr')) or 0)
+            combatant = {
+                'name': f'{kind} {seen[kind]}' if counts[kind] > 1 else kind,
+                'dndBeyondUrl': info['url'],
+                'cr': info.get('cr'),
+                'ac': armor_class,
+                'maxHp': hit_points,
+                'hp': hit_points,
+                'initiativeBonus': init_bonus,
+                'dmg': 0,
+                'heal': 0,
+                'notes': '',
+            }
+            _play(rng, combatant, state)
+            encounter_combatants.append(combatant)
+            if state == 'complete':
+                identified.add(kind)
+        encounter_combatants.sort(key=lambda c: c.get('initiative', 0), reverse=True)
+
+        encounter = {
+            'name': f'{PLACES[number % len(PLACES)]} Encounter {number + 1}',
+            'chapter': chapters[number // ENCOUNTERS_PER_CHAPTER],
+            'state': state,
+            'currentRound': rng.randint(2, 8) if state == 'complete' else (rng.randint(1, 4) if state == 'started' else 1),
+            'currentTurn': rng.randrange(len(encounter_combatants)) if state == 'started' else 0,
+            'description': _paragraph(rng, rng.randint(3, 7)),
+            'descriptionCollapsed': state == 'complete',
+            'minimized': state == 'complete',
+            'treasure': f'Coins: {rng.randint(1, 200)} GP, {rng.randint(0, 99)} SP' if rng.random() < 0.5 else '',
+            'notes': '',
+            'combatants': encounter_combatants,
+        }
+        encounter_list.append(encounter)
+
+    return {
+        'name': name,
+        'chapters': chapters,
+        'chapterNotes': {chapter: _paragraph(rng, 3) for chapter in chapters},
+        'players': party,
+        'encounters': encounter_list,
+        'identifiedMonsters': sorted(identified),
+    }
+
+
+def write_adventure(data, path):
+    """Save ``data`` in storage form, as POST /api/adventure/<name> would."""
+    from app import clean_adventure_for_storage
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(clean_adventure_for_storage(data), f, indent=2)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a large synthetic adventure for scale testing.')
+    parser.add_argument('--name', default='Synthetic Adventure', help='Adventure name (default "Synthetic Adventure")')
+    parser.add_argument('--encounters', type=int, default=500, help='Encounters (default 500)')
+    parser.add_argument('--combatants', type=int, default=40,
+                        help='Combatants per encounter, the party included (default 40)')
+    parser.add_argument('--players', type=int, default=20, help='Party size (default 20)')
+    parser.add_argument('--level', type=int, default=5, help='Party level; picks monster CRs (default 5)')
+    parser.add_argument('--complete', type=float, default=0.6,
+                        help='Fraction of encounters already played (default 0.6)')
+    parser.add_argument('--started', type=int, default=1, help='Encounters in progress after those (default 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0)')
+    parser.add_argument('-o', '--output', type=Path, default=None,
+                        help='Where to write it (default adventures/<name>.json)')
+    args = parser.parse_args(argv)
+
+    data = generate_adventure(args.name, encounters=args.encounters, combatants=args.combatants,
+                              players=args.players, level=args.level, complete=args.complete,
+                              started=args.started, seed=args.seed)
+    import app as flask_app
+    path = write_adventure(data, args.output or flask_app.DATA_DIR / f'{args.name}.json')
+    print(f'Wrote {path} ({path.stat().st_size / 1024:,.0f} KB): {args.encounters} encounters, '
+          f'{sum(len(e["combatants"]) for e in data["encounters"]):,} combatants, {args.players} players')
+
+
+if __name__ == '__main__':
+    main()
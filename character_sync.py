@@ -0,0 +1,228 @@
+"""Character sync: conditional refresh of D&D Beyond characters.
+
+Each character has two cache files in ``.cache/characters``:
+
+- ``<id>.json``: the tracker's character payload (``build_character_details``
+  output), as served by ``/api/dndbeyond/character/<id>``. Its
+  ``timestamp`` says when the character was last confirmed current.
+- ``raw/<id>.json``: the character service's response, its hash, and the
+  ``ETag``/``Last-Modified`` it came with.
+
+Both files carry ``cacheVersion``. Files from another version (including
+the unversioned entries the old HTML-scraping endpoint wrote) are treated
+as missing, so a format change only costs a refetch.
+
+A stale character is refreshed with a conditional request. A ``304``, or a
+payload whose hash matches the stored one, only bumps the timestamp: nothing
+is rebuilt, and the avatar isn't downloaded again. Derived stats can be
+recomputed from the raw payload (``rebuild()``) without calling upstream.
+
+``iter_sync()``/``sync_many()`` refresh a whole party in parallel with
+bounded concurrency. Every upstream call still goes through the shared rate
+limiter.
+"""
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from logs import get_logger
+
+log = get_logger('characters')
+
+SYNC_CONCURRENCY = 4
+
+# Bump when the details or raw record format changes
+CACHE_VERSION = 2
+
+# Statuses returned alongside the character payload
+FRESH = 'fresh'                # Cache younger than max_age; upstream not asked
+NOT_MODIFIED = 'not-modified'  # Upstream answered 304
+UNCHANGED = 'unchanged'        # Upstream payload hashed the same as before
+UPDATED = 'updated'            # New payload; details rebuilt
+ERROR = 'error'
+
+
+def payload_hash(api_data):
+    return hashlib.sha256(json.dumps(api_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def _read_entry(path):
+    """A cache file of the current ``CACHE_VERSION``, or None."""
+    data = _read_json(path)
+    return data if isinstance(data, dict) and data.get('cacheVersion') == CACHE_VERSION else None
+
+
+def _write_entry(path, data):
+    data['cacheVersion'] = CACHE_VERSION
+    _write_json(path, data)
+
+
+class CharacterSync:
+    """Cached characters under ``cache_dir`` (``.cache/characters``).
+
+    ``build(api_data)`` turns a character service response into the tracker
+    payload (None if the service reported failure); entries older than
+    ``max_age`` seconds are refreshed.
+    """
+
+    def __init__(self, cache_dir, build, max_age):
+        self.cache_dir = Path(cache_dir)
+        self.build = build
+        self.max_age = max_age
+        (self.cache_dir / 'raw').mkdir(parents=True, exist_ok=True)
+
+    def details_path(self, character_id):
+        return self.cache_dir / f'{character_id}.json'
+
+    def raw_path(self, character_id):
+        return self.cache_dir / 'raw' / f'{character_id}.json'
+
+    def cached(self, character_id):
+        """``(details, age)``; details is None if missing or older than max_age."""
+        details = _read_entry(self.details_path(character_id))
+        if not details or 'timestamp' not in details:
+            return None, None
+        age = time.time() - details['timestamp']
+        return (details if age < self.max_age else None), age
+
+    def request_headers(self, character_id):
+        """Conditional request headers from the last response, if it had validators."""
+        record = _read_entry(self.raw_path(character_id)) or {}
+        headers = {}
+        if record.get('etag'):
+            headers['If-None-Match'] = record['etag']
+        if record.get('lastModified'):
+            headers['If-Modified-Since'] = record['lastModified']
+        return headers
+
+    def _touch(self, character_id):
+        """Mark the cached details current; returns them (None if there are none)."""
+        details = _read_entry(self.details_path(character_id))
+        if details is None:
+            details = self.rebuild(character_id)
+        if details is not None:
+            details['timestamp'] = time.time()
+            _write_entry(self.details_path(character_id), details)
+        return details
+
+    def apply_response(self, character_id, response):
+        """Process the character service's response.
+
+        Returns ``(details, status, record)``. For ``UPDATED`` the new details
+        still point at the remote avatar and nothing has been written yet:
+        pass them and ``record`` to ``save()`` once the avatar is cached.
+        """
+        if response.status_code == 304:
+            details = self._touch(character_id)
+            if details is not None:
+                return details, NOT_MODIFIED, None
+            raise RuntimeError(f'HTTP 304 for character {character_id} with nothing cached')
+        response.raise_for_status()
+        api_data = response.json()
+        digest = payload_hash(api_data)
+        previous = _read_entry(self.raw_path(character_id)) or {}
+        if previous.get('hash') == digest:
+            details = self._touch(character_id)
+            if details is not None:
+                return details, UNCHANGED, None
+
+        details = self.build(api_data)
+        if details is None:
+            return None, ERROR, None
+        record = {
+            'hash': digest,
+            'etag': response.headers.get('ETag'),
+            'lastModified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+            'payload': api_data,
+        }
+        return details, UPDATED, record
+
+    def save(self, character_id, details, record):
+        # Details first: a raw record must never vouch for details that weren't written
+        _write_entry(self.details_path(character_id), details)
+        _write_entry(self.raw_path(character_id), record)
+
+    def rebuild(self, character_id):
+        """Recompute a character's details from its stored raw payload (no upstream call)."""
+        record = _read_entry(self.raw_path(character_id))
+        if not record:
+            return None
+        details = self.build(record['payload'])
+        if details is not None:
+            previous = _read_json(self.details_path(character_id)) or {}
+            # Keep the locally cached avatar
+            if (previous.get('avatarUrl') or '').startswith('/cached/images/'):
+                details['avatarUrl'] = previous['avatarUrl']
+            _write_entry(self.details_path(character_id), details)
+        return details
+
+    def sync(self, character_id, fetch, finish=None, force=False):
+        """Bring one character up to date; returns ``(details, status)``.
+
+        ``fetch(character_id, headers)`` calls the character service with the
+        extra conditional ``headers``; ``finish(details)`` runs on newly built
+        details before they're saved (to cache the avatar).
+        """
+        if not force:
+            details, _ = self.cached(character_id)
+            if details is not None:
+                return details, FRESH
+        response = fetch(character_id, self.request_headers(character_id))
+        details, status, record = self.apply_response(character_id, response)
+        if status == UPDATED:
+            if finish is not None:
+                finish(details)
+            self.save(character_id, details, record)
+        return details, status
+
+    def iter_sync(self, character_ids, fetch, finish=None, force=False, concurrency=SYNC_CONCURRENCY):
+        """Sync several characters, at most ``concurrency`` at a time.
+
+        Yields ``(id, details, status)`` as each character is ready: fresh
+        cache entries first, then refreshed ones in completion order. A
+        failed character gets ``({'success': False, 'error': ...}, ERROR)``.
+        """
+        def one(character_id):
+            try:
+                details, status = self.sync(character_id, fetch, finish, force)
+                if details is None:
+                    return {'success': False, 'error': 'API returned unsuccessful response'}, ERROR
+                return details, status
+            except Exception as e:
+                log.warning("Error syncing character %s: %s", character_id, e)
+                return {'success': False, 'error': str(e)}, ERROR
+
+        stale = []
+        for character_id in dict.fromkeys(character_ids):
+            details = None if force else self.cached(character_id)[0]
+            if details is not None:
+                yield character_id, details, FRESH
+            else:
+                stale.append(character_id)
+        if not stale:
+            return
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(stale))) as pool:
+            futures = {pool.submit(one, character_id): character_id for character_id in stale}
+            for future in as_completed(futures):
+                yield (futures[future],) + future.result()
+
+    def sync_many(self, character_ids, fetch, finish=None, force=False, concurrency=SYNC_CONCURRENCY):
+        """``iter_sync()`` collected into ``{id: (details, status)}``."""
+        return {character_id: (details, status) for character_id, details, status
+                in self.iter_sync(character_ids, fetch, finish, force, concurrency)}
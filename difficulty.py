@@ -0,0 +1,231 @@
+"""Encounter XP, CR and difficulty.
+
+The tables are module constants, so nothing is rebuilt per call:
+
+- ``CR_TO_XP`` gives the XP of a monster of each CR.
+- An encounter's adjusted XP (2014 rules: base XP times a multiplier for
+  the number of monsters) maps back to an equivalent CR by bisecting
+  ``XP_STEPS``.
+- ``THRESHOLDS_2014`` (easy/medium/hard/deadly) and ``BUDGETS_2024``
+  (low/moderate/high) are per-character XP by level; a party's thresholds
+  are the sums over its members.
+
+``DifficultyEngine`` resolves each monster's CR from the in-memory monster
+index instead of per-monster cache files, and memoizes encounter results by
+their monster list. Build a new engine when the monster list changes.
+"""
+import bisect
+import re
+import threading
+
+from monster_search import normalize, strip_instance_number
+
+CR_TO_XP = {
+    '0': 10, '1/8': 25, '1/4': 50, '1/2': 100,
+    '1': 200, '2': 450, '3': 700, '4': 1100, '5': 1800,
+    '6': 2300, '7': 2900, '8': 3900, '9': 5000, '10': 5900,
+    '11': 7200, '12': 8400, '13': 10000, '14': 11500, '15': 13000,
+    '16': 15000, '17': 18000, '18': 20000, '19': 22000, '20': 25000,
+    '21': 33000, '22': 41000, '23': 50000, '24': 62000, '25': 75000,
+    '26': 90000, '27': 105000, '28': 120000, '29': 135000, '30': 155000,
+}
+
+# Ascending (xp, cr) pairs for mapping XP back to a CR
+XP_STEPS = sorted((xp, cr) for cr, xp in CR_TO_XP.items())
+_XP_VALUES = [xp for xp, _ in XP_STEPS]
+
+# 2014 encounter multipliers: (largest monster count, multiplier)
+MULTIPLIERS = [(1, 1), (2, 1.5), (6, 2), (10, 2.5), (14, 3), (None, 4)]
+# With fewer than 3 or more than 5 characters, the multiplier moves one step
+# up or down; these are the extra steps off either end of MULTIPLIERS
+SMALL_PARTY_MAX_MULTIPLIER = 5
+LARGE_PARTY_MIN_MULTIPLIER = 0.5
+
+# Per-character XP thresholds by level (Dungeon Master's Guide, 2014)
+DIFFICULTIES_2014 = ('easy', 'medium', 'hard', 'deadly')
+THRESHOLDS_2014 = {
+    1: (25, 50, 75, 100), 2: (50, 100, 150, 200), 3: (75, 150, 225, 400),
+    4: (125, 250, 375, 500), 5: (250, 500, 750, 1100), 6: (300, 600, 900, 1400),
+    7: (350, 750, 1100, 1700), 8: (450, 900, 1400, 2100), 9: (550, 1100, 1600, 2400),
+    10: (600, 1200, 1900, 2800), 11: (800, 1600, 2400, 3600), 12: (1000, 2000, 3000, 4500),
+    13: (1100, 2200, 3400, 5100), 14: (1250, 2500, 3800, 5700), 15: (1400, 2800, 4300, 6400),
+    16: (1600, 3200, 4800, 7200), 17: (2000, 3900, 5900, 8800), 18: (2100, 4200, 6300, 9500),
+    19: (2400, 4900, 7300, 10900), 20: (2800, 5700, 8500, 12700),
+}
+
+# Per-character XP budgets by level (Dungeon Master's Guide, 2024)
+DIFFICULTIES_2024 = ('low', 'moderate', 'high')
+BUDGETS_2024 = {
+    1: (50, 75, 100), 2: (100, 150, 200), 3: (150, 225, 400), 4: (250, 375, 500),
+    5: (500, 750, 1100), 6: (600, 1000, 1400), 7: (750, 1300, 1700), 8: (1000, 1700, 2100),
+    9: (1300, 2000, 2600), 10: (1600, 2300, 3100), 11: (1900, 2900, 4100), 12: (2200, 3700, 4700),
+    13: (2600, 4200, 5400), 14: (2900, 4900, 6200), 15: (3300, 5400, 7800), 16: (3800, 6100, 9800),
+    17: (4500, 7200, 11700), 18: (5000, 8700, 14200), 19: (5500, 10700, 17200), 20: (6400, 13200, 22000),
+}
+
+ENCOUNTER_CACHE_SIZE = 4096
+
+_LABEL_RE = re.compile(r'\s*\([^)]*\)\s*$')
+
+
+def xp_for_cr(cr):
+    return CR_TO_XP.get(str(cr).strip(), 0) if cr is not None else 0
+
+
+def cr_for_xp(xp):
+    """The highest CR whose XP is at most ``xp`` ('0' below 10 XP)."""
+    i = bisect.bisect_right(_XP_VALUES, xp)
+    return XP_STEPS[i - 1][1] if i else '0'
+
+
+def multiplier_index(monster_count):
+    for i, (limit, _) in enumerate(MULTIPLIERS):
+        if limit is None or monster_count <= limit:
+            return i
+
+
+def encounter_multiplier(monster_count, party_size=None):
+    """2014 XP multiplier for ``monster_count`` monsters, adjusted for party size if given."""
+    i = multiplier_index(max(monster_count, 1))
+    if party_size is not None and 0 < party_size < 3:
+        return MULTIPLIERS[i + 1][1] if i + 1 < len(MULTIPLIERS) else SMALL_PARTY_MAX_MULTIPLIER
+    if party_size is not None and party_size > 5:
+        return MULTIPLIERS[i - 1][1] if i > 0 else LARGE_PARTY_MIN_MULTIPLIER
+    return MULTIPLIERS[i][1]
+
+
+def _clamp_level(level):
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        level = 1
+    return min(max(level, 1), 20)
+
+
+def party_thresholds(levels):
+    """Summed 2014 thresholds and 2024 budgets for characters of ``levels``."""
+    levels = [_clamp_level(level) for level in levels]
+    return {
+        '2014': {name: sum(THRESHOLDS_2014[level][i] for level in levels)
+                 for i, name in enumerate(DIFFICULTIES_2014)},
+        '2024': {name: sum(BUDGETS_2024[level][i] for level in levels)
+                 for i, name in enumerate(DIFFICULTIES_2024)},
+    }
+
+
+def _rating(xp, thresholds, names, below):
+    rating = below
+    for name in names:
+        if xp >= thresholds[name]:
+            rating = name
+    return rating
+
+
+def is_player(combatant):
+    """Players are stored with a numeric character ID; monsters have a slug or no ID."""
+    combatant_id = str(combatant.get('id') or '')
+    return combatant_id.isdigit()
+
+
+def base_name(name):
+    """'Veteran (Disguised) 1' -> 'Veteran': drop trailing instance numbers and labels."""
+    previous = None
+    while name != previous:
+        previous = name
+        name = strip_instance_number(_LABEL_RE.sub('', name)).strip()
+    return name
+
+
+def monster_id(combatant):
+    """'16907-goblin' from a combatant's D&D Beyond ID or URL, or ''."""
+    url = str(combatant.get('dndBeyondUrl') or combatant.get('id') or '')
+    return url.rstrip('/').rsplit('/', 1)[-1] if '-' in url else ''
+
+
+class DifficultyEngine:
+    """Encounter CR and difficulty against a monster library (a ``MonsterIndex``)."""
+
+    def __init__(self, index=None, fallback_cr=None, cache_size=ENCOUNTER_CACHE_SIZE):
+        self.index = index
+        # fallback_cr(monster_id) -> CR for monsters outside the library
+        self.fallback_cr = fallback_cr
+        self.cache_size = cache_size
+        self._by_id = {}
+        self._by_key = {}
+        if index is not None:
+            for name in index.names:
+                entry = index.monsters[name]
+                cr = entry.get('cr')
+                url_id = monster_id({'id': entry.get('url')})
+                if url_id:
+                    self._by_id.setdefault(url_id, cr)
+                self._by_key.setdefault(normalize(name), cr)
+        self._encounters = {}
+        self._lock = threading.Lock()
+
+    def monster_cr(self, combatant):
+        """A combatant's CR: its own ``cr``, else by D&D Beyond ID, else by name."""
+        cr = combatant.get('cr')
+        if cr not in (None, ''):
+            return str(cr)
+        mid = monster_id(combatant)
+        if mid in self._by_id:
+            return self._by_id[mid]
+        name = combatant.get('name')
+        if name:
+            key = normalize(name)
+            if key not in self._by_key:
+                key = normalize(base_name(name))
+            if key in self._by_key:
+                return self._by_key[key]
+        if mid and self.fallback_cr is not None:
+            return self.fallback_cr(mid)
+        return ''
+
+    @staticmethod
+    def _encounter_key(monsters):
+        return tuple(sorted((str(m.get('cr') or ''), monster_id(m), str(m.get('name') or ''))
+                            for m in monsters))
+
+    def encounter_xp(self, encounter):
+        """(base XP, adjusted XP, monster count) for an encounter's monster combatants."""
+        monsters = [c for c in encounter.get('combatants') or [] if not is_player(c)]
+        key = self._encounter_key(monsters)
+        with self._lock:
+            cached = self._encounters.get(key)
+        if cached is not None:
+            return cached
+        crs = [self.monster_cr(m) for m in monsters]
+        base_xp = sum(xp_for_cr(cr) for cr in crs)
+        result = (base_xp, round(base_xp * encounter_multiplier(len(monsters))), len(monsters))
+        # Unknown monsters may resolve once their details are cached, so don't keep those
+        if '' not in crs:
+            with self._lock:
+                self._encounters[key] = result
+                while len(self._encounters) > self.cache_size:
+                    self._encounters.pop(next(iter(self._encounters)))
+        return result
+
+    def encounter_cr(self, encounter):
+        """The CR equivalent to the encounter's adjusted XP ('0' with no monsters)."""
+        base_xp, adjusted_xp, count = self.encounter_xp(encounter)
+        return cr_for_xp(adjusted_xp) if count else '0'
+
+    def rate_encounter(self, encounter, party_levels):
+        """XP, CR and 2014/2024 difficulty of an encounter for a party of ``party_levels``."""
+        base_xp, adjusted_xp, count = self.encounter_xp(encounter)
+        party_levels = list(party_levels)
+        thresholds = party_thresholds(party_levels)
+        # The 2014 rules shift the multiplier for small and large parties
+        party_xp = round(base_xp * encounter_multiplier(count, len(party_levels) or None))
+        return {
+            'xp': base_xp,
+            'adjustedXp': party_xp,
+            'cr': cr_for_xp(adjusted_xp) if count else '0',
+            'monsters': count,
+            'thresholds': thresholds,
+            'difficulty2014': _rating(party_xp, thresholds['2014'], DIFFICULTIES_2014, 'trivial')
+                              if count and party_levels else None,
+            'difficulty2024': _rating(base_xp, thresholds['2024'], DIFFICULTIES_2024, 'trivial')
+                              if count and party_levels else None,
+        }
@@ -0,0 +1,209 @@
+"""Live change events for open adventures, sent as Server-Sent Events.
+
+Without them a DM interface only learns about another tab's or device's
+saves when its own save comes back merged (or refused). ``AdventureEvents``
+fans each save out to every browser watching:
+
+- A DM interface subscribes to one adventure and gets its changes as a
+  ``change`` event: ``{adventure, revision, base, changes, source}``, where
+  ``changes`` are journal operations (see journal.py) that turn the
+  adventure at revision ``base`` into the one at ``revision``, in the form
+  the DM interface holds it. ``source`` is the client id of the tab that
+  saved, so it can skip its own changes. When the changes aren't known
+  (the server didn't hold the previous state) they are left out and the
+  client reloads the adventure instead.
+- The spectator view subscribes to every adventure and only gets
+  ``{adventure, revision}``: it shows what /api/current-encounter returns,
+  without a PIN, so adventure contents are never sent to it.
+- ``deleted`` is sent when an adventure is deleted, and ``reset`` replaces
+  the queued events of a client that fell too far behind (it reloads).
+- Each DM subscription keeps the ``access`` it was opened with (the PIN
+  version its session verified). A change the caller says that access no
+  longer allows, such as a new PIN, is not sent; the stream gets
+  ``locked`` instead and ends.
+
+Each stream holds a server thread for as long as it is open, so the number
+of streams is capped (``EventStreamsFull`` beyond it; clients fall back to
+polling) and streams end after a while, which browsers reconnect from
+automatically. DM and spectator streams have separate caps, so spectator
+phones can't take the slots DM interfaces need.
+"""
+import json
+import queue
+import threading
+import time
+
+# Seconds between keep-alive comments, which also notice closed connections
+HEARTBEAT_INTERVAL = 15.0
+# Milliseconds a browser waits before reconnecting a stream that ended
+RECONNECT_DELAY = 2000
+
+_CLOSED = object()
+
+
+class EventStreamsFull(Exception):
+    """Every event stream slot is taken."""
+
+
+def format_event(kind, data, event_id=None):
+    """One Server-Sent Event."""
+    lines = [f'event: {kind}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One client's queue of events for an adventure (or every adventure)."""
+
+    def __init__(self, events, name, backlog, access=None):
+        self.name = name
+        self.access = access
+        self._events = events
+        self._queue = queue.Queue(maxsize=backlog)
+
+    def put(self, kind, data):
+        try:
+            self._queue.put_nowait((kind, data))
+        except queue.Full:
+            # The client isn't keeping up; drop what's queued and have it reload
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait(('reset', {'adventure': data.get('adventure')}))
+
+    def end(self):
+        """Stop the stream after the events already queued."""
+        try:
+            self._queue.put_nowait(_CLOSED)
+        except queue.Full:
+            self.put('reset', {'adventure': self.name})
+            self._queue.put_nowait(_CLOSED)
+
+    def get(self, timeout=None):
+        """The next ``(kind, data)``; None on timeout, ``_CLOSED`` at the end."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._events._unsubscribe(self)
+
+    def stream(self, initial=(), heartbeat=HEARTBEAT_INTERVAL, lifetime=300.0):
+        """Server-Sent Events text: the ``initial`` ``(kind, data)`` events,
+        then everything published, until ``lifetime`` seconds have passed or
+        the broker is closed. Unsubscribes when the generator is closed."""
+        try:
+            yield f'retry: {RECONNECT_DELAY}\n\n'
+            for kind, data in initial:
+                yield format_event(kind, data, data.get('revision'))
+            deadline = time.monotonic() + lifetime
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                event = self.get(min(heartbeat, remaining))
+                if event is _CLOSED:
+                    return
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                kind, data = event
+                yield format_event(kind, data, data.get('revision'))
+        finally:
+            self.close()
+
+
+class AdventureEvents:
+    """Subscriptions to adventure changes, and the last state published for
+    each watched adventure (to diff the next save against)."""
+
+    def __init__(self, max_streams=8, max_summary_streams=4, backlog=100):
+        # Streams of one adventure's changes (DM interfaces)
+        self.max_streams = max_streams
+        # Streams of every adventure's summaries (spectator views)
+        self.max_summary_streams = max_summary_streams
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._states = {}
+
+    def subscribe(self, name=None, access=None):
+        """A Subscription to ``name``'s changes, or a summary of every
+        adventure's with None. ``access`` is checked by publish(). Raises
+        EventStreamsFull when that kind of stream is at its cap."""
+        with self._lock:
+            summaries = len(self._subscribers.get(None, ()))
+            if name is None and summaries >= self.max_summary_streams:
+                raise EventStreamsFull(f'At most {self.max_summary_streams} spectator event streams can be open')
+            if name is not None and (sum(len(subs) for subs in self._subscribers.values())
+                                     - summaries >= self.max_streams):
+                raise EventStreamsFull(f'At most {self.max_streams} adventure event streams can be open')
+            subscription = Subscription(self, name, self.backlog, access)
+            self._subscribers.setdefault(name, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subs = self._subscribers.get(subscription.name)
+            if subs is None:
+                return
+            subs.discard(subscription)
+            if not subs:
+                del self._subscribers[subscription.name]
+                self._states.pop(subscription.name, None)
+
+    def watched(self, name):
+        """Whether a DM interface is subscribed to ``name``."""
+        with self._lock:
+            return bool(self._subscribers.get(name))
+
+    def remember(self, name, revision, state):
+        """Keep ``state`` (at ``revision``) to diff the next change against,
+        while ``name`` is watched."""
+        with self._lock:
+            if self._subscribers.get(name):
+                self._states[name] = (revision, state)
+
+    def last_state(self, name):
+        """``(revision, state)`` last remembered for ``name``, or None."""
+        with self._lock:
+            return self._states.get(name)
+
+    def publish(self, name, kind, payload, allowed=None):
+        """Send a ``kind`` event about ``name`` to its subscribers (and a
+        summary to those watching every adventure). Subscribers whose
+        ``access`` fails ``allowed(access)`` are sent ``locked`` instead and
+        dropped. Returns the number of events sent."""
+        event = {'adventure': name, **payload}
+        summary = {key: event[key] for key in ('adventure', 'revision') if key in event}
+        locked = []
+        with self._lock:
+            if kind == 'deleted':
+                self._states.pop(name, None)
+            subs = self._subscribers.get(name, set())
+            if allowed is not None:
+                locked = [sub for sub in subs if not allowed(sub.access)]
+                subs.difference_update(locked)
+                if not subs:
+                    self._subscribers.pop(name, None)
+                    self._states.pop(name, None)
+            targets = [(sub, event) for sub in subs]
+            targets += [(sub, summary) for sub in self._subscribers.get(None, ())]
+        for subscription in locked:
+            subscription.put('locked', {'adventure': name})
+            subscription.end()
+        for subscription, data in targets:
+            subscription.put(kind, data)
+        return len(targets)
+
+    def close(self):
+        """End every open stream (at shutdown)."""
+        with self._lock:
+            subscriptions = [sub for subs in self._subscribers.values() for sub in subs]
+        for subscription in subscriptions:
+            subscription.end()
@@ -0,0 +1,175 @@
+"""Response compression and cache validators.
+
+``finalize_response()`` runs on every GET/HEAD response (an ``after_request``
+hook installed by ``init_app()``, and the async app's native routes):
+
+- JSON responses get a weak ETag hashed from the body and
+  ``Cache-Control: no-cache``. Browsers keep them but revalidate, and an
+  unchanged body is answered with a 304. Routes that set their own ETag
+  (the monster library ties it to the file version) are left alone.
+- Static files requested through ``static_url()`` carry a content
+  fingerprint (``?v=``) and may be cached for a year. Other static requests,
+  such as relative ES module imports, revalidate against Flask's
+  ETag/Last-Modified.
+- Text bodies (JSON, JS, CSS, HTML, SVG) of at least ``COMPRESS_MIN_SIZE``
+  bytes are compressed with brotli (if the optional ``brotli`` package is
+  installed) or gzip, whichever the client prefers. Compressed static files
+  are cached in memory per file version.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request as flask_request, url_for
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'text/javascript',
+    'text/css', 'text/html', 'text/plain', 'image/svg+xml',
+}
+COMPRESS_MIN_SIZE = 1024      # Smaller bodies aren't worth the CPU
+STATIC_MAX_AGE = 31536000     # One year, for fingerprinted static URLs
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STATIC_CACHE_ENTRIES = 256    # Fingerprints and compressed bodies kept in memory
+
+
+def negotiate_encoding(request):
+    """'br', 'gzip' or None, following the client's Accept-Encoding."""
+    accept = request.accept_encodings
+    choices = [('gzip', accept['gzip'])]
+    if brotli is not None:
+        choices.insert(0, ('br', accept['br']))
+    encoding, quality = max(choices, key=lambda choice: choice[1])
+    return encoding if quality > 0 else None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # Fixed mtime so identical bodies compress to identical bytes
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class StaticFiles:
+    """Content fingerprints and compressed copies of static files, per file version."""
+
+    def __init__(self, max_entries=STATIC_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get(self, path, variant, build):
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size, variant)
+        with self._lock:
+            value = self._entries.get(key)
+        if value is None:
+            with open(path, 'rb') as f:
+                value = build(f.read())
+            with self._lock:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+        return value
+
+    def fingerprint(self, path):
+        """Short content hash of the file at ``path`` (None if missing)."""
+        return self._get(path, 'fingerprint', lambda data: hashlib.sha256(data).hexdigest()[:12])
+
+    def compressed(self, path, encoding):
+        return self._get(path, encoding, lambda data: compress(data, encoding))
+
+
+static_files = StaticFiles()
+
+
+def _static_path(app, request):
+    filename = (getattr(request, 'view_args', None) or {}).get('filename')
+    return safe_join(app.static_folder, filename) if filename else None
+
+
+def _static_cache_headers(response, request, app):
+    path = _static_path(app, request)
+    version = request.args.get('v')
+    if path and version and version == static_files.fingerprint(path):
+        response.headers['Cache-Control'] = f"public, max-age={app.config['STATIC_MAX_AGE']}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+
+
+def _compress_response(response, request, app, encoding, is_static):
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    if is_static and response.direct_passthrough:
+        # send_from_directory streams the file; swap in a cached compressed copy
+        if (response.content_length or 0) < min_size:
+            return
+        body = static_files.compressed(_static_path(app, request), encoding)
+        if body is None:
+            return
+        if hasattr(response.response, 'close'):
+            response.response.close()
+        response.direct_passthrough = False
+    elif response.is_streamed or response.direct_passthrough:
+        return
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return
+        body = compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names the identity bytes; a weak one holds for every encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def finalize_response(response, request, app):
+    """Add validators, cache headers and compression to a GET/HEAD response."""
+    if request.method not in ('GET', 'HEAD'):
+        return response
+    is_static = getattr(request, 'endpoint', None) == 'static'
+    if is_static:
+        _static_cache_headers(response, request, app)
+    elif (response.status_code == 200 and response.mimetype == 'application/json'
+          and not response.is_streamed and 'ETag' not in response.headers):
+        response.add_etag(weak=True)
+        if 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = 'no-cache'
+        response.make_conditional(request)
+
+    if (response.status_code == 200 and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers):
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request)
+        if encoding:
+            _compress_response(response, request, app, encoding, is_static)
+    return response
+
+
+def init_app(app):
+    """Install the response hook and the ``static_url()`` template helper."""
+    app.config.setdefault('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    app.config.setdefault('STATIC_MAX_AGE', STATIC_MAX_AGE)
+
+    @app.template_global()
+    def static_url(filename):
+        """URL for a static file, fingerprinted so it can be cached for a year."""
+        version = static_files.fingerprint(safe_join(app.static_folder, filename))
+        return url_for('static', filename=filename, v=version)
+
+    @app.after_request
+    def _finalize_response(response):
+        return finalize_response(response, flask_request, app)
@@ -0,0 +1,428 @@
+"""Background jobs for long-running D&D Beyond work.
+
+Scraping the monster list, fetching details for ~3,400 monsters, probing
+monster URLs and caching avatars take minutes to hours. ``JobManager`` runs
+them on background threads so requests stay fast:
+
+- Each job's state lives in ``<jobs_dir>/<id>.json`` (kind, params, status,
+  progress and a kind-specific checkpoint). Files are replaced atomically,
+  so a crash leaves the last checkpoint intact.
+- Jobs that were queued or running when the process died are marked
+  ``interrupted`` on the next start. ``resume()`` picks them up from their
+  checkpoint, as it does for cancelled and failed jobs.
+- Each kind has a default worker count and request rate, which can be
+  overridden per job (``concurrency`` / ``rate`` params) up to a cap. A
+  job's rate is a cap in the manager's ``UpstreamLimiter`` (the app passes
+  its shared one), below the per-host rates every request already obeys.
+- A job started with ``profile: true`` is run under cProfile (its own
+  thread and every ``ctx.map`` worker); the profile's name is stored as
+  ``job['profile']``.
+
+A job kind is a function ``run(ctx)`` taking a ``JobContext``. Most kinds
+just call ``ctx.map(items, key, fn)``, which handles concurrency, rate
+limiting, skipping already-finished items and checkpointing.
+"""
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+
+from logs import get_logger
+from profiling import Session
+from ratelimit import UpstreamLimiter
+
+log = get_logger('jobs')
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+INTERRUPTED = 'interrupted'
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+RESUMABLE_STATUSES = (CANCELLED, INTERRUPTED, FAILED)
+
+# Minimum seconds between checkpoint writes while a job is running
+CHECKPOINT_INTERVAL = 2.0
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop."""
+
+
+class JobConflict(Exception):
+    """The job can't be started or resumed in its current state."""
+
+
+class JobKind:
+    """A registered type of job and its concurrency/rate defaults."""
+
+    def __init__(self, run, concurrency=1, rate=None, max_concurrency=None, description=''):
+        self.run = run
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency or max(concurrency, 1)
+        self.rate = rate
+        self.description = description
+
+    def settings(self, params):
+        """``(concurrency, rate)`` for a job with ``params``, capped at
+        ``max_concurrency``. Raises ValueError for values that aren't
+        positive numbers."""
+        try:
+            concurrency = int(params.get('concurrency') or self.concurrency)
+            rate = params.get('rate', self.rate)
+            rate = float(rate) if rate else None
+        except (TypeError, ValueError):
+            raise ValueError('params.concurrency and params.rate must be numbers') from None
+        if concurrency < 1:
+            raise ValueError('params.concurrency must be at least 1')
+        if rate is not None and not 0 < rate < float('inf'):
+            raise ValueError('params.rate must be a positive number of requests per second')
+        return min(concurrency, self.max_concurrency), rate
+
+
+class JobContext:
+    """Handle a running job uses to read params and record progress."""
+
+    def __init__(self, manager, job, cancel_event, concurrency, rate, profile=None, lock=None):
+        self._manager = manager
+        self._job = job
+        self._cancel = cancel_event
+        # Guards the job dict; the manager takes it too to copy the job's state
+        self._lock = lock or threading.Lock()
+        self._last_save = 0.0
+        self.concurrency = concurrency
+        self.rate = rate
+        # profiling.Session when the job was started with ``params.profile``
+        self.profile = profile
+
+    @property
+    def params(self):
+        return self._job['params']
+
+    @property
+    def checkpoint(self):
+        """Kind-specific state persisted with the job. Mutate under ``ctx.lock``."""
+        return self._job['checkpoint']
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def throttle(self):
+        """Wait for the job's rate limit before making an upstream request."""
+        if self.rate:
+            delay = self._manager.limiter.reserve_cap(self._job['id'])
+            if delay > 0:
+                self._cancel.wait(delay)
+        self.check_cancelled()
+
+    def set_total(self, total):
+        with self._lock:
+            self._job['progress']['total'] = total
+
+    def advance(self, failed=False):
+        with self._lock:
+            self._job['progress']['done'] += 1
+            if failed:
+                self._job['progress']['failed'] += 1
+        self.save()
+
+    def save(self, force=False):
+        """Persist progress and checkpoint (at most every CHECKPOINT_INTERVAL seconds)."""
+        now = time.monotonic()
+        if not force and now - self._last_save < CHECKPOINT_INTERVAL:
+            return
+        self._last_save = now
+        with self._lock:
+            self._manager._write(self._job)
+
+    def map(self, items, key, fn):
+        """Run ``fn(item)`` for every item whose ``key(item)`` isn't finished yet.
+
+        Uses up to ``ctx.concurrency`` threads; ``fn`` should call
+        ``ctx.throttle()`` before each upstream request so cache hits don't
+        count against the rate limit. Return values (if not None) are stored in ``checkpoint['results']``;
+        exceptions are recorded in ``checkpoint['failed']`` and don't stop the
+        job (failed items are retried when the job is resumed). Raises
+        JobCancelled if the job is cancelled part way.
+        """
+        checkpoint = self.checkpoint
+        checkpoint.setdefault('results', {})
+        # Items that failed last time are retried on resume
+        retry = set(checkpoint.get('failed', {}))
+        with self._lock:
+            checkpoint['done'] = [k for k in checkpoint.get('done', []) if k not in retry]
+            checkpoint['failed'] = {}
+        done = set(checkpoint['done'])
+
+        items = list(items)
+        self.set_total(len(items))
+        with self._lock:
+            self._job['progress']['done'] = len(done)
+            self._job['progress']['failed'] = 0
+        pending = iter([item for item in items if key(item) not in done])
+        pending_lock = threading.Lock()
+
+        def worker():
+            if self.profile is not None:
+                with self.profile.thread():
+                    work()
+            else:
+                work()
+
+        def work():
+            while not self.cancelled():
+                with pending_lock:
+                    item = next(pending, None)
+                if item is None:
+                    return
+                item_key = key(item)
+                try:
+                    result = fn(item)
+                    error = None
+                except JobCancelled:
+                    return
+                except Exception as e:
+                    result, error = None, str(e)
+                with self._lock:
+                    checkpoint['done'].append(item_key)
+                    if error is not None:
+                        checkpoint['failed'][item_key] = error
+                    else:
+                        checkpoint['failed'].pop(item_key, None)
+                        if result is not None:
+                            checkpoint['results'][item_key] = result
+                self.advance(failed=error is not None)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, self.concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.check_cancelled()
+
+
+class JobManager:
+    """Starts, tracks and persists background jobs for one jobs directory."""
+
+    def __init__(self, jobs_dir, kinds, profiles_dir=None, limiter=None):
+        self.jobs_dir = jobs_dir
+        self.kinds = kinds
+        # Where jobs started with ``params.profile`` save their profile
+        self.profiles_dir = profiles_dir
+        # Holds each job's rate as a cap (see ratelimit.UpstreamLimiter.set_cap)
+        self.limiter = limiter if limiter is not None else UpstreamLimiter()
+        self._jobs = {}
+        # Per-job locks guarding each job dict (shared with its JobContext)
+        self._job_locks = {}
+        self._cancel_events = {}
+        self._threads = {}
+        self._stopping = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.jobs_dir.exists():
+            return
+        for path in sorted(self.jobs_dir.glob('*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except Exception as e:
+                log.warning("Skipping unreadable job file %s: %s", path, e)
+                continue
+            if job.get('status') in ACTIVE_STATUSES:
+                # The process stopped while this job was running
+                job['status'] = INTERRUPTED
+                job['updated'] = time.time()
+                self._write(job)
+            self._jobs[job['id']] = job
+
+    def _write(self, job):
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        path = self.jobs_dir / f"{job['id']}.json"
+        tmp_path = path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _job_lock(self, job):
+        return self._job_locks.setdefault(job['id'], threading.Lock())
+
+    def summary(self, job):
+        """A copy of the job's state without the (potentially large) checkpoint."""
+        with self._job_lock(job):
+            info = copy.deepcopy({k: v for k, v in job.items() if k != 'checkpoint'})
+            info['failedItems'] = len(job['checkpoint'].get('failed', {}))
+        return info
+
+    def list(self):
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job['created'], reverse=True)
+        return [self.summary(job) for job in jobs]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return self.summary(job) if job else None
+
+    def checkpoint(self, job_id):
+        """A copy of the job's checkpoint, or None for an unknown job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        with self._job_lock(job):
+            return copy.deepcopy(job['checkpoint'])
+
+    def start(self, kind, params=None):
+        """Queue a new job.
+
+        Raises ValueError for unknown kinds or bad params, and JobConflict
+        if a job of the same kind is already active.
+        """
+        if kind not in self.kinds:
+            raise ValueError(f'Unknown job kind: {kind}')
+        settings = self.kinds[kind].settings(params or {})
+        with self._lock:
+            for job in self._jobs.values():
+                if job['kind'] == kind and job['status'] in ACTIVE_STATUSES:
+                    raise JobConflict(f"A {kind} job is already running ({job['id']})")
+            now = time.time()
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'kind': kind,
+                'params': params or {},
+                'status': QUEUED,
+                'progress': {'done': 0, 'total': None, 'failed': 0},
+                'checkpoint': {},
+                'result': None,
+                'error': None,
+                'created': now,
+                'updated': now,
+                'attempts': 0,
+            }
+            self._jobs[job['id']] = job
+            self._write(job)
+            self._launch(job, settings)
+            return self.summary(job)
+
+    def cancel(self, job_id):
+        """Ask a job to stop. Its checkpoint is kept so it can be resumed."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            event = self._cancel_events.get(job_id)
+            if job['status'] in ACTIVE_STATUSES and event is not None:
+                event.set()
+            return self.summary(job)
+
+    def resume(self, job_id):
+        """Restart a cancelled, interrupted or failed job from its checkpoint.
+
+        Raises JobConflict if it can't be resumed now, and ValueError if its
+        saved params are no longer valid.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] not in RESUMABLE_STATUSES:
+                raise JobConflict(f"Job {job_id} is {job['status']} and can't be resumed")
+            settings = self.kinds[job['kind']].settings(job['params'])
+            for other in self._jobs.values():
+                if other is not job and other['kind'] == job['kind'] and other['status'] in ACTIVE_STATUSES:
+                    raise JobConflict(f"A {job['kind']} job is already running ({other['id']})")
+            job['status'] = QUEUED
+            job['error'] = None
+            job['updated'] = time.time()
+            self._write(job)
+            self._launch(job, settings)
+            return self.summary(job)
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job's thread exits. Returns the job summary."""
+        thread = self._threads.get(job_id)
+        if thread is not None:
+            thread.join(timeout)
+        return self.get(job_id)
+
+    def shutdown(self, timeout=10.0):
+        """Stop running jobs, leaving them ``interrupted`` with a fresh checkpoint."""
+        with self._lock:
+            running = [job_id for job_id, job in self._jobs.items() if job['status'] in ACTIVE_STATUSES]
+            for job_id in running:
+                self._stopping.add(job_id)
+                self._cancel_events[job_id].set()
+        deadline = time.monotonic() + timeout
+        for job_id in running:
+            self.wait(job_id, max(0.0, deadline - time.monotonic()))
+
+    def _launch(self, job, settings):
+        cancel_event = threading.Event()
+        self._cancel_events[job['id']] = cancel_event
+        thread = threading.Thread(target=self._run, args=(job, cancel_event, settings),
+                                  name=f"job-{job['kind']}-{job['id']}", daemon=True)
+        self._threads[job['id']] = thread
+        thread.start()
+
+    def _run(self, job, cancel_event, settings):
+        kind = self.kinds[job['kind']]
+        concurrency, rate = settings
+        profile = None
+        if job['params'].get('profile') and self.profiles_dir is not None:
+            profile = Session(f"job {job['kind']} {job['id']}", kind='job')
+        ctx = JobContext(self, job, cancel_event, concurrency, rate, profile, lock=self._job_lock(job))
+        self.limiter.set_cap(job['id'], rate)
+
+        with ctx.lock:
+            job['status'] = RUNNING
+            job['attempts'] += 1
+            job['started'] = time.time()
+            job['updated'] = job['started']
+        ctx.save(force=True)
+        log.info("Job %s (%s) started", job['id'], job['kind'])
+
+        try:
+            if profile is not None:
+                with profile.thread():
+                    result = kind.run(ctx)
+            else:
+                result = kind.run(ctx)
+            status, error = COMPLETED, None
+        except JobCancelled:
+            result = None
+            status = INTERRUPTED if job['id'] in self._stopping else CANCELLED
+            error = None
+        except Exception as e:
+            log.exception("Job %s (%s) failed", job['id'], job['kind'])
+            result, status, error = None, FAILED, str(e)
+        self.limiter.set_cap(job['id'], None)
+
+        profile_name = None
+        if profile is not None:
+            profile_name = profile.save(self.profiles_dir, job=job['id'], status=status)
+
+        with ctx.lock:
+            job['status'] = status
+            job['error'] = error
+            if status == COMPLETED:
+                job['result'] = result
+            if profile_name:
+                job['profile'] = profile_name
+            job['updated'] = time.time()
+        ctx.save(force=True)
+        log.info("Job %s (%s) %s", job['id'], job['kind'], status, extra={'job_id': job['id'], 'status': status})
@@ -0,0 +1,590 @@
+"""Append-only change journal for adventure files.
+
+An autosave used to rewrite ``<name>.json`` in full, however small the
+change. ``AdventureJournal`` keeps that file as a snapshot and records each
+save as the difference from the previous state instead:
+
+- ``<name>.json``: the snapshot, in storage form. Everything that lists or
+  reads adventures still finds it there.
+- ``<name>.journal.jsonl``: a header line naming the snapshot it applies to
+  (inode, mtime and size) and the last sequence number, then one entry per
+  save that changed something::
+
+      {"seq": 42, "time": 1700000000.0, "changes": [
+          {"op": "set", "path": ["encounters", 3, "combatants", 2, "hp"], "value": 17, "old": 25}]}
+
+  A hit point change or a turn advance is one short line. Adding or
+  removing combatants is a ``splice`` of the list.
+- ``<name>.history.jsonl``: entries already folded into the snapshot.
+
+Loading an adventure reads the snapshot and replays the journal on top.
+``compact()`` (run periodically by a background thread, and at shutdown)
+writes a new snapshot, moves the entries to the history file and starts an
+empty journal. Each step replaces or appends to a file, so a crash at any
+point leaves a consistent pair: a journal whose header doesn't match the
+snapshot is out of date (compaction got as far as the snapshot, or the
+file was edited by hand) and is ignored.
+
+Every change records the value it replaced, so entries can be inverted:
+``undo()`` appends an entry that reverts the latest save, and
+``state_at()`` walks back through the history to any earlier point.
+
+The last entry's sequence number is the adventure's revision. A save made
+from an older revision (another tab or device saved in between) is merged
+three ways with the saves since: edits to different encounters, players or
+settings are combined, and edits to the same one raise ``RevisionConflict``.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from logs import get_logger
+
+log = get_logger('adventures')
+
+JOURNAL_SUFFIX = '.journal.jsonl'
+HISTORY_SUFFIX = '.history.jsonl'
+
+
+# What save() did: bytes written, the adventure's revision afterwards, and
+# whether the save had to be merged with newer ones
+Saved = namedtuple('Saved', 'written revision merged')
+
+
+class UndoError(Exception):
+    """There is nothing to undo, or the journal doesn't fit the current state."""
+
+
+class RevisionConflict(Exception):
+    """A save from an old revision changed something that was changed since."""
+
+    def __init__(self, revision, conflicts):
+        super().__init__(f'Adventure has changed since (now at revision {revision})')
+        self.revision = revision
+        # Paths of the saved changes that overlap newer ones
+        self.conflicts = conflicts
+
+
+# --- diffing ---
+
+def diff(old, new, path=()):
+    """Changes that turn ``old`` into ``new`` (JSON values), as a list of ops.
+
+    Dicts are compared key by key and lists element by element when they
+    have the same length. A list that grew or shrank becomes one ``splice``
+    of the part between the common prefix and suffix, so adding a
+    combatant doesn't rewrite the rest of the encounter.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key, value in new.items():
+            if key not in old:
+                changes.append({'op': 'set', 'path': [*path, key], 'value': value})
+            else:
+                changes.extend(diff(old[key], value, (*path, key)))
+        for key, value in old.items():
+            if key not in new:
+                changes.append({'op': 'del', 'path': [*path, key], 'old': value})
+        return changes
+    if isinstance(old, list) and isinstance(new, list):
+        if len(old) == len(new):
+            changes = []
+            for index, (before, after) in enumerate(zip(old, new)):
+                changes.extend(diff(before, after, (*path, index)))
+            return changes
+        start = 0
+        limit = min(len(old), len(new))
+        while start < limit and old[start] == new[start]:
+            start += 1
+        end = 0
+        while end < limit - start and old[-1 - end] == new[-1 - end]:
+            end += 1
+        return [{'op': 'splice', 'path': list(path), 'at': start,
+                 'remove': old[start:len(old) - end], 'insert': new[start:len(new) - end]}]
+    return [{'op': 'set', 'path': list(path), 'value': new, 'old': old}]
+
+
+
+def _region(change):
+    """The part of an adventure a change belongs to, for merging: a
+    top-level key, or one item of it (``('encounters', 3)``)."""
+    return tuple(change['path'][:2])
+
+
+def _overlap(a, b):
+    ra, rb = _region(a), _region(b)
+    if ra == rb:
+        return True
+    if len(ra) == len(rb):
+        return False
+    outer, inner = (a, b) if len(ra) < len(rb) else (b, a)
+    r_outer, r_inner = _region(outer), _region(inner)
+    if r_inner[:len(r_outer)] != r_outer:
+        return False
+    # Inserting or removing items only moves the ones after them
+    if outer['op'] != 'splice':
+        return True
+    index = r_inner[len(r_outer)]
+    return not isinstance(index, int) or index >= outer['at']
+
+
+def merge(base, ours, theirs):
+    """Three-way merge of two states descended from ``base``.
+
+    Returns ``(merged, conflicts)``. ``merged`` is ``ours`` with the changes
+    from ``theirs`` applied, or None when any of them touches an encounter
+    (player, chapter, setting...) that ``ours`` changed too; ``conflicts``
+    lists the paths of those changes.
+    """
+    ours_changes, theirs_changes = diff(base, ours), diff(base, theirs)
+    # Changes both sides made identically are already in ours, and don't
+    # count against the other changes either side made nearby
+    shared = [change for change in theirs_changes if change in ours_changes]
+    ours_changes = [change for change in ours_changes if change not in shared]
+    theirs_changes = [change for change in theirs_changes if change not in shared]
+    conflicts = [change['path'] for change in theirs_changes
+                 if any(_overlap(change, other) for other in ours_changes)]
+    if conflicts:
+        return None, conflicts
+    try:
+        return apply_changes(copy.deepcopy(ours), theirs_changes, strict=True), []
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None, [change['path'] for change in theirs_changes]
+
+
+def _container(data, path):
+    for key in path:
+        data = data[key]
+    return data
+
+
+def apply_changes(data, changes, strict=False):
+    """Apply ``changes`` to ``data`` in place; returns the (possibly new) root.
+
+    With ``strict``, each change must find the value it recorded replacing
+    (ValueError otherwise), which catches a journal that doesn't belong to
+    ``data``.
+    """
+    for change in changes:
+        path = change['path']
+        op = change['op']
+        if op == 'splice':
+            items = _container(data, path)
+            at, remove = change['at'], change['remove']
+            if strict and items[at:at + len(remove)] != remove:
+                raise ValueError(f'List at {path} has changed')
+            items[at:at + len(remove)] = change['insert']
+            continue
+        if op not in ('set', 'del'):
+            raise ValueError(f'Unknown journal op {op!r}')
+        if not path:
+            data = change['value']
+            continue
+        parent = _container(data, path[:-1])
+        key = path[-1]
+        if strict:
+            present = key in parent if isinstance(parent, dict) else -len(parent) <= key < len(parent)
+            if ('old' in change) != present or (present and parent[key] != change['old']):
+                raise ValueError(f'Value at {path} has changed')
+        if op == 'set':
+            parent[key] = change['value']
+        else:
+            del parent[key]
+    return data
+
+
+def invert(changes):
+    """The changes that undo ``changes``."""
+    inverse = []
+    for change in reversed(changes):
+        op = change['op']
+        if op == 'splice':
+            inverse.append({**change, 'remove': change['insert'], 'insert': change['remove']})
+        elif op == 'del':
+            inverse.append({'op': 'set', 'path': change['path'], 'value': change['old']})
+        elif 'old' in change:
+            inverse.append({'op': 'set', 'path': change['path'], 'value': change['old'], 'old': change['value']})
+        else:
+            inverse.append({'op': 'del', 'path': change['path'], 'old': change['value']})
+    return inverse
+
+
+# --- files ---
+
+def _identity(path):
+    """What a journal header records about its snapshot (None if missing)."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _read_lines(path):
+    """Parsed JSON lines of ``path`` ([] if missing). A torn line is skipped."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    records = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            log.warning("Ignoring unreadable line %d of %s", number, path.name)
+    return records
+
+
+def _write_replace(path, text):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class AdventureJournal:
+    """Snapshots plus change journals for the adventures in ``directory``.
+
+    Names are adventure names (file stems). All methods are thread-safe.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.RLock()
+        # name -> (version, state, seq, journal_ok) after the last save or read,
+        # to diff the next save against
+        self._states = {}
+        # Bumped by every write through this journal, for latest()
+        self._writes = 0
+        self._latest = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot_path(self, name):
+        return self.directory / f'{name}.json'
+
+    def journal_path(self, name):
+        return self.directory / f'{name}{JOURNAL_SUFFIX}'
+
+    def history_path(self, name):
+        return self.directory / f'{name}{HISTORY_SUFFIX}'
+
+    def _version(self, name):
+        try:
+            journal_size = self.journal_path(name).stat().st_size
+        except FileNotFoundError:
+            journal_size = 0
+        return _identity(self.snapshot_path(name)), journal_size
+
+    def version(self, name):
+        """A value that changes whenever the adventure does (for caches).
+
+        Raises FileNotFoundError if there is no such adventure.
+        """
+        snapshot_id, journal_size = self._version(name)
+        if snapshot_id is None:
+            raise FileNotFoundError(self.snapshot_path(name))
+        return (str(self.snapshot_path(name)), *snapshot_id, journal_size)
+
+    def latest(self):
+        """The name of the adventure that changed last (see modified()), or
+        None without adventures.
+
+        The answer is kept until something is written through this journal
+        or the directory's mtime changes (a file added, replaced or removed
+        from outside), so frequent callers don't stat every adventure.
+        """
+        try:
+            key = (self.directory.stat().st_mtime_ns, self._writes)
+        except FileNotFoundError:
+            return None
+        latest = self._latest
+        if latest is not None and latest[0] == key:
+            return latest[1]
+        times, snapshots = {}, set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(JOURNAL_SUFFIX):
+                    name = entry.name[:-len(JOURNAL_SUFFIX)]
+                elif entry.name.endswith('.json'):
+                    name = entry.name[:-len('.json')]
+                    snapshots.add(name)
+                else:
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                times[name] = max(times.get(name, mtime), mtime)
+        name = max(snapshots, key=lambda name: times.get(name, 0), default=None)
+        self._latest = (key, name)
+        return name
+
+    def modified(self, name):
+        """When the adventure last changed: the newer of snapshot and journal mtime."""
+        times = [self.snapshot_path(name).stat().st_mtime]
+        try:
+            times.append(self.journal_path(name).stat().st_mtime)
+        except FileNotFoundError:
+            pass
+        return max(times)
+
+    def _load(self, name):
+        """``(state, entries, seq, journal_ok)``: the snapshot with the
+        journal's ``entries`` replayed, the last sequence number, and whether
+        the journal on disk belongs to this snapshot."""
+        path = self.snapshot_path(name)
+        snapshot_id = _identity(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = _read_lines(self.journal_path(name))
+        if not records or 'snapshot' not in records[0]:
+            return data, [], 0, False
+        header, entries = records[0], records[1:]
+        seq = max([header.get('seq', 0)] + [entry['seq'] for entry in entries])
+        if header['snapshot'] != snapshot_id:
+            if entries:
+                log.warning("Journal for %s doesn't match its snapshot; ignoring %d entries",
+                            name, len(entries))
+            return data, [], seq, False
+        for entry in entries:
+            data = apply_changes(data, entry['changes'])
+        return data, entries, seq, True
+
+    def load(self, name):
+        """The adventure's current state (storage form). Raises FileNotFoundError."""
+        with self._lock:
+            return self._load(name)[0]
+
+    def read(self, name):
+        """``(state, revision)``, like load()."""
+        with self._lock:
+            state, _, seq, _ = self._load(name)
+            return state, seq
+
+    def _current(self, name, version):
+        """``(state, seq, journal_ok)``, from memory if nothing changed on disk since."""
+        cached = self._states.get(name)
+        if cached and cached[0] == version:
+            return cached[1:]
+        state, _, seq, journal_ok = self._load(name)
+        self._states[name] = (version, state, seq, journal_ok)
+        return state, seq, journal_ok
+
+    def peek(self, name):
+        """Like load(), but may return the object kept for diffing saves, so it
+        must not be modified. Cheap when the adventure was just saved."""
+        with self._lock:
+            version = self._version(name)
+            if version[0] is None:
+                raise FileNotFoundError(self.snapshot_path(name))
+            return self._current(name, version)[0]
+
+    def _archive(self, name, entries):
+        with open(self.history_path(name), 'a', encoding='utf-8') as f:
+            f.write(''.join(_dumps(entry) + '\n' for entry in entries))
+
+    def _start_journal(self, name, seq):
+        """Begin an empty journal for the current snapshot. Entries left in
+        the old one are moved to the history file first."""
+        self._writes += 1
+        entries = _read_lines(self.journal_path(name))[1:]
+        if entries:
+            self._archive(name, entries)
+        header = {'snapshot': _identity(self.snapshot_path(name)), 'seq': seq}
+        _write_replace(self.journal_path(name), _dumps(header) + '\n')
+
+    def _append(self, name, entry):
+        self._writes += 1
+        line = _dumps(entry) + '\n'
+        with open(self.journal_path(name), 'a', encoding='utf-8') as f:
+            f.write(line)
+        return len(line.encode('utf-8'))
+
+    def create(self, name, data):
+        """Write a new adventure's snapshot, dropping any old journal and
+        history. Returns the bytes written."""
+        with self._lock:
+            self._writes += 1
+            self._states.pop(name, None)
+            for path in (self.journal_path(name), self.history_path(name)):
+                path.unlink(missing_ok=True)
+            body = json.dumps(data, indent=2)
+            _write_replace(self.snapshot_path(name), body)
+            return len(body.encode('utf-8'))
+
+    def save(self, name, data, revision=None):
+        """Make ``data`` (storage form) the adventure's new state.
+
+        The changes since the current state are appended to the journal as
+        one entry; a new adventure gets a snapshot instead. ``data`` becomes
+        the base for the next save's diff, so don't modify it afterwards.
+
+        ``revision`` is the revision ``data`` was edited from. If there have
+        been saves since, ``data`` is merged with them (see merge()), or
+        RevisionConflict is raised. Without it, ``data`` simply replaces
+        the current state.
+
+        Returns ``Saved(written, revision, merged)``; ``written`` is 0 when
+        nothing changed.
+        """
+        with self._lock:
+            version = self._version(name)
+            if version[0] is None:
+                written = self.create(name, data)
+                self._start_journal(name, 0)
+                self._states[name] = (self._version(name), data, 0, True)
+                return Saved(written, 0, False)
+            current, seq, journal_ok = self._current(name, version)
+            merged = revision is not None and revision != seq
+            if merged:
+                try:
+                    if revision > seq:
+                        raise UndoError(f'Unknown revision {revision}')
+                    base = self.state_at(name, revision)
+                except UndoError:
+                    # Nothing to merge against: the whole save conflicts
+                    raise RevisionConflict(seq, [[]]) from None
+                data, conflicts = merge(base, current, data)
+                if conflicts:
+                    raise RevisionConflict(seq, conflicts)
+            changes = diff(current, data)
+            if not changes:
+                return Saved(0, seq, merged)
+            if not journal_ok:
+                self._start_journal(name, seq)
+            written = self._append(name, {'seq': seq + 1, 'time': round(time.time(), 3), 'changes': changes})
+            self._states[name] = (self._version(name), data, seq + 1, True)
+            return Saved(written, seq + 1, merged)
+
+    def delete(self, name):
+        """Remove the adventure with its journal and history. Raises FileNotFoundError."""
+        with self._lock:
+            self._writes += 1
+            self._states.pop(name, None)
+            self.snapshot_path(name).unlink()
+            for path in (self.journal_path(name), self.history_path(name)):
+                path.unlink(missing_ok=True)
+
+    # --- compaction ---
+
+    def compact(self, name):
+        """Fold the journal into a new snapshot. Returns False if it was empty."""
+        with self._lock:
+            data, entries, seq, _ = self._load(name)
+            if not entries:
+                return False
+            # Both files keep the time of the last save, which is what
+            # modified() (the spectator's "latest adventure") goes by
+            saved = self.journal_path(name).stat().st_mtime_ns
+            self._writes += 1
+            _write_replace(self.snapshot_path(name), json.dumps(data, indent=2))
+            os.utime(self.snapshot_path(name), ns=(saved, saved))
+            self._start_journal(name, seq)
+            os.utime(self.journal_path(name), ns=(saved, saved))
+            self._states[name] = (self._version(name), data, seq, True)
+            log.debug("Compacted %d journal entries of %s", len(entries), name)
+            return True
+
+    def compact_all(self):
+        """Compact every adventure with journal entries; returns how many were."""
+        compacted = 0
+        for path in sorted(self.directory.glob(f'*{JOURNAL_SUFFIX}')):
+            name = path.name[:-len(JOURNAL_SUFFIX)]
+            try:
+                compacted += self.compact(name)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                log.warning("Could not compact the journal of %s: %s", name, e)
+        return compacted
+
+    def start(self, interval):
+        """Compact every ``interval`` seconds on a background thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,),
+                                            name='adventure-journal', daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.compact_all()
+
+    def stop(self, compact=True):
+        """Stop the background thread, then (by default) compact everything."""
+        thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        if compact:
+            self.compact_all()
+
+    # --- history ---
+
+    def entries(self, name):
+        """Every recorded save, oldest first: the history file, then the journal."""
+        with self._lock:
+            entries = []
+            for entry in _read_lines(self.history_path(name)):
+                # A crash mid-compaction can archive entries twice
+                if not entries or entry['seq'] > entries[-1]['seq']:
+                    entries.append(entry)
+            _, journal, _, _ = self._load(name)
+            entries.extend(entry for entry in journal if not entries or entry['seq'] > entries[-1]['seq'])
+            return entries
+
+    def state_at(self, name, seq):
+        """The adventure as it was right after save ``seq`` (0: before the
+        first recorded one). Raises UndoError if the history doesn't reach."""
+        with self._lock:
+            data = self.load(name)
+            for entry in reversed(self.entries(name)):
+                if entry['seq'] <= seq:
+                    break
+                try:
+                    data = apply_changes(data, invert(entry['changes']), strict=True)
+                except (ValueError, KeyError, IndexError, TypeError):
+                    raise UndoError(f"History of {name} is incomplete before save {entry['seq']}")
+            return data
+
+    def undo(self, name):
+        """Revert the latest save that hasn't been undone, by appending its
+        inverse. Returns ``(state, undone_seq, revision)``; raises UndoError."""
+        with self._lock:
+            entries = self.entries(name)
+            undone = set()
+            for entry in reversed(entries):
+                if 'undo' in entry:
+                    undone.add(entry['undo'])
+                elif entry['seq'] not in undone:
+                    break
+            else:
+                raise UndoError('Nothing to undo')
+            data, _, seq, journal_ok = self._load(name)
+            changes = invert(entry['changes'])
+            try:
+                data = apply_changes(data, changes, strict=True)
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise UndoError(f"Save {entry['seq']} can't be undone: the adventure has changed since")
+            if not journal_ok:
+                self._start_journal(name, seq)
+            self._append(name, {'seq': seq + 1, 'time': round(time.time(), 3),
+                                'undo': entry['seq'], 'changes': changes})
+            self._states.pop(name, None)
+            return data, entry['seq'], seq + 1
@@ -0,0 +1,67 @@
+"""Leveled, per-subsystem logging.
+
+Modules log through ``get_logger('<subsystem>')`` (``dndenc.monsters``,
+``dndenc.characters``, ``dndenc.upstream``, ...) with lazy ``%``-style
+arguments, so a message that is filtered out is never formatted. Per-page
+and per-field scraping detail is logged at DEBUG; INFO is for events worth
+seeing on a running server (cookies loaded, a scrape finished, a job ended).
+
+Nothing is printed until ``configure()`` is called, apart from Python's
+last-resort output of warnings and errors. The server calls it at startup
+(``--log-level``, ``--log-format json``); scripts opt in the same way.
+
+JSON output writes one object per line with ``time``, ``level``,
+``logger`` and ``message``, plus any ``extra={...}`` fields and the
+traceback (``exc``) for errors.
+"""
+import json
+import logging
+import sys
+
+ROOT = 'dndenc'
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def get_logger(subsystem):
+    return logging.getLogger(f'{ROOT}.{subsystem}')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(level='INFO', json_format=False, stream=None):
+    """Send ``dndenc.*`` records at ``level`` and above to ``stream`` (stderr).
+
+    Replaces the handler from any earlier call, so it can be called again
+    to change the level or format.
+    """
+    logger = logging.getLogger(ROOT)
+    for handler in list(logger.handlers):
+        if getattr(handler, '_dndenc', False):
+            logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+    handler._dndenc = True
+    logger.addHandler(handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    # Records are handled here; don't print them again through the root logger
+    logger.propagate = False
+    return logger
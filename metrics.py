@@ -0,0 +1,226 @@
+"""In-process metrics, exposed at ``/metrics`` in the Prometheus text format.
+
+A small stdlib implementation of counters and histograms (the
+``prometheus_client`` API subset the tracker needs), so a scrape works
+without extra dependencies. Metrics are process-wide and thread-safe:
+
+- ``dndenc_http_request_duration_seconds``: latency of every request, by
+  method, route pattern (``/api/adventure/<name>``, not the raw path, to
+  keep the label set bounded) and status code, compression included; a
+  view that raises counts as a 500. Streamed bodies are timed up to the
+  point the response is returned, not until the last byte.
+- ``dndenc_cache_requests_total``: lookups in the monster, character,
+  avatar and adventure (statistics) caches, by result: ``hit``, ``miss``,
+  ``revalidated`` (upstream confirmed the cached copy) or ``error``.
+- ``dndenc_upstream_requests_total`` / ``..._duration_seconds``: D&D
+  Beyond calls (and avatar downloads) by host and status (``error`` when
+  the connection failed), including throttled attempts that were retried.
+- ``dndenc_adventure_save_bytes``: size of each adventure file written.
+- ``dndenc_adventure_save_conflicts_total``: saves from an outdated
+  revision, by whether they were merged or refused.
+- ``dndenc_live_events_total``: adventure change events sent to open
+  browsers (one per stream), by kind.
+"""
+import math
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; from cache reads (~1ms) to slow upstream scrapes (15s timeout)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+# Bytes; an empty adventure is ~50B, a long campaign a few MB
+SIZE_BUCKETS = tuple(1024 * 4 ** n for n in range(8))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, per label combination."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f'{self.name}{_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, plus their sum."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels)) or ([0], 0.0)
+            return sum(counts)
+
+    def total(self, **labels):
+        """Sum of the observed values."""
+        with self._lock:
+            _, total = self._values.get(self._key(labels)) or ([0], 0.0)
+            return total
+
+    def _render_samples(self, items):
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{le} {cumulative}'
+            labels = _labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+    """The metrics rendered by one scrape."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Duplicate metric {metric.name}')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def clear(self):
+        """Reset every metric (the test suite does this between tests)."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'dndenc_http_request_duration_seconds', 'Time to handle an HTTP request.',
+    ('method', 'route', 'status')))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'dndenc_cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result')))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    'dndenc_upstream_requests_total', 'Upstream HTTP requests by host and status.', ('host', 'status')))
+UPSTREAM_DURATION = REGISTRY.register(Histogram(
+    'dndenc_upstream_request_duration_seconds', 'Upstream HTTP request latency.', ('host',)))
+SAVE_BYTES = REGISTRY.register(Histogram(
+    'dndenc_adventure_save_bytes', 'Bytes written per adventure save (a journal entry, or 0 if unchanged).', (),
+    buckets=(64, 256) + SIZE_BUCKETS))
+SAVE_CONFLICTS = REGISTRY.register(Counter(
+    'dndenc_adventure_save_conflicts_total', 'Saves from an outdated revision, by result (merged or conflict).',
+    ('result',)))
+LIVE_EVENTS = REGISTRY.register(Counter(
+    'dndenc_live_events_total', 'Live adventure events sent to open event streams, by kind.', ('kind',)))
+
+
+def record_cache(cache, result):
+    CACHE_REQUESTS.inc(cache=cache, result=result)
+
+
+def record_upstream(url, status, seconds):
+    """Count an upstream request; ``status`` is None if it failed to connect."""
+    from urllib.parse import urlsplit
+    host = urlsplit(str(url)).hostname or 'unknown'
+    UPSTREAM_REQUESTS.inc(host=host, status='error' if status is None else status)
+    UPSTREAM_DURATION.observe(seconds, host=host)
+
+
+def init_app(app):
+    """Time every request, labelled by its route pattern.
+
+    Install it before other response hooks (compression) so their time is
+    included. The request is recorded at teardown, which also runs when a
+    view raises; those count as 500s.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _note_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _observe_request(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        status = 500 if exc is not None else g.pop('metrics_status', 500)
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - started, method=request.method,
+                                 route=rule, status=status)
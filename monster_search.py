@@ -0,0 +1,259 @@
+"""Search index over the monster library.
+
+``MonsterIndex`` is built once from the monster list (``{name: {cr, type,
+size, alignment, url, isLegacy}}``) and answers name searches without
+scanning every entry:
+
+- Exact matches come from a dict of normalized names. Normalizing
+  lowercases the name, drops apostrophes and turns other punctuation into
+  spaces ("Yuan-ti" -> "yuan ti"). A trailing instance number, as in
+  "Goblin Boss 2" or "Goblin (3)", is ignored when the full name doesn't
+  match.
+- Prefix matches on the whole name or on any word in it use a sorted key
+  list and ``bisect``.
+- Typos are matched through a trigram index, which narrows the library to a
+  few candidates. Those are ranked by a bounded edit distance to the name,
+  to its words, or to its start (for partly typed names).
+
+Results are ranked exact, then prefix, then word prefix, then substring,
+then fuzzy. Each result carries its ``match`` kind, so callers can tell a
+guess from a hit.
+"""
+import bisect
+import re
+from fractions import Fraction
+
+_APOSTROPHES_RE = re.compile(r"['’`]")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_INSTANCE_SUFFIX_RE = re.compile(r"\s*(?:#\s*\d+|\(\s*\d+\s*\)|\d+)\s*$")
+
+# Rank order of match kinds
+MATCH_RANKS = {'exact': 0, 'prefix': 1, 'word': 2, 'substring': 3, 'fuzzy': 4}
+
+# Candidates taken from the trigram index before computing edit distances
+FUZZY_CANDIDATES = 200
+
+
+def normalize(name):
+    """Lowercase, drop apostrophes and collapse punctuation to single spaces."""
+    return ' '.join(_WORD_RE.findall(_APOSTROPHES_RE.sub('', name.lower())))
+
+
+def strip_instance_number(name):
+    """'Goblin Boss 2' -> 'Goblin Boss' (as numbered in encounters)."""
+    return _INSTANCE_SUFFIX_RE.sub('', name).strip()
+
+
+def cr_value(cr):
+    """Numeric value of a CR string ('1/4' -> 0.25); None if unparseable."""
+    try:
+        return float(Fraction(str(cr).strip()))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(length):
+    """Edit distance tolerated for a query of ``length`` characters."""
+    if length <= 3:
+        return 0
+    if length <= 5:
+        return 1
+    if length <= 10:
+        return 2
+    return 3
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between ``a`` and ``b``, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class MonsterIndex:
+    """Name index plus filter fields for a monster list.
+
+    ``version`` identifies the list it was built from (used for ETags).
+    """
+
+    def __init__(self, monsters, version=None):
+        self.monsters = monsters
+        self.version = version
+        self.names = list(monsters)
+        self._keys = [normalize(name) for name in self.names]
+        self._exact = {}
+        prefixes = []
+        self._grams = {}
+        for i, key in enumerate(self._keys):
+            self._exact.setdefault(key, []).append(i)
+            words = key.split(' ')
+            # Every word-start suffix, so "boss" finds "Goblin Boss"
+            for w in range(len(words)):
+                prefixes.append((' '.join(words[w:]), w, i))
+            for gram in trigrams(key):
+                self._grams.setdefault(gram, []).append(i)
+        prefixes.sort()
+        self._prefix_keys = [p[0] for p in prefixes]
+        self._prefix_entries = [(p[1], p[2]) for p in prefixes]
+
+        self._cr = [cr_value(monsters[name].get('cr')) for name in self.names]
+        self._type = [(monsters[name].get('type') or '').lower() for name in self.names]
+        # "Medium or Small" matches either size
+        self._sizes = [{s.strip() for s in (monsters[name].get('size') or '').lower().split(' or ')}
+                       for name in self.names]
+        self._legacy = [bool(monsters[name].get('isLegacy')) for name in self.names]
+
+    def __len__(self):
+        return len(self.names)
+
+    def _filter(self, cr=None, min_cr=None, max_cr=None, type=None, size=None, legacy=None):
+        """Return a predicate over monster indexes for the given filters (None if unfiltered)."""
+        crs = {cr_value(c) for c in cr} if cr else None
+        types = {t.lower() for t in type} if type else None
+        sizes = {s.lower() for s in size} if size else None
+        if crs is None and min_cr is None and max_cr is None and types is None and sizes is None and legacy is None:
+            return None
+
+        def accept(i):
+            value = self._cr[i]
+            if crs is not None and value not in crs:
+                return False
+            if min_cr is not None and (value is None or value < min_cr):
+                return False
+            if max_cr is not None and (value is None or value > max_cr):
+                return False
+            if types is not None and self._type[i] not in types:
+                return False
+            if sizes is not None and not (self._sizes[i] & sizes):
+                return False
+            if legacy is not None and self._legacy[i] != legacy:
+                return False
+            return True
+        return accept
+
+    def select(self, sort=None, descending=False, exclude=None, only=None, **filters):
+        """Names of the monsters passing ``filters`` (see ``search``).
+
+        ``sort`` is None (library order), ``'name'`` or ``'cr'`` (then name).
+        ``only``/``exclude`` are sets of names to keep or drop.
+        """
+        accept = self._filter(**filters)
+        selected = [i for i in range(len(self.names))
+                    if (accept is None or accept(i))
+                    and (only is None or self.names[i] in only)
+                    and (exclude is None or self.names[i] not in exclude)]
+        if sort == 'name':
+            selected.sort(key=lambda i: self._keys[i], reverse=descending)
+        elif sort == 'cr':
+            selected.sort(key=lambda i: (self._cr[i] if self._cr[i] is not None else -1, self._keys[i]),
+                          reverse=descending)
+        elif descending:
+            selected.reverse()
+        return [self.names[i] for i in selected]
+
+    def _prefix_matches(self, key):
+        start = bisect.bisect_left(self._prefix_keys, key)
+        for pos in range(start, len(self._prefix_keys)):
+            if not self._prefix_keys[pos].startswith(key):
+                break
+            yield self._prefix_entries[pos]
+
+    def _fuzzy_matches(self, key, limit, whole_name=False):
+        grams = trigrams(key)
+        counts = {}
+        for gram in grams:
+            for i in self._grams.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+        needed = max(1, len(grams) // 3)
+        candidates = sorted((i for i, n in counts.items() if n >= needed), key=lambda i: -counts[i])
+        width = len(key.split(' '))
+        for i in candidates[:FUZZY_CANDIDATES]:
+            words = self._keys[i].split(' ')
+            windows = {self._keys[i]}
+            if not whole_name:
+                # Also each run of as many words as the query, and the start
+                # of the name, for typos in a partly typed name
+                windows.update(' '.join(words[w:w + width]) for w in range(len(words)))
+                windows.add(self._keys[i][:len(key)])
+            distance = min(edit_distance(key, window, limit) for window in windows)
+            if distance <= limit:
+                yield i, distance
+
+    def search(self, query, limit=20, **filters):
+        """Ranked matches for ``query``.
+
+        ``filters`` are ``cr`` (list of CR strings), ``min_cr``/``max_cr``
+        (numbers), ``type`` and ``size`` (lists, case-insensitive) and
+        ``legacy`` (bool). An empty query lists every monster that passes
+        the filters, ordered by CR. Returns ``(results, total)``, where
+        ``total`` counts matches before ``limit`` is applied. Typo matches
+        are only looked for when there are fewer than ``limit`` others.
+        """
+        accept = self._filter(**filters) or (lambda i: True)
+        key = normalize(query or '')
+        if not key:
+            matches = [i for i in range(len(self.names)) if accept(i)]
+            matches.sort(key=lambda i: (self._cr[i] if self._cr[i] is not None else -1, self.names[i]))
+            return [self._result(i, None, None) for i in matches[:limit]], len(matches)
+
+        if key not in self._exact:
+            base = normalize(strip_instance_number(query))
+            if base and base in self._exact:
+                key = base
+
+        found = {}
+
+        def add(i, kind, distance=0):
+            rank = (MATCH_RANKS[kind], distance)
+            if accept(i) and (i not in found or rank < found[i]):
+                found[i] = rank
+
+        for i in self._exact.get(key, ()):
+            add(i, 'exact')
+        for word, i in self._prefix_matches(key):
+            add(i, 'prefix' if word == 0 else 'word')
+        for i, k in enumerate(self._keys):
+            if key in k:
+                add(i, 'substring')
+        if len(found) < limit:
+            for i, distance in self._fuzzy_matches(key, max_typos(len(key))):
+                add(i, 'fuzzy', distance)
+
+        ranked = sorted(found, key=lambda i: (found[i], len(self._keys[i]), self.names[i]))
+        kinds = {rank: kind for kind, rank in MATCH_RANKS.items()}
+        results = [self._result(i, kinds[found[i][0]], found[i][1]) for i in ranked[:limit]]
+        return results, len(found)
+
+    def lookup(self, name):
+        """The monster ``name`` refers to (exact, or a close typo of the full name), else None."""
+        key = normalize(name)
+        if key not in self._exact:
+            key = normalize(strip_instance_number(name)) or key
+        if key in self._exact:
+            return self._result(self._exact[key][0], 'exact', 0)
+        fuzzy = sorted(self._fuzzy_matches(key, max_typos(len(key)), whole_name=True),
+                       key=lambda match: (match[1], self.names[match[0]]))
+        if not fuzzy:
+            return None
+        return self._result(fuzzy[0][0], 'fuzzy', fuzzy[0][1])
+
+    def _result(self, i, match, distance):
+        name = self.names[i]
+        result = {'name': name, **self.monsters[name]}
+        if match is not None:
+            result['match'] = match
+            result['distance'] = distance
+        return result
@@ -0,0 +1,466 @@
+"""Music library index for the encounter music player.
+
+The library under ``music/`` (nested folders included) is scanned once and
+kept in memory, with a copy in ``.cache/music_index.json`` so a restart
+doesn't re-read every file. Each track records its title, duration and
+bitrate, read from the file headers:
+
+- MP3: ID3v2 title, first frame header, Xing/Info/VBRI frame count
+- WAV: ``fmt``/``data`` chunks, ``LIST/INFO`` title
+- FLAC: STREAMINFO and Vorbis comment
+- Ogg Vorbis/Opus: identification and comment headers, last granule position
+- M4A/AAC in MP4: ``mvhd`` duration and ``ilst`` title
+
+Other formats (raw AAC, WebM) are listed with just their size. Playlists are
+``.m3u``/``.m3u8`` files in the library; their entries are resolved relative
+to the playlist and only tracks that exist are kept.
+
+Changes are picked up by comparing directory mtimes (adding, removing or
+renaming a file changes its folder's mtime). The check runs at most every
+``rescan_interval`` seconds. A rescan stats every file but only re-reads
+the headers of files whose size or mtime changed. ``snapshot(force=True)``
+re-stats everything, which also catches files rewritten in place.
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from logs import get_logger
+
+log = get_logger('music')
+
+MUSIC_RESCAN_INTERVAL = 2.0  # Seconds between directory mtime checks
+PLAYLIST_EXTENSIONS = {'.m3u', '.m3u8'}
+INDEX_FORMAT = 1  # Bump when the cached index layout or metadata changes
+
+# MPEG audio bitrates (kbps) by [version is MPEG-1][layer], and sample rates
+_MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_MP3_SYNC_SEARCH = 64 * 1024  # How far past the tag to look for the first frame
+_OGG_TAIL = 64 * 1024  # The last Ogg page (with the final granule) is in here
+
+
+def _text(data, encoding):
+    """Decode an ID3 text frame payload."""
+    codec = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}.get(encoding, 'latin-1')
+    return data.decode(codec, errors='replace').split('\x00')[0].strip() or None
+
+
+def _vorbis_comment_title(data):
+    """TITLE from a Vorbis comment block (FLAC, Ogg Vorbis, Opus)."""
+    vendor_length, = struct.unpack_from('<I', data, 0)
+    offset = 4 + vendor_length
+    count, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    for _ in range(count):
+        length, = struct.unpack_from('<I', data, offset)
+        key, _, value = data[offset + 4:offset + 4 + length].decode('utf-8', errors='replace').partition('=')
+        if key.upper() == 'TITLE' and value.strip():
+            return value.strip()
+        offset += 4 + length
+    return None
+
+
+def _read_mp3(f, size, info):
+    header = f.read(10)
+    audio_start = 0
+    if header[:3] == b'ID3':
+        major, flags = header[3], header[5]
+        tag_size = _synchsafe(header[6:10])
+        audio_start = 10 + tag_size + (10 if flags & 0x10 else 0)
+        info['title'] = _id3_title(f, major, 10 + tag_size)
+    f.seek(audio_start)
+    data = f.read(_MP3_SYNC_SEARCH)
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+            continue
+        version, layer = (data[i + 1] >> 3) & 3, 4 - ((data[i + 1] >> 1) & 3)
+        bitrate_index, rate_index = data[i + 2] >> 4, (data[i + 2] >> 2) & 3
+        if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+            continue  # Reserved values: not a real frame header
+        mpeg1 = version == 3
+        bitrate = _MP3_BITRATES[mpeg1, layer][bitrate_index]
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        samples = 384 if layer == 1 else (1152 if mpeg1 or layer == 2 else 576)
+        mono = data[i + 3] >> 6 == 3
+        audio_bytes = size - (audio_start + i)
+
+        frames = None
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        xing = i + 4 + side_info
+        if data[xing:xing + 4] in (b'Xing', b'Info'):
+            flags, = struct.unpack_from('>I', data, xing + 4)
+            if flags & 1:
+                frames, = struct.unpack_from('>I', data, xing + 8)
+        elif data[i + 36:i + 40] == b'VBRI':
+            frames, = struct.unpack_from('>I', data, i + 36 + 14)
+
+        if frames:
+            info['duration'] = frames * samples / sample_rate
+            info['bitrate'] = round(audio_bytes * 8 / info['duration'] / 1000)
+        else:
+            info['duration'] = audio_bytes * 8 / (bitrate * 1000)
+            info['bitrate'] = bitrate
+        return
+
+
+def _synchsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _id3_title(f, major, tag_end):
+    """TIT2/TT2 from an ID3v2 tag, skipping other frames (cover art) by seeking."""
+    wanted = b'TT2' if major == 2 else b'TIT2'
+    header_size = 6 if major == 2 else 10
+    while f.tell() + header_size <= tag_end:
+        frame = f.read(header_size)
+        frame_id = frame[:len(wanted)]
+        if not frame_id.strip(b'\x00'):
+            return None  # Padding
+        if major == 2:
+            frame_size = int.from_bytes(frame[3:6], 'big')
+        elif major == 4:
+            frame_size = _synchsafe(frame[4:8])
+        else:
+            frame_size, = struct.unpack('>I', frame[4:8])
+        if frame_id == wanted:
+            payload = f.read(frame_size)
+            return _text(payload[1:], payload[0]) if payload else None
+        f.seek(frame_size, os.SEEK_CUR)
+    return None
+
+
+def _read_wav(f, size, info):
+    riff = f.read(12)
+    if riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        return
+    byte_rate = None
+    while True:
+        start = f.tell()
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return
+        chunk_id, chunk_size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'fmt ':
+            byte_rate, = struct.unpack_from('<I', f.read(chunk_size), 8)
+            info['bitrate'] = round(byte_rate * 8 / 1000)
+        elif chunk_id == b'data' and byte_rate:
+            info['duration'] = min(chunk_size, size - f.tell()) / byte_rate
+        elif chunk_id == b'LIST':
+            data = f.read(chunk_size)
+            offset = 4 if data[:4] == b'INFO' else len(data)
+            while offset + 8 <= len(data):
+                sub_id, sub_size = data[offset:offset + 4], struct.unpack_from('<I', data, offset + 4)[0]
+                if sub_id == b'INAM':
+                    info['title'] = _text(data[offset + 8:offset + 8 + sub_size], 0)
+                offset += 8 + sub_size + (sub_size & 1)
+        f.seek(start + 8 + chunk_size + (chunk_size & 1))
+
+
+def _read_flac(f, size, info):
+    if f.read(4) != b'fLaC':
+        return
+    last = False
+    while not last:
+        header = f.read(4)
+        if len(header) < 4:
+            return
+        last, block_type = header[0] & 0x80, header[0] & 0x7F
+        length = int.from_bytes(header[1:4], 'big')
+        if block_type == 0:
+            block = f.read(length)
+            packed = int.from_bytes(block[10:18], 'big')
+            sample_rate, total_samples = packed >> 44, packed & 0xFFFFFFFFF
+            if sample_rate and total_samples:
+                info['duration'] = total_samples / sample_rate
+                info['bitrate'] = round(size * 8 / info['duration'] / 1000)
+        elif block_type == 4:
+            info['title'] = _vorbis_comment_title(f.read(length))
+        else:
+            f.seek(length, os.SEEK_CUR)
+
+
+def _ogg_packets(data, count):
+    """The first ``count`` complete packets of an Ogg stream held in ``data``."""
+    packets, current, offset = [], b'', 0
+    while offset + 27 <= len(data) and data[offset:offset + 4] == b'OggS' and len(packets) < count:
+        segments = data[offset + 26]
+        table = data[offset + 27:offset + 27 + segments]
+        offset += 27 + segments
+        for length in table:
+            current += data[offset:offset + length]
+            offset += length
+            if length < 255:
+                packets.append(current)
+                current = b''
+    return packets
+
+
+def _read_ogg(f, size, info):
+    packets = _ogg_packets(f.read(_OGG_TAIL), 2)
+    if not packets:
+        return
+    ident = packets[0]
+    if ident[:7] == b'\x01vorbis':
+        sample_rate, = struct.unpack_from('<I', ident, 12)
+        pre_skip, tags_prefix = 0, b'\x03vorbis'
+    elif ident[:8] == b'OpusHead':
+        pre_skip, = struct.unpack_from('<H', ident, 10)
+        sample_rate, tags_prefix = 48000, b'OpusTags'
+    else:
+        return
+    if len(packets) > 1 and packets[1].startswith(tags_prefix):
+        info['title'] = _vorbis_comment_title(packets[1][len(tags_prefix):])
+
+    f.seek(max(0, size - _OGG_TAIL))
+    tail = f.read()
+    last_page = tail.rfind(b'OggS')
+    if last_page >= 0 and sample_rate:
+        granule, = struct.unpack_from('<q', tail, last_page + 6)
+        if granule > pre_skip:
+            info['duration'] = (granule - pre_skip) / sample_rate
+            info['bitrate'] = round(size * 8 / info['duration'] / 1000)
+
+
+def _mp4_atoms(f, end):
+    """Yield ``(type, content_start, content_end)`` for the atoms up to ``end``."""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        atom_size, atom_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if atom_size == 1:
+            atom_size, = struct.unpack('>Q', f.read(8))
+            header = 16
+        elif atom_size == 0:
+            atom_size = end - start
+        if atom_size < header:
+            return
+        yield atom_type, start + header, start + atom_size
+        f.seek(start + atom_size)
+
+
+def _read_mp4(f, size, info):
+    for atom_type, start, end in _mp4_atoms(f, size):
+        if atom_type == b'moov':
+            break
+    else:
+        return
+    f.seek(start)
+    for atom_type, start, end in _mp4_atoms(f, end):
+        if atom_type == b'mvhd':
+            version = f.read(1)[0]
+            f.seek(3 + (16 if version == 1 else 8), os.SEEK_CUR)
+            timescale, = struct.unpack('>I', f.read(4))
+            duration, = struct.unpack('>Q' if version == 1 else '>I', f.read(8 if version == 1 else 4))
+            if timescale and duration:
+                info['duration'] = duration / timescale
+                info['bitrate'] = round(size * 8 / info['duration'] / 1000)
+            f.seek(end)
+        elif atom_type == b'udta':
+            info['title'] = _mp4_title(f, end)
+            f.seek(end)
+
+
+def _mp4_title(f, udta_end):
+    """The ``©nam`` value under udta/meta/ilst."""
+    for atom_type, start, end in _mp4_atoms(f, udta_end):
+        if atom_type == b'meta':
+            f.seek(start + 4)  # meta is a full box: skip version/flags
+            for child_type, _, child_end in _mp4_atoms(f, end):
+                if child_type == b'ilst':
+                    for item_type, _, item_end in _mp4_atoms(f, child_end):
+                        if item_type == b'\xa9nam':
+                            for data_type, data_start, data_end in _mp4_atoms(f, item_end):
+                                if data_type == b'data':
+                                    f.seek(data_start + 8)  # type and locale
+                                    return _text(f.read(data_end - data_start - 8), 3)
+            return None
+    return None
+
+
+_READERS = {
+    '.mp3': _read_mp3,
+    '.wav': _read_wav,
+    '.flac': _read_flac,
+    '.ogg': _read_ogg, '.oga': _read_ogg, '.opus': _read_ogg,
+    '.m4a': _read_mp4, '.aac': _read_mp4,
+}
+
+
+def read_metadata(path, size=None):
+    """``{'title', 'duration', 'bitrate'}`` from an audio file's headers.
+
+    Anything that can't be read is None; a damaged or unrecognised file
+    never raises. Duration is in seconds, bitrate in kbps.
+    """
+    info = {'title': None, 'duration': None, 'bitrate': None}
+    reader = _READERS.get(Path(path).suffix.lower())
+    if reader is None:
+        return info
+    try:
+        if size is None:
+            size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            reader(f, size, info)
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        log.warning("Could not read music metadata from %s: %s", path, e)
+    if info['duration'] is not None:
+        info['duration'] = round(info['duration'], 2)
+    return info
+
+
+def parse_playlist(text, base):
+    """Track paths in an M3U playlist, relative to the library root.
+
+    ``base`` is the playlist's folder (relative to the root, '' for the root).
+    """
+    entries = []
+    for line in text.splitlines():
+        line = line.strip().lstrip('\ufeff')
+        if not line or line.startswith('#') or '://' in line:
+            continue
+        entry = os.path.normpath(os.path.join(base, line.replace('\\', '/'))).replace(os.sep, '/')
+        if not entry.startswith('../'):
+            entries.append(entry)
+    return entries
+
+
+class MusicLibrary:
+    """Index of the audio files and playlists under ``root``.
+
+    ``extensions`` are the audio file suffixes to list. ``index_path`` is
+    where the index is cached between runs (optional).
+    """
+
+    def __init__(self, root, extensions, index_path=None, rescan_interval=MUSIC_RESCAN_INTERVAL):
+        self.root = Path(root)
+        self.extensions = frozenset(extensions)
+        self.index_path = Path(index_path) if index_path else None
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._tracks = None  # {relative path: track entry}
+        self._listing = []
+        self._playlists = []
+        self._stamps = None  # {directory: mtime_ns} at the last scan
+        self._checked = 0.0
+        self.version = None
+
+    def _directory_stamps(self):
+        stamps = {}
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                stamps[str(directory)] = directory.stat().st_mtime_ns
+                with os.scandir(directory) as entries:
+                    pending.extend(Path(e.path) for e in entries
+                                   if e.is_dir(follow_symlinks=False) and not e.name.startswith('.'))
+            except OSError:
+                continue
+        return stamps
+
+    def _load_cached_index(self):
+        if self.index_path is None:
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cached.get('format') != INDEX_FORMAT or cached.get('root') != str(self.root.resolve()):
+            return {}
+        return cached.get('tracks', {})
+
+    def _save_index(self):
+        if self.index_path is None:
+            return
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': INDEX_FORMAT, 'root': str(self.root.resolve()),
+                           'tracks': self._tracks}, f)
+        except OSError as e:
+            log.warning("Could not save music index: %s", e)
+
+    def _scan(self):
+        previous = self._tracks if self._tracks is not None else self._load_cached_index()
+        tracks, playlist_files = {}, []
+        reread = 0
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            relative_dir = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            relative_dir = '' if relative_dir == '.' else relative_dir
+            for filename in filenames:
+                suffix = os.path.splitext(filename)[1].lower()
+                full_path = os.path.join(directory, filename)
+                relative = f'{relative_dir}/{filename}' if relative_dir else filename
+                if suffix in PLAYLIST_EXTENSIONS:
+                    playlist_files.append((relative, relative_dir, full_path))
+                    continue
+                if suffix not in self.extensions:
+                    continue
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                entry = previous.get(relative)
+                if not entry or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+                    entry = dict(read_metadata(full_path, stat.st_size),
+                                 path=relative, size=stat.st_size, mtime=stat.st_mtime_ns)
+                    reread += 1
+                tracks[relative] = entry
+
+        playlists = []
+        for relative, base, full_path in sorted(playlist_files):
+            try:
+                with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
+                    entries = parse_playlist(f.read(), base)
+            except OSError:
+                continue
+            playlists.append({'name': os.path.splitext(os.path.basename(relative))[0], 'path': relative,
+                              'tracks': [e for e in entries if e in tracks]})
+
+        self._tracks, self._playlists = tracks, playlists
+        self._listing = [{'path': entry['path'],
+                          'title': entry['title'] or os.path.splitext(os.path.basename(entry['path']))[0],
+                          'duration': entry['duration'],
+                          'bitrate': entry['bitrate'],
+                          'size': entry['size']}
+                         for _, entry in sorted(tracks.items())]
+        digest = hashlib.sha1()
+        for relative in sorted(tracks):
+            digest.update(f"{relative}\0{tracks[relative]['size']}\0{tracks[relative]['mtime']}\n".encode())
+        digest.update(json.dumps(playlists, sort_keys=True).encode())
+        self.version = digest.hexdigest()[:16]
+        if reread or len(previous) != len(tracks):
+            self._save_index()
+
+    def snapshot(self, force=False):
+        """Rescan if anything changed; returns ``(version, tracks, playlists)``.
+
+        ``tracks`` is sorted by path; each has path, title (the filename if
+        the file has no title tag), duration, bitrate and size.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if force or self._tracks is None or now - self._checked >= self.rescan_interval:
+                self._checked = now
+                stamps = self._directory_stamps() if self.root.exists() else {}
+                if force or stamps != self._stamps or self._tracks is None:
+                    self._stamps = stamps
+                    if self.root.exists():
+                        self._scan()
+                    else:
+                        self._tracks, self._listing, self._playlists, self.version = {}, [], [], 'empty'
+            return self.version, self._listing, self._playlists
@@ -0,0 +1,95 @@
+"""Music streaming: zero-copy file responses and low-bitrate variants.
+
+``FileSpan`` is the body of a ``/music/<file>`` response: a byte range of
+a file. Under werkzeug's servers (the development server and
+``serving.ProductionServer``) it sends the headers and then hands the
+range to ``socket.sendfile()``, so the kernel copies the file straight to
+the socket. Python falls back to a send loop for TLS sockets and platforms
+without ``sendfile``. Elsewhere (the ASGI server, the test client) it is an
+ordinary iterator of ``CHUNK_SIZE`` blocks.
+
+Variants are lower-bitrate copies of tracks for phones on weak Wi-Fi. The
+``music-variants`` background job encodes them with ffmpeg, if it's
+installed, into ``.cache/music_variants/<track>.<format>``. A variant is
+only used while it is newer than its source track.
+"""
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+CHUNK_SIZE = 256 * 1024
+
+# Variant formats: file suffix, mimetype and ffmpeg encoder arguments
+VARIANT_FORMATS = {
+    'opus': ('.opus', 'audio/ogg', ['-c:a', 'libopus', '-vbr', 'on']),
+    'mp3': ('.mp3', 'audio/mpeg', ['-c:a', 'libmp3lame']),
+}
+VARIANT_BITRATE = 96  # kbps
+TRANSCODE_TIMEOUT = 600  # Seconds per track
+
+
+class FileSpan:
+    """``length`` bytes of the file at ``path`` starting at ``offset``, as a WSGI body."""
+
+    def __init__(self, path, offset, length, environ):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self._socket = environ.get('werkzeug.socket')
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            if self._socket is not None and self.length:
+                # The first (empty) write makes werkzeug send the headers, with
+                # the Content-Length of the span; the body then goes out as is
+                yield b''
+                self._socket.sendfile(f, self.offset, self.length)
+                return
+            f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+
+def variant_path(variants_dir, track, variant_format):
+    """Where the ``variant_format`` copy of ``track`` (a library path) is stored."""
+    return Path(variants_dir) / f"{track}{VARIANT_FORMATS[variant_format][0]}"
+
+
+def current_variant(variants_dir, source, track, variant_format):
+    """The variant file if it exists and is newer than ``source``, else None."""
+    path = variant_path(variants_dir, track, variant_format)
+    try:
+        if path.stat().st_mtime_ns >= os.stat(source).st_mtime_ns:
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def find_encoder():
+    """Path of the ffmpeg binary, or None if it isn't installed."""
+    return shutil.which('ffmpeg')
+
+
+def transcode(encoder, source, destination, variant_format, bitrate=VARIANT_BITRATE):
+    """Encode ``source`` into ``destination`` (written atomically)."""
+    suffix, _, codec_args = VARIANT_FORMATS[variant_format]
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(f'.{destination.name}.partial{suffix}')
+    command = [encoder, '-nostdin', '-v', 'error', '-y', '-i', str(source),
+               '-vn', '-map_metadata', '0', *codec_args, '-b:a', f'{bitrate}k', str(partial)]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=TRANSCODE_TIMEOUT)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f'ffmpeg exited with {result.returncode}')
+        os.replace(partial, destination)
+    finally:
+        if partial.exists():
+            partial.unlink()
@@ -0,0 +1,182 @@
+"""Opt-in cProfile capture for requests, background jobs and scripts.
+
+A ``Session`` collects cProfile data for one unit of work from every
+thread that takes part in it (a job's ``ctx.map`` workers, a script's
+thread pool) and ``save()`` merges it into ``.cache/profiles``:
+
+- ``<name>.prof``: the merged ``pstats`` dump, for ``snakeviz`` or
+  ``python -m pstats``.
+- ``<name>.txt``: the top functions by cumulative time.
+- ``<name>.json``: what was profiled, when, and how long it took.
+
+Only the newest ``MAX_PROFILES`` profiles are kept.
+
+Requests are profiled with an ``X-Profile: 1`` header or ``?profile=1``
+(``init_app()``), or all of them with ``python app.py --profile``. The
+profile's name comes back in the ``X-Profile`` response header.
+"""
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+MAX_PROFILES = 100
+SUMMARY_LINES = 40  # Functions listed in the text summary
+PROFILE_FLAGS = ('1', 'true', 'yes')
+
+_NAME = re.compile(r'^[\w.-]+$')
+
+
+def valid_name(name):
+    return bool(_NAME.match(name or ''))
+
+
+class Session:
+    """cProfile data for one request, job or script run, from any number of threads."""
+
+    def __init__(self, label, kind='request'):
+        self.label = label
+        self.kind = kind
+        self.started = time.time()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self):
+        """Profile the calling thread until ``stop()``.
+
+        A thread keeps one profiler for the whole session, so a pool thread
+        that runs many work items adds up their time. Returns False (and
+        profiles nothing) if this thread is already being profiled, or if
+        another profiler is active where Python only allows one.
+        """
+        if getattr(self._local, 'running', False):
+            return False
+        profile = getattr(self._local, 'profile', None) or cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return False
+        if getattr(self._local, 'profile', None) is None:
+            self._local.profile = profile
+            with self._lock:
+                self._profiles.append(profile)
+        self._local.running = True
+        return True
+
+    def stop(self):
+        if getattr(self._local, 'running', False):
+            self._local.profile.disable()
+            self._local.running = False
+
+    @contextmanager
+    def thread(self):
+        """Profile the calling thread for the ``with`` block."""
+        started = self.start()
+        try:
+            yield
+        finally:
+            if started:
+                self.stop()
+
+    def save(self, directory, **info):
+        """Merge the collected profiles into ``directory``; returns the profile name.
+
+        Returns None if nothing was captured. ``info`` is stored with the
+        metadata (the response status, the job ID, ...).
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        duration = time.time() - self.started
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^\w.-]+', '-', self.label).strip('-')[:60] or self.kind
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{slug}-{uuid.uuid4().hex[:6]}"
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(directory / f'{name}.prof')
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.strip_dirs().sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        (directory / f'{name}.txt').write_text(f'{self.label}\n{summary.getvalue()}', encoding='utf-8')
+
+        meta = {
+            'name': name,
+            'kind': self.kind,
+            'label': self.label,
+            'created': self.started,
+            'duration': round(duration, 4),
+            'threads': len(profiles),
+            'calls': stats.total_calls,
+            **info,
+        }
+        with open(directory / f'{name}.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        prune(directory)
+        return name
+
+
+def list_profiles(directory):
+    """Metadata of the saved profiles, newest first."""
+    profiles = []
+    for path in Path(directory).glob('*.json'):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda meta: meta.get('created', 0), reverse=True)
+    return profiles
+
+
+def prune(directory, keep=MAX_PROFILES):
+    """Delete all but the newest ``keep`` profiles."""
+    for meta in list_profiles(directory)[keep:]:
+        for suffix in ('.json', '.prof', '.txt'):
+            (Path(directory) / f"{meta['name']}{suffix}").unlink(missing_ok=True)
+
+
+def init_app(app, directory, skip=()):
+    """Profile requests that ask for it (or all, with ``PROFILE`` set).
+
+    ``directory()`` returns where profiles go; endpoints in ``skip`` (the
+    profile viewers themselves) are never profiled.
+    """
+    from flask import g, request
+
+    app.config.setdefault('PROFILE', False)
+
+    def requested():
+        return (app.config.get('PROFILE')
+                or request.headers.get('X-Profile', '').lower() in PROFILE_FLAGS
+                or request.args.get('profile', '').lower() in PROFILE_FLAGS)
+
+    @app.before_request
+    def _start_profile():
+        if request.endpoint in skip or not requested():
+            return
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        session = Session(f'{request.method} {rule}', kind='request')
+        if session.start():
+            g.profile_session = session
+
+    @app.after_request
+    def _save_profile(response):
+        session = g.pop('profile_session', None)
+        if session is not None:
+            session.stop()
+            name = session.save(directory(), path=request.full_path.rstrip('?'), status=response.status_code)
+            if name:
+                response.headers['X-Profile'] = name
+        return response
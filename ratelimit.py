@@ -0,0 +1,184 @@
+"""Shared, adaptive rate limiting for upstream (D&D Beyond) requests.
+
+Every outbound request goes through one ``UpstreamLimiter``, which keeps a
+token bucket per host:
+
+- ``reserve(url)`` takes a token and returns how long the caller must wait
+  before sending. Blocking code sleeps for it (``wait()``), async code
+  awaits ``asyncio.sleep()`` for it. The bucket allows short bursts of
+  ``burst`` requests, then ``rate`` requests per second.
+- ``record(url, status, latency)`` feeds the outcome back. A 429/503 halves
+  the host's rate and pauses it for ``Retry-After`` seconds. A slow
+  response or a connection error cuts the rate by 20%. Every other response
+  raises it a little, up to ``max_rate``. Several bad responses arriving
+  together only count once per ``cooldown`` seconds.
+- ``set_cap(name, rate)`` holds one caller, such as a background job with
+  ``params.rate``, to a fixed rate below the host's. The caller waits for
+  ``reserve_cap(name)`` before each request, which then waits for its
+  host's bucket as usual.
+
+``stats()`` exports the current per-host rates for /api/upstream/limits.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Statuses that mean "slow down"
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostBucket:
+    """Token bucket with AIMD rate adaptation for a single host."""
+
+    def __init__(self, rate, burst, min_rate, max_rate, slow_seconds, increase, cooldown):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_seconds = slow_seconds
+        self.increase = increase
+        self.cooldown = cooldown
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.slow = 0
+        self.errors = 0
+        self.latency_total = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now):
+        self._refill(now)
+        self.tokens -= 1
+        delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(delay, self.paused_until - now)
+
+    def _decrease(self, now, factor):
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def record(self, now, status, latency, retry_after=None):
+        self.requests += 1
+        if latency is not None:
+            self.latency_total += latency
+        if status in THROTTLE_STATUSES:
+            self.throttled += 1
+            self._decrease(now, 0.5)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.paused_until = max(self.paused_until, now + min(pause, 60.0))
+        elif status is None:
+            self.errors += 1
+            self._decrease(now, 0.8)
+        elif latency is not None and latency > self.slow_seconds:
+            self.slow += 1
+            self._decrease(now, 0.8)
+        else:
+            self._refill(now)
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def stats(self, now):
+        self._refill(now)
+        return {
+            'rate': round(self.rate, 3),
+            'burst': self.burst,
+            'tokens': round(self.tokens, 2),
+            'pausedFor': round(max(0.0, self.paused_until - now), 2),
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'slow': self.slow,
+            'errors': self.errors,
+            'avgLatency': round(self.latency_total / self.requests, 3) if self.requests else None,
+        }
+
+
+class UpstreamLimiter:
+    """Per-host token buckets shared by every upstream caller in the process."""
+
+    DEFAULTS = {
+        'rate': 5.0,          # Starting requests/second per host
+        'burst': 5,           # Requests allowed back to back
+        'min_rate': 0.2,
+        'max_rate': 20.0,
+        'slow_seconds': 5.0,  # Responses slower than this count as a slow-down signal
+        'increase': 0.1,      # Requests/second added per good response
+        'cooldown': 1.0,      # Seconds between consecutive rate cuts
+    }
+
+    def __init__(self, **settings):
+        self.settings = dict(self.DEFAULTS)
+        self.settings.update(settings)
+        self._hosts = {}
+        self._caps = {}
+        self._lock = threading.Lock()
+
+    def configure(self, **settings):
+        """Change settings. Hosts already seen restart from the new values."""
+        unknown = set(settings) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown rate limit settings: {', '.join(sorted(unknown))}")
+        with self._lock:
+            self.settings.update(settings)
+            self._hosts.clear()
+
+    def _bucket(self, url):
+        host = urlsplit(url).hostname or url
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = self._hosts[host] = HostBucket(**self.settings)
+        return bucket
+
+    def reserve(self, url):
+        """Take a token for ``url``'s host. Returns seconds to wait before sending."""
+        with self._lock:
+            return self._bucket(url).reserve(time.monotonic())
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def record(self, url, status, latency=None, retry_after=None):
+        """Report a response (``status`` None for a connection error/timeout)."""
+        retry_seconds = None
+        if retry_after is not None:
+            try:
+                retry_seconds = max(0.0, float(retry_after))
+            except (TypeError, ValueError):
+                retry_seconds = None  # HTTP-date form; fall back to the bucket's own pause
+        with self._lock:
+            self._bucket(url).record(time.monotonic(), status, latency, retry_seconds)
+
+    def set_cap(self, name, rate):
+        """Hold the caller ``name`` to ``rate`` requests/second (a fixed-rate
+        bucket without bursts); None removes its cap."""
+        with self._lock:
+            if rate:
+                self._caps[name] = HostBucket(**dict(self.settings, rate=rate, burst=1, min_rate=rate,
+                                                     max_rate=rate, increase=0.0))
+            else:
+                self._caps.pop(name, None)
+
+    def reserve_cap(self, name):
+        """Take a token from ``name``'s cap. Returns seconds to wait (0 without one)."""
+        with self._lock:
+            bucket = self._caps.get(name)
+            return bucket.reserve(time.monotonic()) if bucket is not None else 0.0
+
+    def caps(self):
+        """Current caps as ``{name: rate}``."""
+        with self._lock:
+            return {name: bucket.rate for name, bucket in sorted(self._caps.items())}
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {host: bucket.stats(now) for host, bucket in sorted(self._hosts.items())}
@@ -5,7 +5,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import COOKIES_CACHE
+from app import COOKIES_CACHE, upstream_get
 import requests
 import json
 from pathlib import Path
@@ -30,8 +30,9 @@ def check_url(monster_id, session, headers):
     url = f"https://www.dndbeyond.com/monsters/{monster_id}"
     
     try:
-        # Use GET request (not HEAD) with short timeout to follow redirects
-        response = session.get(url, headers=headers, timeout=5, allow_redirects=True)
+        # Use GET request (not HEAD) with short timeout to follow redirects.
+        # upstream_get paces all workers through the shared per-host limiter.
+        response = upstream_get(session.get, url, headers=headers, timeout=5, allow_redirects=True)
         
         # Check if we got a valid monster page (not a 404 or marketplace redirect)
         is_valid = (
@@ -2,8 +2,12 @@
 """
 Fetch and parse all monsters from monsters.json in parallel.
 Marks monsters with access issues as "noAccess": true.
+
+--profile runs every worker under cProfile and saves the merged profile to
+.cache/profiles (see profiling.py), like the server's --profile flag.
 """
 
+import argparse
 import json
 import sys
 from pathlib import Path
@@ -14,7 +18,8 @@ import time
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app import get_monster_details, app
+from app import get_monster_details, init_runtime, app
+from profiling import Session
 
 # Constants
 CACHE_DIR = Path(__file__).parent.parent / '.cache'
@@ -229,14 +234,29 @@ def validate_cached_monsters():
     
     return validation_results
 
+def profiled(profile, fn, *args):
+    """Run fn(*args), under the session's profiler for this thread if profiling"""
+    if profile is None:
+        return fn(*args)
+    with profile.thread():
+        return fn(*args)
+
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description='Fetch and parse every monster in .cache/monsters.json')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run (all worker threads) into .cache/profiles')
+    args = parser.parse_args()
+    profile = Session('fetch_all_monsters', kind='script') if args.profile else None
     start_time = time.time()
     
     print("="*80)
     print("PARALLEL MONSTER FETCHER")
     print("="*80)
     
+    # Load cookies and seed the cache the same way the server does
+    init_runtime()
+    
     # Load monsters
     monsters = load_monsters()
     
@@ -258,7 +278,7 @@ def main():
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         # Submit all tasks
         futures = {
-            executor.submit(fetch_monster, name, data, monsters, dict_lock): name 
+            executor.submit(profiled, profile, fetch_monster, name, data, monsters, dict_lock): name 
             for name, data in monster_items
         }
         
@@ -307,6 +327,11 @@ def main():
     print(f"  ⊗ Skipped: {stats['skipped']} ({stats['skipped']/stats['total']*100:.1f}%)")
     print(f"\nTime Elapsed: {elapsed:.1f}s ({stats['total']/elapsed:.1f} monsters/sec)")
     
+    if profile is not None:
+        name = profile.save(CACHE_DIR / 'profiles', monsters=stats['total'])
+        if name:
+            print(f"Profile: {CACHE_DIR / 'profiles' / name}.txt (raw: {name}.prof)")
+    
     # Validate cached monsters
     validation_results = validate_cached_monsters()
     
@@ -5,7 +5,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import get_monster_details, CACHE_DIR, MONSTER_DETAILS_DIR
+from app import get_monster_details, init_runtime, CACHE_DIR, MONSTER_DETAILS_DIR
 import json
 import random
 import time
@@ -150,6 +150,9 @@ def fetch_monsters(monster_list, count=50):
     return passed, failed
 
 if __name__ == '__main__':
+    # Load cookies and seed the cache the same way the server does
+    init_runtime()
+    
     # Get monster URLs from monsters.json
     all_monsters = get_monster_list()
     
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Load test for the spectator endpoint (/api/current-encounter).
+
+Simulates a table of phones polling the spectator view and reports
+throughput, latency percentiles and errors.
+
+Usage:
+    # Against a running server
+    python scripts/load_test_spectator.py --url http://localhost:5000 --clients 50
+
+    # Start the dev (thread-per-connection) and production (worker pool)
+    # servers in-process and compare them on the same workload
+    python scripts/load_test_spectator.py --compare --clients 200 --reconnect
+
+``--reconnect`` opens a new connection for every request, which is what a
+room full of phones waking up and reconnecting looks like to the server.
+
+With ``--compare`` the servers normally serve ``adventures/``. To see how
+polling scales with campaign size, serve a generated adventure instead
+(``--synthetic 500`` for 500 encounters, see benchmarks/synthetic.py) or
+any adventure file (``--adventure path.json``).
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+ENDPOINT = '/api/current-encounter'
+
+
+def _client(host, port, args, deadline, results, lock):
+    latencies = []
+    errors = 0
+    overloaded = 0
+    conn = None
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=args.timeout)
+            conn.request('GET', args.path)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 503:
+                overloaded += 1
+            elif response.status != 200:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+            if args.reconnect or response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            if conn is not None:
+                conn.close()
+            conn = None
+        if args.interval:
+            time.sleep(args.interval)
+    if conn is not None:
+        conn.close()
+    with lock:
+        results['latencies'].extend(latencies)
+        results['errors'] += errors
+        results['overloaded'] += overloaded
+
+
+def run_load(url, args):
+    """Run the configured workload against ``url`` and return a summary dict."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    results = {'latencies': [], 'errors': 0, 'overloaded': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=_client, args=(host, port, args, deadline, results, lock), daemon=True)
+        for _ in range(args.clients)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(args.duration + args.timeout + 5)
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(results['latencies'])
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+    return {
+        'url': url,
+        'clients': args.clients,
+        'duration': round(elapsed, 2),
+        'requests': len(latencies),
+        'requestsPerSecond': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50Ms': percentile(0.50),
+        'p95Ms': percentile(0.95),
+        'p99Ms': percentile(0.99),
+        'meanMs': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        'errors': results['errors'],
+        'overloaded': results['overloaded'],
+    }
+
+
+def _start_in_process(mode, args):
+    """Start the app on an ephemeral port in ``mode`` ('dev' or 'production')."""
+    import app as flask_app
+    flask_app.init_runtime()
+    if mode == 'production':
+        from serving import ProductionServer
+        server = ProductionServer(flask_app.app, workers=args.workers,
+                                  queue_size=args.queue_size, keep_alive=args.keep_alive)
+        listener = server.add_listener('HTTP', '127.0.0.1', 0)
+        server.start()
+        return f'http://127.0.0.1:{listener.port}', lambda: server.shutdown(timeout=5)
+
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.port}', server.shutdown
+
+
+def _use_adventure(args):
+    """Serve only the --adventure file or a --synthetic one, from a temporary directory."""
+    import shutil
+    import tempfile
+
+    import app as flask_app
+    directory = Path(tempfile.mkdtemp(prefix='spectator-load-'))
+    if args.adventure:
+        shutil.copyfile(args.adventure, directory / args.adventure.name)
+    else:
+        from benchmarks.synthetic import generate_adventure, write_adventure
+        data = generate_adventure(f'Synthetic {args.synthetic}', encounters=args.synthetic)
+        write_adventure(data, directory / f"{data['name']}.json")
+    flask_app.DATA_DIR = directory
+    return directory
+
+
+def print_summary(label, summary):
+    print(f"{label}:")
+    print(f"  {summary['requests']} requests in {summary['duration']}s "
+          f"({summary['requestsPerSecond']} req/s, {summary['clients']} clients)")
+    print(f"  latency p50 {summary['p50Ms']}ms  p95 {summary['p95Ms']}ms  p99 {summary['p99Ms']}ms")
+    print(f"  errors {summary['errors']}  overloaded (503) {summary['overloaded']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Base URL of a running server')
+    parser.add_argument('--path', default=ENDPOINT, help=f'Path to poll (default {ENDPOINT})')
+    parser.add_argument('--clients', type=int, default=50, help='Concurrent pollers (default 50)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run (default 10)')
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help='Pause between a client\'s requests; the spectator page uses 3s (default 0)')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout (default 10)')
+    parser.add_argument('--reconnect', action='store_true', help='Open a new connection per request')
+    parser.add_argument('--compare', action='store_true',
+                        help='Start dev and production servers in-process and compare them')
+    parser.add_argument('--workers', type=int, default=16, help='Production workers for --compare')
+    parser.add_argument('--queue-size', type=int, default=64, help='Production queue size for --compare')
+    parser.add_argument('--keep-alive', type=float, default=5.0, help='Production keep-alive for --compare')
+    parser.add_argument('--adventure', type=Path, default=None,
+                        help='With --compare, serve this adventure file instead of adventures/')
+    parser.add_argument('--synthetic', type=int, default=None, metavar='ENCOUNTERS',
+                        help='With --compare, serve a generated adventure with this many encounters')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+    if (args.adventure or args.synthetic) and not args.compare:
+        parser.error('--adventure and --synthetic need --compare (a running server serves its own adventures)')
+    if args.adventure and args.synthetic:
+        parser.error('--adventure and --synthetic are mutually exclusive')
+
+    if not args.compare:
+        summary = run_load(args.url.rstrip('/'), args)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_summary(summary['url'], summary)
+        return 0
+
+    directory = _use_adventure(args) if args.adventure or args.synthetic else None
+    summaries = {}
+    try:
+        for mode in ('dev', 'production'):
+            url, stop = _start_in_process(mode, args)
+            try:
+                summaries[mode] = run_load(url, args)
+            finally:
+                stop()
+    finally:
+        if directory is not None:
+            import shutil
+            shutil.rmtree(directory, ignore_errors=True)
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print_summary('Dev server (thread per connection)', summaries['dev'])
+        print_summary(f'Production server ({args.workers} workers)', summaries['production'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""Production WSGI serving for the encounter tracker.
+
+The development server (werkzeug's ``make_server(..., threaded=True)``)
+starts a new thread for every connection and keeps it alive for as long as
+the browser holds the connection open. A table full of phones polling the
+spectator view, plus a slow monster scrape or two, quickly turns into
+hundreds of threads.
+
+``ProductionServer`` serves the app from a fixed-size worker pool that is
+shared by every listener (HTTP and HTTPS):
+
+- Accepted connections wait on a selector until their first request
+  arrives, so idle sockets (browser preconnects, phones reconnecting at
+  once) don't hold a worker. A connection that sends nothing within
+  ``keep_alive`` seconds is closed.
+- Connections with a request ready are queued for the pool. When the queue
+  is full the client gets an immediate ``503`` with ``Retry-After`` instead
+  of piling up.
+- Workers handle one request at a time. Between requests, keep-alive
+  connections go back on the selector rather than blocking a worker, and
+  are closed after ``keep_alive`` idle seconds. Keep-alive is offered for
+  requests without a body (the spectator poll and other GETs); requests
+  with a body still close the connection, as with werkzeug's own server.
+- ``shutdown()`` stops accepting, closes idle connections and lets queued
+  and in-flight requests finish (up to a timeout).
+
+Each listener accepts on its own thread, and for HTTPS that thread also
+runs the TLS handshake (the ``ssl`` module does it on accept). A slow or
+stalled handshake therefore delays that listener's next accept, not the
+workers or the other listener.
+
+Only the standard library and werkzeug (already a Flask dependency) are used.
+"""
+import queue
+import selectors
+import socket
+import ssl
+import threading
+import time
+import traceback
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 20\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"Server overloaded.\r\n"
+)
+
+
+class WorkerPool:
+    """Fixed number of worker threads fed from a bounded task queue."""
+
+    def __init__(self, workers=16, queue_size=64, name='wsgi-worker'):
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        self.workers = workers
+        self.queue_size = queue_size
+        self._tasks = queue.Queue(maxsize=queue_size)
+        self._accepting = True
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name=f'{name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args):
+        """Queue ``fn(*args)``. Returns False if the pool is full or stopping."""
+        if not self._accepting:
+            return False
+        try:
+            self._tasks.put_nowait((fn, args))
+        except queue.Full:
+            return False
+        return True
+
+    def stats(self):
+        """Snapshot of pool utilization."""
+        return {
+            'workers': self.workers,
+            'busy': self._busy,
+            'queued': self._tasks.qsize(),
+            'queueSize': self.queue_size,
+        }
+
+    def _run(self):
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                return
+            fn, args = item
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting work and wait for queued tasks to drain.
+
+        Returns True if every worker exited within ``timeout`` seconds.
+        """
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                # Sentinels go behind any queued work, so it drains first
+                self._tasks.put(None, timeout=remaining)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
+
+
+class _EmptyReader:
+    """Stand-in for ``rfile`` that reports no unread input."""
+
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    def read(self, size=-1):
+        return b''
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    """Request handler driven one request at a time by ``PooledWSGIServer``.
+
+    The stock handler loops over every request on a connection inside
+    ``handle()``. Here ``handle()`` and ``finish()`` are no-ops so that
+    constructing the handler only sets up the socket files; the server then
+    calls ``serve_one()`` per request and ``close()`` when done.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Applies while a request is being read/written, not while idle
+    timeout = 30
+
+    def handle(self):
+        pass
+
+    def send_header(self, keyword, value):
+        # werkzeug always answers with "Connection: close" because it can't
+        # drain a request body the app didn't read. Requests without a body
+        # leave nothing to drain, so those may keep the connection open.
+        if keyword.lower() == 'connection' and value.lower() == 'close' and self._can_keep_alive():
+            return
+        super().send_header(keyword, value)
+
+    def _can_keep_alive(self):
+        headers = self.headers
+        return (
+            self.request_version == 'HTTP/1.1'
+            and self.command in ('GET', 'HEAD', 'OPTIONS')
+            and 'Content-Length' not in headers
+            and 'Transfer-Encoding' not in headers
+            and headers.get('Connection', '').lower() != 'close'
+        )
+
+    def make_environ(self):
+        environ = super().make_environ()
+        # After the response werkzeug drains unread input with a blocking
+        # read; on a kept-alive connection that would swallow (or wait for)
+        # the next request. A body-less request has nothing to drain, so the
+        # drain gets an empty reader. The app's wsgi.input is already bound.
+        if self._can_keep_alive():
+            self.rfile = _EmptyReader(self.rfile)
+        return environ
+
+    def finish(self):
+        pass
+
+    def serve_one(self):
+        """Handle a single request. Returns True if the connection can be reused."""
+        self.close_connection = True
+        try:
+            self.handle_one_request()
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e)
+            return False
+        except Exception as e:
+            if self.server.ssl_context is not None and isinstance(e, ssl.SSLError):
+                self.log_error('SSL error occurred: %s', e)
+                return False
+            raise
+        finally:
+            if isinstance(self.rfile, _EmptyReader):
+                self.rfile = self.rfile.wrapped
+        return not self.close_connection
+
+    def has_buffered_input(self):
+        """True if the next request is already readable without blocking."""
+        sock = self.connection
+        if isinstance(sock, ssl.SSLSocket) and sock.pending():
+            return True
+        try:
+            sock.setblocking(False)
+            return bool(self.rfile.peek(1))
+        except (OSError, ValueError):
+            return False
+        finally:
+            try:
+                sock.settimeout(self.timeout)
+            except OSError:
+                pass
+
+    def close(self):
+        super().finish()
+
+
+class _Connection:
+    __slots__ = ('handler', 'request', 'client_address', 'idle_since')
+
+    def __init__(self, handler, request, client_address):
+        self.handler = handler
+        self.request = request
+        self.client_address = client_address
+        self.idle_since = time.monotonic()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Listener that dispatches its connections to a shared ``ProductionServer``."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, owner, ssl_context=None):
+        self.owner = owner
+        super().__init__(host, port, app, handler=PooledRequestHandler, ssl_context=ssl_context)
+
+    def process_request(self, request, client_address):
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        # Wait for the request on the selector, not on a worker
+        self.owner.park(_Connection(handler, request, client_address), self)
+
+
+class ProductionServer:
+    """Serve one WSGI app on several listeners from a single worker pool."""
+
+    def __init__(self, app, workers=16, queue_size=64, keep_alive=5.0):
+        self.app = app
+        self.keep_alive = keep_alive
+        self.pool = WorkerPool(workers=workers, queue_size=queue_size)
+        self.listeners = []
+        self._selector = selectors.DefaultSelector()
+        self._selector_lock = threading.Lock()
+        # Written to when a connection is parked, so the selector picks it up at once
+        self._wakeup, self._wakeup_signal = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._wakeup_signal.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ, None)
+        self._stopping = threading.Event()
+        self._threads = []
+        # Counted on the accept, keep-alive and worker threads
+        self.rejected = 0
+        self._rejected_lock = threading.Lock()
+
+    def add_listener(self, name, host, port, ssl_context=None):
+        server = PooledWSGIServer(host, port, self.app, self, ssl_context=ssl_context)
+        self.listeners.append((name, server))
+        return server
+
+    def start(self):
+        for name, server in self.listeners:
+            thread = threading.Thread(target=server.serve_forever, name=f'{name}-accept', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        idle_thread = threading.Thread(target=self._watch_idle, name='keep-alive', daemon=True)
+        idle_thread.start()
+        self._threads.append(idle_thread)
+
+    def stats(self):
+        stats = self.pool.stats()
+        with self._selector_lock:
+            stats['idle'] = len(self._selector.get_map()) - 1
+        stats['rejected'] = self.rejected
+        return stats
+
+    def dispatch(self, conn, server):
+        """Hand a connection with a pending request to the worker pool."""
+        if self._stopping.is_set() or not self.pool.submit(self._serve, conn, server):
+            with self._rejected_lock:
+                self.rejected += 1
+            try:
+                conn.request.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            self._close(conn, server)
+
+    def _serve(self, conn, server):
+        try:
+            keep_open = conn.handler.serve_one()
+        except Exception:
+            server.handle_error(conn.request, conn.client_address)
+            keep_open = False
+        if not keep_open or self._stopping.is_set():
+            self._close(conn, server)
+        elif conn.handler.has_buffered_input():
+            self.dispatch(conn, server)
+        else:
+            self.park(conn, server)
+
+    def park(self, conn, server):
+        """Hold an idle connection until its next request is readable."""
+        if isinstance(conn.request, ssl.SSLSocket) and conn.request.pending():
+            # Already decrypted, so the socket won't become readable for it
+            self.dispatch(conn, server)
+            return
+        conn.idle_since = time.monotonic()
+        try:
+            with self._selector_lock:
+                self._selector.register(conn.request, selectors.EVENT_READ, (conn, server))
+        except (ValueError, OSError):
+            self._close(conn, server)
+            return
+        try:
+            self._wakeup_signal.send(b'\0')
+        except OSError:
+            pass
+
+    def _watch_idle(self):
+        while not self._stopping.is_set():
+            for key, _ in self._selector.select(timeout=0.1):
+                if key.data is None:
+                    try:
+                        while self._wakeup.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                conn, server = key.data
+                with self._selector_lock:
+                    self._selector.unregister(key.fileobj)
+                self.dispatch(conn, server)
+            self._reap_idle(time.monotonic() - self.keep_alive)
+
+    def _reap_idle(self, cutoff):
+        expired = []
+        with self._selector_lock:
+            for key in list(self._selector.get_map().values()):
+                if key.data is None:
+                    continue
+                conn, server = key.data
+                if cutoff is None or conn.idle_since < cutoff:
+                    self._selector.unregister(key.fileobj)
+                    expired.append((conn, server))
+        for conn, server in expired:
+            self._close(conn, server)
+
+    def _close(self, conn, server):
+        try:
+            conn.handler.close()
+        except Exception:
+            pass
+        server.shutdown_request(conn.request)
+
+    def shutdown(self, timeout=10.0):
+        """Stop listeners, close idle connections and drain in-flight requests.
+
+        Returns True if all requests finished within ``timeout`` seconds.
+        """
+        self._stopping.set()
+        for _, server in self.listeners:
+            server.shutdown()
+            server.server_close()
+        self._reap_idle(None)
+        drained = self.pool.shutdown(timeout)
+        for thread in self._threads:
+            thread.join(1.0)
+        self._wakeup.close()
+        self._wakeup_signal.close()
+        return drained
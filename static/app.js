@@ -12,7 +12,8 @@ import { createModalManager } from './components/modalManager.js';
 import { createEventHandlers } from './core/eventHandlers.js';
 import { createAdventureRenderer } from './renderers/adventureRenderer.js';
 import { createAdventureService } from './services/adventureService.js';
-import { musicService } from './services/musicService.js';
+import { createLiveSync } from './services/liveSync.js';
+import { musicService, formatTrackLabel } from './services/musicService.js';
 import * as monsterListRenderer from './renderers/monsterListRenderer.js';
 import * as playerRenderer from './renderers/playerRenderer.js';
 import * as encounterRenderer from './renderers/encounterRenderer.js';
@@ -58,6 +59,10 @@ export function initializeApp(config = {}) {
     const doc = config.document || document;
     const win = config.window || window;
     const fetchFn = config.fetch || fetch.bind(win);
+    // Names this tab in the live change events its saves cause
+    const clientId = (win.crypto && win.crypto.randomUUID)
+        ? win.crypto.randomUUID()
+        : Math.random().toString(36).slice(2);
 
     // ==================== MODULE INITIALIZATION ====================
 
@@ -68,6 +73,7 @@ export function initializeApp(config = {}) {
     const api = createAPIClient({
         fetch: fetchFn,
         baseURL: config.apiBaseURL || '',
+        clientId,
     });
 
     // Initialize DOM helpers
@@ -90,6 +96,57 @@ export function initializeApp(config = {}) {
             const select = dom.getElementById('adventureSelect');
             return select ? select.value : '';
         },
+        // Another tab or device saved too: show the server's copy
+        onAdventureReplaced: replaceAdventure,
+    });
+
+    function replaceAdventure(adventure) {
+        state.loadAdventure(adventure, state.get('currentChapter'));
+        win.currentAdventure = state.get('currentAdventure');
+        renderAdventureWhenIdle();
+    }
+
+    // Re-render the whole adventure, but not under the DM's cursor: wait
+    // until the field being edited loses focus
+    let renderPending = false;
+    function renderAdventureWhenIdle() {
+        const active = doc.activeElement;
+        if (active && ['INPUT', 'TEXTAREA', 'SELECT'].includes(active.tagName)) {
+            if (!renderPending) {
+                renderPending = true;
+                active.addEventListener('blur', () => {
+                    renderPending = false;
+                    renderAdventureWhenIdle();
+                }, { once: true });
+            }
+            return;
+        }
+        renderers.renderAdventure();
+        renderers.renderChapterSelector();
+        renderers.renderPlayers();
+        renderers.renderEncounters();
+    }
+
+    // Follow changes saved from other tabs and devices
+    const liveSync = createLiveSync({
+        EventSource: config.EventSource || win.EventSource,
+        clientId,
+        getAdventure: () => state.get('currentAdventure'),
+        onAdventureChanged: () => renderAdventureWhenIdle(),
+        reloadAdventure: async (name) => {
+            try {
+                replaceAdventure(await api.getAdventure(name));
+            } catch (error) {
+                console.error('Live sync: reloading the adventure failed:', error);
+            }
+        },
+        onAdventureDeleted: () => {
+            helpers.showToast('This adventure was deleted on another device', 'error');
+            handlers.goHome();
+        },
+        onAdventureLocked: () => {
+            helpers.showToast('The PIN for this adventure was changed. Reload and enter the new PIN to keep editing.', 'error');
+        },
     });
 
     // Renderer functions - mix of modular renderers and legacy bridges
@@ -129,7 +186,7 @@ export function initializeApp(config = {}) {
         const options = ['<option value="">— none —</option>']
             .concat((status.available || []).map(name => {
                 const sel = name === selected ? ' selected' : '';
-                return `<option value="${escapeAttr(name)}"${sel}>${escapeAttr(name)}</option>`;
+                return `<option value="${escapeAttr(name)}"${sel}>${escapeAttr(formatTrackLabel(name, status.tracks))}</option>`;
             }));
         select.innerHTML = options.join('');
     }
@@ -161,6 +218,7 @@ export function initializeApp(config = {}) {
         helpers,
         renderers,
         musicService,
+        liveSync,
     });
 
     // ==================== EVENT LISTENER SETUP ====================
@@ -373,7 +431,7 @@ export function initializeApp(config = {}) {
         }
         if (refreshEl) {
             dom.addEventListener(refreshEl, 'click', async () => {
-                await musicService.refreshAvailable();
+                await musicService.refreshAvailable({ rescan: true });
                 if (renderers.updateChapterMusicDisplay) {
                     renderers.updateChapterMusicDisplay();
                 }
@@ -699,6 +757,7 @@ export function initializeApp(config = {}) {
         modalManager,
         handlers,
         helpers,
+        liveSync,
         initialize,
         setupEventListeners,
     };
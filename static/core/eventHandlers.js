@@ -18,10 +18,11 @@
  * @param {Object} deps.modalManager - Modal manager
  * @param {Object} deps.helpers - UI helpers
  * @param {Object} deps.renderers - Renderer functions {renderAdventure, renderPlayers, renderEncounters, etc.}
+ * @param {Object} deps.liveSync - Optional live sync service (follows other devices' changes)
  * @returns {Object} Event handler functions
  */
 export function createEventHandlers(deps) {
-    const { state, api, dom, modalManager, helpers, renderers, musicService } = deps;
+    const { state, api, dom, modalManager, helpers, renderers, musicService, liveSync } = deps;
 
     // Optional music service - swallow no-ops gracefully so the rest of
     // the event handlers still work in test environments that don't pass
@@ -61,6 +62,10 @@ export function createEventHandlers(deps) {
             adventureSelect.value = '';
         }
         
+        if (liveSync) {
+            liveSync.stop();
+        }
+
         // Clear state
         state.setState({ currentAdventure: null, currentChapter: null });
         if (typeof window !== 'undefined') {
@@ -159,6 +164,11 @@ export function createEventHandlers(deps) {
             // Switch to adventure view
             showAdventureView(adventureName);
 
+            // Follow changes saved from other tabs and devices
+            if (liveSync) {
+                liveSync.watch(adventureName);
+            }
+
             // Render everything
             if (renderers.renderAdventure) {
                 renderers.renderAdventure();
@@ -247,6 +257,9 @@ export function createEventHandlers(deps) {
 
         try {
             await api.deleteAdventure(name);
+            if (liveSync) {
+                liveSync.stop();
+            }
             
             // Reload adventures list
             if (renderers.loadAdventuresList) {
@@ -866,6 +879,11 @@ export function createEventHandlers(deps) {
             return;
         }
         
+        const saveResult = await saveResponse.json();
+        if (saveResult.revision !== undefined) {
+            currentAdventure.revision = saveResult.revision;
+        }
+        
         // Clear current session if PIN changed
         if (pinChanged) {
             try {
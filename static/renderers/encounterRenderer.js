@@ -6,7 +6,7 @@
 
 import { CR_TO_XP, DND_CONDITIONS, CONDITION_ICONS } from '../utils/constants.js';
 import { getMonsterBaseName } from '../utils/helpers.js';
-import { musicService } from '../services/musicService.js';
+import { musicService, formatTrackLabel } from '../services/musicService.js';
 
 // ==================== UTILITY FUNCTIONS ====================
 
@@ -63,32 +63,57 @@ export function getCombatantAvatarUrl(combatant) {
 
 // Track in-flight player avatar fetches keyed by dndBeyondUrl
 const playerAvatarFetchStatus = {};
+// Players waiting for the next batch request
+let pendingAvatarPlayers = [];
 
 /**
  * Lazily fetch a player's avatarUrl from the character API and
  * persist it on the player record, then re-render.
+ * Requests made during one render pass are sent as a single batch.
  */
-export async function fetchPlayerAvatar(player) {
+export function fetchPlayerAvatar(player) {
     if (!player || !player.dndBeyondUrl) return;
     if (player.avatarUrl) return;
     if (playerAvatarFetchStatus[player.dndBeyondUrl]) return;
     playerAvatarFetchStatus[player.dndBeyondUrl] = true;
 
+    pendingAvatarPlayers.push(player);
+    if (pendingAvatarPlayers.length === 1) {
+        setTimeout(fetchPendingPlayerAvatars, 0);
+    }
+}
+
+/**
+ * Load the avatars of every queued player with one /api/dndbeyond/characters call
+ */
+async function fetchPendingPlayerAvatars() {
+    const players = pendingAvatarPlayers;
+    pendingAvatarPlayers = [];
+
     try {
-        const encodedUrl = encodeURIComponent(player.dndBeyondUrl);
-        const response = await fetch(`/api/dndbeyond/character/${encodedUrl}`);
+        const response = await fetch('/api/dndbeyond/characters', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids: players.map(p => p.dndBeyondUrl) })
+        });
         if (!response.ok) return;
 
-        const data = await response.json();
-        // The character endpoint returns avatarUrl at the top level
-        const avatarUrl = data.avatarUrl || data.details?.avatarUrl;
-        if (data.success !== false && avatarUrl) {
-            player.avatarUrl = avatarUrl;
+        const { characters = {} } = await response.json();
+        let updated = false;
+        players.forEach(player => {
+            const characterId = player.dndBeyondUrl.replace(/\/+$/, '').split('/').pop();
+            const character = characters[characterId];
+            if (character && character.success !== false && character.avatarUrl) {
+                player.avatarUrl = character.avatarUrl;
+                updated = true;
+            }
+        });
+        if (updated) {
             if (window.renderEncounters) window.renderEncounters();
             if (window.autoSave) window.autoSave();
         }
     } catch (e) {
-        console.log(`Could not fetch avatar for ${player.name || player.dndBeyondUrl}:`, e.message);
+        console.log(`Could not fetch avatars for ${players.map(p => p.name || p.dndBeyondUrl).join(', ')}:`, e.message);
     }
 }
 
@@ -565,7 +590,7 @@ export function createEncounterCard(encounter, encounterIndex) {
         const optionsHtml = ['<option value="">— none —</option>']
             .concat(available.map(name => {
                 const sel = name === currentMusic ? ' selected' : '';
-                return `<option value="${escapeAttr(name)}"${sel}>${escapeAttr(name)}</option>`;
+                return `<option value="${escapeAttr(name)}"${sel}>${escapeAttr(formatTrackLabel(name, musicStatus.tracks))}</option>`;
             }))
             .join('');
         const musicRow = document.createElement('div');
@@ -32,18 +32,22 @@ export function closeMonsterModal() {
     currentEncounterIndex = null;
 }
 
+// Latest server search, so slower responses for earlier keystrokes are dropped
+let searchSequence = 0;
+
 /**
  * Render monster list based on search term
+ * Filters the in-memory library immediately, then replaces the results with
+ * the server's ranked search (prefix, word and typo matches) when it answers.
  * @param {string} searchTerm - Search filter
  */
 export function renderMonsterList(searchTerm) {
-    const monsterList = document.getElementById('monsterList');
-    const monsterCount = document.getElementById('monsterCount');
+    const library = window.DND_MONSTERS || {};
     
     // Get all monsters sorted by CR
-    const allMonsters = Object.keys(window.DND_MONSTERS).sort((a, b) => {
-        const crA = parseCR(window.DND_MONSTERS[a].cr);
-        const crB = parseCR(window.DND_MONSTERS[b].cr);
+    const allMonsters = Object.keys(library).sort((a, b) => {
+        const crA = parseCR(library[a].cr);
+        const crB = parseCR(library[b].cr);
         return crA - crB;
     });
     
@@ -53,15 +57,60 @@ export function renderMonsterList(searchTerm) {
         allMonsters.filter(name => name.toLowerCase().includes(searchLower)) :
         allMonsters;
     
-    monsterCount.textContent = `Showing ${filtered.length} of ${allMonsters.length} monsters`;
+    renderMonsterItems(filtered, filtered.length, allMonsters.length);
+    
+    const sequence = ++searchSequence;
+    if (searchTerm.trim()) {
+        searchMonstersOnServer(searchTerm, sequence);
+    }
+}
+
+/**
+ * Fetch ranked matches from /api/monsters/search and re-render with them
+ * @param {string} searchTerm - Search filter
+ * @param {number} sequence - Search number this request belongs to
+ */
+async function searchMonstersOnServer(searchTerm, sequence) {
+    try {
+        const response = await fetch(`/api/monsters/search?q=${encodeURIComponent(searchTerm)}&limit=50`);
+        const data = await response.json();
+        if (sequence !== searchSequence || !data.success) return;
+        
+        // Results may include monsters the page hasn't loaded; keep them for selectMonster
+        window.DND_MONSTERS = window.DND_MONSTERS || {};
+        const names = data.results.map(result => {
+            const { name, match, distance, ...monster } = result;
+            if (!window.DND_MONSTERS[name]) {
+                window.DND_MONSTERS[name] = monster;
+            }
+            return name;
+        });
+        renderMonsterItems(names, data.total, data.librarySize);
+    } catch (error) {
+        // Keep the local results
+        console.error('Monster search failed:', error);
+    }
+}
+
+/**
+ * Render the monster items for the selection modal
+ * @param {string[]} names - Matching monster names, best first
+ * @param {number} total - Number of matches
+ * @param {number} librarySize - Number of monsters in the library
+ */
+function renderMonsterItems(names, total, librarySize) {
+    const monsterList = document.getElementById('monsterList');
+    const monsterCount = document.getElementById('monsterCount');
+    
+    monsterCount.textContent = `Showing ${total} of ${librarySize} monsters`;
     
-    if (filtered.length === 0) {
+    if (names.length === 0) {
         monsterList.innerHTML = '<div class="no-results">No monsters found. Try a different search term.</div>';
         return;
     }
     
     // Render monster items (limit to 50 for performance)
-    const displayList = filtered.slice(0, 50);
+    const displayList = names.slice(0, 50);
     monsterList.innerHTML = displayList.map(name => {
         const monster = window.DND_MONSTERS[name];
         return `
@@ -92,8 +141,8 @@ export function renderMonsterList(searchTerm) {
         `;
     }).join('');
     
-    if (filtered.length > 50) {
-        monsterList.innerHTML += `<div class="no-results">...and ${filtered.length - 50} more. Refine your search to see them.</div>`;
+    if (total > 50) {
+        monsterList.innerHTML += `<div class="no-results">...and ${total - 50} more. Refine your search to see them.</div>`;
     }
 }
 
@@ -2,6 +2,8 @@
  * Adventure Service - Handles adventure-related operations
  */
 
+import { applyChanges } from './liveSync.js';
+
 /**
  * Create adventure service with dependencies
  * @param {Object} deps - Dependencies
@@ -9,12 +11,15 @@
  * @param {Object} deps.dom - DOM helpers
  * @param {Function} deps.getAdventure - Get current adventure from state
  * @param {Function} deps.getAdventureSelectValue - Get selected adventure name
+ * @param {Function} deps.onAdventureReplaced - Show an adventure the server merged or kept instead
  * @returns {Object} Service methods
  */
 export function createAdventureService(deps = {}) {
-    const { api, dom, getAdventure, getAdventureSelectValue } = deps;
+    const { api, dom, getAdventure, getAdventureSelectValue, onAdventureReplaced } = deps;
     
     let autoSaveTimeout = null;
+    // The save being sent; the next one waits for its revision
+    let saveInFlight = null;
 
     /**
      * Load list of adventures into the dropdown
@@ -45,6 +50,10 @@ export function createAdventureService(deps = {}) {
     function autoSave() {
         clearTimeout(autoSaveTimeout);
         autoSaveTimeout = setTimeout(async () => {
+            if (saveInFlight) {
+                await saveInFlight;
+            }
+            
             const name = getAdventureSelectValue();
             if (!name) return;
             
@@ -56,20 +65,78 @@ export function createAdventureService(deps = {}) {
                 return;
             }
             
-            try {
-                await api.updateAdventure(name, currentAdventure);
-                showSaveIndicator();
-            } catch (error) {
-                if (error.status === 403) {
-                    // Session expired or invalid - prompt for reload
-                    alert('Your session has expired. Please reload the page and re-enter your PIN.');
-                    // Clear state would be handled by event handler
-                }
-                console.error('Auto-save error:', error);
-            }
+            saveInFlight = saveAdventure(name, currentAdventure);
+            await saveInFlight;
+            saveInFlight = null;
         }, 500);
     }
 
+    /**
+     * Send the adventure with the revision it was edited from. The server
+     * merges it with saves from other tabs or devices, or (409) returns its
+     * own copy when both changed the same encounter.
+     */
+    async function saveAdventure(name, currentAdventure) {
+        const sent = JSON.stringify(currentAdventure);
+        try {
+            const result = await api.updateAdventure(name, currentAdventure);
+            if (result && result.merged && result.adventure && onAdventureReplaced) {
+                showMerged(name, sent, result);
+            } else if (result && result.revision !== undefined) {
+                setRevision(name, result.revision);
+            }
+            showSaveIndicator();
+        } catch (error) {
+            if (error.status === 403) {
+                // Session expired or invalid - prompt for reload
+                alert('Your session has expired. Please reload the page and re-enter your PIN.');
+                // Clear state would be handled by event handler
+            } else if (error.status === 409 && error.data && error.data.adventure && onAdventureReplaced) {
+                alert('This adventure was changed in another tab or device, in the same place as your last change. ' +
+                      'Their version has been loaded; please make your change again.');
+                onAdventureReplaced(error.data.adventure);
+            }
+            console.error('Auto-save error:', error);
+        }
+    }
+
+    /**
+     * Show a merged save. If the adventure was edited while it was being
+     * sent, the server's copy doesn't have those edits: the other saves'
+     * changes are applied to it instead, and the pending auto-save sends
+     * the edits on top of the merged revision.
+     */
+    function showMerged(name, sent, result) {
+        const adventure = getAdventure();
+        if (!adventure || adventure.name !== name) return;
+        if (JSON.stringify(adventure) === sent) {
+            onAdventureReplaced(result.adventure);
+            return;
+        }
+        // Live sync has applied changes meanwhile: the next save merges again
+        if (!result.changes || adventure.revision !== JSON.parse(sent).revision) return;
+        try {
+            applyChanges(adventure, result.changes);
+        } catch (error) {
+            // Left at the revision it was sent from, so the next save merges again
+            console.warn('Could not apply the merged changes to later edits:', error);
+            return;
+        }
+        adventure.revision = result.revision;
+        onAdventureReplaced(adventure);
+    }
+
+    /**
+     * Record the server's revision on the adventure being edited (which may
+     * be a newer object than the one that was sent)
+     */
+    function setRevision(name, revision) {
+        const adventure = getAdventure();
+        if (adventure && adventure.name === name) {
+            adventure.revision = revision;
+        }
+    }
+
     /**
      * Show temporary save indicator
      */
@@ -21,12 +21,14 @@ export class APIError extends Error {
  * @param {Object} config - Configuration options
  * @param {string} config.baseURL - Base URL for API calls
  * @param {Function} config.fetchImpl - Fetch implementation (injectable for testing)
+ * @param {string} config.clientId - Sent as X-Client-Id so live change events can name this tab
  * @returns {Object} API client with all methods
  */
 export function createAPIClient(config = {}) {
     const {
         baseURL = '',
-        fetchImpl = typeof fetch !== 'undefined' ? fetch : null
+        fetchImpl = typeof fetch !== 'undefined' ? fetch : null,
+        clientId = null
     } = config;
     
     if (!fetchImpl) {
@@ -44,6 +46,7 @@ export function createAPIClient(config = {}) {
                 credentials: 'same-origin', // Include cookies for session management
                 headers: {
                     'Content-Type': 'application/json',
+                    ...(clientId ? { 'X-Client-Id': clientId } : {}),
                     ...options.headers
                 },
                 ...options
@@ -239,6 +242,26 @@ export function createAPIClient(config = {}) {
             return data.details;
         },
         
+        /**
+         * Load several characters in one request (cached ones immediately,
+         * stale ones refreshed in parallel on the server)
+         * @param {string[]} characterUrls - D&D Beyond character URLs or IDs
+         * @param {Object} [options] - { force: true } to revalidate fresh entries
+         * @returns {Promise<Object>} { characters: {id: details}, status: {id: status} }
+         */
+        async getCharacters(characterUrls, { force = false } = {}) {
+            const { data } = await request('/api/dndbeyond/characters', {
+                method: 'POST',
+                body: JSON.stringify({ ids: characterUrls, force })
+            });
+            
+            if (!data.success) {
+                throw new APIError(data.error || 'Failed to fetch characters', 400, null, data);
+            }
+            
+            return { characters: data.characters, status: data.status };
+        },
+        
         // ==================== Cookie/Auth API ====================
         
         /**
@@ -316,6 +339,7 @@ export function createMockAPIClient(mockResponses = {}) {
         loadMonsters: mockResponses.loadMonsters || jest.fn(defaultMock),
         getMonsterDetails: mockResponses.getMonsterDetails || jest.fn(defaultMock),
         getCharacterDetails: mockResponses.getCharacterDetails || jest.fn(defaultMock),
+        getCharacters: mockResponses.getCharacters || jest.fn(defaultMock),
         checkCookieStatus: mockResponses.checkCookieStatus || jest.fn(() => Promise.resolve(false)),
         saveCookies: mockResponses.saveCookies || jest.fn(defaultMock),
         clearCookies: mockResponses.clearCookies || jest.fn(defaultMock),
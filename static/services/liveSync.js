@@ -0,0 +1,154 @@
+/**
+ * Live Sync - Keeps the open adventure in step with other tabs and devices
+ *
+ * Listens to /api/adventure/<name>/events (Server-Sent Events) and applies
+ * the changes other clients save to the adventure being edited, so it never
+ * has to be reloaded by hand. When the changes can't be applied (a revision
+ * was missed, or the server didn't send them) the adventure is reloaded.
+ */
+
+/**
+ * Apply journal operations (see journal.py) to an adventure in place
+ * @param {Object} data - Adventure to change
+ * @param {Array} changes - {op: 'set'|'del'|'splice', path, ...} operations
+ * @returns {Object} The adventure
+ * @throws {Error} If a path doesn't exist in the adventure
+ */
+export function applyChanges(data, changes) {
+    for (const change of changes) {
+        const path = change.path;
+        if (change.op === 'splice') {
+            const items = resolve(data, path);
+            if (!Array.isArray(items)) {
+                throw new Error(`Not a list: ${path.join('.')}`);
+            }
+            items.splice(change.at, change.remove.length, ...change.insert);
+            continue;
+        }
+        if (path.length === 0) {
+            throw new Error('Cannot replace the whole adventure');
+        }
+        const parent = resolve(data, path.slice(0, -1));
+        const key = path[path.length - 1];
+        if (change.op === 'set') {
+            parent[key] = change.value;
+        } else if (change.op === 'del') {
+            delete parent[key];
+        }
+    }
+    return data;
+}
+
+function resolve(data, path) {
+    let node = data;
+    for (const key of path) {
+        if (node === null || typeof node !== 'object' || !(key in node)) {
+            throw new Error(`Missing ${path.join('.')}`);
+        }
+        node = node[key];
+    }
+    return node;
+}
+
+/**
+ * Create the live sync service
+ * @param {Object} deps - Dependencies
+ * @param {Function} deps.EventSource - EventSource constructor (live sync is off without one)
+ * @param {string} deps.clientId - This tab's id, sent with its saves
+ * @param {Function} deps.getAdventure - Get current adventure from state
+ * @param {Function} deps.onAdventureChanged - Re-render after changes were applied
+ * @param {Function} deps.reloadAdventure - Load the adventure from the server again
+ * @param {Function} deps.onAdventureDeleted - The adventure was deleted elsewhere
+ * @param {Function} deps.onAdventureLocked - The PIN changed; this session no longer gets changes
+ * @returns {Object} Service methods
+ */
+export function createLiveSync(deps = {}) {
+    const {
+        EventSource, clientId, getAdventure, onAdventureChanged, reloadAdventure, onAdventureDeleted, onAdventureLocked
+    } = deps;
+
+    let source = null;
+    let watching = null;
+
+    /**
+     * Start following an adventure's changes (stops following any other)
+     */
+    function watch(name) {
+        stop();
+        if (!EventSource || !name) return;
+        watching = name;
+        source = new EventSource(`/api/adventure/${encodeURIComponent(name)}/events`);
+        const listen = (type, handler) => source.addEventListener(type, (event) => {
+            handler(JSON.parse(event.data));
+        });
+        listen('revision', handleRevision);
+        listen('change', handleChange);
+        listen('reset', () => reload());
+        listen('deleted', () => {
+            stop();
+            if (onAdventureDeleted) onAdventureDeleted();
+        });
+        // The server has closed the stream; don't let EventSource reconnect
+        listen('locked', () => {
+            stop();
+            if (onAdventureLocked) onAdventureLocked();
+        });
+    }
+
+    function stop() {
+        if (source) {
+            source.close();
+        }
+        source = null;
+        watching = null;
+    }
+
+    function current() {
+        const adventure = getAdventure();
+        return adventure && adventure.name === watching ? adventure : null;
+    }
+
+    function reload() {
+        if (watching && reloadAdventure) {
+            reloadAdventure(watching);
+        }
+    }
+
+    /**
+     * Sent when the stream (re)connects: reload if saves were missed
+     */
+    function handleRevision(event) {
+        const adventure = current();
+        if (adventure && adventure.revision !== undefined && adventure.revision !== event.revision) {
+            reload();
+        }
+    }
+
+    function handleChange(event) {
+        const adventure = current();
+        if (!adventure) return;
+        // Our own save, or one already loaded (a merged save's response)
+        if ((clientId && event.source === clientId) || adventure.revision >= event.revision) return;
+        if (!event.changes || adventure.revision !== event.base) {
+            reload();
+            return;
+        }
+        try {
+            applyChanges(adventure, event.changes);
+        } catch (error) {
+            console.warn('Live sync: reloading after a change that did not apply:', error);
+            reload();
+            return;
+        }
+        adventure.revision = event.revision;
+        if (onAdventureChanged) onAdventureChanged(adventure);
+    }
+
+    return {
+        watch,
+        stop,
+        handleRevision,
+        handleChange,
+        getWatching: () => watching,
+    };
+}
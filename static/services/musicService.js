@@ -36,11 +36,41 @@ export const ENCOUNTER_INTRO_SKIP_SECONDS = 15;
 
 /**
  * Build the URL we should hand to the <audio> element for a given filename.
- * Handles `null` (no track) and properly URI-encodes filenames.
+ * Handles `null` (no track) and properly URI-encodes filenames. Tracks in
+ * subfolders ("dungeon/drips.ogg") keep their slashes. With a
+ * `variantFormat` ('opus' or 'mp3') the server sends its low-bitrate copy
+ * of the track if one has been encoded, else the original.
  */
-function trackUrl(filename) {
+function trackUrl(filename, variantFormat = null) {
     if (!filename) return null;
-    return `/music/${encodeURIComponent(filename)}`;
+    const url = `/music/${filename.split('/').map(encodeURIComponent).join('/')}`;
+    return variantFormat ? `${url}?quality=low&format=${variantFormat}` : url;
+}
+
+/**
+ * Whether the browser reports a slow or data-saving connection (Network
+ * Information API; most desktop browsers don't expose it).
+ */
+function detectLowBandwidth() {
+    const connection = typeof navigator !== 'undefined' ? navigator.connection : null;
+    if (!connection) return false;
+    return !!connection.saveData || ['slow-2g', '2g', '3g'].includes(connection.effectiveType);
+}
+
+/**
+ * Label for a track in the music selectors: its title and duration when
+ * the library index has them, else the filename.
+ *
+ * @param {string} path - track path as listed by /api/music/library
+ * @param {Object} [tracks] - the `tracks` map from getStatus()
+ */
+export function formatTrackLabel(path, tracks = {}) {
+    const track = tracks[path];
+    if (!track) return path;
+    const title = track.title || path;
+    if (!Number.isFinite(track.duration)) return title;
+    const seconds = Math.round(track.duration);
+    return `${title} (${Math.floor(seconds / 60)}:${String(seconds % 60).padStart(2, '0')})`;
 }
 
 /**
@@ -50,11 +80,13 @@ function trackUrl(filename) {
  * @param {Function} [deps.fetchImpl=fetch] - injectable fetch (for tests)
  * @param {Storage}  [deps.storage=localStorage] - injectable storage
  * @param {HTMLAudioElement} [deps.audio] - injectable audio element (for tests)
+ * @param {boolean} [deps.lowBandwidth] - stream low-bitrate variants (default: detected)
  * @returns {Object} the service API
  */
 export function createMusicService(deps = {}) {
     const fetchImpl = deps.fetchImpl || (typeof fetch !== 'undefined' ? fetch.bind(globalThis) : null);
     const storage = deps.storage || (typeof localStorage !== 'undefined' ? localStorage : null);
+    const lowBandwidth = deps.lowBandwidth ?? detectLowBandwidth();
 
     // Lazily create the audio element so the module can be imported in
     // jsdom without an HTMLAudioElement being available at import time.
@@ -128,6 +160,8 @@ export function createMusicService(deps = {}) {
     const internalState = {
         // Catalog of available files in /music
         available: [],
+        // Library metadata by path: { title, duration, bitrate, size }
+        tracks: {},
         // Track currently selected for the active chapter (the "background")
         chapterTrack: null,
         // Track that overrides the chapter track during an active encounter
@@ -163,6 +197,16 @@ export function createMusicService(deps = {}) {
     }
 
     // ─── Playback ────────────────────────────────────────────────────────
+    /**
+     * Low-bitrate variant to ask for on slow connections: Opus where the
+     * browser plays it (smaller at the same quality), else MP3.
+     */
+    function variantFormat(a) {
+        if (!lowBandwidth) return null;
+        const opus = a && typeof a.canPlayType === 'function' && a.canPlayType('audio/ogg; codecs=opus');
+        return opus ? 'opus' : 'mp3';
+    }
+
     /**
      * Resolve which track should currently be playing based on whether an
      * encounter override is set, and load it into the <audio> element if
@@ -177,7 +221,7 @@ export function createMusicService(deps = {}) {
         if (desired !== internalState.currentTrack) {
             internalState.currentTrack = desired;
             if (desired) {
-                a.src = trackUrl(desired);
+                a.src = trackUrl(desired, variantFormat(a));
                 applyAudioSettings();
             } else {
                 a.pause();
@@ -234,17 +278,22 @@ export function createMusicService(deps = {}) {
 
     /**
      * Fetch the catalog of available music files. Idempotent; safe to call
-     * after the user adds files and clicks "refresh" in the player.
+     * after the user adds files and clicks "refresh" in the player
+     * (pass `{ rescan: true }` there so the server rescans right away).
      */
-    async function refreshAvailable() {
+    async function refreshAvailable({ rescan = false } = {}) {
         if (!fetchImpl) return [];
         try {
-            const res = await fetchImpl('/api/music', { credentials: 'same-origin' });
-            const list = await res.json();
-            internalState.available = Array.isArray(list) ? list : [];
+            const url = rescan ? '/api/music/library?refresh=1' : '/api/music/library';
+            const res = await fetchImpl(url, { credentials: 'same-origin' });
+            const library = await res.json();
+            const tracks = Array.isArray(library.tracks) ? library.tracks : [];
+            internalState.available = tracks.map(t => t.path);
+            internalState.tracks = Object.fromEntries(tracks.map(t => [t.path, t]));
         } catch (err) {
             console.warn('Could not load music catalog:', err);
             internalState.available = [];
+            internalState.tracks = {};
         }
         notify();
         return internalState.available;
@@ -377,6 +426,7 @@ export function createMusicService(deps = {}) {
         const dur = a && Number.isFinite(a.duration) ? a.duration : 0;
         return {
             available: [...internalState.available],
+            tracks: internalState.tracks,
             chapterTrack: internalState.chapterTrack,
             encounterTrack: internalState.encounterTrack,
             currentTrack: internalState.currentTrack,
@@ -51,15 +51,18 @@ def app():
     # Reset in-memory cookie state so tests don't leak auth across each other
     flask_app.DNDBEYOND_COOKIES = {}
     
-    # Configure app for testing
-    flask_app.app.config.update({
+    # Configure app for testing. LAZY_INIT is off because the fixture has
+    # already created the directories, and we don't want the bundled
+    # monster index copied into the temporary cache.
+    test_app = flask_app.create_app({
         'TESTING': True,
         'SECRET_KEY': 'test-secret-key',
         'WTF_CSRF_ENABLED': False,
-        'SERVER_NAME': 'localhost:5000'
+        'SERVER_NAME': 'localhost:5000',
+        'LAZY_INIT': False
     })
     
-    yield flask_app.app
+    yield test_app
     
     # Restore original paths
     flask_app.DATA_DIR = original_data_dir
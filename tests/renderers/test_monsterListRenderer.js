@@ -273,6 +273,30 @@ describe('monsterListRenderer', () => {
             expect(monsterList.innerHTML).toContain('D&amp;D Beyond');
             expect(monsterList.innerHTML).toContain('📖');
         });
+
+        test('replaces local results with server ranked search', async () => {
+            global.fetch.mockResolvedValueOnce({
+                json: async () => ({
+                    success: true,
+                    total: 1,
+                    librarySize: 2824,
+                    results: [{ name: 'Goblin Boss', cr: '1', type: 'Humanoid', size: 'Small',
+                                alignment: 'Neutral Evil', match: 'fuzzy', distance: 1 }]
+                })
+            });
+
+            renderMonsterList('Gobin Bos');
+            expect(document.getElementById('monsterList').innerHTML).toContain('No monsters found');
+
+            await new Promise(resolve => setTimeout(resolve, 0));
+
+            expect(global.fetch).toHaveBeenCalledWith('/api/monsters/search?q=Gobin%20Bos&limit=50');
+            const items = document.getElementById('monsterList').querySelectorAll('.monster-item');
+            expect(items).toHaveLength(1);
+            expect(items[0].textContent).toContain('Goblin Boss');
+            expect(document.getElementById('monsterCount').textContent).toBe('Showing 1 of 2824 monsters');
+            expect(window.DND_MONSTERS['Goblin Boss'].cr).toBe('1');
+        });
     });
     
     describe('integration tests', () => {
@@ -198,6 +198,105 @@ describe('adventureService', () => {
             consoleError.mockRestore();
         });
         
+        test('records the revision returned by the server', async () => {
+            const adventure = { name: 'Test Adventure', revision: 3, encounters: [] };
+            mockDeps.getAdventure.mockReturnValue(adventure);
+            mockAPI.updateAdventure.mockResolvedValue({ success: true, revision: 4 });
+            
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            await Promise.resolve();
+            await Promise.resolve();
+            
+            expect(adventure.revision).toBe(4);
+        });
+        
+        test('shows the adventure merged with saves from another device', async () => {
+            const merged = { name: 'Test Adventure', revision: 7, encounters: [] };
+            mockDeps.onAdventureReplaced = jest.fn();
+            service = createAdventureService(mockDeps);
+            mockAPI.updateAdventure.mockResolvedValue({ success: true, revision: 7, merged: true, adventure: merged });
+            
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            await Promise.resolve();
+            await Promise.resolve();
+            
+            expect(mockDeps.onAdventureReplaced).toHaveBeenCalledWith(merged);
+        });
+        
+        test('keeps edits made while a merged save was in flight', async () => {
+            const adventure = { name: 'Test Adventure', revision: 3, encounters: [{ hp: 59 }, { hp: 59 }] };
+            mockDeps.getAdventure.mockReturnValue(adventure);
+            mockDeps.onAdventureReplaced = jest.fn();
+            service = createAdventureService(mockDeps);
+            let finish;
+            mockAPI.updateAdventure
+                .mockReturnValueOnce(new Promise(resolve => { finish = resolve; }))
+                .mockResolvedValue({ success: true, revision: 6 });
+            
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            await Promise.resolve();
+            adventure.encounters[1].hp = 12;
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            
+            // Another device set the first encounter's HP to 30
+            finish({
+                success: true, revision: 5, merged: true,
+                adventure: { name: 'Test Adventure', revision: 5, encounters: [{ hp: 30 }, { hp: 59 }] },
+                changes: [{ op: 'set', path: ['encounters', 0, 'hp'], value: 30 }],
+            });
+            for (let i = 0; i < 5; i++) {
+                await Promise.resolve();
+            }
+            
+            expect(adventure.encounters).toEqual([{ hp: 30 }, { hp: 12 }]);
+            expect(mockDeps.onAdventureReplaced).toHaveBeenCalledWith(adventure);
+            expect(mockAPI.updateAdventure).toHaveBeenCalledTimes(2);
+            expect(mockAPI.updateAdventure).toHaveBeenLastCalledWith('Test Adventure', adventure);
+            expect(adventure.revision).toBe(6);
+        });
+        
+        test('loads the server copy on a conflict (409)', async () => {
+            const alertSpy = jest.spyOn(window, 'alert').mockImplementation();
+            const consoleError = jest.spyOn(console, 'error').mockImplementation();
+            const current = { name: 'Test Adventure', revision: 9, encounters: [] };
+            mockDeps.onAdventureReplaced = jest.fn();
+            service = createAdventureService(mockDeps);
+            mockAPI.updateAdventure.mockRejectedValue({ status: 409, data: { adventure: current } });
+            
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            await Promise.resolve();
+            await Promise.resolve();
+            
+            expect(alertSpy).toHaveBeenCalledWith(expect.stringContaining('another tab or device'));
+            expect(mockDeps.onAdventureReplaced).toHaveBeenCalledWith(current);
+            
+            alertSpy.mockRestore();
+            consoleError.mockRestore();
+        });
+        
+        test('waits for the previous save before sending the next', async () => {
+            let finish;
+            mockAPI.updateAdventure.mockReturnValueOnce(new Promise(resolve => { finish = resolve; }));
+            
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            service.autoSave();
+            jest.advanceTimersByTime(500);
+            await Promise.resolve();
+            expect(mockAPI.updateAdventure).toHaveBeenCalledTimes(1);
+            
+            finish({ success: true, revision: 1 });
+            for (let i = 0; i < 5; i++) {
+                await Promise.resolve();
+            }
+            expect(mockAPI.updateAdventure).toHaveBeenCalledTimes(2);
+        });
+        
         test('handles other API errors', async () => {
             mockAPI.updateAdventure.mockRejectedValue(new Error('Network error'));
             const consoleError = jest.spyOn(console, 'error').mockImplementation();
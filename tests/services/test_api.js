@@ -323,6 +323,26 @@ describe('API Service', () => {
                 expect(result).toEqual(details);
             });
         });
+        
+        describe('getCharacters', () => {
+            test('loads several characters in one request', async () => {
+                const characters = { '111': { name: 'Aria' }, '222': { name: 'Brom' } };
+                const status = { '111': 'fresh', '222': 'updated' };
+                mockFetch.mockResolvedValue({
+                    ok: true,
+                    json: async () => ({ success: true, characters, status })
+                });
+                
+                const result = await api.getCharacters(['111', 'characters/222']);
+                
+                expect(result).toEqual({ characters, status });
+                expect(mockFetch).toHaveBeenCalledTimes(1);
+                expect(JSON.parse(mockFetch.mock.calls[0][1].body)).toEqual({
+                    ids: ['111', 'characters/222'],
+                    force: false
+                });
+            });
+        });
     });
     
     describe('Cookie/Auth API', () => {
@@ -0,0 +1,125 @@
+/**
+ * Tests for liveSync module
+ */
+
+import { applyChanges, createLiveSync } from '../../static/services/liveSync.js';
+
+class FakeEventSource {
+    constructor(url) {
+        this.url = url;
+        this.listeners = {};
+        this.closed = false;
+        FakeEventSource.instances.push(this);
+    }
+
+    addEventListener(type, handler) {
+        this.listeners[type] = handler;
+    }
+
+    emit(type, data) {
+        this.listeners[type]({ data: JSON.stringify(data) });
+    }
+
+    close() {
+        this.closed = true;
+    }
+}
+
+describe('applyChanges', () => {
+    test('sets, deletes and splices', () => {
+        const data = { encounters: [{ combatants: [{ hp: 30, notes: 'x' }, { hp: 7 }] }] };
+        applyChanges(data, [
+            { op: 'set', path: ['encounters', 0, 'combatants', 0, 'hp'], value: 12 },
+            { op: 'del', path: ['encounters', 0, 'combatants', 0, 'notes'], old: 'x' },
+            { op: 'splice', path: ['encounters', 0, 'combatants'], at: 1, remove: [{ hp: 7 }], insert: [{ hp: 1 }, { hp: 2 }] },
+        ]);
+        expect(data).toEqual({ encounters: [{ combatants: [{ hp: 12 }, { hp: 1 }, { hp: 2 }] }] });
+    });
+
+    test('throws on a missing path', () => {
+        expect(() => applyChanges({ encounters: [] }, [
+            { op: 'set', path: ['encounters', 3, 'name'], value: 'Ambush' },
+        ])).toThrow();
+    });
+});
+
+describe('liveSync', () => {
+    let adventure;
+    let deps;
+    let sync;
+
+    beforeEach(() => {
+        FakeEventSource.instances = [];
+        adventure = { name: 'Live', revision: 4, encounters: [{ name: 'Ambush', currentTurn: 0 }] };
+        deps = {
+            EventSource: FakeEventSource,
+            clientId: 'me',
+            getAdventure: jest.fn(() => adventure),
+            onAdventureChanged: jest.fn(),
+            reloadAdventure: jest.fn(),
+            onAdventureDeleted: jest.fn(),
+            onAdventureLocked: jest.fn(),
+        };
+        sync = createLiveSync(deps);
+        sync.watch('Live');
+    });
+
+    function source() {
+        return FakeEventSource.instances[FakeEventSource.instances.length - 1];
+    }
+
+    test('subscribes to the adventure', () => {
+        expect(source().url).toBe('/api/adventure/Live/events');
+        sync.watch('Other');
+        expect(FakeEventSource.instances[0].closed).toBe(true);
+        expect(sync.getWatching()).toBe('Other');
+    });
+
+    test('applies changes from other clients', () => {
+        source().emit('change', {
+            adventure: 'Live', revision: 5, base: 4, source: 'other',
+            changes: [{ op: 'set', path: ['encounters', 0, 'currentTurn'], value: 2 }],
+        });
+        expect(adventure.encounters[0].currentTurn).toBe(2);
+        expect(adventure.revision).toBe(5);
+        expect(deps.onAdventureChanged).toHaveBeenCalledWith(adventure);
+    });
+
+    test('skips its own and already loaded changes', () => {
+        source().emit('change', { adventure: 'Live', revision: 5, base: 4, source: 'me', changes: [] });
+        source().emit('change', { adventure: 'Live', revision: 4, base: 3, source: 'other', changes: [] });
+        expect(deps.onAdventureChanged).not.toHaveBeenCalled();
+        expect(deps.reloadAdventure).not.toHaveBeenCalled();
+    });
+
+    test('reloads after a missed revision or a change that does not apply', () => {
+        source().emit('change', { adventure: 'Live', revision: 7, base: 6, source: 'other', changes: [] });
+        source().emit('change', {
+            adventure: 'Live', revision: 5, base: 4, source: 'other',
+            changes: [{ op: 'set', path: ['players', 0, 'name'], value: 'Aria' }],
+        });
+        source().emit('revision', { adventure: 'Live', revision: 9 });
+        expect(deps.reloadAdventure).toHaveBeenCalledTimes(3);
+        expect(deps.reloadAdventure).toHaveBeenCalledWith('Live');
+    });
+
+    test('stops when the adventure is deleted', () => {
+        source().emit('deleted', { adventure: 'Live' });
+        expect(source().closed).toBe(true);
+        expect(deps.onAdventureDeleted).toHaveBeenCalled();
+        expect(sync.getWatching()).toBe(null);
+    });
+
+    test('stops when the PIN changes', () => {
+        source().emit('locked', { adventure: 'Live' });
+        expect(source().closed).toBe(true);
+        expect(deps.onAdventureLocked).toHaveBeenCalled();
+        expect(deps.reloadAdventure).not.toHaveBeenCalled();
+    });
+
+    test('does nothing without EventSource', () => {
+        const offline = createLiveSync({ ...deps, EventSource: undefined });
+        offline.watch('Live');
+        expect(offline.getWatching()).toBe(null);
+    });
+});
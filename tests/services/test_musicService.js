@@ -8,7 +8,7 @@
  * encounter overrides change.
  */
 
-import { createMusicService } from '../../static/services/musicService.js';
+import { createMusicService, formatTrackLabel } from '../../static/services/musicService.js';
 
 /**
  * Build a minimal stub audio element with the surface our service uses.
@@ -271,8 +271,12 @@ describe('musicService', () => {
 
     describe('refreshAvailable', () => {
         test('fetches the catalog and exposes it', async () => {
+            const tracks = [
+                { path: 'a.mp3', title: 'Ambush', duration: 95.2 },
+                { path: 'dungeon/b.ogg', title: 'b', duration: null },
+            ];
             const fetchImpl = jest.fn().mockResolvedValue({
-                json: async () => ['a.mp3', 'b.ogg'],
+                json: async () => ({ version: 'v1', tracks, playlists: [] }),
             });
             const service = createMusicService({
                 fetchImpl,
@@ -282,8 +286,22 @@ describe('musicService', () => {
 
             await service.refreshAvailable();
 
-            expect(fetchImpl).toHaveBeenCalledWith('/api/music', expect.any(Object));
-            expect(service.getStatus().available).toEqual(['a.mp3', 'b.ogg']);
+            expect(fetchImpl).toHaveBeenCalledWith('/api/music/library', expect.any(Object));
+            expect(service.getStatus().available).toEqual(['a.mp3', 'dungeon/b.ogg']);
+            expect(service.getStatus().tracks['a.mp3'].title).toBe('Ambush');
+        });
+
+        test('asks the server to rescan when requested', async () => {
+            const fetchImpl = jest.fn().mockResolvedValue({ json: async () => ({ tracks: [] }) });
+            const service = createMusicService({
+                fetchImpl,
+                storage: makeStorage(),
+                audio: makeFakeAudio(),
+            });
+
+            await service.refreshAvailable({ rescan: true });
+
+            expect(fetchImpl).toHaveBeenCalledWith('/api/music/library?refresh=1', expect.any(Object));
         });
 
         test('survives a failed fetch', async () => {
@@ -456,4 +474,35 @@ describe('musicService', () => {
             expect(listener).not.toHaveBeenCalled();
         });
     });
+
+    describe('formatTrackLabel', () => {
+        test('shows title and duration from the library index', () => {
+            const tracks = { 'a.mp3': { title: 'Ambush', duration: 95.4 }, 'b.ogg': { title: 'b', duration: null } };
+            expect(formatTrackLabel('a.mp3', tracks)).toBe('Ambush (1:35)');
+            expect(formatTrackLabel('b.ogg', tracks)).toBe('b');
+            expect(formatTrackLabel('c.mp3', tracks)).toBe('c.mp3');
+        });
+    });
+
+    describe('low-bandwidth variants', () => {
+        test('asks for the Opus variant when the browser plays Opus', () => {
+            const audio = makeFakeAudio();
+            audio.canPlayType = jest.fn(type => (type.includes('opus') ? 'probably' : ''));
+            const service = createMusicService({ storage: makeStorage(), audio, lowBandwidth: true });
+
+            service.setChapterTrack('dungeon/lair.flac');
+
+            expect(audio.src).toBe('/music/dungeon/lair.flac?quality=low&format=opus');
+        });
+
+        test('falls back to MP3 and leaves fast connections alone', () => {
+            const slow = makeFakeAudio();
+            createMusicService({ storage: makeStorage(), audio: slow, lowBandwidth: true }).setChapterTrack('a.flac');
+            expect(slow.src).toBe('/music/a.flac?quality=low&format=mp3');
+
+            const fast = makeFakeAudio();
+            createMusicService({ storage: makeStorage(), audio: fast, lowBandwidth: false }).setChapterTrack('a.flac');
+            expect(fast.src).toBe('/music/a.flac');
+        });
+    });
 });
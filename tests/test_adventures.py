@@ -154,8 +154,9 @@ class TestAdventureUpdate:
         data = json.loads(response.data)
         assert data['success'] is True
         
-        # Verify changes were saved
-        saved_data = json.loads(adventure_path.read_text())
+        # Verify changes were saved (to the journal; the snapshot is unchanged)
+        from app import read_adventure
+        saved_data = read_adventure("Test Adventure")
         assert len(saved_data['players']) == 4  # 3 original + 1 new
     
     def test_update_adventure_not_found(self, client, sample_adventure):
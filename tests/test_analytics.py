@@ -0,0 +1,133 @@
+"""
+Tests for the cross-campaign analytics store (analytics.py and /api/analytics).
+"""
+import json
+
+import app as flask_app
+from analytics import AnalyticsStore
+from difficulty import DifficultyEngine
+from monster_search import MonsterIndex
+
+MONSTERS = {
+    'Ogre': {'cr': '2', 'url': 'https://www.dndbeyond.com/monsters/17002-ogre'},
+    'Goblin': {'cr': '1/4', 'url': 'https://www.dndbeyond.com/monsters/16907-goblin'},
+}
+
+
+def adventure(name, rounds=3, ogre_hp=0):
+    return {
+        'name': name,
+        'players': [{'name': 'Aria', 'dndBeyondUrl': '111', 'level': 3}],
+        'encounters': [
+            {'name': 'Bridge', 'state': 'complete', 'currentRound': rounds, 'combatants': [
+                {'id': '111', 'init': 15, 'dmg': 20, 'heal': 4},
+                {'id': '17002-ogre', 'name': 'Ogre', 'maxHp': 59, 'hp': ogre_hp, 'dmg': 9},
+            ]},
+            {'name': 'Camp', 'state': 'complete', 'currentRound': 2, 'combatants': [
+                {'id': '111', 'init': 8},
+                {'name': 'Goblin 1', 'maxHp': 7, 'hp': 0},
+            ]},
+            {'name': 'Lair', 'combatants': [{'name': 'Ogre', 'maxHp': 59}]},
+        ],
+    }
+
+
+def make_store(tmp_path):
+    restored = []
+
+    def restore(data):
+        restored.append(data['encounters'][0]['name'])
+        return flask_app.restore_adventure_from_storage(data)
+
+    store = AnalyticsStore(tmp_path / 'analytics.sqlite3', restore)
+    return store, DifficultyEngine(MonsterIndex(MONSTERS)), restored
+
+
+class TestAnalyticsStore:
+    """Encounter outcomes are written incrementally and queried across adventures."""
+
+    def test_rounds_by_cr(self, tmp_path):
+        store, engine, _ = make_store(tmp_path)
+        store.record_adventure('One', adventure('One', rounds=3), engine)
+        store.record_adventure('Two', adventure('Two', rounds=5), engine)
+
+        assert store.rounds_by_cr() == [
+            {'cr': '1/4', 'encounters': 2, 'avgRounds': 2.0, 'avgMonsters': 1.0},
+            {'cr': '2', 'encounters': 2, 'avgRounds': 4.0, 'avgMonsters': 1.0},
+        ]
+        # The unstarted encounter only counts when asked for
+        assert [r['encounters'] for r in store.rounds_by_cr(states=('complete', 'unstarted'))] == [2, 4]
+
+    def test_monsters_and_players(self, tmp_path):
+        store, engine, _ = make_store(tmp_path)
+        store.record_adventure('One', adventure('One'), engine)
+        store.record_adventure('Two', adventure('Two', ogre_hp=10), engine)
+
+        ogre = next(m for m in store.monsters() if m['name'] == 'Ogre')
+        assert (ogre['appearances'], ogre['kills'], ogre['monsterId']) == (2, 1, '17002-ogre')
+        assert ogre['avgDamageDealt'] == 9
+        assert ogre['avgDamageTaken'] == (59 + 49) / 2
+
+        players = store.players()
+        assert [(p['adventure'], p['name']) for p in players] == [('One', 'Aria'), ('Two', 'Aria')]
+        assert players[0]['avgInitiative'] == (15 + 8) / 2
+        assert (players[0]['damageDealt'], players[0]['healing']) == (20, 4)
+
+    def test_only_changed_encounters_are_rewritten(self, tmp_path):
+        store, engine, restored = make_store(tmp_path)
+        data = adventure('One')
+        assert store.record_adventure('One', data, engine) == 3
+        assert store.record_adventure('One', data, engine) == 0
+
+        data['encounters'][1]['currentRound'] = 4
+        assert store.record_adventure('One', data, engine) == 1
+        assert restored == ['Bridge', 'Camp', 'Lair', 'Camp']
+
+    def test_removed_encounters_are_dropped(self, tmp_path):
+        store, engine, _ = make_store(tmp_path)
+        data = adventure('One')
+        store.record_adventure('One', data, engine)
+        data['encounters'] = data['encounters'][:1]
+        store.record_adventure('One', data, engine)
+        assert store.adventures() == [{'adventure': 'One', 'encounters': 1, 'completed': 1,
+                                       'rounds': 3, 'xp': 450}]
+
+        store.forget_adventure('One')
+        assert store.adventures() == []
+
+
+class TestAnalyticsRoutes:
+    """Saves feed the store; the query endpoints read it."""
+
+    def test_save_feeds_store(self, client):
+        flask_app.MONSTERS_CACHE.write_text(json.dumps(MONSTERS))
+        client.post('/api/adventure/One', json=adventure('One'))
+
+        data = client.get('/api/analytics/rounds-by-cr').get_json()
+        assert data['success'] is True
+        assert [r['cr'] for r in data['results']] == ['1/4', '2']
+        monsters = client.get('/api/analytics/monsters?limit=1').get_json()['results']
+        assert len(monsters) == 1
+
+    def test_played_state_filter(self, client):
+        flask_app.MONSTERS_CACHE.write_text(json.dumps(MONSTERS))
+        data = adventure('One')
+        data['encounters'][0]['state'] = 'started'
+        client.post('/api/adventure/One', json=data)
+
+        assert len(client.get('/api/analytics/rounds-by-cr').get_json()['results']) == 1
+        assert len(client.get('/api/analytics/rounds-by-cr?state=played').get_json()['results']) == 2
+
+    def test_delete_forgets_adventure(self, client):
+        client.post('/api/adventure/One', json=adventure('One'))
+        client.delete('/api/adventure/One')
+        assert client.get('/api/analytics/adventures').get_json()['results'] == []
+
+    def test_rebuild_loads_existing_files(self, client):
+        (flask_app.DATA_DIR / 'Old.json').write_text(json.dumps(adventure('Old')))
+        data = client.post('/api/analytics/rebuild').get_json()
+        assert data == {'success': True, 'adventures': 1, 'encountersUpdated': 3}
+        assert client.get('/api/analytics/adventures').get_json()['results'][0]['adventure'] == 'Old'
+
+    def test_bad_limit(self, client):
+        assert client.get('/api/analytics/monsters?limit=lots').status_code == 400
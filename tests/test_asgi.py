@@ -0,0 +1,240 @@
+"""
+Tests for the async (ASGI) serving mode in asgi.py.
+
+The ASGI app is driven directly with hand-built scopes, and upstream D&D
+Beyond calls go to a fake async client, so neither uvicorn nor httpx is
+needed to run these.
+"""
+import asyncio
+import json
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+import app as flask_app
+from asgi import AsyncApp
+from character_sync import CACHE_VERSION
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, text='', content=b''):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = text
+        self.content = content
+        self.cookies = {}
+        self.headers = {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'HTTP {self.status_code}')
+
+
+class FakeUpstream:
+    """Stands in for httpx.AsyncClient; records requests, optionally waits on ``gate``."""
+
+    def __init__(self, responses=None, gate=None):
+        self.responses = responses or {}
+        self.gate = gate
+        self.requests = []
+
+    async def get(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        if self.gate is not None:
+            await self.gate.wait()
+        return self.responses[url]
+
+
+def make_scope(path, method='GET', query=b''):
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'root_path': '',
+        'scheme': 'http',
+        'http_version': '1.1',
+        'server': ('localhost', 5000),
+        'client': ('127.0.0.1', 40000),
+        'headers': [(b'host', b'localhost:5000'), (b'content-type', b'application/json')],
+    }
+
+
+async def call(asgi_app, path, method='GET', query=b'', body=b''):
+    """Run one request through ``asgi_app``; returns (status, headers, body)."""
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return pending.pop(0) if pending else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(make_scope(path, method, query), receive, send)
+    start = sent[0]
+    assert start['type'] == 'http.response.start'
+    return start['status'], dict(start['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+@pytest.fixture
+def upstream():
+    return FakeUpstream()
+
+
+@pytest.fixture
+def asgi_app(app, upstream):
+    instance = AsyncApp(app, workers=2, http_client=upstream)
+    yield instance
+    asyncio.run(instance.aclose())
+
+
+class TestFlaskFallback:
+    """Routes without a native async handler are served by the Flask app."""
+
+    def test_get_matches_flask_response(self, asgi_app, client, sample_adventure):
+        client.post('/api/adventure', json=sample_adventure)
+
+        status, headers, body = asyncio.run(call(asgi_app, '/api/adventures'))
+        assert status == 200
+        assert headers[b'content-type'] == b'application/json'
+        assert body == client.get('/api/adventures').data
+
+    def test_post_body_is_passed_through(self, asgi_app, sample_adventure):
+        status, _, body = asyncio.run(call(asgi_app, '/api/adventure', method='POST',
+                                           body=json.dumps(sample_adventure).encode()))
+        assert status == 200
+        assert json.loads(body)['success'] is True
+        assert (flask_app.DATA_DIR / 'Test Adventure.json').exists()
+
+    def test_monster_search_is_not_treated_as_monster_url(self, asgi_app, upstream):
+        status, _, body = asyncio.run(call(asgi_app, '/api/dndbeyond/monster/search/Goblin'))
+        assert status == 200
+        assert 'not loaded' in json.loads(body)['error']
+        assert upstream.requests == []
+
+
+class TestNativeUpstreamRoutes:
+    """The D&D Beyond routes run as coroutines against the async client."""
+
+    def test_monster_list_cache_only_without_cache(self, asgi_app):
+        _, _, body = asyncio.run(call(asgi_app, '/api/dndbeyond/monsters', query=b'cache_only=true'))
+        assert json.loads(body) == {'success': True, 'monsters': {}, 'count': 0,
+                                    'cached': False, 'scraped': False}
+
+    def test_cached_monster_list_is_listed_by_flask(self, asgi_app, upstream, client):
+        flask_app.MONSTERS_CACHE.write_text(json.dumps({
+            'Goblin': {'cr': '1/4', 'type': 'Humanoid', 'url': 'https://example/goblin'},
+            'Orc': {'cr': '1/2', 'type': 'Humanoid', 'url': 'https://example/orc'},
+        }))
+
+        status, headers, body = asyncio.run(call(asgi_app, '/api/dndbeyond/monsters',
+                                                 query=b'sort=cr&per_page=1&fields=cr'))
+        assert status == 200
+        assert b'etag' in headers
+        assert body == client.get('/api/dndbeyond/monsters?sort=cr&per_page=1&fields=cr').data
+        assert json.loads(body)['monsters'] == {'Goblin': {'cr': '1/4'}}
+        assert upstream.requests == []
+
+    def test_cached_character_skips_upstream(self, asgi_app, upstream):
+        cached = {'success': True, 'name': 'Cached Hero', 'avatarUrl': None, 'timestamp': time.time(),
+                  'cacheVersion': CACHE_VERSION}
+        (flask_app.CACHE_DIR / 'characters' / '123.json').write_text(json.dumps(cached))
+
+        _, _, body = asyncio.run(call(asgi_app, '/api/dndbeyond/character/123'))
+        assert json.loads(body)['name'] == 'Cached Hero'
+        assert upstream.requests == []
+
+    def test_character_fetched_with_async_client(self, asgi_app, upstream):
+        flask_app.DNDBEYOND_COOKIES = {'CobaltSession': 'abc'}
+        api_url = flask_app.CHARACTER_API_URL.format(character_id='456')
+        upstream.responses[api_url] = FakeResponse(payload={'success': True, 'data': {
+            'name': 'Async Hero',
+            'stats': [{'id': 2, 'value': 14}],
+            'classes': [{'definition': {'name': 'Rogue'}, 'level': 3}],
+            'baseHitPoints': 20,
+        }})
+
+        _, _, body = asyncio.run(call(asgi_app, '/api/dndbeyond/character/456'))
+        data = json.loads(body)
+        assert data['name'] == 'Async Hero'
+        assert data['level'] == 3
+        assert data['initiative'] == 2
+        url, kwargs = upstream.requests[0]
+        assert url == api_url
+        assert kwargs['headers']['Cookie'] == 'CobaltSession=abc'
+        assert (flask_app.CACHE_DIR / 'characters' / '456.json').exists()
+
+    def test_slow_upstream_does_not_block_other_requests(self, app, client, sample_adventure):
+        """A pending upstream fetch must not hold up requests behind it."""
+        client.post('/api/adventure', json=sample_adventure)
+        api_url = flask_app.CHARACTER_API_URL.format(character_id='789')
+
+        async def scenario():
+            gate = asyncio.Event()
+            upstream = FakeUpstream({api_url: FakeResponse(payload={'success': False})}, gate=gate)
+            instance = AsyncApp(app, workers=1, http_client=upstream)
+            try:
+                slow = asyncio.create_task(call(instance, '/api/dndbeyond/character/789'))
+                while not upstream.requests:
+                    await asyncio.sleep(0.01)
+                # One executor thread, and the upstream call is still pending
+                status, _, _ = await asyncio.wait_for(call(instance, '/api/adventures'), timeout=5)
+                assert not slow.done()
+                gate.set()
+                _, _, slow_body = await slow
+                return status, json.loads(slow_body)
+            finally:
+                await instance.aclose()
+
+        status, slow_result = asyncio.run(scenario())
+        assert status == 200
+        assert slow_result == {'success': False, 'error': 'API returned unsuccessful response'}
+
+
+class TestAsyncStartup:
+    """``python app.py --async`` serves the app it configured."""
+
+    def test_command_line_config_reaches_served_app(self, tmp_path):
+        # uvicorn's server is replaced by one that reports what it was given
+        driver = textwrap.dedent(f"""
+            import json, runpy, sys
+            import uvicorn
+
+            sys.path.insert(0, {str(Path(__file__).resolve().parents[1])!r})
+
+            class Server:
+                def __init__(self, config):
+                    self.config = config
+
+                async def serve(self):
+                    import asgi
+                    tracker = asgi.tracker
+                    flask_app = self.config.app.flask_app
+                    print('SERVED ' + json.dumps({{
+                        'module': tracker.__name__,
+                        'same_app': flask_app is tracker.app,
+                        'upstream_url': flask_app.config['UPSTREAM_URL'],
+                        'max_streams': tracker.ADVENTURE_EVENTS.max_streams,
+                        'initialized': tracker._runtime_initialized,
+                    }}))
+
+            uvicorn.Server = Server
+            sys.argv = ['app.py', '--async', '--upstream-url', 'http://127.0.0.1:9', '--event-streams', '3']
+            runpy.run_path(sys.path[0] + '/app.py', run_name='__main__')
+        """)
+        result = subprocess.run([sys.executable, '-c', driver], cwd=tmp_path,
+                                capture_output=True, text=True, timeout=60)
+        served = [line for line in result.stdout.splitlines() if line.startswith('SERVED ')]
+        assert served, result.stdout + result.stderr
+        assert json.loads(served[0][len('SERVED '):]) == {
+            'module': '__main__', 'same_app': True, 'upstream_url': 'http://127.0.0.1:9',
+            'max_streams': 3, 'initialized': True}
+        assert result.returncode == 0
@@ -0,0 +1,47 @@
+"""
+Tests for the benchmark suite (benchmarks/).
+"""
+import json
+
+from benchmarks import harness
+from benchmarks.__main__ import main
+
+
+def summary(per_op):
+    return {'per_op': per_op}
+
+
+class TestCompare:
+    """Per-operation medians are compared with the baseline's."""
+
+    def test_statuses(self):
+        baseline = {'a': summary(1.0), 'b': summary(1.0), 'c': summary(1.0)}
+        results = {'a': summary(1.3), 'b': summary(1.1), 'c': summary(0.5), 'd': summary(1.0)}
+        statuses = {row[0]: row[4] for row in harness.compare(results, baseline, threshold=0.2)}
+        assert statuses == {'a': 'regression', 'b': 'ok', 'c': 'improvement', 'd': 'new'}
+
+    def test_batch_divides_per_op(self):
+        result = harness.measure(lambda: {'size': 3}, number=2, rounds=2, batch=5)
+        assert result['per_op'] == result['median'] / 10
+        assert result['extra'] == {'size': 3}
+
+
+class TestSuite:
+    """The suite runs offline against the recorded fixtures."""
+
+    def test_quick_run_and_compare(self, app, tmp_path):
+        output = tmp_path / 'latest.json'
+        baseline = tmp_path / 'baseline.json'
+        args = ['--quick', '-k', 'parser.monster_page', '--output', str(output)]
+
+        assert main(args + ['--save-baseline', str(baseline)]) == 0
+        results = json.loads(output.read_text())['results']
+        assert sorted(results) == ['parser.monster_page_2014', 'parser.monster_page_2024']
+        assert main(args + ['--compare', str(baseline), '--threshold', '100']) == 0
+
+    def test_spectator_pollers(self, app, tmp_path):
+        output = tmp_path / 'latest.json'
+        assert main(['--quick', '-k', 'spectator', '--pollers', '2', '--requests', '2',
+                     '--output', str(output)]) == 0
+        result = json.loads(output.read_text())['results']['spectator.current_encounter_2_pollers']
+        assert (result['batch'], result['extra']['requests']) == (4, 4)
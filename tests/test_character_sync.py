@@ -0,0 +1,260 @@
+"""
+Tests for character sync (character_sync.py): conditional refresh, payload
+hashing and parallel party refresh.
+"""
+import json
+import threading
+import time
+
+import pytest
+
+import app as flask_app
+from character_sync import (CACHE_VERSION, ERROR, FRESH, NOT_MODIFIED, UNCHANGED,
+                            UPDATED, CharacterSync)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'HTTP {self.status_code}')
+
+
+def character_payload(name='Aria', level=3, avatar='https://example/aria.jpg'):
+    return {'success': True, 'data': {
+        'name': name,
+        'stats': [{'id': 2, 'value': 14}],
+        'classes': [{'definition': {'name': 'Rogue'}, 'level': level}],
+        'baseHitPoints': 20,
+        'decorations': {'avatarUrl': avatar},
+    }}
+
+
+class FakeService:
+    """Stands in for the character service; records the conditional headers it gets."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def __call__(self, character_id, headers):
+        self.calls.append((character_id, headers))
+        response = self.responses[character_id]
+        return response(headers) if callable(response) else response
+
+
+@pytest.fixture
+def sync(tmp_path):
+    return CharacterSync(tmp_path / 'characters', flask_app.build_character_details, max_age=3600)
+
+
+def localize(details):
+    details['avatarUrl'] = '/cached/images/aria.jpg'
+
+
+def expire(sync, character_id):
+    path = sync.details_path(character_id)
+    details = json.loads(path.read_text())
+    details['timestamp'] = time.time() - 7200
+    path.write_text(json.dumps(details))
+
+
+class TestCharacterSync:
+    """Stale characters are confirmed cheaply when nothing changed."""
+
+    def test_first_fetch_builds_and_stores_raw(self, sync):
+        service = FakeService({'1': FakeResponse(payload=character_payload(), headers={'ETag': '"v1"'})})
+        details, status = sync.sync('1', service, finish=localize)
+
+        assert status == UPDATED
+        assert (details['name'], details['level']) == ('Aria', 3)
+        assert details['avatarUrl'] == '/cached/images/aria.jpg'
+        raw = json.loads(sync.raw_path('1').read_text())
+        assert raw['etag'] == '"v1"'
+        assert raw['payload'] == character_payload()
+
+    def test_fresh_cache_skips_upstream(self, sync):
+        service = FakeService({'1': FakeResponse(payload=character_payload())})
+        sync.sync('1', service)
+        assert sync.sync('1', service)[1] == FRESH
+        assert len(service.calls) == 1
+
+    def test_not_modified(self, sync):
+        service = FakeService({'1': FakeResponse(payload=character_payload(), headers={'ETag': '"v1"'})})
+        sync.sync('1', service, finish=localize)
+        expire(sync, '1')
+
+        service.responses['1'] = lambda headers: FakeResponse(304 if headers.get('If-None-Match') == '"v1"' else 200)
+        details, status = sync.sync('1', service)
+        assert status == NOT_MODIFIED
+        assert details['avatarUrl'] == '/cached/images/aria.jpg'
+        assert sync.cached('1')[0] is not None
+
+    def test_unchanged_payload_is_not_rebuilt(self, sync):
+        service = FakeService({'1': FakeResponse(payload=character_payload())})
+        sync.sync('1', service, finish=localize)
+        expire(sync, '1')
+
+        finished = []
+        details, status = sync.sync('1', service, finish=finished.append)
+        assert status == UNCHANGED
+        assert finished == []
+        assert details['avatarUrl'] == '/cached/images/aria.jpg'
+
+    def test_changed_payload_is_rebuilt(self, sync):
+        service = FakeService({'1': FakeResponse(payload=character_payload())})
+        sync.sync('1', service)
+        service.responses['1'] = FakeResponse(payload=character_payload(level=4))
+
+        details, status = sync.sync('1', service, force=True)
+        assert (status, details['level']) == (UPDATED, 4)
+        assert json.loads(sync.details_path('1').read_text())['level'] == 4
+
+    def test_rebuild_from_raw_keeps_local_avatar(self, sync):
+        sync.sync('1', FakeService({'1': FakeResponse(payload=character_payload())}), finish=localize)
+        sync.details_path('1').write_text(json.dumps({'avatarUrl': '/cached/images/aria.jpg'}))
+
+        details = sync.rebuild('1')
+        assert details['level'] == 3
+        assert details['avatarUrl'] == '/cached/images/aria.jpg'
+
+    def test_sync_many_runs_in_parallel(self, sync):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def respond(headers):
+            barrier.wait()  # Only passes if three fetches are in flight at once
+            return FakeResponse(payload=character_payload())
+
+        service = FakeService({'1': respond, '2': respond, '3': respond})
+        results = sync.sync_many(['1', '2', '3', '2'], service, concurrency=3)
+        assert sorted(results) == ['1', '2', '3']
+        assert {status for _, status in results.values()} == {UPDATED}
+
+    def test_sync_many_isolates_failures(self, sync):
+        service = FakeService({'1': FakeResponse(payload=character_payload()),
+                               '2': FakeResponse(status_code=500),
+                               '3': FakeResponse(payload={'success': False})})
+        results = sync.sync_many(['1', '2', '3'], service)
+        assert results['1'][1] == UPDATED
+        assert results['2'] == ({'success': False, 'error': 'HTTP 500'}, ERROR)
+        assert results['3'][1] == ERROR
+
+
+class TestCharacterRoutes:
+    """The character endpoint and the party sync endpoint use the sync engine."""
+
+    def test_character_endpoint_revalidates_stale_entry(self, client, monkeypatch):
+        service = FakeService({'555': FakeResponse(payload=character_payload(avatar=None))})
+        monkeypatch.setattr(flask_app, 'fetch_character', service)
+
+        assert client.get('/api/dndbeyond/character/555').get_json()['name'] == 'Aria'
+        expire(flask_app.get_character_sync(), '555')
+        assert client.get('/api/dndbeyond/character/555').get_json()['name'] == 'Aria'
+        assert len(service.calls) == 2
+
+    def test_sync_adventure_party(self, client, monkeypatch):
+        (flask_app.DATA_DIR / 'Party.json').write_text(json.dumps({'name': 'Party', 'players': [
+            {'name': 'Aria', 'dndBeyondUrl': '111'},
+            {'name': 'Brom', 'dndBeyondUrl': 'https://www.dndbeyond.com/characters/222'},
+            {'name': 'Offline'},
+        ]}))
+        service = FakeService({'111': FakeResponse(payload=character_payload('Aria', avatar=None)),
+                               '222': FakeResponse(payload=character_payload('Brom', avatar=None))})
+        monkeypatch.setattr(flask_app, 'fetch_character', service)
+
+        data = client.post('/api/adventure/Party/sync-characters').get_json()
+        assert data['status'] == {'111': UPDATED, '222': UPDATED}
+        assert data['characters']['222']['name'] == 'Brom'
+
+        data = client.post('/api/adventure/Party/sync-characters').get_json()
+        assert data['status'] == {'111': FRESH, '222': FRESH}
+        data = client.post('/api/adventure/Party/sync-characters', json={'force': True}).get_json()
+        assert data['status'] == {'111': UNCHANGED, '222': UNCHANGED}
+
+    def test_sync_missing_adventure(self, client):
+        assert client.post('/api/adventure/Nope/sync-characters').status_code == 404
+
+
+class TestCharacterBatch:
+    """POST /api/dndbeyond/characters loads a party in one round trip."""
+
+    def test_cached_and_stale_characters(self, client, monkeypatch):
+        service = FakeService({'111': FakeResponse(payload=character_payload('Aria', avatar=None)),
+                               '222': FakeResponse(payload=character_payload('Brom', avatar=None)),
+                               '333': FakeResponse(status_code=500)})
+        monkeypatch.setattr(flask_app, 'fetch_character', service)
+        client.get('/api/dndbeyond/character/111')
+
+        response = client.post('/api/dndbeyond/characters', json={
+            'ids': ['111', 'https://www.dndbeyond.com/characters/222', '333']})
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['status'] == {'111': FRESH, '222': UPDATED, '333': ERROR}
+        assert data['characters']['222']['name'] == 'Brom'
+        # Partial results: the failed character carries its own error
+        assert data['characters']['333'] == {'success': False, 'error': 'HTTP 500'}
+        assert [cid for cid, _ in service.calls] == ['111', '222', '333']
+
+    def test_stream(self, client, monkeypatch):
+        service = FakeService({'111': FakeResponse(payload=character_payload('Aria', avatar=None)),
+                               '222': FakeResponse(payload=character_payload('Brom', avatar=None))})
+        monkeypatch.setattr(flask_app, 'fetch_character', service)
+        client.get('/api/dndbeyond/character/111')
+
+        response = client.post('/api/dndbeyond/characters?stream=1', json={'ids': ['222', '111']})
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        # Cached characters come first, before any upstream call finishes
+        assert [(line['id'], line['status']) for line in lines] == [('111', FRESH), ('222', UPDATED)]
+        assert lines[1]['character']['name'] == 'Brom'
+
+    def test_bad_requests(self, client):
+        assert client.post('/api/dndbeyond/characters', json={'ids': '111'}).status_code == 400
+        assert client.post('/api/dndbeyond/characters', json={'ids': ['1'] * 51}).status_code == 400
+        assert client.post('/api/dndbeyond/characters', json={'ids': []}).get_json() == {
+            'success': True, 'characters': {}, 'status': {}}
+
+
+class TestSharedCharacterCache:
+    """The legacy endpoint reads the same versioned cache entry."""
+
+    def test_legacy_endpoint_shares_cache(self, client, monkeypatch):
+        service = FakeService({'555': FakeResponse(payload=character_payload(avatar=None))})
+        monkeypatch.setattr(flask_app, 'fetch_character', service)
+
+        legacy = client.get('/api/dndbeyond/character-old/characters/555').get_json()
+        assert legacy['success'] is True and legacy['cached'] is False
+        assert legacy['details']['summary'] == 'Level 3 Unknown Rogue'
+        assert legacy['details']['abilities']['dex'] == {'score': 14, 'modifier': 2}
+        assert legacy['details']['hp'] == legacy['details']['maxHp'] == 20
+
+        assert client.get('/api/dndbeyond/character/555').get_json()['name'] == 'Aria'
+        assert client.get('/api/dndbeyond/character-old/555').get_json()['cached'] is True
+        assert len(service.calls) == 1
+
+    def test_unversioned_entries_are_refetched(self, sync):
+        sync.details_path('1').write_text(json.dumps(
+            {'url': 'https://www.dndbeyond.com/characters/1', 'data': {'name': 'Old'}, 'timestamp': time.time()}))
+        service = FakeService({'1': FakeResponse(payload=character_payload())})
+
+        details, status = sync.sync('1', service)
+        assert (status, details['name']) == (UPDATED, 'Aria')
+        assert json.loads(sync.details_path('1').read_text())['cacheVersion'] == CACHE_VERSION
+
+    def test_debug_html_is_opt_in(self, app):
+        flask_app.parse_monster_list_page('<html></html>', {}, page=1)
+        assert not (flask_app.CACHE_DIR / 'monsters_page_debug.html').exists()
+
+        app.config['SAVE_DEBUG_HTML'] = True
+        try:
+            flask_app.parse_monster_list_page('<html></html>', {}, page=1)
+        finally:
+            app.config['SAVE_DEBUG_HTML'] = False
+        assert (flask_app.CACHE_DIR / 'monsters_page_debug.html').exists()
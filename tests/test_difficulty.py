@@ -0,0 +1,152 @@
+"""
+Tests for encounter XP, CR and difficulty (difficulty.py).
+"""
+import json
+
+import app as flask_app
+from difficulty import (DifficultyEngine, cr_for_xp, encounter_multiplier,
+                        party_thresholds, xp_for_cr)
+from monster_search import MonsterIndex
+
+MONSTERS = {
+    'Goblin': {'cr': '1/4', 'url': 'https://www.dndbeyond.com/monsters/16907-goblin'},
+    'Goblin Boss': {'cr': '1', 'url': 'https://www.dndbeyond.com/monsters/16908-goblin-boss'},
+    'Ogre': {'cr': '2', 'url': 'https://www.dndbeyond.com/monsters/17002-ogre'},
+}
+
+
+def make_engine(**kwargs):
+    return DifficultyEngine(MonsterIndex(MONSTERS), **kwargs)
+
+
+class TestTables:
+    """XP/CR conversions and multipliers."""
+
+    def test_xp_for_cr(self):
+        assert xp_for_cr('1/4') == 50
+        assert xp_for_cr('30') == 155000
+        assert xp_for_cr('') == 0
+        assert xp_for_cr(None) == 0
+
+    def test_cr_for_xp_takes_highest_reached(self):
+        assert cr_for_xp(0) == '0'
+        assert cr_for_xp(50) == '1/4'
+        assert cr_for_xp(449) == '1'
+        assert cr_for_xp(450) == '2'
+        assert cr_for_xp(10 ** 7) == '30'
+
+    def test_multiplier_by_monster_count(self):
+        assert [encounter_multiplier(n) for n in (1, 2, 3, 7, 11, 15)] == [1, 1.5, 2, 2.5, 3, 4]
+
+    def test_multiplier_shifts_for_party_size(self):
+        assert encounter_multiplier(1, party_size=2) == 1.5
+        assert encounter_multiplier(15, party_size=2) == 5
+        assert encounter_multiplier(2, party_size=6) == 1
+        assert encounter_multiplier(1, party_size=6) == 0.5
+        assert encounter_multiplier(2, party_size=4) == 1.5
+
+    def test_party_thresholds(self):
+        thresholds = party_thresholds([1, 1, 3, 99])
+        assert thresholds['2014'] == {'easy': 25 + 25 + 75 + 2800, 'medium': 50 + 50 + 150 + 5700,
+                                      'hard': 75 + 75 + 225 + 8500, 'deadly': 100 + 100 + 400 + 12700}
+        assert thresholds['2024']['moderate'] == 75 + 75 + 225 + 13200
+
+
+class TestDifficultyEngine:
+    """CR comes from the monster index; results are memoized per monster list."""
+
+    def test_monster_cr_by_id_url_and_name(self):
+        engine = make_engine()
+        assert engine.monster_cr({'id': '16907-goblin'}) == '1/4'
+        assert engine.monster_cr({'dndBeyondUrl': 'https://www.dndbeyond.com/monsters/17002-ogre'}) == '2'
+        assert engine.monster_cr({'name': 'Goblin Boss 2'}) == '1'
+        assert engine.monster_cr({'name': 'Ogre (Disguised) 1'}) == '2'
+        assert engine.monster_cr({'name': 'Ogre', 'cr': '5'}) == '5'
+        assert engine.monster_cr({'name': 'Homebrew Horror'}) == ''
+
+    def test_encounter_cr_skips_players(self):
+        engine = make_engine()
+        encounter = {'combatants': [
+            {'id': '12345'},
+            {'id': '16907-goblin', 'name': 'Goblin 1'},
+            {'id': '16907-goblin', 'name': 'Goblin 2'},
+            {'id': '16908-goblin-boss', 'name': 'Goblin Boss'},
+        ]}
+        # (50 + 50 + 200) * 2 = 600 XP
+        assert engine.encounter_xp(encounter) == (300, 600, 3)
+        assert engine.encounter_cr(encounter) == '2'
+        assert engine.encounter_cr({'combatants': [{'id': '12345'}]}) == '0'
+
+    def test_fallback_for_monsters_outside_library(self):
+        looked_up = []
+        engine = make_engine(fallback_cr=lambda mid: looked_up.append(mid) or '3')
+        assert engine.encounter_cr({'combatants': [{'id': '99999-homebrew', 'name': 'Horror'}]}) == '3'
+        assert looked_up == ['99999-homebrew']
+
+    def test_encounters_are_memoized(self):
+        looked_up = []
+        engine = make_engine(fallback_cr=lambda mid: looked_up.append(mid) or '1')
+        encounter = {'combatants': [{'id': '99999-homebrew', 'name': 'Horror'}, {'name': 'Ogre'}]}
+        engine.encounter_cr(encounter)
+        # Same monsters in another order hit the memo
+        engine.encounter_cr({'combatants': list(reversed(encounter['combatants']))})
+        assert looked_up == ['99999-homebrew']
+
+    def test_unresolved_monsters_are_not_memoized(self):
+        engine = make_engine()
+        encounter = {'combatants': [{'name': 'Homebrew Horror'}]}
+        assert engine.encounter_cr(encounter) == '0'
+        assert engine._encounters == {}
+
+    def test_rate_encounter(self):
+        engine = make_engine()
+        encounter = {'combatants': [{'name': 'Ogre'}, {'name': 'Ogre'}]}
+        rating = engine.rate_encounter(encounter, [3, 3, 3, 3])
+        # 900 XP * 1.5 = 1350 against a level-3 party of four
+        assert rating['xp'] == 900
+        assert rating['adjustedXp'] == 1350
+        assert rating['cr'] == '4'
+        assert rating['difficulty2014'] == 'hard'
+        assert rating['difficulty2024'] == 'moderate'
+
+    def test_rate_encounter_without_party(self):
+        rating = make_engine().rate_encounter({'combatants': [{'name': 'Goblin'}]}, [])
+        assert rating['cr'] == '1/4'
+        assert rating['difficulty2014'] is None
+        assert rating['difficulty2024'] is None
+
+
+class TestSavedEncounterCR:
+    """Saving drops totalCR when it matches the calculated default."""
+
+    def save_and_load(self, client, encounter):
+        client.post('/api/adventure/Test Adventure', json={'name': 'Test Adventure', 'encounters': [encounter]})
+        return json.loads((flask_app.DATA_DIR / 'Test Adventure.json').read_text())['encounters'][0]
+
+    def test_default_cr_is_stripped(self, client):
+        flask_app.MONSTER_DETAILS_DIR.mkdir(parents=True, exist_ok=True)
+        (flask_app.MONSTER_DETAILS_DIR / '17002-ogre.json').write_text(json.dumps({'data': {'cr': '2'}}))
+        saved = self.save_and_load(client, {'name': 'Ambush', 'totalCR': '2', 'combatants': [
+            {'name': 'Ogre', 'id': '17002-ogre'}]})
+        assert 'totalCR' not in saved
+
+    def test_homebrew_cr_survives_reload(self, client):
+        """A monster's own cr isn't stored, so it can't make totalCR the default."""
+        self.save_and_load(client, {'name': 'Lair', 'totalCR': '5', 'combatants': [
+            {'name': 'Homebrew Horror', 'cr': '5'}]})
+        loaded = client.get('/api/adventure/Test Adventure').get_json()
+        assert loaded['encounters'][0]['totalCR'] == '5'
+        client.post('/api/adventure/Test Adventure', json=loaded)
+        assert client.get('/api/adventure/Test Adventure').get_json()['encounters'][0]['totalCR'] == '5'
+
+    def test_names_dont_change_the_default(self, client):
+        """Monsters without an ID count as 0 XP, as in adventures saved before the library lookup."""
+        flask_app.MONSTERS_CACHE.write_text(json.dumps(MONSTERS))
+        saved = self.save_and_load(client, {'name': 'Ambush', 'totalCR': '2', 'combatants': [{'name': 'Ogre'}]})
+        assert saved['totalCR'] == '2'
+
+    def test_custom_cr_is_kept(self, client):
+        flask_app.MONSTERS_CACHE.write_text(json.dumps(MONSTERS))
+        saved = self.save_and_load(client, {'name': 'Ambush', 'totalCR': '5', 'combatants': [
+            {'name': 'Ogre', 'dndBeyondUrl': 'https://www.dndbeyond.com/monsters/17002-ogre'}]})
+        assert saved['totalCR'] == '5'
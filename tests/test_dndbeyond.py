@@ -315,7 +315,22 @@ class TestDndBeyondMonsters:
 
 
 class TestMonsterBundleBootstrap:
-    """The bundled ``data/monsters.json`` should seed an empty cache on import."""
+    """The bundled ``data/monsters.json`` should seed an empty cache at startup."""
+
+    def test_import_has_no_filesystem_side_effects(self, tmp_path, monkeypatch):
+        import importlib
+        import app as flask_app
+
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        (data_dir / "monsters.json").write_text(json.dumps({'Goblin': {'cr': '1/4'}}))
+
+        monkeypatch.chdir(tmp_path)
+        importlib.reload(flask_app)
+
+        # Nothing but the fake bundle should exist after a bare import
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['data']
+        assert not flask_app.MONSTERS_CACHE.exists()
 
     def test_bootstrap_copies_bundle_when_cache_missing(self, tmp_path, monkeypatch):
         import importlib
@@ -333,8 +348,9 @@ class TestMonsterBundleBootstrap:
         }))
 
         monkeypatch.chdir(tmp_path)
-        # Re-import app to re-run the module-level bootstrap under the new cwd
+        # Re-import app so the relative paths resolve under the new cwd
         importlib.reload(flask_app)
+        assert flask_app.bootstrap_monster_cache() is True
 
         assert flask_app.MONSTERS_CACHE.exists()
         restored = json.loads(flask_app.MONSTERS_CACHE.read_text())
@@ -354,10 +370,29 @@ class TestMonsterBundleBootstrap:
 
         monkeypatch.chdir(tmp_path)
         importlib.reload(flask_app)
+        assert flask_app.bootstrap_monster_cache() is False
 
         # Existing cache must not be overwritten
         assert json.loads(flask_app.MONSTERS_CACHE.read_text()) == {'Existing': {'cr': '5'}}
 
+    def test_first_request_initializes_runtime(self, tmp_path, monkeypatch):
+        import importlib
+        import app as flask_app
+
+        cache_dir = tmp_path / ".cache"
+        cache_dir.mkdir()
+        (cache_dir / "cookies.json").write_text(json.dumps({'CobaltId': 'abc'}))
+
+        monkeypatch.chdir(tmp_path)
+        importlib.reload(flask_app)
+        assert flask_app.DNDBEYOND_COOKIES == {}
+
+        test_app = flask_app.create_app({'TESTING': True})
+        response = test_app.test_client().get('/api/dndbeyond/cookie-status')
+        assert json.loads(response.data)['cookieCount'] == 1
+        assert (tmp_path / "adventures").is_dir()
+        assert (tmp_path / "music").is_dir()
+
 
 @pytest.mark.dndbeyond
 class TestDndBeyondCharacters:
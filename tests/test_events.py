@@ -0,0 +1,225 @@
+"""
+Tests for live adventure change events (events.py) and their endpoints.
+"""
+import json
+
+import pytest
+
+import app as flask_app
+from events import AdventureEvents, EventStreamsFull, format_event
+
+
+def adventure(*hps, pin=None):
+    data = {
+        'name': 'Live',
+        'players': [],
+        'encounters': [{'name': f'Encounter {i + 1}', 'state': 'started', 'combatants': [
+            {'name': 'Ogre', 'dndBeyondUrl': 'https://www.dndbeyond.com/monsters/17002-ogre', 'hp': hp, 'maxHp': 59},
+        ]} for i, hp in enumerate(hps)],
+    }
+    if pin:
+        data['pin'] = pin
+    return data
+
+
+def parse(text):
+    """``(kind, data)`` of one Server-Sent Event, or None for other lines."""
+    fields = dict(line.split(': ', 1) for line in text.strip().splitlines() if not line.startswith(':'))
+    if 'event' not in fields:
+        return None
+    return fields['event'], json.loads(fields['data'])
+
+
+class TestAdventureEvents:
+    """Subscriptions, fan-out and the stream format."""
+
+    def test_publish_to_adventure_and_summary(self):
+        events = AdventureEvents()
+        live, other, everything = events.subscribe('Live'), events.subscribe('Other'), events.subscribe()
+        assert events.publish('Live', 'change', {'revision': 3, 'base': 2, 'changes': []}) == 2
+
+        assert live.get(0) == ('change', {'adventure': 'Live', 'revision': 3, 'base': 2, 'changes': []})
+        assert everything.get(0) == ('change', {'adventure': 'Live', 'revision': 3})
+        assert other.get(0) is None
+
+    def test_stream_limit(self):
+        events = AdventureEvents(max_streams=1)
+        subscription = events.subscribe('Live')
+        with pytest.raises(EventStreamsFull):
+            events.subscribe('Other')
+        subscription.close()
+        events.subscribe('Other')
+
+    def test_spectators_have_their_own_limit(self):
+        events = AdventureEvents(max_streams=1, max_summary_streams=2)
+        events.subscribe(), events.subscribe()
+        with pytest.raises(EventStreamsFull):
+            events.subscribe()
+        # The DM's slot is still free
+        events.subscribe('Live')
+
+    def test_slow_client_is_reset(self):
+        events = AdventureEvents(backlog=2)
+        subscription = events.subscribe('Live')
+        for revision in range(1, 4):
+            events.publish('Live', 'change', {'revision': revision})
+        assert subscription.get(0) == ('reset', {'adventure': 'Live'})
+        assert subscription.get(0) is None
+
+    def test_state_kept_while_watched(self):
+        events = AdventureEvents()
+        events.remember('Live', 1, {'a': 1})
+        assert events.last_state('Live') is None
+        subscription = events.subscribe('Live')
+        events.remember('Live', 1, {'a': 1})
+        assert events.last_state('Live') == (1, {'a': 1})
+        subscription.close()
+        assert events.last_state('Live') is None
+
+    def test_locked_subscribers_are_dropped(self):
+        events = AdventureEvents()
+        old, current = events.subscribe('Live', access=0), events.subscribe('Live', access=1)
+        assert events.publish('Live', 'change', {'revision': 2}, allowed=lambda access: access == 1) == 1
+        assert old.get(0) == ('locked', {'adventure': 'Live'})
+        assert current.get(0) == ('change', {'adventure': 'Live', 'revision': 2})
+        events.publish('Live', 'change', {'revision': 3})
+        assert old.get(0) is not None and old.get(0) is None
+
+    def test_stream_ends_on_close(self):
+        events = AdventureEvents()
+        subscription = events.subscribe('Live')
+        stream = subscription.stream([('revision', {'revision': 0})], heartbeat=0.01, lifetime=5)
+        assert next(stream).startswith('retry: ')
+        assert next(stream) == format_event('revision', {'revision': 0}, 0)
+        assert next(stream) == ': keep-alive\n\n'
+        events.close()
+        assert list(stream) == []
+        assert not events.watched('Live')
+
+
+class TestEventEndpoints:
+    """Saves are sent to the browsers watching the adventure."""
+
+    @pytest.fixture
+    def streams(self, client, monkeypatch):
+        monkeypatch.setitem(flask_app.app.config, 'EVENT_STREAM_LIFETIME', 2)
+        opened = []
+
+        def open_stream(path):
+            response = client.get(path, buffered=False)
+            opened.append(response)
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            return (chunk.decode() for chunk in response.response)
+
+        yield open_stream
+        for response in opened:
+            response.close()
+
+    def next_event(self, stream):
+        for text in stream:
+            event = parse(text)
+            if event:
+                return event
+
+    def save(self, client, data, client_id='tab-a'):
+        return client.post('/api/adventure/Live', json=data, headers={'X-Client-Id': client_id}).get_json()
+
+    def test_dm_gets_changes(self, client, streams):
+        self.save(client, adventure(59, 59))
+        loaded = client.get('/api/adventure/Live').get_json()
+        stream = streams('/api/adventure/Live/events')
+        assert self.next_event(stream) == ('revision', {'adventure': 'Live', 'revision': 0})
+
+        loaded['encounters'][1]['combatants'][0]['hp'] = 12
+        self.save(client, loaded)
+        kind, event = self.next_event(stream)
+        assert kind == 'change'
+        assert (event['revision'], event['base'], event['source']) == (1, 0, 'tab-a')
+        assert [(c['op'], c['path'], c['value']) for c in event['changes']] == [
+            ('set', ['encounters', 1, 'combatants', 0, 'hp'], 12)]
+
+        # The changes are in the form the DM interface loads
+        loaded['revision'] = 1
+        loaded['encounters'][0]['combatants'][0]['hp'] = 30
+        self.save(client, loaded, client_id='tab-b')
+        kind, event = self.next_event(stream)
+        assert event['changes'][0]['path'] == ['encounters', 0, 'combatants', 0, 'hp']
+        assert client.get('/api/adventure/Live').get_json()['encounters'][0]['combatants'][0]['dndBeyondUrl'] \
+            .startswith('https://')
+
+    def test_undo_and_delete(self, client, streams):
+        self.save(client, adventure(59))
+        self.save(client, adventure(20))
+        stream = streams('/api/adventure/Live/events')
+        self.next_event(stream)
+
+        client.post('/api/adventure/Live/undo')
+        kind, event = self.next_event(stream)
+        assert (kind, event['revision']) == ('change', 2)
+        assert event['changes'][0]['value'] == 59
+
+        client.delete('/api/adventure/Live')
+        assert self.next_event(stream) == ('deleted', {'adventure': 'Live'})
+
+    def test_spectator_gets_summaries(self, client, streams):
+        stream = streams('/api/current-encounter/events')
+        self.save(client, adventure(59, pin='1234'))
+        assert self.next_event(stream) == ('change', {'adventure': 'Live', 'revision': 0})
+
+    def test_pin_required(self, client):
+        flask_app.get_adventure_journal().save('Live', adventure(59, pin='1234'))
+        assert client.get('/api/adventure/Live/events').status_code == 403
+        assert client.get('/api/adventure/Missing/events').status_code == 404
+
+    def test_pin_change_locks_open_streams(self, app, client, streams):
+        """A stream opened under the old PIN gets no more changes, and the
+        PIN is never sent in one."""
+        flask_app.get_adventure_journal().save('Live', adventure(59, pin='1234'))
+        changer = app.test_client()
+        for session in (client, changer):
+            assert session.post('/api/adventure/Live/verify-pin', json={'pin': '1234'}).status_code == 200
+        stream = streams('/api/adventure/Live/events')
+        self.next_event(stream)
+
+        loaded = changer.get('/api/adventure/Live').get_json()
+        loaded['encounters'][0]['combatants'][0]['hp'] = 40
+        self.save(changer, loaded, client_id='tab-b')
+        kind, event = self.next_event(stream)
+        assert kind == 'change' and 'pin' not in json.dumps(event['changes'])
+
+        loaded.update(revision=1, pin='9999', pinVersion=1)
+        loaded['encounters'][0]['combatants'][0]['hp'] = 30
+        self.save(changer, loaded, client_id='tab-b')
+        assert self.next_event(stream) == ('locked', {'adventure': 'Live'})
+        assert list(stream) == []
+        assert not flask_app.ADVENTURE_EVENTS.watched('Live')
+        assert client.get('/api/adventure/Live').status_code == 403
+
+    def test_pin_never_sent(self, client, streams):
+        flask_app.get_adventure_journal().save('Live', adventure(59, pin='1234'))
+        client.post('/api/adventure/Live/verify-pin', json={'pin': '1234'})
+        stream = streams('/api/adventure/Live/events')
+        self.next_event(stream)
+
+        # Same PIN version: the stream stays open but doesn't see the new PIN
+        self.save(client, {**adventure(59), 'revision': 0, 'pin': '5678'})
+        kind, event = self.next_event(stream)
+        assert kind == 'change'
+        assert [c for c in event['changes'] if c['path'][0] == 'pin'] == []
+        assert '5678' not in json.dumps(event)
+
+    def test_new_pin_locks_unverified_streams(self, client, streams):
+        self.save(client, adventure(59))
+        stream = streams('/api/adventure/Live/events')
+        self.next_event(stream)
+        self.save(client, {**adventure(59), 'revision': 0, 'pin': '1234'})
+        assert self.next_event(stream) == ('locked', {'adventure': 'Live'})
+
+    def test_streams_full(self, client, streams, monkeypatch):
+        monkeypatch.setattr(flask_app.ADVENTURE_EVENTS, 'max_summary_streams', 1)
+        streams('/api/current-encounter/events')
+        assert client.get('/api/current-encounter/events').status_code == 503
+        # Spectators don't use up the DM's streams
+        self.save(client, adventure(59))
+        streams('/api/adventure/Live/events')
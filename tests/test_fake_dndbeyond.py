@@ -0,0 +1,120 @@
+"""
+Tests for the D&D Beyond stand-in (benchmarks/fake_dndbeyond.py) and
+pointing the app at it with UPSTREAM_URL.
+"""
+import pytest
+
+import app as flask_app
+from benchmarks.fake_dndbeyond import FakeDndBeyond
+
+LIBRARY = {
+    'Goblin': {'cr': '1/4', 'type': 'Humanoid', 'size': 'Small', 'alignment': 'Neutral Evil',
+               'url': 'https://www.dndbeyond.com/monsters/16907-goblin', 'isLegacy': True},
+    'Owlbear': {'cr': '3', 'type': 'Monstrosity', 'size': 'Large', 'alignment': 'Unaligned',
+                'url': 'https://www.dndbeyond.com/monsters/5195204-owlbear', 'isLegacy': False},
+    'Vecna': {'cr': '26', 'type': 'Undead', 'size': 'Medium', 'alignment': 'Neutral Evil',
+              'url': 'https://www.dndbeyond.com/monsters/2935-vecna', 'noAccess': True},
+}
+
+
+@pytest.fixture
+def upstream(app):
+    """Starts a stand-in; pass its settings with ``upstream(**settings)``."""
+    servers = []
+
+    def start(**settings):
+        fake = FakeDndBeyond(monsters=LIBRARY, retry_after=0, **settings)
+        fake.start()
+        servers.append(fake)
+        app.config['UPSTREAM_URL'] = fake.url
+        flask_app.DNDBEYOND_COOKIES = {'CobaltSession': 'test'}
+        return fake
+
+    yield start
+    app.config['UPSTREAM_URL'] = None
+    for fake in servers:
+        fake.stop()
+    # Don't let throttled test hosts slow later tests down
+    flask_app.UPSTREAM_LIMITER.configure()
+
+
+class TestUpstreamUrl:
+    """UPSTREAM_URL redirects D&D Beyond hosts only."""
+
+    def test_rewrites_dndbeyond_hosts(self, app):
+        url = 'https://character-service.dndbeyond.com/character/v5/character/1?x=1'
+        assert flask_app.upstream_url(url) == url
+
+        app.config['UPSTREAM_URL'] = 'http://127.0.0.1:8765/ddb/'
+        try:
+            assert flask_app.upstream_url(url) == 'http://127.0.0.1:8765/ddb/character/v5/character/1?x=1'
+            assert flask_app.upstream_url('https://www.dndbeyond.com/monsters/1-a') == 'http://127.0.0.1:8765/ddb/monsters/1-a'
+            assert flask_app.upstream_url('https://example.com/a.png') == 'https://example.com/a.png'
+            assert flask_app.upstream_url('https://notdndbeyond.com/') == 'https://notdndbeyond.com/'
+        finally:
+            app.config['UPSTREAM_URL'] = None
+
+
+class TestFetchPipeline:
+    """The scrapers run end to end against the stand-in."""
+
+    def test_monster_list(self, client, upstream):
+        fake = upstream()
+        data = client.get('/api/dndbeyond/monsters').get_json()
+        assert data['success'] is True
+        assert data['monsters']['Owlbear']['url'] == 'https://www.dndbeyond.com/monsters/5195204-owlbear'
+        assert data['monsters']['Goblin']['isLegacy'] is True
+        assert fake.stats()['routes']['list'] >= 2
+
+    def test_monster_details(self, client, upstream):
+        fake = upstream()
+        data = client.get('/api/dndbeyond/monster/5195204-owlbear').get_json()
+        assert data['success'] is True
+        assert data['details']['name'] == 'Owlbear'
+        # Stored under the real D&D Beyond URL, not the stand-in's
+        cached = (flask_app.MONSTER_DETAILS_DIR / '5195204-owlbear.json').read_text()
+        assert 'https://www.dndbeyond.com/monsters/5195204-owlbear' in cached
+        assert fake.stats()['routes'] == {'home': 1, 'monster': 1}
+
+    def test_no_access_redirects_to_marketplace(self, upstream):
+        upstream()
+        result = flask_app.fetch_monster_details('https://www.dndbeyond.com/monsters/2935-vecna')
+        assert result['success'] is False
+        assert result['auth_failed'] is True
+
+    def test_character_conditional_refresh(self, app, client, upstream):
+        fake = upstream()
+        first = client.get('/api/dndbeyond/character/159889233').get_json()
+        assert first['name'] == 'Adventurer 159889233'
+        assert first['avatarUrl'].startswith('/cached/images/')
+
+        sync = flask_app.get_character_sync()
+        record = flask_app.json.loads(sync.raw_path('159889233').read_text())
+        record['fetched'] = 0
+        sync.raw_path('159889233').write_text(flask_app.json.dumps(record))
+        details = flask_app.json.loads(sync.details_path('159889233').read_text())
+        details['timestamp'] = 0
+        sync.details_path('159889233').write_text(flask_app.json.dumps(details))
+
+        client.get('/api/dndbeyond/character/159889233')
+        assert fake.stats()['statuses'] == {'200': 2, '304': 1}
+
+
+class TestFaults:
+    """Latency, errors and 429s are injected as configured."""
+
+    def test_throttling_is_retried(self, upstream):
+        fake = upstream(throttle_rate=1.0)
+        result = flask_app.fetch_monster_details('https://www.dndbeyond.com/monsters/16907-goblin')
+        assert result == {'success': False, 'error': 'HTTP 429'}
+        # The homepage and the monster page, each tried three times
+        assert fake.stats()['statuses'] == {'429': 6}
+        assert flask_app.UPSTREAM_LIMITER.stats()['127.0.0.1']['throttled'] == 6
+
+    def test_rate_limit_and_errors(self):
+        fake = FakeDndBeyond(monsters=LIBRARY, rate_limit=2, error_rate=0.5, seed=1)
+        now = 1000.0
+        fake._refilled = now
+        faults = [fake._fault(now) for _ in range(6)]
+        assert faults[2:] == [429] * 4
+        assert set(faults[:2]) <= {None, 500}
@@ -0,0 +1,107 @@
+"""
+Tests for response compression and cache validators (http_cache.py).
+"""
+import gzip
+import json
+import re
+
+import http_cache
+
+
+class TestJsonValidators:
+    """JSON GET responses carry a content ETag and revalidate."""
+
+    def test_json_response_has_weak_etag(self, client):
+        response = client.get('/api/adventures')
+        assert response.status_code == 200
+        etag, weak = response.get_etag()
+        assert etag and weak
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    def test_unchanged_json_is_not_modified(self, client):
+        etag = client.get('/api/adventures').headers['ETag']
+        response = client.get('/api/adventures', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_changed_json_gets_new_etag(self, client, sample_adventure):
+        etag = client.get('/api/adventures').headers['ETag']
+        client.post('/api/adventure', json=sample_adventure)
+        response = client.get('/api/adventures', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_post_response_is_untouched(self, client, sample_adventure):
+        response = client.post('/api/adventure', json=sample_adventure,
+                               headers={'Accept-Encoding': 'gzip'})
+        assert 'ETag' not in response.headers
+        assert 'Content-Encoding' not in response.headers
+
+
+class TestCompression:
+    """Text bodies above COMPRESS_MIN_SIZE are compressed when accepted."""
+
+    def test_large_json_is_gzipped(self, client, sample_adventure):
+        sample_adventure['players'] = [{'name': f'Hero {i}', 'maxHp': 30} for i in range(60)]
+        client.post('/api/adventure/Test Adventure', json=sample_adventure)
+
+        response = client.get('/api/adventure/Test Adventure', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(json.loads(gzip.decompress(response.data))['players']) == 60
+
+    def test_small_json_is_not_compressed(self, client):
+        response = client.get('/api/adventures', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert json.loads(response.data) == []
+
+    def test_no_accept_encoding_means_identity(self, client, sample_adventure):
+        sample_adventure['players'] = [{'name': f'Hero {i}', 'maxHp': 30} for i in range(60)]
+        client.post('/api/adventure/Test Adventure', json=sample_adventure)
+        response = client.get('/api/adventure/Test Adventure')
+        assert 'Content-Encoding' not in response.headers
+
+    def test_compressed_body_is_deterministic(self):
+        body = b'{"monsters": {}}' * 100
+        assert http_cache.compress(body, 'gzip') == http_cache.compress(body, 'gzip')
+
+
+class TestStaticAssets:
+    """Fingerprinted static URLs are immutable; others revalidate."""
+
+    def test_index_uses_fingerprinted_urls(self, client):
+        html = client.get('/').data.decode()
+        assert re.search(r'/static/style\.css\?v=[0-9a-f]{12}"', html)
+        assert re.search(r'/static/app\.js\?v=[0-9a-f]{12}"', html)
+
+    def test_fingerprinted_asset_is_immutable(self, client):
+        html = client.get('/').data.decode()
+        url = re.search(r'"(/static/style\.css\?v=[0-9a-f]{12})"', html).group(1)
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        assert 'max-age=31536000' in response.headers['Cache-Control']
+        response.close()
+
+    def test_stale_fingerprint_revalidates(self, client):
+        response = client.get('/static/style.css?v=000000000000')
+        assert response.headers['Cache-Control'] == 'no-cache'
+        response.close()
+
+    def test_unversioned_module_revalidates(self, client):
+        response = client.get('/static/app.js')
+        assert response.headers['Cache-Control'] == 'no-cache'
+        etag = response.headers['ETag']
+        response.close()
+        assert client.get('/static/app.js', headers={'If-None-Match': etag}).status_code == 304
+
+    def test_static_file_is_compressed_with_weak_etag(self, client):
+        plain = client.get('/static/style.css')
+        plain_body = plain.data
+        plain.close()
+
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == plain_body
+        assert response.headers['ETag'].startswith('W/')
+        response.close()
@@ -0,0 +1,216 @@
+"""
+Tests for the background job subsystem (jobs.py and the /api/jobs endpoints).
+"""
+import json
+import threading
+import time
+
+import pytest
+
+import app as flask_app
+from jobs import JobKind, JobManager
+from ratelimit import UpstreamLimiter
+
+
+def gated_kind(calls, gate, block_on='3'):
+    """A job kind over items '0'..'9' that blocks on ``gate`` at ``block_on``."""
+    def run(ctx):
+        def work(item):
+            calls.append(item)
+            if item == block_on:
+                gate.wait(5)
+            return int(item) * 10
+        ctx.map([str(i) for i in range(10)], key=str, fn=work)
+        return {'items': 10}
+    return JobKind(run, concurrency=1)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+class TestJobManager:
+    """JobManager lifecycle, checkpoints and recovery."""
+
+    def test_job_runs_to_completion_and_persists(self, tmp_path):
+        gate = threading.Event()
+        gate.set()
+        manager = JobManager(tmp_path, {'gated': gated_kind([], gate)})
+
+        job = manager.start('gated')
+        job = manager.wait(job['id'], timeout=5)
+
+        assert job['status'] == 'completed'
+        assert job['result'] == {'items': 10}
+        assert job['progress'] == {'done': 10, 'total': 10, 'failed': 0}
+        with open(tmp_path / f"{job['id']}.json", encoding='utf-8') as f:
+            saved = json.load(f)
+        assert saved['status'] == 'completed'
+        assert saved['checkpoint']['results']['4'] == 40
+
+    def test_cancel_then_resume_skips_finished_items(self, tmp_path):
+        calls = []
+        gate = threading.Event()
+        manager = JobManager(tmp_path, {'gated': gated_kind(calls, gate)})
+
+        job = manager.start('gated')
+        wait_for(lambda: '3' in calls)
+        manager.cancel(job['id'])
+        gate.set()
+        job = manager.wait(job['id'], timeout=5)
+        assert job['status'] == 'cancelled'
+        assert calls == ['0', '1', '2', '3']
+
+        manager.resume(job['id'])
+        job = manager.wait(job['id'], timeout=5)
+        assert job['status'] == 'completed'
+        assert job['attempts'] == 2
+        assert calls == [str(i) for i in range(10)]
+
+    def test_running_job_is_interrupted_after_restart(self, tmp_path):
+        calls = []
+        gate = threading.Event()
+        kinds = {'gated': gated_kind(calls, gate)}
+        job_file = tmp_path / 'abc.json'
+        job_file.write_text(json.dumps({
+            'id': 'abc', 'kind': 'gated', 'params': {}, 'status': 'running',
+            'progress': {'done': 2, 'total': 10, 'failed': 0},
+            'checkpoint': {'done': ['0', '1'], 'failed': {}, 'results': {'0': 0, '1': 10}},
+            'result': None, 'error': None, 'created': 1.0, 'updated': 1.0, 'attempts': 1,
+        }))
+
+        manager = JobManager(tmp_path, kinds)
+        assert manager.get('abc')['status'] == 'interrupted'
+
+        gate.set()
+        manager.resume('abc')
+        job = manager.wait('abc', timeout=5)
+        assert job['status'] == 'completed'
+        assert calls == [str(i) for i in range(2, 10)]
+
+    def test_shutdown_leaves_job_resumable(self, tmp_path):
+        calls = []
+        gate = threading.Event()
+        manager = JobManager(tmp_path, {'gated': gated_kind(calls, gate)})
+        job = manager.start('gated')
+        wait_for(lambda: '3' in calls)
+
+        stopper = threading.Thread(target=manager.shutdown, kwargs={'timeout': 5})
+        stopper.start()
+        wait_for(lambda: manager._cancel_events[job['id']].is_set())
+        gate.set()
+        stopper.join()
+        assert manager.get(job['id'])['status'] == 'interrupted'
+        with open(tmp_path / f"{job['id']}.json", encoding='utf-8') as f:
+            assert '3' in json.load(f)['checkpoint']['done']
+
+    def test_bad_params_are_rejected_before_queueing(self, tmp_path):
+        gate = threading.Event()
+        gate.set()
+        manager = JobManager(tmp_path, {'gated': gated_kind([], gate)})
+        for params in ({'concurrency': 'abc'}, {'concurrency': -2}, {'rate': 'fast'}, {'rate': -1}):
+            with pytest.raises(ValueError):
+                manager.start('gated', params)
+        assert manager.list() == []
+
+        # Nothing was left queued to block the next job of the kind
+        job = manager.wait(manager.start('gated', {'concurrency': '2'})['id'], timeout=5)
+        assert job['status'] == 'completed'
+
+    def test_state_is_copied_under_the_job_lock(self, tmp_path):
+        """Reading a job waits for a worker that is changing it."""
+        holding, release = threading.Event(), threading.Event()
+
+        def run(ctx):
+            with ctx.lock:
+                ctx.checkpoint['results'] = {'a': 1}
+                holding.set()
+                release.wait(5)
+                ctx.checkpoint['results']['b'] = 2
+
+        manager = JobManager(tmp_path, {'locked': JobKind(run)})
+        job = manager.start('locked')
+        assert holding.wait(5)
+        copied = []
+        reader = threading.Thread(target=lambda: copied.append(manager.checkpoint(job['id'])))
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive()
+        release.set()
+        reader.join(5)
+        assert copied == [{'results': {'a': 1, 'b': 2}}]
+        assert manager.wait(job['id'], timeout=5)['status'] == 'completed'
+
+    def test_rate_is_capped_by_the_upstream_limiter(self, tmp_path):
+        def run(ctx):
+            started = time.monotonic()
+            for _ in range(5):
+                ctx.throttle()
+            return {'caps': limiter.caps(), 'elapsed': time.monotonic() - started}
+
+        limiter = UpstreamLimiter()
+        manager = JobManager(tmp_path, {'paced': JobKind(run)}, limiter=limiter)
+        job = manager.wait(manager.start('paced', {'rate': 20})['id'], timeout=5)
+        # First call is immediate, the next four are 50ms apart
+        assert job['result']['caps'] == {job['id']: 20.0}
+        assert job['result']['elapsed'] >= 0.19
+        assert limiter.caps() == {}
+
+
+class TestJobRoutes:
+    """Tests for the /api/jobs endpoints."""
+
+    def test_unknown_kind_is_rejected(self, client):
+        response = client.post('/api/jobs', json={'kind': 'nope'})
+        assert response.status_code == 400
+        assert json.loads(response.data)['success'] is False
+
+    def test_bad_params_are_rejected(self, client):
+        response = client.post('/api/jobs', json={'kind': 'avatars', 'params': {'concurrency': 'abc'}})
+        assert response.status_code == 400
+        assert 'concurrency' in json.loads(response.data)['error']
+
+    def test_start_and_poll_avatar_job(self, client):
+        response = client.post('/api/jobs', json={'kind': 'avatars'})
+        assert response.status_code == 202
+        job_id = json.loads(response.data)['job']['id']
+
+        flask_app.get_job_manager().wait(job_id, timeout=5)
+        data = json.loads(client.get(f'/api/jobs/{job_id}').data)
+        assert data['job']['status'] == 'completed'
+        assert data['job']['result'] == {'avatars': 0, 'failed': 0}
+
+        listed = json.loads(client.get('/api/jobs').data)
+        assert [job['id'] for job in listed['jobs']] == [job_id]
+        assert 'monster-details' in listed['kinds']
+
+    def test_missing_job_returns_404(self, client):
+        assert client.get('/api/jobs/missing').status_code == 404
+        assert client.post('/api/jobs/missing/cancel').status_code == 404
+        assert client.post('/api/jobs/missing/resume').status_code == 404
+
+    def test_cancel_resume_and_conflicts(self, client, monkeypatch):
+        calls = []
+        gate = threading.Event()
+        monkeypatch.setitem(flask_app.JOB_KINDS, 'gated', gated_kind(calls, gate))
+
+        job_id = json.loads(client.post('/api/jobs', json={'kind': 'gated'}).data)['job']['id']
+        wait_for(lambda: '3' in calls)
+        # Only one job of a kind at a time, and running jobs can't be resumed
+        assert client.post('/api/jobs', json={'kind': 'gated'}).status_code == 409
+        assert client.post(f'/api/jobs/{job_id}/resume').status_code == 409
+
+        assert client.post(f'/api/jobs/{job_id}/cancel').status_code == 200
+        gate.set()
+        flask_app.get_job_manager().wait(job_id, timeout=5)
+        assert json.loads(client.get(f'/api/jobs/{job_id}').data)['job']['status'] == 'cancelled'
+
+        assert client.post(f'/api/jobs/{job_id}/resume').status_code == 202
+        flask_app.get_job_manager().wait(job_id, timeout=5)
+        data = json.loads(client.get(f'/api/jobs/{job_id}?checkpoint=true').data)
+        assert data['job']['status'] == 'completed'
+        assert data['checkpoint']['results']['9'] == 90
+        assert len(calls) == 10
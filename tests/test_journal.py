@@ -0,0 +1,259 @@
+"""
+Tests for the adventure journal (journal.py) and the history/undo endpoints.
+"""
+import copy
+import json
+import time
+
+import pytest
+
+import app as flask_app
+from journal import AdventureJournal, UndoError, apply_changes, diff, invert
+
+
+def adventure(hp=30, turn=0, combatants=None):
+    return {
+        'name': 'Journal Test',
+        'players': [{'name': 'Aria', 'dndBeyondUrl': '100'}],
+        'encounters': [{
+            'name': 'Ambush',
+            'state': 'started',
+            'currentTurn': turn,
+            'combatants': combatants if combatants is not None else [
+                {'name': 'Aria', 'dndBeyondUrl': '100', 'hp': hp, 'maxHp': 30},
+                {'name': 'Goblin 1', 'dndBeyondUrl': '17100-goblin'},
+                {'name': 'Goblin 2', 'dndBeyondUrl': '17100-goblin'},
+            ],
+        }],
+    }
+
+
+class TestDiff:
+    """Changes between two states, applied and inverted."""
+
+    def round_trip(self, old, new):
+        changes = diff(old, new)
+        assert apply_changes(copy.deepcopy(old), changes) == new
+        assert apply_changes(copy.deepcopy(new), invert(changes), strict=True) == old
+        return changes
+
+    def test_hp_change(self):
+        changes = self.round_trip(adventure(hp=30), adventure(hp=22))
+        assert changes == [{'op': 'set', 'path': ['encounters', 0, 'combatants', 0, 'hp'], 'value': 22, 'old': 30}]
+
+    def test_added_and_removed_keys(self):
+        old = {'a': 1, 'b': {'c': 2}}
+        new = {'a': 1, 'b': {'d': 3}}
+        assert len(self.round_trip(old, new)) == 2
+
+    def test_combatant_splices(self):
+        base = adventure()
+        combatants = base['encounters'][0]['combatants']
+        added = adventure(combatants=combatants[:2] + [{'name': 'Ogre'}] + combatants[2:])
+        removed = adventure(combatants=combatants[:1] + combatants[2:])
+        assert self.round_trip(base, added) == [{'op': 'splice', 'path': ['encounters', 0, 'combatants'],
+                                                 'at': 2, 'remove': [], 'insert': [{'name': 'Ogre'}]}]
+        changes = self.round_trip(base, removed)
+        assert [(c['op'], c['at'], len(c['remove'])) for c in changes] == [('splice', 1, 1)]
+
+    def test_no_changes(self):
+        assert diff(adventure(), adventure()) == []
+
+    def test_strict_apply_detects_mismatch(self):
+        changes = diff(adventure(hp=30), adventure(hp=22))
+        with pytest.raises(ValueError):
+            apply_changes(adventure(hp=10), changes, strict=True)
+
+
+class TestAdventureJournal:
+    """Snapshots, journal entries, compaction and recovery."""
+
+    @pytest.fixture
+    def journal(self, tmp_path):
+        return AdventureJournal(tmp_path)
+
+    def test_first_save_writes_snapshot(self, journal):
+        written = journal.save('A', adventure()).written
+        assert written == journal.snapshot_path('A').stat().st_size
+        assert journal.load('A') == adventure()
+
+    def test_saves_append_small_entries(self, journal):
+        journal.save('A', adventure())
+        snapshot = journal.snapshot_path('A').read_text()
+        written = journal.save('A', adventure(hp=25)).written
+        assert 0 < written < 200
+        assert journal.save('A', adventure(hp=25)).written == 0
+        journal.save('A', adventure(hp=25, turn=1))
+
+        assert journal.snapshot_path('A').read_text() == snapshot
+        assert journal.load('A') == adventure(hp=25, turn=1)
+        assert [entry['seq'] for entry in journal.entries('A')] == [1, 2]
+
+    def test_compact(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=12))
+        assert journal.compact_all() == 1
+        assert json.loads(journal.snapshot_path('A').read_text()) == adventure(hp=12)
+        assert journal.compact('A') is False
+
+        # Sequence numbers and history carry on across compactions
+        journal.save('A', adventure(hp=5))
+        assert [entry['seq'] for entry in journal.entries('A')] == [1, 2]
+        assert AdventureJournal(journal.directory).load('A') == adventure(hp=5)
+
+    def test_compact_keeps_modified_time(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=12))
+        modified = journal.modified('A')
+        time.sleep(0.01)
+        journal.compact('A')
+        assert journal.modified('A') == modified
+
+    def test_latest(self, journal):
+        assert journal.latest() is None
+        journal.save('A', adventure())
+        journal.save('B', adventure())
+        assert journal.latest() == 'B'
+        time.sleep(0.01)
+        journal.save('A', adventure(hp=12))
+        assert journal.latest() == 'A'
+
+        # A file copied in from outside, and files that aren't adventures
+        time.sleep(0.01)
+        (journal.directory / 'notes.txt').write_text('x')
+        (journal.directory / 'C.json').write_text(json.dumps(adventure()))
+        assert journal.latest() == 'C'
+
+    def test_peek_keeps_what_it_read(self, journal, monkeypatch):
+        journal.directory.mkdir(exist_ok=True)
+        journal.snapshot_path('A').write_text(json.dumps(adventure()))
+        loads = []
+        real_load = journal._load
+        monkeypatch.setattr(journal, '_load', lambda name: loads.append(name) or real_load(name))
+        assert journal.peek('A') is journal.peek('A')
+        assert loads == ['A']
+
+        # Saving after a read still starts the journal for the snapshot
+        journal.save('A', adventure(hp=12))
+        assert AdventureJournal(journal.directory).load('A') == adventure(hp=12)
+
+    def test_crash_after_snapshot_write(self, journal):
+        """A journal left behind by an interrupted compaction is not replayed again."""
+        journal.save('A', adventure())
+        journal.save('A', adventure(combatants=[]))
+        stale = journal.journal_path('A').read_text()
+        journal.compact('A')
+        journal.journal_path('A').write_text(stale)
+
+        reopened = AdventureJournal(journal.directory)
+        assert reopened.load('A') == adventure(combatants=[])
+        reopened.save('A', adventure(combatants=[{'name': 'Ogre'}]))
+        assert reopened.load('A') == adventure(combatants=[{'name': 'Ogre'}])
+        assert [entry['seq'] for entry in reopened.entries('A')] == [1, 2]
+
+    def test_torn_last_line(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=20))
+        with open(journal.journal_path('A'), 'a') as f:
+            f.write('{"seq": 2, "changes": [')
+        assert journal.load('A') == adventure(hp=20)
+
+    def test_undo_and_state_at(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=20))
+        journal.save('A', adventure(hp=20, turn=1))
+        journal.compact('A')
+        journal.save('A', adventure(hp=8, turn=1))
+
+        assert journal.undo('A') == (adventure(hp=20, turn=1), 3, 4)
+        assert journal.undo('A') == (adventure(hp=20), 2, 5)
+        assert journal.load('A') == adventure(hp=20)
+        assert journal.state_at('A', 0) == adventure()
+        assert journal.state_at('A', 3) == adventure(hp=8, turn=1)
+        journal.undo('A')
+        with pytest.raises(UndoError):
+            journal.undo('A')
+
+    def test_undo_after_hand_edit(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=20))
+        journal.compact('A')
+        journal.snapshot_path('A').write_text(json.dumps(adventure(hp=3)))
+        with pytest.raises(UndoError):
+            journal.undo('A')
+
+    def test_background_compaction(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=1))
+        journal.start(0.01)
+        try:
+            deadline = time.monotonic() + 5
+            while json.loads(journal.snapshot_path('A').read_text()) != adventure(hp=1):
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        finally:
+            journal.stop()
+
+    def test_delete(self, journal):
+        journal.save('A', adventure())
+        journal.save('A', adventure(hp=1))
+        journal.compact('A')
+        journal.delete('A')
+        assert list(journal.directory.iterdir()) == []
+
+
+class TestJournalEndpoints:
+    """Saves go to the journal; history and undo are served over the API."""
+
+    def save(self, client, **kwargs):
+        response = client.post('/api/adventure/Journal Test', json=adventure(**kwargs))
+        assert response.get_json()['success'] is True
+
+    def test_save_load_and_spectate(self, client):
+        self.save(client)
+        self.save(client, hp=9)
+        assert flask_app.get_adventure_journal().journal_path('Journal Test').exists()
+        assert client.get('/api/adventure/Journal Test').get_json()['encounters'][0]['combatants'][0]['hp'] == 9
+        spectator = client.get('/api/current-encounter').get_json()
+        assert spectator['active'] is True
+
+    def test_spectator_polls_dont_replay_the_journal(self, client, monkeypatch):
+        self.save(client)
+        self.save(client, hp=9)
+        journal = flask_app.get_adventure_journal()
+        monkeypatch.setattr(journal, '_load', lambda name: pytest.fail('replayed ' + name))
+        for _ in range(3):
+            spectator = client.get('/api/current-encounter').get_json()
+            assert spectator['combatants'][0]['hp'] == 9
+
+    def test_history_and_undo(self, client):
+        self.save(client)
+        self.save(client, hp=9)
+        self.save(client, hp=9, turn=1)
+
+        history = client.get('/api/adventure/Journal Test/history').get_json()
+        assert history['total'] == 2
+        assert [entry['seq'] for entry in history['entries']] == [2, 1]
+        before = client.get('/api/adventure/Journal Test/history?at=0').get_json()
+        assert before['adventure']['encounters'][0]['combatants'][0]['hp'] == 30
+
+        undone = client.post('/api/adventure/Journal Test/undo').get_json()
+        assert undone['undone'] == 2
+        assert undone['adventure']['encounters'][0]['currentTurn'] == 0
+        assert client.get('/api/adventure/Journal Test').get_json()['encounters'][0]['currentTurn'] == 0
+
+    def test_pin_required(self, client):
+        flask_app.get_adventure_journal().save('Locked', {'name': 'Locked', 'pin': '1234'})
+        assert client.get('/api/adventure/Locked/history').status_code == 403
+        assert client.post('/api/adventure/Locked/undo').status_code == 403
+
+    def test_nothing_to_undo(self, client):
+        self.save(client)
+        assert client.post('/api/adventure/Journal Test/undo').status_code == 409
+        assert client.post('/api/adventure/Missing/undo').status_code == 404
+
+    def test_delete_removes_journal(self, client):
+        self.save(client)
+        self.save(client, hp=1)
+        client.delete('/api/adventure/Journal Test')
+        assert list(flask_app.DATA_DIR.iterdir()) == []
@@ -0,0 +1,74 @@
+"""
+Tests for leveled logging (logs.py).
+"""
+import io
+import json
+import logging
+
+import pytest
+
+import app as flask_app
+import logs
+
+
+@pytest.fixture
+def stream():
+    """Capture dndenc.* records; restores the unconfigured state afterwards."""
+    output = io.StringIO()
+    logs.configure('INFO', stream=output)
+    yield output
+    root = logging.getLogger(logs.ROOT)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.NOTSET)
+    root.propagate = True
+
+
+class Exploding:
+    def __str__(self):
+        raise AssertionError('formatted a filtered-out message')
+
+
+class TestLogging:
+    """Per-subsystem loggers with levels, lazy formatting and JSON output."""
+
+    def test_levels_filter_and_format_lazily(self, stream):
+        log = logs.get_logger('monsters')
+        log.debug('Found AC: %s', Exploding())
+        log.info('Scraped %d monsters total', 3)
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 1
+        assert lines[0].endswith('INFO    dndenc.monsters: Scraped 3 monsters total')
+
+    def test_json_format(self, stream):
+        logs.configure('DEBUG', json_format=True, stream=stream)
+        log = logs.get_logger('jobs')
+        log.debug('Job %s started', 'abc', extra={'job_id': 'abc'})
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            log.exception('Job %s failed', 'abc')
+
+        started, failed = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert (started['level'], started['logger'], started['message']) == ('DEBUG', 'dndenc.jobs', 'Job abc started')
+        assert started['job_id'] == 'abc'
+        assert failed['level'] == 'ERROR'
+        assert 'ValueError: boom' in failed['exc']
+
+    def test_reconfigure_replaces_handler(self, stream):
+        logs.configure('WARNING', stream=stream)
+        logs.configure('WARNING', stream=stream)
+        logs.get_logger('cookies').warning('Rejected cookie input')
+        assert stream.getvalue().count('Rejected cookie input') == 1
+
+    def test_scraping_is_silent_by_default(self, app, capsys, stream):
+        html = '<html><head><title>Goblin</title></head><body><div class="mon-stat-block"></div></body></html>'
+        flask_app.parse_monster_page(html, 'https://www.dndbeyond.com/monsters/16907-goblin',
+                                     flask_app.MONSTER_DETAILS_DIR / '16907-goblin.json')
+
+        assert capsys.readouterr().out == ''
+        # Only the "nothing extracted" warning gets through at INFO
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 1
+        assert 'WARNING dndenc.monsters: No core stats extracted' in lines[0]
@@ -0,0 +1,160 @@
+"""
+Tests for the metrics subsystem (metrics.py and /metrics).
+"""
+import json
+import time
+
+import pytest
+
+import app as flask_app
+import metrics
+from metrics import Counter, Histogram, Registry
+from tests.test_character_sync import FakeResponse, FakeService, character_payload
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.REGISTRY.clear()
+    yield
+    metrics.REGISTRY.clear()
+
+
+def cache_count(cache, result):
+    return metrics.CACHE_REQUESTS.value(cache=cache, result=result)
+
+
+class TestRegistry:
+    """Counters and histograms render in the Prometheus text format."""
+
+    def test_render(self):
+        registry = Registry()
+        hits = registry.register(Counter('hits_total', 'Hits.', ('cache',)))
+        latency = registry.register(Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1)))
+        hits.inc(cache='monster')
+        hits.inc(2, cache='say "hi"')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(3)
+
+        assert registry.render().splitlines() == [
+            '# HELP hits_total Hits.',
+            '# TYPE hits_total counter',
+            'hits_total{cache="monster"} 1',
+            'hits_total{cache="say \\"hi\\""} 2',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 3.55',
+            'latency_seconds_count 3',
+        ]
+
+    def test_labels_must_match(self):
+        counter = Counter('c_total', 'C.', ('cache', 'result'))
+        with pytest.raises(ValueError):
+            counter.inc(cache='monster')
+        registry = Registry()
+        registry.register(counter)
+        with pytest.raises(ValueError):
+            registry.register(Counter('c_total', 'Again.'))
+
+
+class TestInstrumentation:
+    """The hot paths feed the shared registry."""
+
+    def test_route_latency_uses_rule(self, client):
+        client.get('/api/adventure/One')
+        client.get('/api/adventure/Two')
+        client.get('/no/such/page')
+
+        assert metrics.REQUEST_DURATION.count(method='GET', route='/api/adventure/<name>', status=404) == 2
+        assert metrics.REQUEST_DURATION.count(method='GET', route='unmatched', status=404) == 1
+
+    def test_unhandled_error_counts_as_500(self, client, monkeypatch):
+        def fail():
+            raise RuntimeError('analytics store is gone')
+        monkeypatch.setattr(flask_app, 'get_analytics_store', fail)
+        with pytest.raises(RuntimeError):
+            client.get('/api/analytics/adventures')
+
+        assert metrics.REQUEST_DURATION.count(method='GET', route='/api/analytics/adventures', status=500) == 1
+
+    def test_latency_includes_compression(self, client, monkeypatch):
+        import http_cache
+        real_compress = http_cache.compress
+
+        def slow_compress(data, encoding):
+            time.sleep(0.05)
+            return real_compress(data, encoding)
+        monkeypatch.setattr(http_cache, 'compress', slow_compress)
+        monkeypatch.setitem(flask_app.app.config, 'COMPRESS_MIN_SIZE', 0)
+        response = client.get('/api/adventures', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers.get('Content-Encoding') == 'gzip'
+
+        assert metrics.REQUEST_DURATION.total(method='GET', route='/api/adventures', status=200) >= 0.05
+
+    def test_monster_and_avatar_cache(self, app):
+        avatar = 'https://example.com/goblin.png'
+        flask_app.avatar_cache_path(avatar).write_bytes(b'png')
+        (flask_app.MONSTER_DETAILS_DIR / '16907-goblin.json').write_text(json.dumps(
+            {'timestamp': time.time(), 'data': {'name': 'Goblin', 'avatarUrl': avatar}}))
+
+        details = flask_app.fetch_monster_details('https://www.dndbeyond.com/monsters/16907-goblin')
+        assert details['cached'] is True
+        assert cache_count('monster', 'hit') == 1
+        assert cache_count('avatar', 'hit') == 1
+
+    def test_character_cache(self, client, monkeypatch):
+        service = FakeService({'555': FakeResponse(payload=character_payload(avatar=None)),
+                               '666': FakeResponse(status_code=500)})
+        monkeypatch.setattr(flask_app, 'fetch_character', service)
+
+        client.get('/api/dndbeyond/character/555')
+        client.get('/api/dndbeyond/character/555')
+        client.post('/api/dndbeyond/characters', json={'ids': ['555', '666']})
+        assert cache_count('character', 'miss') == 1
+        assert cache_count('character', 'hit') == 2
+        assert cache_count('character', 'error') == 1
+
+    def test_adventure_statistics_cache(self, client):
+        client.post('/api/adventure/One', json={'name': 'One', 'players': [], 'encounters': []})
+        client.get('/api/adventure/One/statistics')
+        client.get('/api/adventure/One/statistics')
+        assert (cache_count('adventure', 'miss'), cache_count('adventure', 'hit')) == (1, 1)
+
+    def test_save_bytes(self, client):
+        client.post('/api/adventure/One', json={'name': 'One', 'players': [], 'encounters': []})
+        size = (flask_app.DATA_DIR / 'One.json').stat().st_size
+        assert metrics.SAVE_BYTES.count() == 1
+        assert f'dndenc_adventure_save_bytes_sum {size}' in metrics.REGISTRY.render()
+
+    def test_upstream_requests(self, app):
+        def get(url, **kwargs):
+            if 'down' in url:
+                import requests
+                raise requests.ConnectionError('refused')
+            return FakeResponse(404)
+
+        flask_app.upstream_get(get, 'https://www.dndbeyond.com/monsters/nope')
+        with pytest.raises(Exception):
+            flask_app.upstream_get(get, 'https://down.example.com/')
+
+        assert metrics.UPSTREAM_REQUESTS.value(host='www.dndbeyond.com', status=404) == 1
+        assert metrics.UPSTREAM_REQUESTS.value(host='down.example.com', status='error') == 1
+        assert metrics.UPSTREAM_DURATION.count(host='www.dndbeyond.com') == 1
+
+
+class TestMetricsEndpoint:
+    """GET /metrics serves the registry."""
+
+    def test_scrape(self, client):
+        client.get('/api/adventures')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type == metrics.CONTENT_TYPE
+        assert response.headers['Cache-Control'] == 'no-store'
+        body = response.get_data(as_text=True)
+        assert '# TYPE dndenc_http_request_duration_seconds histogram' in body
+        assert ('dndenc_http_request_duration_seconds_count'
+                '{method="GET",route="/api/adventures",status="200"} 1') in body
@@ -0,0 +1,193 @@
+"""
+Tests for the monster search index (monster_search.py) and /api/monsters/search.
+"""
+import json
+
+import pytest
+
+import app as flask_app
+from monster_search import MonsterIndex, edit_distance, normalize, strip_instance_number
+
+MONSTERS = {
+    'Goblin': {'cr': '1/4', 'type': 'Humanoid', 'size': 'Small', 'alignment': 'Neutral Evil',
+               'url': 'https://www.dndbeyond.com/monsters/16907-goblin', 'isLegacy': True},
+    'Goblin Boss': {'cr': '1', 'type': 'Humanoid', 'size': 'Small', 'alignment': 'Neutral Evil',
+                    'url': 'https://www.dndbeyond.com/monsters/16908-goblin-boss', 'isLegacy': True},
+    'Hobgoblin': {'cr': '1/2', 'type': 'Humanoid', 'size': 'Medium', 'alignment': 'Lawful Evil',
+                  'url': 'https://www.dndbeyond.com/monsters/16932-hobgoblin', 'isLegacy': False},
+    'Yuan-ti Pureblood': {'cr': '1', 'type': 'Humanoid', 'size': 'Medium', 'alignment': 'Neutral Evil',
+                          'url': 'https://www.dndbeyond.com/monsters/17111-yuan-ti-pureblood', 'isLegacy': False},
+    'Beholder': {'cr': '13', 'type': 'Aberration', 'size': 'Large', 'alignment': 'Lawful Evil',
+                 'url': 'https://www.dndbeyond.com/monsters/16797-beholder', 'isLegacy': False},
+    'Commoner': {'cr': '0', 'type': 'Humanoid', 'size': 'Medium or Small', 'alignment': 'Neutral',
+                 'url': 'https://www.dndbeyond.com/monsters/16835-commoner', 'isLegacy': False},
+}
+
+
+@pytest.fixture
+def index():
+    return MonsterIndex(MONSTERS)
+
+
+@pytest.fixture
+def monster_cache():
+    with open(flask_app.MONSTERS_CACHE, 'w', encoding='utf-8') as f:
+        json.dump(MONSTERS, f)
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+class TestMonsterIndex:
+    """Ranking, typo tolerance and filters."""
+
+    def test_normalize_and_instance_numbers(self):
+        assert normalize("Yuan-ti  Pureblood") == 'yuan ti pureblood'
+        assert normalize('B’rohg') == 'brohg'
+        assert strip_instance_number('Goblin Boss 2') == 'Goblin Boss'
+        assert strip_instance_number('Goblin (3)') == 'Goblin'
+        assert edit_distance('beholdr', 'beholder', 2) == 1
+        assert edit_distance('goblin', 'beholder', 2) == 3
+
+    def test_exact_then_prefix_then_word_then_substring(self, index):
+        results, total = index.search('goblin')
+        assert names(results) == ['Goblin', 'Goblin Boss', 'Hobgoblin']
+        assert [r['match'] for r in results] == ['exact', 'prefix', 'substring']
+        assert total == 3
+
+        results, _ = index.search('boss')
+        assert results[0]['name'] == 'Goblin Boss'
+        assert results[0]['match'] == 'word'
+
+    def test_instance_number_resolves_to_monster(self, index):
+        results, _ = index.search('Goblin Boss 2')
+        assert results[0]['name'] == 'Goblin Boss'
+        assert results[0]['match'] == 'exact'
+        assert index.lookup('Goblin Boss 2')['name'] == 'Goblin Boss'
+
+    def test_typos_are_matched_by_edit_distance(self, index):
+        results, _ = index.search('Beholdr')
+        assert results[0]['name'] == 'Beholder'
+        assert results[0]['match'] == 'fuzzy'
+        assert results[0]['distance'] == 1
+        assert names(index.search('yuanti pure')[0]) == ['Yuan-ti Pureblood']
+        assert index.lookup('Gobin')['name'] == 'Goblin'
+        assert index.lookup('Dragon') is None
+
+    def test_filters(self, index):
+        assert names(index.search('goblin', type=['humanoid'], legacy=False)[0]) == ['Hobgoblin']
+        assert names(index.search('', cr=['1/4', '13'])[0]) == ['Goblin', 'Beholder']
+        assert names(index.search('', size=['small'], max_cr=0.5)[0]) == ['Commoner', 'Goblin']
+        assert index.search('', min_cr=1, limit=2) == (index.search('', min_cr=1)[0][:2], 3)
+
+
+class TestMonsterSearchRoutes:
+    """Tests for /api/monsters/search and the by-name lookup."""
+
+    def test_search_without_monster_list(self, client):
+        data = json.loads(client.get('/api/monsters/search?q=goblin').data)
+        assert data['success'] is False
+        assert 'not loaded' in data['error']
+
+    def test_search_with_filters_and_limit(self, client, monster_cache):
+        response = client.get('/api/monsters/search?q=gob&type=Humanoid&limit=1')
+        data = json.loads(response.data)
+        assert data['success'] is True
+        assert data['count'] == 1
+        assert data['total'] == 3
+        assert data['librarySize'] == len(MONSTERS)
+        assert data['results'][0]['name'] == 'Goblin'
+        assert data['results'][0]['url'] == MONSTERS['Goblin']['url']
+
+        data = json.loads(client.get('/api/monsters/search?min_cr=1/2&legacy=false').data)
+        assert [r['name'] for r in data['results']] == ['Hobgoblin', 'Yuan-ti Pureblood', 'Beholder']
+
+    def test_invalid_arguments_return_400(self, client, monster_cache):
+        assert client.get('/api/monsters/search?q=a&limit=many').status_code == 400
+        assert client.get('/api/monsters/search?q=a&min_cr=high').status_code == 400
+
+    def test_index_is_rebuilt_when_cache_changes(self, client, monster_cache):
+        assert json.loads(client.get('/api/monsters/search?q=owlbear').data)['total'] == 0
+        updated = dict(MONSTERS, Owlbear={'cr': '3', 'type': 'Monstrosity', 'size': 'Large',
+                                          'alignment': 'Unaligned', 'isLegacy': False,
+                                          'url': 'https://www.dndbeyond.com/monsters/16971-owlbear'})
+        with open(flask_app.MONSTERS_CACHE, 'w', encoding='utf-8') as f:
+            json.dump(updated, f, indent=2)
+        assert json.loads(client.get('/api/monsters/search?q=owlbear').data)['total'] == 1
+
+    def test_lookup_by_name_ignores_instance_number_and_typos(self, client, monster_cache):
+        data = json.loads(client.get('/api/dndbeyond/monster/search/Goblin%20Boss%203').data)
+        assert data['success'] is True
+        assert data['name'] == 'Goblin Boss'
+        assert data['match'] == 'exact'
+        assert data['id'] == '16908-goblin-boss'
+
+        data = json.loads(client.get('/api/dndbeyond/monster/search/Beholdr').data)
+        assert data['name'] == 'Beholder'
+        assert data['match'] == 'fuzzy'
+
+
+class TestMonsterLibraryListing:
+    """Pagination, filters, projection and caching for /api/dndbeyond/monsters."""
+
+    def test_default_listing_is_the_whole_library(self, client, monster_cache):
+        data = json.loads(client.get('/api/dndbeyond/monsters').data)
+        assert data['success'] is True
+        assert data['cached'] is True
+        assert data['monsters'] == MONSTERS
+        assert data['count'] == data['total'] == len(MONSTERS)
+        assert 'page' not in data
+
+    def test_pagination_sort_and_projection(self, client, monster_cache):
+        response = client.get('/api/dndbeyond/monsters?sort=cr&order=desc&page=2&per_page=4&fields=cr,url')
+        data = json.loads(response.data)
+        assert (data['page'], data['perPage'], data['pages'], data['total']) == (2, 4, 2, 6)
+        assert list(data['monsters']) == ['Goblin', 'Commoner']
+        assert data['monsters']['Goblin'] == {'cr': '1/4', 'url': MONSTERS['Goblin']['url']}
+
+        data = json.loads(client.get('/api/dndbeyond/monsters?sort=name&per_page=2').data)
+        assert list(data['monsters']) == ['Beholder', 'Commoner']
+
+    def test_filters(self, client, monster_cache):
+        data = json.loads(client.get('/api/dndbeyond/monsters?type=humanoid&min_cr=1/2&legacy=false').data)
+        assert list(data['monsters']) == ['Hobgoblin', 'Yuan-ti Pureblood']
+        data = json.loads(client.get('/api/dndbeyond/monsters?size=Small&max_cr=0').data)
+        assert list(data['monsters']) == ['Commoner']
+
+    def test_no_access_from_marketplace_redirects(self, client, monster_cache):
+        (flask_app.MONSTER_DETAILS_DIR / '16797-beholder.json').write_text(json.dumps(
+            {'url': MONSTERS['Beholder']['url'], 'data': {}, 'error': 'redirected', 'timestamp': 1}))
+
+        data = json.loads(client.get('/api/dndbeyond/monsters?no_access=true').data)
+        assert data['monsters'] == {'Beholder': dict(MONSTERS['Beholder'], noAccess=True)}
+        data = json.loads(client.get('/api/dndbeyond/monsters?no_access=false&fields=noAccess').data)
+        assert 'Beholder' not in data['monsters']
+        assert data['monsters']['Goblin'] == {'noAccess': False}
+
+    def test_etag_revalidation(self, client, monster_cache):
+        first = client.get('/api/dndbeyond/monsters?fields=cr')
+        etag = first.headers['ETag']
+        assert first.headers['Cache-Control'] == 'no-cache'
+
+        repeat = client.get('/api/dndbeyond/monsters?fields=cr', headers={'If-None-Match': etag})
+        assert repeat.status_code == 304
+        assert repeat.data == b''
+
+        # A page that turns out to be inaccessible changes the version
+        flask_app.record_monster_access(flask_app.MONSTER_DETAILS_DIR / '16907-goblin.json', False)
+        changed = client.get('/api/dndbeyond/monsters?fields=cr', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+
+    def test_gzip_when_accepted(self, client, monster_cache):
+        import gzip
+        response = client.get('/api/dndbeyond/monsters', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert json.loads(gzip.decompress(response.data))['monsters'] == MONSTERS
+
+    def test_invalid_arguments_return_400(self, client, monster_cache):
+        for query in ('sort=size', 'order=up', 'page=0', 'per_page=5000', 'page=x', 'fields=hp'):
+            response = client.get(f'/api/dndbeyond/monsters?{query}')
+            assert response.status_code == 400, query
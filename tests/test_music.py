@@ -5,7 +5,19 @@ These exercise just the file-listing and file-serving paths; playback
 behaviour lives entirely in the frontend music service and is tested in
 tests/services/test_musicService.js.
 """
+import http.client
 import json
+import os
+import socket
+import stat
+import struct
+import time
+import wave
+
+import app as flask_app
+import music_library
+from music_library import MusicLibrary, read_metadata
+from serving import ProductionServer
 
 
 class TestListMusic:
@@ -97,3 +109,288 @@ class TestServeMusic:
         # Flask's send_from_directory normalizes and rejects this; the
         # extension guard would also reject it. Either 404 or 400 is fine.
         assert response.status_code in (400, 404)
+
+
+# Minimal audio files: just the headers the library reads
+
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413  # MPEG-1 layer III, 128kbps, 44.1kHz
+
+
+def id3_frame(frame_id, payload):
+    return frame_id + struct.pack('>I', len(payload)) + b'\x00\x00' + payload
+
+
+def mp3_bytes(title=None, frames=100, xing_frames=None):
+    tag = id3_frame(b'APIC', b'\x00' * 5000)  # Cover art before the title is skipped
+    if title:
+        tag += id3_frame(b'TIT2', b'\x03' + title.encode('utf-8'))
+    size = len(tag)
+    synchsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    first = MP3_FRAME
+    if xing_frames:
+        first = MP3_FRAME[:36] + b'Xing' + struct.pack('>II', 1, xing_frames) + MP3_FRAME[48:]
+    return b'ID3\x03\x00\x00' + synchsafe + tag + first + MP3_FRAME * (frames - 1)
+
+
+def vorbis_comment(title):
+    comment = f'TITLE={title}'.encode('utf-8')
+    return struct.pack('<I', 4) + b'test' + struct.pack('<I', 1) + struct.pack('<I', len(comment)) + comment
+
+
+def flac_bytes(title, seconds, rate=44100):
+    packed = (rate << 44) | (1 << 41) | (15 << 36) | (seconds * rate)
+    streaminfo = b'\x00' * 10 + packed.to_bytes(8, 'big') + b'\x00' * 16
+    comment = vorbis_comment(title)
+    return (b'fLaC' + bytes([0]) + len(streaminfo).to_bytes(3, 'big') + streaminfo
+            + bytes([0x84]) + len(comment).to_bytes(3, 'big') + comment + b'\x00' * 1000)
+
+
+def ogg_page(packet, granule, sequence):
+    segments = [255] * (len(packet) // 255) + [len(packet) % 255]
+    return (b'OggS\x00\x00' + struct.pack('<qIII', granule, 1, sequence, 0)
+            + bytes([len(segments)]) + bytes(segments) + packet)
+
+
+def ogg_vorbis_bytes(title, seconds, rate=48000):
+    ident = b'\x01vorbis' + struct.pack('<IBIiii', 0, 2, rate, 0, 160000, 0) + b'\x00\x01'
+    return (ogg_page(ident, 0, 0) + ogg_page(b'\x03vorbis' + vorbis_comment(title) + b'\x01', 0, 1)
+            + ogg_page(b'\x00' * 300, seconds * rate, 2))
+
+
+def atom(kind, payload):
+    return struct.pack('>I', 8 + len(payload)) + kind + payload
+
+
+def m4a_bytes(title, milliseconds):
+    mvhd = atom(b'mvhd', b'\x00' * 4 + b'\x00' * 8 + struct.pack('>II', 1000, milliseconds) + b'\x00' * 80)
+    data = atom(b'data', struct.pack('>II', 1, 0) + title.encode('utf-8'))
+    meta = atom(b'meta', b'\x00' * 4 + atom(b'ilst', atom(b'\xa9nam', data)))
+    return atom(b'ftyp', b'M4A \x00\x00\x00\x00') + atom(b'mdat', b'\x00' * 2000) + atom(b'moov', mvhd + atom(b'udta', meta))
+
+
+def write_wav(path, seconds, rate=8000):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b'\x00\x00' * rate * seconds)
+
+
+class TestReadMetadata:
+    """Title, duration and bitrate come from the file headers."""
+
+    def test_mp3_cbr(self, tmp_path):
+        path = tmp_path / 'a.mp3'
+        path.write_bytes(mp3_bytes('Goblin Ambush'))
+        info = read_metadata(path)
+        assert info == {'title': 'Goblin Ambush', 'bitrate': 128, 'duration': round(100 * 417 * 8 / 128000, 2)}
+
+    def test_mp3_vbr_frame_count(self, tmp_path):
+        path = tmp_path / 'a.mp3'
+        path.write_bytes(mp3_bytes(xing_frames=1000))
+        info = read_metadata(path)
+        assert info['duration'] == round(1000 * 1152 / 44100, 2)
+        assert info['title'] is None
+
+    def test_wav(self, tmp_path):
+        write_wav(tmp_path / 'a.wav', 2)
+        assert read_metadata(tmp_path / 'a.wav') == {'title': None, 'duration': 2.0, 'bitrate': 128}
+
+    def test_flac(self, tmp_path):
+        (tmp_path / 'a.flac').write_bytes(flac_bytes('Dragon Lair', 90))
+        info = read_metadata(tmp_path / 'a.flac')
+        assert (info['title'], info['duration']) == ('Dragon Lair', 90.0)
+
+    def test_ogg_vorbis(self, tmp_path):
+        (tmp_path / 'a.ogg').write_bytes(ogg_vorbis_bytes('Tavern', 75))
+        info = read_metadata(tmp_path / 'a.ogg')
+        assert (info['title'], info['duration']) == ('Tavern', 75.0)
+
+    def test_m4a(self, tmp_path):
+        (tmp_path / 'a.m4a').write_bytes(m4a_bytes('Boss Fight', 90500))
+        info = read_metadata(tmp_path / 'a.m4a')
+        assert (info['title'], info['duration']) == ('Boss Fight', 90.5)
+
+    def test_damaged_files_dont_raise(self, tmp_path):
+        for name, data in [('a.mp3', b'ID3\x03\x00\x00\x7f\x7f'), ('b.flac', b'fLaC\x00\x00'),
+                           ('c.ogg', b'OggS'), ('d.m4a', b'\x00\x00\x00\x01moov'), ('e.wav', b'RIFF')]:
+            (tmp_path / name).write_bytes(data)
+            assert read_metadata(tmp_path / name)['duration'] is None
+
+
+class TestMusicLibrary:
+    """The index is built once and only re-reads changed files."""
+
+    def test_nested_folders_and_playlists(self, tmp_path):
+        (tmp_path / 'dungeon').mkdir()
+        (tmp_path / 'dungeon' / 'drips.ogg').write_bytes(ogg_vorbis_bytes('Drips', 60))
+        (tmp_path / 'battle.mp3').write_bytes(mp3_bytes('Battle'))
+        (tmp_path / 'dungeon' / 'crawl.m3u').write_text('#EXTM3U\ndrips.ogg\n../battle.mp3\nmissing.mp3\n')
+
+        version, tracks, playlists = MusicLibrary(tmp_path, flask_app.MUSIC_EXTENSIONS).snapshot()
+        assert [(t['path'], t['title']) for t in tracks] == [('battle.mp3', 'Battle'), ('dungeon/drips.ogg', 'Drips')]
+        assert playlists == [{'name': 'crawl', 'path': 'dungeon/crawl.m3u',
+                              'tracks': ['dungeon/drips.ogg', 'battle.mp3']}]
+
+    def test_index_is_reused_across_restarts(self, tmp_path, monkeypatch):
+        root, index = tmp_path / 'music', tmp_path / 'index.json'
+        root.mkdir()
+        (root / 'a.mp3').write_bytes(mp3_bytes('A'))
+        (root / 'b.mp3').write_bytes(mp3_bytes('B'))
+        first = MusicLibrary(root, {'.mp3'}, index).snapshot()
+
+        reads = []
+
+        def read_metadata(path, size=None):
+            reads.append(path)
+            return {'title': None, 'duration': None, 'bitrate': None}
+
+        monkeypatch.setattr(music_library, 'read_metadata', read_metadata)
+        library = MusicLibrary(root, {'.mp3'}, index, rescan_interval=0)
+        assert library.snapshot() == first
+        assert reads == []
+
+        (root / 'c.mp3').write_bytes(b'')
+        library.snapshot(force=True)
+        assert [p.rsplit('/', 1)[-1] for p in map(str, reads)] == ['c.mp3']
+
+    def test_changes_picked_up_by_directory_mtime(self, tmp_path):
+        library = MusicLibrary(tmp_path, {'.mp3'}, rescan_interval=0)
+        version, tracks, _ = library.snapshot()
+        assert tracks == []
+        (tmp_path / 'new.mp3').write_bytes(mp3_bytes())
+        new_version, tracks, _ = library.snapshot()
+        assert [t['title'] for t in tracks] == ['new']
+        assert new_version != version
+
+
+class TestMusicLibraryEndpoint:
+    """GET /api/music/library returns metadata and revalidates by version."""
+
+    def test_library_and_etag(self, client, app):
+        (flask_app.MUSIC_DIR / 'ambient').mkdir()
+        (flask_app.MUSIC_DIR / 'ambient' / 'forest.flac').write_bytes(flac_bytes('Forest', 120))
+
+        response = client.get('/api/music/library')
+        library = response.get_json()
+        assert library['tracks'][0]['path'] == 'ambient/forest.flac'
+        assert (library['tracks'][0]['title'], library['tracks'][0]['duration']) == ('Forest', 120.0)
+        assert response.headers['ETag'] == f'"{library["version"]}"'
+
+        again = client.get('/api/music/library', headers={'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304
+        assert client.get('/api/music').get_json() == ['ambient/forest.flac']
+
+    def test_refresh_rescans_immediately(self, client, app):
+        assert client.get('/api/music').get_json() == []
+        (flask_app.MUSIC_DIR / 'late.mp3').write_bytes(b'')
+        assert client.get('/api/music?refresh=1').get_json() == ['late.mp3']
+
+    def test_serves_nested_track(self, client, app):
+        (flask_app.MUSIC_DIR / 'town').mkdir()
+        (flask_app.MUSIC_DIR / 'town' / 'inn.mp3').write_bytes(b'abc')
+        assert client.get('/music/town/inn.mp3').data == b'abc'
+
+
+TRACK = bytes(range(256)) * 400  # 100KB
+
+
+class TestMusicStreaming:
+    """Range requests, validators and low-bitrate variants on /music/<file>."""
+
+    def test_range_request(self, client, app):
+        (flask_app.MUSIC_DIR / 'long.flac').write_bytes(TRACK)
+        response = client.get('/music/long.flac', headers={'Range': 'bytes=1000-1999'})
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == f'bytes 1000-1999/{len(TRACK)}'
+        assert response.data == TRACK[1000:2000]
+
+        assert client.get('/music/long.flac', headers={'Range': 'bytes=-10'}).data == TRACK[-10:]
+        unsatisfiable = client.get('/music/long.flac', headers={'Range': f'bytes={len(TRACK)}-'})
+        assert unsatisfiable.status_code == 416
+
+    def test_if_range_and_etag(self, client, app):
+        (flask_app.MUSIC_DIR / 'long.flac').write_bytes(TRACK)
+        full = client.get('/music/long.flac')
+        assert (full.status_code, full.headers['Accept-Ranges']) == (200, 'bytes')
+        etag = full.headers['ETag']
+
+        stale = client.get('/music/long.flac', headers={'Range': 'bytes=0-9', 'If-Range': '"old"'})
+        assert (stale.status_code, len(stale.data)) == (200, len(TRACK))
+        fresh = client.get('/music/long.flac', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+        assert fresh.status_code == 206
+        assert client.get('/music/long.flac', headers={'If-None-Match': etag}).status_code == 304
+
+    def test_low_quality_variant(self, client, app):
+        source = flask_app.MUSIC_DIR / 'lair.flac'
+        source.write_bytes(TRACK)
+        variant = flask_app.CACHE_DIR / 'music_variants' / 'lair.flac.mp3'
+        variant.parent.mkdir()
+        variant.write_bytes(b'small')
+
+        response = client.get('/music/lair.flac?quality=low&format=opus')
+        assert (response.mimetype, response.data) == ('audio/mpeg', b'small')
+
+        # A variant older than its track is ignored
+        later = time.time() + 10
+        os.utime(source, (later, later))
+        assert client.get('/music/lair.flac?quality=low').data == TRACK
+
+    def test_sendfile_under_real_server(self, app, monkeypatch):
+        (flask_app.MUSIC_DIR / 'long.flac').write_bytes(TRACK)
+        sent = []
+        original = socket.socket.sendfile
+
+        def sendfile(self, file, offset=0, count=None):
+            sent.append((offset, count))
+            return original(self, file, offset, count)
+
+        monkeypatch.setattr(socket.socket, 'sendfile', sendfile)
+        server = ProductionServer(app, workers=2)
+        listener = server.add_listener('HTTP', '127.0.0.1', 0)
+        server.start()
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', listener.port, timeout=5)
+            connection.request('GET', '/music/long.flac', headers={'Range': 'bytes=500-', 'Host': 'localhost:5000'})
+            response = connection.getresponse()
+            assert response.status == 206
+            assert response.read() == TRACK[500:]
+            connection.close()
+        finally:
+            server.shutdown(timeout=2)
+        assert sent == [(500, len(TRACK) - 500)]
+
+
+class TestMusicVariantsJob:
+    """The music-variants job encodes tracks above the target bitrate."""
+
+    def fake_encoder(self, tmp_path):
+        script = tmp_path / 'ffmpeg'
+        script.write_text('#!/bin/sh\nfor last; do :; done\nprintf encoded > "$last"\n')
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        return str(script)
+
+    def test_encodes_variants(self, client, app, tmp_path, monkeypatch):
+        monkeypatch.setattr(flask_app, 'find_encoder', lambda: self.fake_encoder(tmp_path))
+        (flask_app.MUSIC_DIR / 'town').mkdir()
+        # About 200kbps, so it gets a variant; the 128kbps MP3 doesn't
+        (flask_app.MUSIC_DIR / 'town' / 'inn.flac').write_bytes(flac_bytes('Inn', 60) + b'\x00' * 1500000)
+        (flask_app.MUSIC_DIR / 'small.mp3').write_bytes(mp3_bytes(frames=10))
+
+        job_id = client.post('/api/jobs', json={'kind': 'music-variants',
+                                                'params': {'formats': ['opus'], 'bitrate': 128}}).get_json()['job']['id']
+        flask_app.get_job_manager().wait(job_id, timeout=5)
+        job = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        assert job['status'] == 'completed'
+        assert job['result'] == {'variants': 1, 'failed': 0}
+        variant = flask_app.CACHE_DIR / 'music_variants' / 'town' / 'inn.flac.opus'
+        assert variant.read_bytes() == b'encoded'
+        assert client.get('/music/town/inn.flac?quality=low').data == b'encoded'
+
+    def test_fails_without_encoder(self, client, app, monkeypatch):
+        monkeypatch.setattr(flask_app, 'find_encoder', lambda: None)
+        job_id = client.post('/api/jobs', json={'kind': 'music-variants'}).get_json()['job']['id']
+        flask_app.get_job_manager().wait(job_id, timeout=5)
+        job = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        assert job['status'] == 'failed'
+        assert 'ffmpeg' in job['error']
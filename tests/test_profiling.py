@@ -0,0 +1,114 @@
+"""
+Tests for the opt-in profiler (profiling.py and /api/profiles).
+"""
+import pstats
+import threading
+
+import app as flask_app
+import profiling
+from jobs import JobKind, JobManager
+from profiling import Session
+
+
+def busy(n=2000):
+    return sum(i * i for i in range(n))
+
+
+class TestSession:
+    """Profiles from several threads are merged into one saved profile."""
+
+    def test_threads_are_merged(self, tmp_path):
+        session = Session('bulk fetch', kind='script')
+
+        def worker():
+            for _ in range(3):
+                with session.thread():
+                    busy()
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        name = session.save(tmp_path, monsters=6)
+
+        meta = profiling.list_profiles(tmp_path)[0]
+        assert (meta['name'], meta['kind'], meta['label']) == (name, 'script', 'bulk fetch')
+        # One profiler per thread, however many work items it ran
+        assert (meta['threads'], meta['monsters']) == (2, 6)
+        stats = pstats.Stats(str(tmp_path / f'{name}.prof'))
+        calls = [s[1] for func, s in stats.stats.items() if func[2] == 'busy']
+        assert calls == [6]
+        assert 'busy' in (tmp_path / f'{name}.txt').read_text()
+
+    def test_nothing_captured(self, tmp_path):
+        assert Session('idle').save(tmp_path) is None
+        assert profiling.list_profiles(tmp_path) == []
+
+    def test_prune_keeps_newest(self, tmp_path):
+        names = []
+        for i in range(4):
+            session = Session(f'run {i}')
+            session.started += i  # Distinct creation times
+            with session.thread():
+                busy(10)
+            names.append(session.save(tmp_path))
+        profiling.prune(tmp_path, keep=2)
+        assert [meta['name'] for meta in profiling.list_profiles(tmp_path)] == names[:1:-1]
+        assert len(list(tmp_path.iterdir())) == 6
+
+
+class TestRequestProfiling:
+    """X-Profile / ?profile=1 capture a request; /api/profiles lists them."""
+
+    def test_profile_header(self, client):
+        assert 'X-Profile' not in client.get('/api/adventures').headers
+        name = client.get('/api/adventures', headers={'X-Profile': '1'}).headers['X-Profile']
+
+        profiles = client.get('/api/profiles').get_json()['profiles']
+        assert [(p['name'], p['label'], p['status']) for p in profiles] == [(name, 'GET /api/adventures', 200)]
+        assert client.get(f'/api/profiles/{name}').get_data(as_text=True).startswith('GET /api/adventures')
+
+        raw = client.get(f'/api/profiles/{name}?format=prof')
+        assert raw.mimetype == 'application/octet-stream'
+
+    def test_query_flag_and_global_setting(self, app, client):
+        client.get('/api/adventures?profile=1')
+        app.config['PROFILE'] = True
+        try:
+            client.get('/api/adventures')
+            # The viewers are never profiled themselves
+            client.get('/api/profiles')
+        finally:
+            app.config['PROFILE'] = False
+        profiles = profiling.list_profiles(flask_app.CACHE_DIR / 'profiles')
+        assert [p['path'] for p in profiles] == ['/api/adventures', '/api/adventures?profile=1']
+
+    def test_bad_names(self, client):
+        assert client.get('/api/profiles/..%2Fsecret').status_code in (400, 404)
+        assert client.get('/api/profiles/nope').status_code == 404
+
+
+class TestJobProfiling:
+    """params.profile runs a job and its map workers under the profiler."""
+
+    def test_job_profile(self, tmp_path):
+        def run(ctx):
+            ctx.map(range(8), key=str, fn=lambda item: busy())
+        manager = JobManager(tmp_path / 'jobs', {'busy': JobKind(run, concurrency=2)},
+                             profiles_dir=tmp_path / 'profiles')
+
+        job = manager.start('busy', {'profile': True})
+        job = manager.wait(job['id'], timeout=5)
+
+        meta = profiling.list_profiles(tmp_path / 'profiles')[0]
+        assert job['profile'] == meta['name']
+        assert (meta['kind'], meta['job'], meta['status']) == ('job', job['id'], 'completed')
+        assert meta['threads'] == 3  # The job thread and two workers
+
+    def test_unprofiled_job(self, tmp_path):
+        manager = JobManager(tmp_path / 'jobs', {'busy': JobKind(lambda ctx: None)},
+                             profiles_dir=tmp_path / 'profiles')
+        job = manager.wait(manager.start('busy')['id'], timeout=5)
+        assert 'profile' not in job
+        assert not (tmp_path / 'profiles').exists()
@@ -0,0 +1,127 @@
+"""
+Tests for the adaptive upstream rate limiter (ratelimit.py) and upstream_get.
+"""
+import json
+
+import pytest
+
+import app as flask_app
+from ratelimit import UpstreamLimiter
+
+HOST = 'https://www.dndbeyond.com/monsters'
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestUpstreamLimiter:
+    """Token bucket pacing and rate adaptation."""
+
+    def test_burst_then_paced(self):
+        limiter = UpstreamLimiter(rate=10, burst=3)
+        delays = [limiter.reserve(HOST) for _ in range(5)]
+        assert delays[:3] == [0.0, 0.0, 0.0]
+        # Tokens run out: the 4th and 5th requests wait ~0.1s and ~0.2s
+        assert 0.08 < delays[3] < 0.11
+        assert 0.18 < delays[4] < 0.21
+
+    def test_hosts_have_separate_buckets(self):
+        limiter = UpstreamLimiter(rate=10, burst=1)
+        assert limiter.reserve(HOST) == 0.0
+        assert limiter.reserve('https://media.dndbeyond.com/avatar.png') == 0.0
+        assert limiter.reserve(HOST) > 0
+        assert set(limiter.stats()) == {'www.dndbeyond.com', 'media.dndbeyond.com'}
+
+    def test_throttle_halves_rate_and_honours_retry_after(self):
+        limiter = UpstreamLimiter(rate=8, burst=5)
+        limiter.record(HOST, 429, 0.1, retry_after='3')
+        stats = limiter.stats()['www.dndbeyond.com']
+        assert stats['rate'] == 4.0
+        assert stats['throttled'] == 1
+        assert 2.9 < stats['pausedFor'] <= 3.0
+        # Tokens are left, but the host is paused
+        assert limiter.reserve(HOST) > 2.9
+
+    def test_rate_cuts_are_spaced_by_cooldown(self):
+        limiter = UpstreamLimiter(rate=8, cooldown=60)
+        for _ in range(3):
+            limiter.record(HOST, 503, 0.1)
+        assert limiter.stats()['www.dndbeyond.com']['rate'] == 4.0
+
+    def test_slow_responses_and_errors_reduce_rate(self):
+        limiter = UpstreamLimiter(rate=10, slow_seconds=1, cooldown=0)
+        limiter.record(HOST, 200, 2.5)
+        limiter.record(HOST, None, 0.1)
+        stats = limiter.stats()['www.dndbeyond.com']
+        assert stats['rate'] == 6.4
+        assert (stats['slow'], stats['errors']) == (1, 1)
+
+    def test_success_recovers_rate_up_to_max(self):
+        limiter = UpstreamLimiter(rate=1, max_rate=1.5, increase=0.2)
+        for _ in range(10):
+            limiter.record(HOST, 200, 0.1)
+        assert limiter.stats()['www.dndbeyond.com']['rate'] == 1.5
+
+    def test_caps_pace_one_caller_without_touching_hosts(self):
+        limiter = UpstreamLimiter(rate=10, burst=1)
+        limiter.set_cap('job', 4)
+        assert limiter.reserve_cap('job') == 0.0
+        assert 0.23 < limiter.reserve_cap('job') < 0.26
+        assert limiter.reserve_cap('other') == 0.0
+        assert limiter.stats() == {}
+        assert limiter.caps() == {'job': 4}
+        limiter.set_cap('job', None)
+        assert limiter.reserve_cap('job') == 0.0
+
+    def test_configure_rejects_unknown_settings(self):
+        limiter = UpstreamLimiter()
+        with pytest.raises(ValueError, match='speed'):
+            limiter.configure(speed=3)
+        limiter.configure(rate=2)
+        assert limiter.settings['rate'] == 2
+
+
+class TestUpstreamGet:
+    """upstream_get feeds responses back to the shared limiter."""
+
+    def test_retries_after_throttling(self, monkeypatch):
+        limiter = UpstreamLimiter(rate=100, burst=10)
+        monkeypatch.setattr(flask_app, 'UPSTREAM_LIMITER', limiter)
+        responses = [FakeResponse(429, {'Retry-After': '0.05'}), FakeResponse(200)]
+        calls = []
+
+        def fake_get(url, **kwargs):
+            calls.append(kwargs)
+            return responses.pop(0)
+
+        response = flask_app.upstream_get(fake_get, HOST, timeout=5)
+        assert response.status_code == 200
+        assert calls == [{'timeout': 5}, {'timeout': 5}]
+        stats = limiter.stats()['www.dndbeyond.com']
+        assert (stats['requests'], stats['throttled']) == (2, 1)
+
+    def test_gives_up_after_retries(self, monkeypatch):
+        monkeypatch.setattr(flask_app, 'UPSTREAM_LIMITER', UpstreamLimiter(rate=100, burst=10))
+        calls = []
+
+        def fake_get(url, **kwargs):
+            calls.append(url)
+            return FakeResponse(503, {'Retry-After': '0'})
+
+        assert flask_app.upstream_get(fake_get, HOST, retries=1).status_code == 503
+        assert len(calls) == 2
+
+    def test_limits_endpoint(self, client, monkeypatch):
+        limiter = UpstreamLimiter(rate=3)
+        monkeypatch.setattr(flask_app, 'UPSTREAM_LIMITER', limiter)
+        limiter.record(HOST, 200, 0.5)
+
+        data = json.loads(client.get('/api/upstream/limits').data)
+        assert data['success'] is True
+        assert data['settings']['rate'] == 3
+        assert data['hosts']['www.dndbeyond.com']['requests'] == 1
+        assert data['hosts']['www.dndbeyond.com']['avgLatency'] == 0.5
+        assert data['caps'] == {}
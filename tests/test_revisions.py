@@ -0,0 +1,127 @@
+"""
+Tests for adventure revisions and merging saves from several tabs or devices.
+"""
+import copy
+
+import app as flask_app
+from journal import merge
+
+
+def adventure(*hps):
+    return {
+        'name': 'Shared',
+        'players': [{'name': 'Aria', 'dndBeyondUrl': 'https://www.dndbeyond.com/characters/100'}],
+        'encounters': [{'name': f'Encounter {i + 1}', 'state': 'started', 'combatants': [
+            {'name': 'Ogre', 'dndBeyondUrl': 'https://www.dndbeyond.com/monsters/17002-ogre', 'hp': hp, 'maxHp': 59},
+        ]} for i, hp in enumerate(hps)],
+    }
+
+
+def hps(data):
+    return [e['combatants'][0]['hp'] for e in data['encounters']]
+
+
+class TestMerge:
+    """Three-way merges of stored adventures."""
+
+    def test_different_encounters(self):
+        base = adventure(59, 59, 59)
+        ours, theirs = adventure(40, 59, 59), adventure(59, 59, 12)
+        merged, conflicts = merge(base, ours, theirs)
+        assert conflicts == []
+        assert hps(merged) == [40, 59, 12]
+        assert ours == adventure(40, 59, 59)
+
+    def test_same_encounter(self):
+        base = adventure(59, 59)
+        merged, conflicts = merge(base, adventure(40, 59), adventure(30, 59))
+        assert merged is None
+        assert conflicts == [['encounters', 0, 'combatants', 0, 'hp']]
+
+    def test_same_change_on_both_sides(self):
+        merged, conflicts = merge(adventure(59, 59), adventure(40, 59), adventure(40, 12))
+        assert (hps(merged), conflicts) == ([40, 12], [])
+
+    def test_added_encounter(self):
+        base = adventure(59, 59)
+        ours = adventure(59, 59, 59)
+        merged, conflicts = merge(base, ours, adventure(20, 59))
+        assert (hps(merged), conflicts) == ([20, 59, 59], [])
+
+    def test_removed_encounter_moves_later_ones(self):
+        base = adventure(59, 58, 57)
+        ours = copy.deepcopy(base)
+        del ours['encounters'][0]
+        merged, conflicts = merge(base, ours, adventure(59, 58, 10))
+        assert merged is None and conflicts
+
+
+class TestRevisions:
+    """Loads return a revision; saves from an old one are merged or refused."""
+
+    def load(self, client):
+        return client.get('/api/adventure/Shared').get_json()
+
+    def save(self, client, data):
+        return client.post('/api/adventure/Shared', json=data)
+
+    def test_revision_increments(self, client):
+        self.save(client, adventure(59, 59))
+        loaded = self.load(client)
+        assert loaded['revision'] == 0
+
+        loaded['encounters'][0]['combatants'][0]['hp'] = 30
+        assert self.save(client, loaded).get_json() == {'success': True, 'revision': 1}
+        assert self.load(client)['revision'] == 1
+        # The revision isn't stored with the adventure
+        assert 'revision' not in flask_app.read_adventure('Shared')
+
+    def test_non_overlapping_saves_merge(self, client):
+        self.save(client, adventure(59, 59))
+        tab_a, tab_b = self.load(client), self.load(client)
+
+        tab_a['encounters'][0]['combatants'][0]['hp'] = 30
+        assert self.save(client, tab_a).status_code == 200
+        tab_b['encounters'][1]['combatants'][0]['hp'] = 12
+        result = self.save(client, tab_b).get_json()
+
+        assert result['merged'] is True
+        assert result['revision'] == 2
+        assert hps(result['adventure']) == [30, 12]
+        assert hps(self.load(client)) == [30, 12]
+        # Just tab A's change, for tab B to apply to edits it made meanwhile
+        assert [(c['op'], c['path'], c['value']) for c in result['changes']] == [
+            ('set', ['encounters', 0, 'combatants', 0, 'hp'], 30)]
+
+    def test_overlapping_saves_conflict(self, client):
+        self.save(client, adventure(59, 59))
+        tab_a, tab_b = self.load(client), self.load(client)
+
+        tab_a['encounters'][0]['combatants'][0]['hp'] = 30
+        self.save(client, tab_a)
+        tab_b['encounters'][0]['combatants'][0]['hp'] = 5
+        response = self.save(client, tab_b)
+
+        assert response.status_code == 409
+        body = response.get_json()
+        assert body['revision'] == 1
+        assert body['conflicts'] == [['encounters', 0, 'combatants', 0, 'hp']]
+        assert hps(body['adventure']) == [30, 59]
+        assert hps(self.load(client)) == [30, 59]
+
+    def test_unknown_revision(self, client):
+        self.save(client, adventure(59))
+        loaded = self.load(client)
+        loaded['revision'] = 5
+        assert self.save(client, loaded).status_code == 409
+
+    def test_invalid_revision(self, client):
+        self.save(client, adventure(59))
+        response = self.save(client, {**adventure(59), 'revision': 'latest'})
+        assert response.status_code == 400
+
+    def test_save_without_revision_overwrites(self, client):
+        self.save(client, adventure(59, 59))
+        self.save(client, adventure(30, 59))
+        assert self.save(client, adventure(59, 10)).get_json() == {'success': True, 'revision': 2}
+        assert hps(self.load(client)) == [59, 10]
@@ -170,8 +170,8 @@ class TestAdventureDataIntegrity:
         assert response.status_code == 200
         
         # Verify update
-        with open(adventure_path, 'r', encoding='utf-8') as f:
-            updated = json.load(f)
+        from app import read_adventure
+        updated = read_adventure("Update Test")
         
         assert updated['chapters'] == ["New Chapter"]
     
@@ -0,0 +1,136 @@
+"""
+Tests for the production WSGI server (serving.py).
+"""
+import http.client
+import socket
+import threading
+import time
+
+import pytest
+
+from serving import ProductionServer, WorkerPool
+
+
+def slow_app(environ, start_response):
+    """Minimal WSGI app; /slow blocks until the test releases it."""
+    if environ['PATH_INFO'] == '/slow':
+        environ['test.release'].wait(5)
+    body = b'ok'
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def server_factory(release):
+    servers = []
+
+    def make(**kwargs):
+        def app(environ, start_response):
+            environ['test.release'] = release
+            return slow_app(environ, start_response)
+        server = ProductionServer(app, **kwargs)
+        listener = server.add_listener('HTTP', '127.0.0.1', 0)
+        server.start()
+        servers.append(server)
+        return server, listener.port
+
+    yield make
+    release.set()
+    for server in servers:
+        server.shutdown(timeout=2)
+
+
+class TestWorkerPool:
+    """Tests for the bounded worker pool."""
+
+    def test_rejects_when_queue_full(self):
+        gate = threading.Event()
+        pool = WorkerPool(workers=1, queue_size=1)
+        assert pool.submit(gate.wait) is True  # picked up by the worker
+        time.sleep(0.05)
+        assert pool.submit(gate.wait) is True  # waits in the queue
+        assert pool.submit(gate.wait) is False
+        gate.set()
+        assert pool.shutdown(timeout=2) is True
+
+
+class TestProductionServer:
+    """Tests for keep-alive, overload shedding and graceful shutdown."""
+
+    def test_keep_alive_connection_is_reused(self, server_factory):
+        server, port = server_factory(workers=2, queue_size=4)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        for _ in range(3):
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            assert response.status == 200
+            assert response.read() == b'ok'
+            assert not response.will_close
+        conn.close()
+        # Idle connections don't hold a worker between requests
+        assert server.stats()['busy'] == 0
+
+    def test_idle_connections_dont_hold_workers(self, server_factory):
+        """Connections that haven't sent a request yet (preconnects, phones
+        reconnecting) wait on the selector, not on a worker."""
+        server, port = server_factory(workers=2, queue_size=4, keep_alive=0.5)
+        idle = [socket.create_connection(('127.0.0.1', port)) for _ in range(4)]
+        try:
+            started = time.monotonic()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            assert conn.getresponse().status == 200
+            assert time.monotonic() - started < 1
+            conn.close()
+            deadline = time.monotonic() + 1
+            while server.stats()['busy']:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+            assert server.stats()['idle'] >= 3
+
+            # Connections that never send a request are closed after keep_alive
+            idle[0].settimeout(5)
+            assert idle[0].recv(1) == b''
+        finally:
+            for sock in idle:
+                sock.close()
+
+    def test_overload_returns_503(self, server_factory, release):
+        server, port = server_factory(workers=1, queue_size=1)
+        blockers = []
+        # One request running, then one waiting in the queue
+        for stat in ('busy', 'queued'):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/slow')
+            blockers.append(conn)
+            deadline = time.monotonic() + 5
+            while server.pool.stats()[stat] < 1:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        assert response.status == 503
+        assert response.getheader('Retry-After') == '1'
+
+        release.set()
+        for blocker in blockers:
+            assert blocker.getresponse().status == 200
+
+    def test_shutdown_lets_in_flight_requests_finish(self, server_factory, release):
+        server, port = server_factory(workers=2, queue_size=2)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/slow')
+        time.sleep(0.1)
+
+        threading.Timer(0.2, release.set).start()
+        assert server.shutdown(timeout=5) is True
+        assert conn.getresponse().status == 200
@@ -0,0 +1,129 @@
+"""
+Tests for the statistics aggregation API (adventure_stats.py and
+/api/adventure/<name>/statistics).
+"""
+import json
+
+import app as flask_app
+from adventure_stats import AdventureStatistics
+from difficulty import DifficultyEngine
+from monster_search import MonsterIndex
+
+MONSTERS = {
+    'Ogre': {'cr': '2', 'url': 'https://www.dndbeyond.com/monsters/17002-ogre'},
+    'Goblin': {'cr': '1/4', 'url': 'https://www.dndbeyond.com/monsters/16907-goblin'},
+}
+
+
+def stored_adventure(**overrides):
+    """An adventure as saved on disk (short IDs, 'init', defaults stripped)."""
+    adventure = {
+        'name': 'Stats Adventure',
+        'players': [
+            {'name': 'Aria', 'dndBeyondUrl': '111', 'level': 3},
+            {'name': 'Brom', 'dndBeyondUrl': '222', 'level': 3},
+        ],
+        'encounters': [
+            {'name': 'Bridge', 'chapter': 'One', 'state': 'complete', 'combatants': [
+                {'id': '111', 'init': 15, 'dmg': 12},
+                {'id': '222', 'init': 9, 'dmg': 4},
+                {'id': '17002-ogre', 'name': 'Ogre', 'maxHp': 59, 'hp': 30, 'dmg': 7},
+            ]},
+            {'name': 'Camp', 'chapter': 'One', 'state': 'started', 'combatants': [
+                {'id': '111', 'init': 3, 'dmg': 5},
+                {'name': 'Goblin 1', 'maxHp': 7, 'hp': 0},
+                {'name': 'Goblin 2', 'maxHp': 7, 'hp': 7},
+            ]},
+            {'name': 'Lair', 'chapter': 'Two', 'totalCR': '5', 'combatants': [
+                {'id': '17002-ogre', 'name': 'Ogre', 'maxHp': 59, 'hp': 1},
+            ]},
+        ],
+    }
+    adventure.update(overrides)
+    return adventure
+
+
+def write_adventure(adventure):
+    flask_app.MONSTERS_CACHE.write_text(json.dumps(MONSTERS))
+    (flask_app.DATA_DIR / f"{adventure['name']}.json").write_text(json.dumps(adventure))
+
+
+class TestStatisticsEndpoint:
+    """The endpoint returns precomputed chart series."""
+
+    def test_aggregates(self, client):
+        write_adventure(stored_adventure())
+        stats = client.get('/api/adventure/Stats Adventure/statistics').get_json()
+
+        assert stats['success'] is True
+        assert stats['players'] == ['Aria', 'Brom']
+        assert stats['initiative'] == {'Aria': [15, 3], 'Brom': [9]}
+        assert stats['damageTotals'] == {'Aria': 17, 'Brom': 4}
+
+        bridge, camp, lair = stats['encounters']
+        assert (bridge['number'], bridge['cr'], bridge['xp']) == (1, '2', 450)
+        # A party of two bumps the multiplier: 675 XP against 450 (hard) / 800 (deadly)
+        assert bridge['difficulty2014'] == 'hard'
+        assert bridge['enemyDamage'] == 7
+        # 29 HP lost by the ogre, 16 credited to players
+        assert bridge['otherDamage'] == 13
+        # Two goblins: 100 XP * 1.5
+        assert (camp['cr'], camp['xp']) == ('1/2', 150)
+        assert camp['playerDamage'] == {'Aria': 5}
+        assert camp['otherDamage'] == 2
+        # Custom CR; unstarted encounters don't count damage
+        assert (lair['cr'], lair['crValue'], lair['xp']) == ('5', 5, 1800)
+        assert lair['otherDamage'] == 0
+        assert lair['cumulativeXpPerPlayer'] == (450 + 150 + 1800) / 2
+
+    def test_completed_only(self, client):
+        write_adventure(stored_adventure())
+        stats = client.get('/api/adventure/Stats Adventure/statistics?completed=true').get_json()
+        assert [e['name'] for e in stats['encounters']] == ['Bridge']
+        assert stats['initiative'] == {'Aria': [15], 'Brom': [9]}
+
+    def test_pin_protected_adventure_shows_completed_only(self, client):
+        write_adventure(stored_adventure(pin='1234', pinVersion=1))
+        stats = client.get('/api/adventure/Stats Adventure/statistics').get_json()
+        assert stats['completedOnly'] is True
+        assert [e['name'] for e in stats['encounters']] == ['Bridge']
+
+        client.post('/api/adventure/Stats Adventure/verify-pin', json={'pin': '1234'})
+        stats = client.get('/api/adventure/Stats Adventure/statistics').get_json()
+        assert len(stats['encounters']) == 3
+
+    def test_missing_adventure(self, client):
+        response = client.get('/api/adventure/Nope/statistics')
+        assert response.status_code == 404
+        assert response.get_json()['success'] is False
+
+
+class TestIncrementalStatistics:
+    """Encounter summaries are reused until that encounter changes."""
+
+    def make(self):
+        restored = []
+
+        def restore(data):
+            restored.append(data['encounters'][0]['name'])
+            return flask_app.restore_adventure_from_storage(data)
+
+        return AdventureStatistics(restore), DifficultyEngine(MonsterIndex(MONSTERS)), restored
+
+    def test_only_changed_encounters_are_recomputed(self):
+        stats, engine, restored = self.make()
+        adventure = stored_adventure()
+        stats.build(adventure, engine)
+        assert restored == ['Bridge', 'Camp', 'Lair']
+
+        adventure['encounters'][1]['state'] = 'complete'
+        result = stats.build(adventure, engine)
+        assert restored == ['Bridge', 'Camp', 'Lair', 'Camp']
+        assert result['encounters'][1]['state'] == 'complete'
+
+    def test_results_are_cached_per_version(self):
+        stats, engine, restored = self.make()
+        first = stats.build(stored_adventure(), engine, version=('file', 1, 100))
+        assert stats.build(stored_adventure(), engine, version=('file', 1, 100)) is first
+        assert stats.build(stored_adventure(), engine, version=('file', 2, 100)) is not first
+        assert len(restored) == 3
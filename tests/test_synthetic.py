@@ -0,0 +1,52 @@
+"""
+Tests for the synthetic adventure generator (benchmarks/synthetic.py).
+"""
+from collections import Counter
+
+import app as flask_app
+from benchmarks.synthetic import generate_adventure, write_adventure
+
+
+class TestGenerateAdventure:
+    """Generated adventures have the requested size and state mix."""
+
+    def test_size_and_states(self):
+        data = generate_adventure('Big', encounters=30, combatants=12, players=5, complete=0.5, started=2)
+
+        assert len(data['players']) == 5
+        assert len(data['chapters']) == 3
+        assert [len(e['combatants']) for e in data['encounters']] == [12] * 30
+        states = [e['state'] for e in data['encounters']]
+        assert states == ['complete'] * 15 + ['started'] * 2 + ['unstarted'] * 13
+        # Monsters from completed encounters have been identified
+        assert data['identifiedMonsters']
+        monster_urls = {c['dndBeyondUrl'] for e in data['encounters'] for c in e['combatants']
+                        if '/monsters/' in c['dndBeyondUrl']}
+        assert all(url.startswith('https://www.dndbeyond.com/monsters/') for url in monster_urls)
+
+    def test_seeded(self):
+        assert generate_adventure(encounters=5, seed=3) == generate_adventure(encounters=5, seed=3)
+        assert generate_adventure(encounters=5, seed=3) != generate_adventure(encounters=5, seed=4)
+
+    def test_at_least_one_monster(self):
+        data = generate_adventure(encounters=2, combatants=4, players=6)
+        assert [len(e['combatants']) for e in data['encounters']] == [7, 7]
+
+
+class TestServingGeneratedAdventures:
+    """A generated adventure loads, saves and shows on the spectator view."""
+
+    def test_round_trip(self, client):
+        data = generate_adventure('Synthetic', encounters=12, combatants=10, players=4, complete=0.5)
+        write_adventure(data, flask_app.DATA_DIR / 'Synthetic.json')
+
+        loaded = client.get('/api/adventure/Synthetic').get_json()
+        assert Counter(e['state'] for e in loaded['encounters']) == {'complete': 6, 'started': 1, 'unstarted': 5}
+        assert loaded['players'][0]['dndBeyondUrl'] == data['players'][0]['dndBeyondUrl']
+
+        spectator = client.get('/api/current-encounter').get_json()
+        assert spectator['active'] is True
+
+        assert client.post('/api/adventure/Synthetic', json=loaded).get_json()['success'] is True
+        stats = client.get('/api/adventure/Synthetic/statistics').get_json()
+        assert len(stats['encounters']) == 12